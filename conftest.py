@@ -2,6 +2,13 @@ import pytest
 import responses
 
 
+@pytest.fixture(autouse=True)
+def _clear_reference_cache():
+    from gsl_demarches_simplifiees.importer.reference_cache import reference_cache
+
+    reference_cache.clear()
+
+
 @pytest.fixture(autouse=True)
 def _block_outbound_http():
     with responses.RequestsMock(assert_all_requests_are_fired=False) as rsps:
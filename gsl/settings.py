@@ -433,11 +433,159 @@ DS_SYNC_LOCK_TIMEOUT = int(os.getenv("DS_SYNC_LOCK_TIMEOUT", 30 * 60))  # 30 min
 DS_INIT_SYNC_LOCK_TIMEOUT = int(
     os.getenv("DS_INIT_SYNC_LOCK_TIMEOUT", 6 * 60 * 60)
 )  # 6 h
+# Synchronisation initiale découpée en lots : la période depuis la date choisie
+# est divisée en DS_INIT_SYNC_SHARDS fenêtres de dateDerniereModification,
+# chacune parcourue par sa propre tâche avec son propre curseur (1 = parcours
+# unique, comme une sync incrémentale). Un lot en échec est retenté seul, au
+# plus DS_INIT_SYNC_SHARD_MAX_RETRIES fois.
+DS_INIT_SYNC_SHARDS = int(os.getenv("DS_INIT_SYNC_SHARDS", 1))
+DS_INIT_SYNC_SHARD_MAX_RETRIES = int(os.getenv("DS_INIT_SYNC_SHARD_MAX_RETRIES", 5))
+DS_INIT_SYNC_SHARD_RETRY_DELAY = int(
+    os.getenv("DS_INIT_SYNC_SHARD_RETRY_DELAY", 60)
+)  # secondes
+# Un lot en cours sans nouvelle page depuis ce délai (worker tué) est relancé
+# par task_redispatch_stale_sync_shards ; c'est aussi le TTL de son verrou.
+DS_INIT_SYNC_SHARD_STALE_AFTER = int(
+    os.getenv("DS_INIT_SYNC_SHARD_STALE_AFTER", 15 * 60)
+)  # secondes
+
+# Ingestion ensembliste des pages de dossiers DN : une requête pour charger les
+# dossiers existants de la page, bulk_create / bulk_update pour les écritures et
+# une seule tâche de rafraîchissement par page (au lieu d'une par dossier).
+DS_SYNC_BULK_PAGE_INGESTION = (
+    os.getenv("DS_SYNC_BULK_PAGE_INGESTION", "false").lower() == "true"
+)
+# Récupère la page DN suivante dans un thread pendant l'enregistrement de la
+# page courante. Les curseurs restent sauvegardés après traitement de chaque page.
+DS_SYNC_PIPELINED_FETCH = (
+    os.getenv("DS_SYNC_PIPELINED_FETCH", "false").lower() == "true"
+)
+# Taille de page adaptative pour getDemarcheDossiers : elle grandit quand les
+# réponses sont rapides et légères, et diminue après une réponse lente, un
+# timeout ou une erreur GraphQL. DN plafonne `first` à 100.
+DS_SYNC_PAGE_SIZE_INITIAL = int(os.getenv("DS_SYNC_PAGE_SIZE_INITIAL", 50))
+DS_SYNC_PAGE_SIZE_MIN = int(os.getenv("DS_SYNC_PAGE_SIZE_MIN", 10))
+DS_SYNC_PAGE_SIZE_MAX = int(os.getenv("DS_SYNC_PAGE_SIZE_MAX", 100))
+DS_SYNC_PAGE_FAST_SECONDS = float(os.getenv("DS_SYNC_PAGE_FAST_SECONDS", 3))
+DS_SYNC_PAGE_SLOW_SECONDS = float(os.getenv("DS_SYNC_PAGE_SLOW_SECONDS", 20))
+DS_SYNC_PAGE_SMALL_BYTES = int(
+    os.getenv("DS_SYNC_PAGE_SMALL_BYTES", 2 * 1024 * 1024)
+)  # 2 Mo
+# Profil de sync des pages de dossiers : "full" (dossiers complets),
+# "instruction" (annotations seules) ou "state-only" (état et dates). Hors
+# "full", seuls les dossiers nouveaux ou modifiés depuis la dernière sync
+# (dateDerniereModification) sont ensuite récupérés en entier, par lots.
+DS_SYNC_PROFILE = os.getenv("DS_SYNC_PROFILE", "full")
+# Mêmes noms que ds_client.SYNC_PROFILES
+if DS_SYNC_PROFILE not in ("full", "instruction", "state-only"):
+    raise ValueError(
+        "DS_SYNC_PROFILE must be one of 'full', 'instruction' or 'state-only'. "
+        f"Got {DS_SYNC_PROFILE} instead."
+    )
+DS_SYNC_ESCALATION_BATCH_SIZE = int(os.getenv("DS_SYNC_ESCALATION_BATCH_SIZE", 20))
+
+# Budget global (partagé via Redis entre tous les workers) des requêtes de
+# synchronisation vers DN : débit en requêtes par seconde (seau à jetons) et
+# nombre maximal de requêtes simultanées. 0 = pas de limite.
+DS_API_RATE_LIMIT_PER_SECOND = float(os.getenv("DS_API_RATE_LIMIT_PER_SECOND", 0))
+DS_API_MAX_IN_FLIGHT = int(os.getenv("DS_API_MAX_IN_FLIGHT", 0))
+# Attente maximale (secondes) pour obtenir le budget avant d'abandonner la sync
+DS_API_RATE_BUDGET_MAX_WAIT = int(os.getenv("DS_API_RATE_BUDGET_MAX_WAIT", 5 * 60))
+
+# Appels HTTP à l'API DN : session keep-alive, timeouts (secondes) et nouvelles
+# tentatives avec backoff exponentiel pour les requêtes en lecture uniquement
+# (5xx, 429, connexion coupée). Les mutations ne sont jamais rejouées.
+DS_API_CONNECT_TIMEOUT = float(os.getenv("DS_API_CONNECT_TIMEOUT", 5))
+DS_API_READ_TIMEOUT = float(os.getenv("DS_API_READ_TIMEOUT", 60))
+DS_API_MAX_RETRIES = int(os.getenv("DS_API_MAX_RETRIES", 3))
+DS_API_RETRY_BACKOFF = float(os.getenv("DS_API_RETRY_BACKOFF", 1))
+DS_API_RETRY_MAX_DELAY = float(os.getenv("DS_API_RETRY_MAX_DELAY", 30))
+DS_API_POOL_MAXSIZE = int(os.getenv("DS_API_POOL_MAXSIZE", 10))
+# Taille des blocs (octets) lus pour calculer le checksum et envoyer les pièces
+# jointes à DN : le fichier n'est jamais chargé entièrement en mémoire.
+DS_UPLOAD_CHUNK_SIZE = int(os.getenv("DS_UPLOAD_CHUNK_SIZE", 1024 * 1024))  # 1 Mo
+# Nombre de dossiers dont les annotations sont modifiées par requête DN en mode
+# multi-dossiers (mutations aliasées dans un même document GraphQL).
+DS_ANNOTATIONS_BATCH_SIZE = int(os.getenv("DS_ANNOTATIONS_BATCH_SIZE", 20))
+
+# Outbox des mutations DN : les transitions de statut des projets enregistrent
+# les mutations DN (annotations, repasser en instruction) en base, et une tâche
+# Celery les envoie ensuite par lots au lieu de les faire dans la requête.
+DS_MUTATIONS_OUTBOX_ENABLED = (
+    os.getenv("DS_MUTATIONS_OUTBOX_ENABLED", "false").lower() == "true"
+)
+# Nombre maximal de mutations envoyées par exécution de la tâche
+DS_MUTATIONS_DRAIN_LIMIT = int(os.getenv("DS_MUTATIONS_DRAIN_LIMIT", 500))
+DS_MUTATIONS_DRAIN_LOCK_TIMEOUT = int(
+    os.getenv("DS_MUTATIONS_DRAIN_LOCK_TIMEOUT", 15 * 60)
+)  # 15 min
+# Nouvelles tentatives après une erreur de connexion à DN (backoff exponentiel,
+# en secondes) avant d'abandonner la mutation
+DS_MUTATIONS_MAX_ATTEMPTS = int(os.getenv("DS_MUTATIONS_MAX_ATTEMPTS", 5))
+DS_MUTATIONS_RETRY_BACKOFF = int(os.getenv("DS_MUTATIONS_RETRY_BACKOFF", 60))
+DS_MUTATIONS_RETRY_MAX_DELAY = int(os.getenv("DS_MUTATIONS_RETRY_MAX_DELAY", 60 * 60))
+
+# Stockage froid des payloads DN (DossierData) : le JSONB raw_data ne garde que
+# les champs lus par la conversion, le payload complet est archivé compressé
+# (zstd si le paquet zstandard est installé, zlib sinon) dans raw_data_archive.
+DS_RAW_DATA_COLD_STORAGE = (
+    os.getenv("DS_RAW_DATA_COLD_STORAGE", "false").lower() == "true"
+)
+# Niveau de compression zstd des archives
+DS_RAW_DATA_ARCHIVE_LEVEL = int(os.getenv("DS_RAW_DATA_ARCHIVE_LEVEL", 10))
+
+# Durée de vie (secondes) du cache mémoire des données de référence utilisées
+# pour convertir les dossiers DN (départements, périmètres, catégories…)
+DS_REFERENCE_CACHE_TTL = int(os.getenv("DS_REFERENCE_CACHE_TTL", 10 * 60))
+# Redis où sont partagés les compteurs d'invalidation de ce cache entre
+# workers (vide : invalidation locale au process, seul le TTL s'applique ailleurs)
+DS_REFERENCE_CACHE_REDIS_URL = os.getenv(
+    "DS_REFERENCE_CACHE_REDIS_URL", CELERY_BROKER_URL
+)
+# Nombre de dossiers rafraîchis par tâche task_refresh_dossiers_from_saved_data
+DS_REFRESH_BATCH_SIZE = int(os.getenv("DS_REFRESH_BATCH_SIZE", 100))
 
-# TTL du verrou « une requête à la fois » par token proxy DS (secondes).
-# Filet de sécurité si un worker meurt sans libérer le verrou : doit rester
+# TTL d'un créneau de requête par token proxy DS (secondes).
+# Filet de sécurité si un worker meurt sans libérer son créneau : doit rester
 # au-dessus de la durée max d'un forward DS (_DS_TIMEOUT = 5 + 55s).
 DS_PROXY_TOKEN_LOCK_TIMEOUT = int(os.getenv("DS_PROXY_TOKEN_LOCK_TIMEOUT", 90))
+# Requêtes simultanées par token (surchargeable token par token avec
+# max_concurrent_requests), puis file d'attente courte : au plus
+# DS_PROXY_TOKEN_QUEUE_SIZE requêtes attendent un créneau, pendant
+# DS_PROXY_TOKEN_QUEUE_TIMEOUT secondes, avant un 429. Par défaut une seule
+# requête à la fois, comme avec l'ancien verrou par token.
+DS_PROXY_TOKEN_MAX_CONCURRENCY = int(os.getenv("DS_PROXY_TOKEN_MAX_CONCURRENCY", 1))
+DS_PROXY_TOKEN_QUEUE_SIZE = int(os.getenv("DS_PROXY_TOKEN_QUEUE_SIZE", 2))
+DS_PROXY_TOKEN_QUEUE_TIMEOUT = float(os.getenv("DS_PROXY_TOKEN_QUEUE_TIMEOUT", 3))
+
+# Cache court des réponses du proxy DS (cf. gsl_ds_proxy/cache.py).
+# TTL en secondes, surchargeable par opération : "getDemarche=120,getDossier=0"
+# (0 désactive le cache pour l'opération).
+DS_PROXY_CACHE_ENABLED = os.getenv("DS_PROXY_CACHE_ENABLED", "false").lower() == "true"
+# Redis des caches du proxy (réponses, requêtes persistées)
+DS_PROXY_CACHE_REDIS_URL = os.getenv("DS_PROXY_CACHE_REDIS_URL", CELERY_BROKER_URL)
+DS_PROXY_CACHE_TTL = int(os.getenv("DS_PROXY_CACHE_TTL", 60))
+DS_PROXY_CACHE_TTL_BY_OPERATION = {
+    operation_name.strip(): int(ttl)
+    for operation_name, ttl in (
+        item.split("=", 1)
+        for item in os.getenv("DS_PROXY_CACHE_TTL_BY_OPERATION", "").split(",")
+        if item.strip()
+    )
+}
+# Taille max (octets) d'une réponse mise en cache
+DS_PROXY_CACHE_MAX_BYTES = int(os.getenv("DS_PROXY_CACHE_MAX_BYTES", 2 * 1024 * 1024))
+# Documents GraphQL validés gardés en mémoire par worker, et durée de vie
+# (secondes) des requêtes persistées dans Redis (cf. gsl_ds_proxy/documents.py)
+DS_PROXY_PREPARED_QUERY_CACHE_SIZE = int(
+    os.getenv("DS_PROXY_PREPARED_QUERY_CACHE_SIZE", 256)
+)
+DS_PROXY_PERSISTED_QUERY_TTL = int(
+    os.getenv("DS_PROXY_PERSISTED_QUERY_TTL", 30 * 24 * 3600)
+)
+# Connexions keep-alive gardées vers DS par worker du proxy
+# (cf. gsl_ds_proxy/upstream.py)
+DS_PROXY_UPSTREAM_POOL_SIZE = int(os.getenv("DS_PROXY_UPSTREAM_POOL_SIZE", 10))
 
 
 # Storage
@@ -11,6 +11,8 @@ CELERY_TASK_EAGER_PROPAGATES = True
 
 BYPASS_ANTIVIRUS = True
 
+DS_REFERENCE_CACHE_REDIS_URL = ""
+
 STORAGES = {
     "default": {
         "BACKEND": "django.core.files.storage.InMemoryStorage",
@@ -0,0 +1,42 @@
+import time
+
+# KEYS[1] = zset {bail: date d'acquisition}, ARGV = max, now, ttl, bail.
+# Les baux plus vieux que le TTL (process mort sans libérer) sont récupérés.
+_LEASE_SEMAPHORE_SCRIPT = """
+local max_leases = tonumber(ARGV[1])
+local now = tonumber(ARGV[2])
+local ttl = tonumber(ARGV[3])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - ttl)
+if redis.call('ZCARD', KEYS[1]) < max_leases then
+    redis.call('ZADD', KEYS[1], now, ARGV[4])
+    redis.call('EXPIRE', KEYS[1], ttl)
+    return 1
+end
+return 0
+"""
+
+
+class LeaseSemaphore:
+    """Sémaphore Redis non bloquant : au plus N baux en cours sur ``key``.
+
+    Chaque bail est daté dans un zset ; un bail plus vieux que ``ttl`` secondes
+    est récupéré à la prochaine acquisition, et la clé expire avec le dernier
+    bail : un process tué ne bloque jamais le sémaphore au-delà du TTL.
+    """
+
+    def __init__(self, client, key, ttl):
+        self.client = client
+        self.key = key
+        self.ttl = ttl
+        self._acquire = client.register_script(_LEASE_SEMAPHORE_SCRIPT)
+
+    def acquire(self, max_leases, lease_id) -> bool:
+        return bool(
+            self._acquire(
+                keys=[self.key], args=[max_leases, time.time(), self.ttl, lease_id]
+            )
+        )
+
+    def release(self, lease_id) -> bool:
+        """Retourne False si le bail avait déjà expiré."""
+        return bool(self.client.zrem(self.key, lease_id))
@@ -7,6 +7,9 @@ from django.core.management.base import BaseCommand, CommandError
 from django.db import transaction
 
 from gsl_core.models import Arrondissement, Commune, Departement, Region
+from gsl_demarches_simplifiees.importer.reference_cache import (
+    invalidate_reference_cache,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -48,6 +51,7 @@ class Command(BaseCommand):
         self.import_departements()
         self.import_arrondissements()
         self.import_communes()
+        transaction.on_commit(invalidate_reference_cache)
         self.stdout.write(self.style.SUCCESS("Terminé."))
 
     def import_regions(self):
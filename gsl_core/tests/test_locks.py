@@ -0,0 +1,31 @@
+from unittest.mock import MagicMock, patch
+
+from gsl_core.locks import LeaseSemaphore
+
+
+@patch("gsl_core.locks.time.time", return_value=1000.0)
+def test_acquire_runs_the_script_with_the_lease(mock_time):
+    client = MagicMock()
+    client.register_script.return_value.return_value = 1
+    semaphore = LeaseSemaphore(client, "some:key", 90)
+
+    assert semaphore.acquire(3, "lease-1") is True
+
+    client.register_script.return_value.assert_called_once_with(
+        keys=["some:key"], args=[3, 1000.0, 90, "lease-1"]
+    )
+
+
+def test_acquire_returns_false_when_every_lease_is_taken():
+    client = MagicMock()
+    client.register_script.return_value.return_value = 0
+
+    assert LeaseSemaphore(client, "some:key", 90).acquire(1, "lease-1") is False
+
+
+def test_release_reports_an_expired_lease():
+    client = MagicMock()
+    client.zrem.return_value = 0
+
+    assert LeaseSemaphore(client, "some:key", 90).release("lease-1") is False
+    client.zrem.assert_called_once_with("some:key", "lease-1")
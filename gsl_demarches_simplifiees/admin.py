@@ -1,3 +1,6 @@
+from itertools import batched
+
+from django.conf import settings
 from django.contrib import admin, messages
 from django.db.models import Count, JSONField
 from django.shortcuts import redirect, render
@@ -10,7 +13,11 @@ from django.utils.safestring import mark_safe
 from django_json_widget.widgets import JSONEditorWidget
 from import_export.admin import ImportExportMixin
 
-from gsl.celery import TASK_PRIORITY_LOW, priority_for_dispatch_count
+from gsl.celery import (
+    TASK_PRIORITY_HIGH,
+    TASK_PRIORITY_LOW,
+    priority_for_dispatch_count,
+)
 from gsl.utils.csp import csp_update
 from gsl_core.admin import AllPermsForStaffUser
 from gsl_core.models import Arrondissement
@@ -31,21 +38,26 @@ from .models import (
     CategorieDetr,
     CategorieDsil,
     Demarche,
+    DemarcheSyncShard,
     Dossier,
     DossierData,
+    DsMutation,
     FieldMapping,
+    GroupeInstructeur,
     NaturePorteurProjet,
     PersonneMorale,
     Profile,
 )
 from .resources import FieldMappingResource
 from .tasks import (
+    task_drain_ds_mutations,
     task_init_demarche_sync,
-    task_refresh_dossier_from_saved_data,
+    task_refresh_dossiers_from_saved_data,
     task_refresh_field_mappings_from_demarche_data,
     task_save_demarche_dossiers_from_ds,
     task_save_demarche_from_ds,
     task_save_one_dossier_from_ds,
+    task_sync_demarche_shard,
 )
 
 
@@ -86,6 +98,7 @@ class DemarcheAdmin(AllPermsForStaffUser, admin.ModelAdmin):
                     "sync_cursor",
                     "pending_deleted_cursor",
                     "deleted_cursor",
+                    "last_synced_at",
                 )
             },
         ),
@@ -213,7 +226,11 @@ class DemarcheAdmin(AllPermsForStaffUser, admin.ModelAdmin):
                 demarche = form.cleaned_data["demarche"]
                 updated_after = form.cleaned_data["updated_after"]
                 task_init_demarche_sync.apply_async(
-                    (demarche.ds_number, updated_after.isoformat()),
+                    (
+                        demarche.ds_number,
+                        updated_after.isoformat(),
+                        form.cleaned_data["shards_count"],
+                    ),
                     priority=TASK_PRIORITY_LOW,
                 )
                 self.message_user(
@@ -439,9 +456,12 @@ class DossierAdmin(AllPermsForStaffUser, admin.ModelAdmin):
             refresh_dossier_from_saved_data(queryset.get())
         else:
             count = queryset.count()
-            for dossier in queryset:
-                task_refresh_dossier_from_saved_data.apply_async(
-                    (dossier.ds_number,),
+            for dossier_numbers in batched(
+                queryset.values_list("ds_number", flat=True),
+                settings.DS_REFRESH_BATCH_SIZE,
+            ):
+                task_refresh_dossiers_from_saved_data.apply_async(
+                    (list(dossier_numbers),),
                     priority=priority_for_dispatch_count(count),
                 )
 
@@ -476,6 +496,7 @@ class DossierAdmin(AllPermsForStaffUser, admin.ModelAdmin):
             "perimetre__departement",
         ).defer(
             "ds_data__raw_data",  # Main Dossier
+            "ds_data__raw_data_archive",
             "ds_demarche__raw_ds_data",  # Related Demarche
         )
         return qs
@@ -611,11 +632,93 @@ class FieldMappingAdmin(AllPermsForStaffUser, ImportExportMixin, admin.ModelAdmi
         return qs
 
 
+@admin.register(DsMutation)
+class DsMutationAdmin(AllPermsForStaffUser, admin.ModelAdmin):
+    readonly_fields = [field.name for field in DsMutation._meta.fields]
+    list_display = (
+        "__str__",
+        "dossier__ds_number",
+        "kind",
+        "status",
+        "attempts",
+        "next_attempt_at",
+        "sent_at",
+        "created_at",
+    )
+    list_filter = ("status", "kind")
+    search_fields = ("dossier__ds_number", "idempotency_key")
+    actions = ("requeue",)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related("dossier", "instructeur")
+
+    @admin.action(description="🔁 Renvoyer à DN")
+    def requeue(self, request, queryset):
+        count = queryset.exclude(status=DsMutation.STATUS_SENT).update(
+            status=DsMutation.STATUS_PENDING,
+            attempts=0,
+            next_attempt_at=timezone.now(),
+            updated_at=timezone.now(),
+        )
+        task_drain_ds_mutations.apply_async(priority=TASK_PRIORITY_HIGH)
+        self.message_user(request, f"{count} mutation(s) remise(s) en attente.")
+
+
+@admin.register(DemarcheSyncShard)
+class DemarcheSyncShardAdmin(AllPermsForStaffUser, admin.ModelAdmin):
+    readonly_fields = [field.name for field in DemarcheSyncShard._meta.fields]
+    list_display = (
+        "__str__",
+        "demarche__ds_number",
+        "kind",
+        "window_start",
+        "window_end",
+        "status",
+        "attempts",
+        "dossiers_count",
+        "finished_at",
+    )
+    list_filter = ("status", "kind")
+    search_fields = ("demarche__ds_number",)
+    actions = ("retry",)
+
+    def get_queryset(self, request):
+        return (
+            super()
+            .get_queryset(request)
+            .select_related("demarche")
+            .defer("demarche__raw_ds_data")
+        )
+
+    @admin.action(description="🔁 Relancer les lots en échec")
+    def retry(self, request, queryset):
+        failed = queryset.filter(status=DemarcheSyncShard.STATUS_FAILED)
+        shard_pks = list(failed.values_list("pk", flat=True))
+        failed.update(
+            status=DemarcheSyncShard.STATUS_PENDING,
+            attempts=0,
+            updated_at=timezone.now(),
+        )
+        for shard_pk in shard_pks:
+            task_sync_demarche_shard.apply_async(
+                (shard_pk,), priority=TASK_PRIORITY_LOW
+            )
+        self.message_user(request, f"{len(shard_pks)} lot(s) relancé(s).")
+
+
 @admin.register(Profile)
 class ProfileAdmin(AllPermsForStaffUser, admin.ModelAdmin):
     search_fields = ("ds_id", "ds_email")
 
 
+@admin.register(GroupeInstructeur)
+class GroupeInstructeurAdmin(AllPermsForStaffUser, admin.ModelAdmin):
+    list_display = ("__str__", "demarche", "ds_id")
+    list_filter = ("demarche",)
+    search_fields = ("ds_id", "label", "instructeurs__ds_email")
+    raw_id_fields = ("instructeurs",)
+
+
 @admin.register(NaturePorteurProjet)
 class NaturePorteurProjetAdmin(
     AllPermsForStaffUser, ImportExportMixin, admin.ModelAdmin
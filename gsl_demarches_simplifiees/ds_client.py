@@ -2,12 +2,16 @@ import base64
 import hashlib
 import json
 import logging
+import threading
+import time
 from datetime import datetime
 from logging import getLogger
 from pathlib import Path
+from typing import NamedTuple
 
 import requests
 from django.conf import settings
+from django.core.files import File
 from django.core.files.uploadedfile import UploadedFile
 
 from gsl_demarches_simplifiees.exceptions import DsConnectionError, DsServiceException
@@ -15,9 +19,52 @@ from gsl_demarches_simplifiees.models import Dossier
 
 logger = getLogger(__name__)
 
+RETRYABLE_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
+_session_local = threading.local()
+
+
+def get_ds_session() -> requests.Session:
+    """
+    Keep-alive HTTP session to DN, shared by every client of the current thread
+    (a requests.Session is not guaranteed thread-safe, the page prefetch thread
+    gets its own).
+    """
+    session = getattr(_session_local, "session", None)
+    if session is None:
+        session = _new_session()
+        _session_local.session = session
+    return session
+
+
+def get_upload_session() -> requests.Session:
+    """
+    Keep-alive HTTP session to the direct upload storage, per thread. The
+    storage is on another host than the DN API: sharing ``get_ds_session``
+    (one pool per session) would close the DN connections on every upload.
+    """
+    session = getattr(_session_local, "upload_session", None)
+    if session is None:
+        session = _new_session()
+        _session_local.upload_session = session
+    return session
+
+
+def _new_session() -> requests.Session:
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=1, pool_maxsize=settings.DS_API_POOL_MAXSIZE
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
 
 class DsClientBase:
     filename = ""
+    # Only read-only queries are retried: replaying a mutation whose response
+    # was lost could apply it twice on DN.
+    retry_transient_errors = False
 
     _graphql_cache: dict[str, str] = {}
 
@@ -25,6 +72,19 @@ class DsClientBase:
         self.token = settings.DS_API_TOKEN
         self.url = settings.DS_API_URL
         self.query = self._load_graphql(self.filename) if self.filename else ""
+        self._local = threading.local()
+
+    @property
+    def last_response_size(self) -> int | None:
+        """
+        Size of the last response received by the current thread: the page
+        prefetch thread shares the client with the sync loop.
+        """
+        return getattr(self._local, "last_response_size", None)
+
+    @last_response_size.setter
+    def last_response_size(self, size: int | None):
+        self._local.last_response_size = size
 
     @classmethod
     def _load_graphql(cls, *filenames: str) -> str:
@@ -54,13 +114,9 @@ class DsClientBase:
         data = {"query": query or self.query, "operationName": operation_name}
         if variables:
             data["variables"] = variables
-        try:
-            response = requests.post(self.url, json=data, headers=headers)
 
-        except requests.exceptions.ConnectionError as e:
-            raise DsConnectionError(
-                extra={"error": str(e), "operation_name": operation_name}
-            )
+        response = self._post(operation_name, data, headers)
+        self.last_response_size = len(response.content)
 
         if response.status_code == 200:
             results = response.json()
@@ -96,8 +152,169 @@ class DsClientBase:
             extra={"status_code": response.status_code, "error": response.text},
         )
 
+    def _post(self, operation_name, data, headers) -> requests.Response:
+        max_retries = settings.DS_API_MAX_RETRIES if self.retry_transient_errors else 0
+        start = time.monotonic()
+        attempt = 0
+        while True:
+            try:
+                response = get_ds_session().post(
+                    self.url,
+                    json=data,
+                    headers=headers,
+                    timeout=(
+                        settings.DS_API_CONNECT_TIMEOUT,
+                        settings.DS_API_READ_TIMEOUT,
+                    ),
+                )
+            except requests.exceptions.ConnectionError as e:
+                if attempt < max_retries:
+                    attempt += 1
+                    self._wait_before_retry(operation_name, attempt, None, str(e))
+                    continue
+                raise DsConnectionError(
+                    extra={"error": str(e), "operation_name": operation_name}
+                )
+            except requests.exceptions.Timeout as e:
+                raise DsConnectionError(
+                    log_message="DN request timed out",
+                    extra={"error": str(e), "operation_name": operation_name},
+                )
+
+            if response.status_code in RETRYABLE_STATUS_CODES and attempt < max_retries:
+                attempt += 1
+                self._wait_before_retry(
+                    operation_name, attempt, response, response.status_code
+                )
+                continue
+
+            logger.info(
+                "DN request",
+                extra={
+                    "operation_name": operation_name,
+                    "status_code": response.status_code,
+                    "elapsed_ms": round((time.monotonic() - start) * 1000),
+                    "retries": attempt,
+                },
+            )
+            return response
+
+    @staticmethod
+    def _wait_before_retry(operation_name, attempt, response, error):
+        delay = settings.DS_API_RETRY_BACKOFF * 2 ** (attempt - 1)
+        retry_after = (
+            response.headers.get("Retry-After") if response is not None else None
+        )
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, int(retry_after))
+        delay = min(delay, settings.DS_API_RETRY_MAX_DELAY)
+        logger.warning(
+            "DN request failed, retrying",
+            extra={
+                "operation_name": operation_name,
+                "attempt": attempt,
+                "delay": delay,
+                "error": error,
+            },
+        )
+        time.sleep(delay)
+
+
+class AdaptivePageSize:
+    """
+    Page size controller for ``DsClient.fetch_demarche_page``.
+
+    Grows the page size (x1.5) after a fast and small response, halves it after
+    a slow response, a timeout or a GraphQL error, and always stays within
+    ``[minimum, maximum]``. Pagination cursors are unaffected by the page size,
+    so it can change between two pages without losing position.
+    """
+
+    GROWTH_FACTOR = 1.5
+    SHRINK_FACTOR = 0.5
+
+    def __init__(
+        self,
+        initial=None,
+        minimum=None,
+        maximum=None,
+        fast_seconds=None,
+        slow_seconds=None,
+        small_bytes=None,
+    ):
+        self.minimum = minimum or settings.DS_SYNC_PAGE_SIZE_MIN
+        self.maximum = max(maximum or settings.DS_SYNC_PAGE_SIZE_MAX, self.minimum)
+        self.fast_seconds = fast_seconds or settings.DS_SYNC_PAGE_FAST_SECONDS
+        self.slow_seconds = slow_seconds or settings.DS_SYNC_PAGE_SLOW_SECONDS
+        self.small_bytes = small_bytes or settings.DS_SYNC_PAGE_SMALL_BYTES
+        self.page_size = self._bounded(initial or settings.DS_SYNC_PAGE_SIZE_INITIAL)
+
+    @property
+    def can_shrink(self) -> bool:
+        return self.page_size > self.minimum
+
+    def record_success(
+        self, elapsed_seconds: float, response_size: int | None, has_errors: bool
+    ):
+        if has_errors or elapsed_seconds >= self.slow_seconds:
+            self.shrink()
+        elif elapsed_seconds < self.fast_seconds and (
+            response_size is not None and response_size < self.small_bytes
+        ):
+            self.page_size = self._bounded(
+                max(int(self.page_size * self.GROWTH_FACTOR), self.page_size + 1)
+            )
+
+    def shrink(self):
+        self.page_size = self._bounded(int(self.page_size * self.SHRINK_FACTOR))
+
+    def _bounded(self, page_size: int) -> int:
+        return min(max(page_size, self.minimum), self.maximum)
+
+
+class SyncProfile(NamedTuple):
+    """
+    Parts of ``DossierFragment`` fetched by a page of
+    ``DsClient.fetch_demarche_page``. Without champs, annotations or demandeur,
+    a page only tells which dossiers moved: those are then fetched in full
+    (``DsClient.get_dossiers``).
+    """
+
+    name: str
+    include_champs: bool
+    include_annotations: bool
+    include_demandeur: bool
+
+    @property
+    def is_full(self) -> bool:
+        return (
+            self.include_champs and self.include_annotations and self.include_demandeur
+        )
+
+    def as_variables(self) -> dict:
+        return {
+            "includeChamps": self.include_champs,
+            "includeAnnotations": self.include_annotations,
+            "includeDemandeur": self.include_demandeur,
+        }
+
+
+SYNC_PROFILE_FULL = SyncProfile("full", True, True, True)
+SYNC_PROFILE_INSTRUCTION = SyncProfile("instruction", False, True, False)
+SYNC_PROFILE_STATE_ONLY = SyncProfile("state-only", False, False, False)
+SYNC_PROFILES = {
+    profile.name: profile
+    for profile in (
+        SYNC_PROFILE_FULL,
+        SYNC_PROFILE_INSTRUCTION,
+        SYNC_PROFILE_STATE_ONLY,
+    )
+}
+
 
 class DsClient(DsClientBase):
+    retry_transient_errors = True
+
     def get_demarche(self, demarche_number) -> dict:
         """
         Get metadata about one demarche, without its dossiers: scalar fields,
@@ -124,10 +341,12 @@ class DsClient(DsClientBase):
         include_pending_deleted: bool = True,
         include_deleted: bool = True,
         page_size: int = 50,
+        profile: SyncProfile = SYNC_PROFILE_FULL,
     ) -> tuple[dict, bool]:
         """
         Fetch one page of dossiers, pendingDeletedDossiers, and/or deletedDossiers.
         Only the sets for which the corresponding include_* flag is True are fetched.
+        ``profile`` selects the parts of each dossier that are fetched.
 
         :return: the 'demarche' dict from the GraphQL response
         """
@@ -147,6 +366,7 @@ class DsClient(DsClientBase):
             "deletedAfter": deleted_after,
             "deletedFirst": page_size,
             "deletedSince": updated_since_iso,
+            **profile.as_variables(),
         }
         result, has_errors = self.launch_graphql_query(
             "getDemarcheDossiers", variables=variables, query=query
@@ -161,6 +381,56 @@ class DsClient(DsClientBase):
         result, _ = self.launch_graphql_query("getDossier", variables, query=query)
         return result["data"]["dossier"]
 
+    def get_dossiers(self, dossier_numbers: list[int]) -> dict[int, dict]:
+        """
+        Fetch several full dossiers in a single GraphQL document, each dossier
+        under its own alias.
+
+        :return: the dossiers by number; a dossier that DN did not return
+            (deleted, not accessible) is missing.
+        """
+        if not dossier_numbers:
+            return {}
+        aliases = [f"dossier{i}" for i in range(len(dossier_numbers))]
+        query = "query getDossiers({}) {{\n{}\n}}\n".format(
+            ", ".join(f"$number{i}: Int!" for i in range(len(aliases))),
+            "\n".join(
+                f"  {alias}: dossier(number: $number{i}) {{ ...DossierFragment }}"
+                for i, alias in enumerate(aliases)
+            ),
+        ) + self._load_graphql("dossier_fragments.gql")
+        variables = {
+            f"number{i}": dossier_number
+            for i, dossier_number in enumerate(dossier_numbers)
+        }
+        variables.update(SYNC_PROFILE_FULL.as_variables())
+        result, _ = self.launch_graphql_query(
+            "getDossiers", variables=variables, query=query
+        )
+        data = result.get("data") or {}
+        return {
+            dossier_number: data[alias]
+            for alias, dossier_number in zip(aliases, dossier_numbers)
+            if data.get(alias)
+        }
+
+
+class _ChunkedFileReader:
+    """
+    File-like body for requests: reads are capped to ``DS_UPLOAD_CHUNK_SIZE``
+    so that the upload streams from disk or S3 with bounded memory.
+    """
+
+    def __init__(self, file: File):
+        self.file = file
+        self.len = file.size
+
+    def read(self, size=-1):
+        chunk_size = settings.DS_UPLOAD_CHUNK_SIZE
+        if size is None or size < 0 or size > chunk_size:
+            size = chunk_size
+        return self.file.read(size)
+
 
 class DsMutator(DsClientBase):
     filename = "ds_mutations.gql"
@@ -170,10 +440,11 @@ class DsMutator(DsClientBase):
         dossier_id: str,
         instructeur_id: str,
         annotations: list[dict],
+        client_mutation_id: str | None = None,
     ):
         variables = {
             "input": {
-                "clientMutationId": settings.DS_CLIENT_ID,
+                "clientMutationId": client_mutation_id or settings.DS_CLIENT_ID,
                 "dossierId": dossier_id,
                 "instructeurId": instructeur_id,
                 "annotations": annotations,
@@ -183,12 +454,71 @@ class DsMutator(DsClientBase):
             "dossierModifierAnnotations", variables=variables
         )[0]
 
+    def dossiers_modifier_annotations(
+        self,
+        instructeur_id: str,
+        annotations_by_dossier: list[tuple[str, list[dict]]],
+        client_mutation_ids: list[str | None] | None = None,
+    ) -> list[dict]:
+        """
+        Send one ``dossierModifierAnnotations`` per dossier in a single GraphQL
+        document, each mutation under its own alias.
+
+        :param annotations_by_dossier: ``(dossier_id, annotations)`` pairs.
+        :param client_mutation_ids: for each pair, in order, the
+            ``clientMutationId`` of its mutation (``DS_CLIENT_ID`` if None).
+        :return: for each pair, in order, a result shaped like the one of
+            ``dossier_modifier_annotations``, with the GraphQL errors of its alias.
+        """
+        aliases = [f"dossier{i}" for i in range(len(annotations_by_dossier))]
+        query = "mutation dossiersModifierAnnotations({}) {{\n{}\n}}".format(
+            ", ".join(
+                f"$input{i}: DossierModifierAnnotationsInput!"
+                for i in range(len(aliases))
+            ),
+            "\n".join(
+                f"  {alias}: dossierModifierAnnotations(input: $input{i}) "
+                "{ clientMutationId annotations { id updatedAt } errors { message } }"
+                for i, alias in enumerate(aliases)
+            ),
+        )
+        client_mutation_ids = client_mutation_ids or [None] * len(aliases)
+        variables = {
+            f"input{i}": {
+                "clientMutationId": client_mutation_id or settings.DS_CLIENT_ID,
+                "dossierId": dossier_id,
+                "instructeurId": instructeur_id,
+                "annotations": annotations,
+            }
+            for i, ((dossier_id, annotations), client_mutation_id) in enumerate(
+                zip(annotations_by_dossier, client_mutation_ids)
+            )
+        }
+        results = self.launch_graphql_query(
+            "dossiersModifierAnnotations", variables=variables, query=query
+        )[0]
+
+        data = results.get("data") or {}
+        errors = results.get("errors") or []
+        results_by_dossier = []
+        for alias in aliases:
+            result = {"data": {"dossierModifierAnnotations": data.get(alias)}}
+            alias_errors = [e for e in errors if (e.get("path") or [None])[0] == alias]
+            if alias_errors:
+                result["errors"] = alias_errors
+            results_by_dossier.append(result)
+        return results_by_dossier
+
     def dossier_repasser_en_instruction(
-        self, dossier_id, instructeur_id, disable_notification=False
+        self,
+        dossier_id,
+        instructeur_id,
+        disable_notification=False,
+        client_mutation_id: str | None = None,
     ):
         variables = {
             "input": {
-                "clientMutationId": settings.DS_CLIENT_ID,
+                "clientMutationId": client_mutation_id or settings.DS_CLIENT_ID,
                 "disableNotification": disable_notification,
                 "dossierId": dossier_id,
                 "instructeurId": instructeur_id,
@@ -201,11 +531,15 @@ class DsMutator(DsClientBase):
         )[0]
 
     def dossier_passer_en_instruction(
-        self, dossier_id, instructeur_id, disable_notification=False
+        self,
+        dossier_id,
+        instructeur_id,
+        disable_notification=False,
+        client_mutation_id: str | None = None,
     ):
         variables = {
             "input": {
-                "clientMutationId": settings.DS_CLIENT_ID,
+                "clientMutationId": client_mutation_id or settings.DS_CLIENT_ID,
                 "disableNotification": disable_notification,
                 "dossierId": dossier_id,
                 "instructeurId": instructeur_id,
@@ -223,10 +557,11 @@ class DsMutator(DsClientBase):
         motivation: str = "",
         justificatif_id: str | None = None,
         disable_notification: bool = False,
+        client_mutation_id: str | None = None,
     ):
         variables = {
             "input": {
-                "clientMutationId": settings.DS_CLIENT_ID,
+                "clientMutationId": client_mutation_id or settings.DS_CLIENT_ID,
                 "disableNotification": disable_notification,
                 "dossierId": dossier_ds_id,
                 "instructeurId": instructeur_id,
@@ -239,11 +574,15 @@ class DsMutator(DsClientBase):
             variables["input"]["justificatif"] = justificatif_id
         return self.launch_graphql_query(action, variables=variables)[0]
 
-    def _upload_attachment(self, dossier_ds_id: str, file: UploadedFile) -> str:
+    def _upload_attachment(self, dossier_ds_id: str, file: File) -> str:
         """
         Upload a file to Démarche Numérique using GraphQL mutation.
 
-        :param file: UploadedFile instance. It must be a PDF file.
+        The file is read by chunks of ``DS_UPLOAD_CHUNK_SIZE`` bytes, once to
+        compute the checksum, then streamed to the direct upload URL: it is
+        never held in memory as a whole, whether it lives on disk or on S3.
+
+        :param file: File instance (UploadedFile, FieldFile…). It must be a PDF file.
         :param dossier_id: ID of the dossier to attach the file to.
         :return: signedBlobId of the uploaded file.
         """
@@ -254,9 +593,7 @@ class DsMutator(DsClientBase):
                     "dossierId": dossier_ds_id,
                     "filename": file.name,
                     "byteSize": file.size,
-                    "checksum": base64.b64encode(
-                        hashlib.md5(file.read()).digest()
-                    ).decode(),
+                    "checksum": self._compute_checksum(file),
                     "contentType": "application/pdf",
                 }
             },
@@ -266,28 +603,85 @@ class DsMutator(DsClientBase):
             res["data"]["createDirectUpload"]["directUpload"]["headers"]
         )
         blob_id = res["data"]["createDirectUpload"]["directUpload"]["signedBlobId"]
-        try:
-            file.seek(0)
-            res = requests.put(upload_url, data=file.read(), headers=credential_headers)
-            if not 200 <= res.status_code < 300:
-                raise DsConnectionError(
-                    level=logging.ERROR,
-                    log_message="Attachment upload failed",
-                    extra={
-                        "dossier_ds_id": dossier_ds_id,
-                        "file_name": file.name,
-                        "error": res.text,
-                        "status_code": res.status_code,
-                    },
-                )
-        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+        res = self._put_attachment(upload_url, credential_headers, file, dossier_ds_id)
+        if not 200 <= res.status_code < 300:
             raise DsConnectionError(
-                log_message="Attachment upload failed (ConnectionError or Timeout)",
-                extra={"dossier_ds_id": dossier_ds_id, "file_name": file.name},
+                level=logging.ERROR,
+                log_message="Attachment upload failed",
+                extra={
+                    "dossier_ds_id": dossier_ds_id,
+                    "file_name": file.name,
+                    "error": res.text,
+                    "status_code": res.status_code,
+                },
             )
 
         return blob_id
 
+    @staticmethod
+    def _compute_checksum(file: File) -> str:
+        md5 = hashlib.md5()
+        for chunk in file.chunks(chunk_size=settings.DS_UPLOAD_CHUNK_SIZE):
+            md5.update(chunk)
+        return base64.b64encode(md5.digest()).decode()
+
+    def _put_attachment(
+        self, upload_url, credential_headers, file: File, dossier_ds_id
+    ) -> requests.Response:
+        """
+        Stream the file to the direct upload URL. On a transient failure the
+        upload is replayed from the start of the file on the same signed URL:
+        the direct upload is not created again and the checksum not recomputed.
+        """
+        start = time.monotonic()
+        attempt = 0
+        while True:
+            file.seek(0)
+            try:
+                response = get_upload_session().put(
+                    upload_url,
+                    data=_ChunkedFileReader(file),
+                    headers=credential_headers,
+                    timeout=(
+                        settings.DS_API_CONNECT_TIMEOUT,
+                        settings.DS_API_READ_TIMEOUT,
+                    ),
+                )
+            except (
+                requests.exceptions.ConnectionError,
+                requests.exceptions.Timeout,
+            ) as e:
+                if attempt < settings.DS_API_MAX_RETRIES:
+                    attempt += 1
+                    self._wait_before_retry("directUpload", attempt, None, str(e))
+                    continue
+                raise DsConnectionError(
+                    log_message="Attachment upload failed (ConnectionError or Timeout)",
+                    extra={"dossier_ds_id": dossier_ds_id, "file_name": file.name},
+                )
+
+            if (
+                response.status_code in RETRYABLE_STATUS_CODES
+                and attempt < settings.DS_API_MAX_RETRIES
+            ):
+                attempt += 1
+                self._wait_before_retry(
+                    "directUpload", attempt, response, response.status_code
+                )
+                continue
+
+            logger.info(
+                "DN attachment upload",
+                extra={
+                    "dossier_ds_id": dossier_ds_id,
+                    "status_code": response.status_code,
+                    "byte_size": file.size,
+                    "elapsed_ms": round((time.monotonic() - start) * 1000),
+                    "retries": attempt,
+                },
+            )
+            return response
+
     def dossier_accepter(
         self,
         dossier: Dossier,
@@ -295,6 +689,7 @@ class DsMutator(DsClientBase):
         motivation: str = "",
         disable_notification: bool = False,
         document: UploadedFile = None,
+        client_mutation_id: str | None = None,
     ):
         justificatif_id = (
             self._upload_attachment(dossier.ds_id, document)
@@ -308,6 +703,7 @@ class DsMutator(DsClientBase):
             motivation=motivation,
             disable_notification=disable_notification,
             justificatif_id=justificatif_id,
+            client_mutation_id=client_mutation_id,
         )
 
     def dossier_classer_sans_suite(
@@ -316,6 +712,7 @@ class DsMutator(DsClientBase):
         instructeur_id: str,
         motivation: str = "",
         document: UploadedFile = None,
+        client_mutation_id: str | None = None,
     ):
         if document is not None:
             justificatif_id = self._upload_attachment(dossier_id, document)
@@ -327,6 +724,7 @@ class DsMutator(DsClientBase):
             instructeur_id,
             motivation,
             justificatif_id,
+            client_mutation_id=client_mutation_id,
         )
 
     def dossier_refuser(
@@ -335,11 +733,17 @@ class DsMutator(DsClientBase):
         instructeur_id: str,
         motivation: str = "",
         document: UploadedFile = None,
+        client_mutation_id: str | None = None,
     ):
         if document is not None:
             justificatif_id = self._upload_attachment(dossier.ds_id, document)
         else:
             justificatif_id = None
         return self._mutate_with_justificatif_and_motivation(
-            "dossierRefuser", dossier.ds_id, instructeur_id, motivation, justificatif_id
+            "dossierRefuser",
+            dossier.ds_id,
+            instructeur_id,
+            motivation,
+            justificatif_id,
+            client_mutation_id=client_mutation_id,
         )
@@ -149,3 +149,12 @@ class RefreshDossiersDepotForm(forms.Form):
         help_text="Seuls les dossiers déposés après cette date seront rafraîchis depuis Démarches Numériques.",
         widget=forms.DateTimeInput(attrs={"type": "datetime-local"}),
     )
+    shards_count = forms.IntegerField(
+        label="Nombre de lots",
+        help_text="Pour les très grosses démarches : la période est découpée en lots "
+        "synchronisés en parallèle, chacun retenté seul en cas d'échec. "
+        "Par défaut : DS_INIT_SYNC_SHARDS.",
+        min_value=1,
+        max_value=50,
+        required=False,
+    )
@@ -1,12 +1,21 @@
+import hashlib
+import json
 from logging import getLogger
 
+from django.db.models import Q
 from django.utils import timezone
 
 from gsl_core.models import Departement
 from gsl_demarches_simplifiees.ds_client import DsClient
+from gsl_demarches_simplifiees.importer.dossier_converter import (
+    invalidate_conversion_plan,
+)
+from gsl_demarches_simplifiees.importer.reference_cache import (
+    invalidate_reference_cache,
+)
 from gsl_demarches_simplifiees.importer.utils import (
     get_departement_from_field_label,
-    get_or_create_profile,
+    upsert_profiles,
 )
 from gsl_demarches_simplifiees.models import (
     CategorieDetr,
@@ -14,6 +23,7 @@ from gsl_demarches_simplifiees.models import (
     Demarche,
     Dossier,
     FieldMapping,
+    GroupeInstructeur,
 )
 
 logger = getLogger(__name__)
@@ -42,6 +52,19 @@ def camelcase(my_string):
     return f"{s[0].lower()}{s[1:]}"
 
 
+def compute_descriptors_hash(demarche_data) -> str:
+    """
+    Empreinte des descripteurs de champs et d'annotations de la révision active :
+    tant qu'elle ne change pas, les FieldMapping et catégories sont à jour.
+    """
+    revision = demarche_data.get("activeRevision") or {}
+    descriptors = {
+        "champDescriptors": revision.get("champDescriptors", []),
+        "annotationDescriptors": revision.get("annotationDescriptors", []),
+    }
+    return hashlib.sha256(json.dumps(descriptors, sort_keys=True).encode()).hexdigest()
+
+
 def save_demarche_from_ds(
     demarche_number, refresh_only_if_demarche_has_been_updated=False
 ):
@@ -49,19 +72,37 @@ def save_demarche_from_ds(
     result = client.get_demarche(demarche_number)
     demarche_data = result["data"]["demarche"]
 
-    if refresh_only_if_demarche_has_been_updated:
-        try:
-            demarche = Demarche.objects.get(ds_number=demarche_number)
-            if demarche.active_revision_id == demarche_data["activeRevision"]["id"]:
-                return
-        except Demarche.DoesNotExist:
-            pass
+    previous = (
+        Demarche.objects.filter(ds_number=demarche_number)
+        .values("active_revision_id", "descriptors_hash")
+        .first()
+    )
+    if (
+        refresh_only_if_demarche_has_been_updated
+        and previous
+        and previous["active_revision_id"] == demarche_data["activeRevision"]["id"]
+    ):
+        return
 
+    descriptors_hash = compute_descriptors_hash(demarche_data)
     demarche = update_or_create_demarche(demarche_data)
     save_groupe_instructeurs(demarche_data, demarche)
+
+    if previous == {
+        "active_revision_id": demarche.active_revision_id,
+        "descriptors_hash": descriptors_hash,
+    }:
+        logger.info(
+            "Demarche descriptors unchanged, field mappings refresh skipped",
+            extra={"demarche_ds_number": demarche_number},
+        )
+        return
+
     save_field_mappings(demarche_data, demarche)
     save_categories_detr(demarche_data, demarche)
     save_categories_dsil(demarche_data, demarche)
+    Demarche.objects.filter(pk=demarche.pk).update(descriptors_hash=descriptors_hash)
+    invalidate_reference_cache()
 
 
 def refresh_field_mappings_on_demarche(demarche_number):
@@ -70,6 +111,7 @@ def refresh_field_mappings_on_demarche(demarche_number):
         save_field_mappings(demarche.raw_ds_data, demarche)
         save_categories_detr(demarche.raw_ds_data, demarche)
         save_categories_dsil(demarche.raw_ds_data, demarche)
+        invalidate_reference_cache()
     else:
         save_demarche_from_ds(demarche_number)
 
@@ -100,10 +142,85 @@ def update_or_create_demarche(demarche_data):
 
 
 def save_groupe_instructeurs(demarche_data, demarche):
-    for groupe in demarche_data["groupeInstructeurs"]:
-        for instructeur in groupe["instructeurs"]:
-            profile = get_or_create_profile(instructeur["id"], instructeur["email"])
-            demarche.ds_instructeurs.add(profile)
+    """
+    Enregistre les groupes instructeurs de la démarche et leurs instructeurs dans
+    GroupeInstructeur : les groupes et les appartenances sont mis à jour par
+    différence d'ensembles, les groupes disparus de DN sont supprimés.
+    """
+    groupes = [
+        groupe
+        for groupe in demarche_data.get("groupeInstructeurs") or []
+        if groupe.get("id")
+    ]
+    profiles_by_ds_id = upsert_profiles(
+        instructeur
+        for groupe in groupes
+        for instructeur in groupe.get("instructeurs") or []
+    )
+    demarche.ds_instructeurs.add(*profiles_by_ds_id.values())
+
+    groupes_by_ds_id = _sync_groupes(groupes, demarche)
+
+    Membership = GroupeInstructeur.instructeurs.through
+    wanted = {
+        (groupes_by_ds_id[groupe["id"]].pk, profiles_by_ds_id[instructeur["id"]].pk)
+        for groupe in groupes
+        for instructeur in groupe.get("instructeurs") or []
+    }
+    existing = set(
+        Membership.objects.filter(groupeinstructeur__demarche=demarche).values_list(
+            "groupeinstructeur_id", "profile_id"
+        )
+    )
+    Membership.objects.bulk_create(
+        [
+            Membership(groupeinstructeur_id=groupe_pk, profile_id=profile_pk)
+            for groupe_pk, profile_pk in wanted - existing
+        ]
+    )
+    removed = existing - wanted
+    if removed:
+        removed_filter = Q()
+        for groupe_pk, profile_pk in removed:
+            removed_filter |= Q(groupeinstructeur_id=groupe_pk, profile_id=profile_pk)
+        Membership.objects.filter(removed_filter).delete()
+
+
+def _sync_groupes(groupes: list[dict], demarche) -> dict[str, GroupeInstructeur]:
+    now = timezone.now()
+    existing = {
+        groupe.ds_id: groupe
+        for groupe in GroupeInstructeur.objects.filter(demarche=demarche)
+    }
+    to_create = []
+    to_update = []
+    for groupe_data in groupes:
+        number = groupe_data.get("number")
+        label = groupe_data.get("label") or ""
+        groupe = existing.get(groupe_data["id"])
+        if groupe is None:
+            groupe = GroupeInstructeur(
+                demarche=demarche,
+                ds_id=groupe_data["id"],
+                ds_number=number,
+                label=label,
+            )
+            existing[groupe.ds_id] = groupe
+            to_create.append(groupe)
+        elif (groupe.ds_number, groupe.label) != (number, label):
+            groupe.ds_number = number
+            groupe.label = label
+            groupe.updated_at = now
+            to_update.append(groupe)
+
+    GroupeInstructeur.objects.bulk_create(to_create)
+    GroupeInstructeur.objects.bulk_update(
+        to_update, ["ds_number", "label", "updated_at"]
+    )
+    GroupeInstructeur.objects.filter(demarche=demarche).exclude(
+        ds_id__in=[groupe["id"] for groupe in groupes]
+    ).delete()
+    return existing
 
 
 DN_DEPARTEMENT_FIELD_TO_DJANGO_FIELD_MAP = {
@@ -112,73 +229,132 @@ DN_DEPARTEMENT_FIELD_TO_DJANGO_FIELD_MAP = {
 }
 
 
-def _sync_existing_field_mapping(computer_mapping, ds_label, ds_type):
-    update_fields = []
+def _sync_existing_field_mapping(computer_mapping, ds_label, ds_type) -> bool:
+    changed = False
     if computer_mapping.ds_field_label != ds_label:
         computer_mapping.ds_field_label = ds_label
-        update_fields.append("ds_field_label")
+        changed = True
     if computer_mapping.ds_field_type != ds_type:
         computer_mapping.ds_field_type = ds_type
-        update_fields.append("ds_field_type")
+        changed = True
     if not computer_mapping.is_active:
         computer_mapping.is_active = True
         computer_mapping.deactivated_at = None
-        update_fields.extend(["is_active", "deactivated_at"])
-    if update_fields:
-        computer_mapping.save(update_fields=update_fields)
-
-
-def _auto_map_django_field(computer_mapping, ds_label, reversed_mapping):
-    if ds_label in reversed_mapping:
-        django_field = reversed_mapping.get(ds_label)
-        if django_field != computer_mapping.django_field:
-            computer_mapping.django_field = django_field
-            computer_mapping.save()
-        return
-
-    for dn_field, django_field in DN_DEPARTEMENT_FIELD_TO_DJANGO_FIELD_MAP.items():
-        if ds_label.startswith(dn_field):
-            computer_mapping.django_field = django_field
-            computer_mapping.save()
-            break
+        changed = True
+    return changed
+
+
+def _auto_map_django_field(computer_mapping, ds_label, reversed_mapping) -> bool:
+    django_field = reversed_mapping.get(ds_label)
+    if django_field is None:
+        for (
+            dn_field,
+            departement_field,
+        ) in DN_DEPARTEMENT_FIELD_TO_DJANGO_FIELD_MAP.items():
+            if ds_label.startswith(dn_field):
+                django_field = departement_field
+                break
+    if django_field is None or django_field == computer_mapping.django_field:
+        return False
+    computer_mapping.django_field = django_field
+    return True
 
 
 def save_field_mappings(demarche_data, demarche):
+    """
+    Met les FieldMapping de la démarche en cohérence avec les descripteurs de la
+    révision active, par différence d'ensembles : créations, mises à jour et
+    désactivations sont écrites en masse.
+    """
     reversed_mapping = {
         field.verbose_name: field.name for field in Dossier.MAPPED_FIELDS
     }
-
+    existing_mappings = {
+        mapping.ds_field_id: mapping
+        for mapping in FieldMapping.objects.filter(demarche=demarche)
+    }
+    now = timezone.now()
     active_ds_field_ids = set()
+    mappings_to_create = []
+    mappings_to_update = []
 
     for champ_descriptor in (
         demarche_data["activeRevision"]["champDescriptors"]
         + demarche_data["activeRevision"]["annotationDescriptors"]
     ):
         ds_type = champ_descriptor["__typename"]
-        if ds_type not in IMPORTED_DS_FIELDS:
+        ds_id = champ_descriptor["id"]
+        if ds_type not in IMPORTED_DS_FIELDS or ds_id in active_ds_field_ids:
             continue
 
         ds_label = champ_descriptor["label"]
-        ds_id = champ_descriptor["id"]
         active_ds_field_ids.add(ds_id)
 
-        computer_mapping, created = FieldMapping.objects.get_or_create(
-            ds_field_id=ds_id,
-            demarche=demarche,
-            defaults={
-                "ds_field_label": ds_label,
-                "ds_field_type": ds_type,
-            },
-        )
-
-        if not created:
-            _sync_existing_field_mapping(computer_mapping, ds_label, ds_type)
-
-        _auto_map_django_field(computer_mapping, ds_label, reversed_mapping)
+        computer_mapping = existing_mappings.get(ds_id)
+        if computer_mapping is None:
+            computer_mapping = FieldMapping(
+                demarche=demarche,
+                ds_field_id=ds_id,
+                ds_field_label=ds_label,
+                ds_field_type=ds_type,
+            )
+            _auto_map_django_field(computer_mapping, ds_label, reversed_mapping)
+            mappings_to_create.append(computer_mapping)
+            continue
 
+        synced = _sync_existing_field_mapping(computer_mapping, ds_label, ds_type)
+        mapped = _auto_map_django_field(computer_mapping, ds_label, reversed_mapping)
+        if synced or mapped:
+            computer_mapping.updated_at = now
+            mappings_to_update.append(computer_mapping)
+
+    FieldMapping.objects.bulk_create(mappings_to_create)
+    FieldMapping.objects.bulk_update(
+        mappings_to_update,
+        [
+            "ds_field_label",
+            "ds_field_type",
+            "django_field",
+            "is_active",
+            "deactivated_at",
+            "updated_at",
+        ],
+    )
     FieldMapping.actives.filter(demarche=demarche).exclude(
         ds_field_id__in=active_ds_field_ids
-    ).update(is_active=False, deactivated_at=timezone.now())
+    ).update(is_active=False, deactivated_at=now)
+    invalidate_conversion_plan(demarche.pk)
+
+
+def _sync_categories(model, categories, wanted: dict[str, dict], **identity):
+    """
+    Aligne les catégories ``categories`` sur ``wanted`` (valeurs par libellé) :
+    création et mise à jour en masse, désactivation des libellés absents.
+    """
+    now = timezone.now()
+    existing = {category.label: category for category in categories}
+    to_create = []
+    to_update = []
+    fields = set()
+
+    for label, values in wanted.items():
+        values = {**values, "active": True, "deactivated_at": None}
+        fields.update(values)
+        category = existing.get(label)
+        if category is None:
+            to_create.append(model(label=label, **identity, **values))
+        elif any(getattr(category, field) != value for field, value in values.items()):
+            for field, value in values.items():
+                setattr(category, field, value)
+            category.updated_at = now
+            to_update.append(category)
+
+    model.objects.bulk_create(to_create)
+    if to_update:
+        model.objects.bulk_update(to_update, [*sorted(fields), "updated_at"])
+    categories.filter(active=True).exclude(label__in=wanted).update(
+        active=False, deactivated_at=now
+    )
 
 
 def save_categories_dsil(demarche_data, demarche):
@@ -191,18 +367,12 @@ def save_categories_dsil(demarche_data, demarche):
         if field["id"] == demande_categorie_dsil_field_id:
             options = field["options"]
             break
-    categories = []
-    for sort_order, label in enumerate(options, 1):
-        category, _ = CategorieDsil.objects.update_or_create(
-            demarche=demarche,
-            label=label,
-            defaults={"rank": sort_order, "active": True, "deactivated_at": None},
-        )
-        categories.append(category)
-
-    CategorieDsil.objects.filter(demarche=demarche, active=True).exclude(
-        id__in=[category.id for category in categories]
-    ).update(active=False, deactivated_at=timezone.now())
+    _sync_categories(
+        CategorieDsil,
+        CategorieDsil.objects.filter(demarche=demarche),
+        {label: {"rank": sort_order} for sort_order, label in enumerate(options, 1)},
+        demarche=demarche,
+    )
 
 
 def save_categories_detr(demarche_data: dict, demarche: Demarche) -> None:
@@ -233,7 +403,7 @@ def _save_categorie_detr_from_field(
         return
 
     options = field["options"]
-    categories = []
+    wanted = {}
     parent_label = ""
     for sort_order, label in enumerate(options, 1):
         if label.startswith("--"):
@@ -249,23 +419,14 @@ def _save_categorie_detr_from_field(
             label = parent_label
             parent_label = ""
 
-        category, _ = CategorieDetr.objects.update_or_create(
-            demarche=demarche,
-            label=label,
-            departement=departement,
-            defaults={
-                "rank": sort_order,
-                "active": True,
-                "deactivated_at": None,
-                "parent_label": parent_label,
-            },
-        )
-        categories.append(category)
+        wanted[label] = {"rank": sort_order, "parent_label": parent_label}
 
-    CategorieDetr.objects.filter(
-        demarche=demarche, departement=departement, active=True
-    ).exclude(id__in=[category.id for category in categories]).update(
-        active=False, deactivated_at=timezone.now()
+    _sync_categories(
+        CategorieDetr,
+        CategorieDetr.objects.filter(demarche=demarche, departement=departement),
+        wanted,
+        demarche=demarche,
+        departement=departement,
     )
 
 
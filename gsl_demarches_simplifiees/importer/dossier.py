@@ -1,30 +1,61 @@
 import logging
+import time
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from contextlib import nullcontext
+from itertools import batched
 from typing import Iterable, NamedTuple
 
+import requests
+from django.conf import settings
 from django.contrib import messages
+from django.db import models, transaction
 from django.utils import timezone
 
 from gsl.celery import TASK_PRIORITY_HIGH, TASK_PRIORITY_LOW
 from gsl_core.models import Departement
-from gsl_demarches_simplifiees.ds_client import DsClient
+from gsl_demarches_simplifiees.ds_client import (
+    SYNC_PROFILE_FULL,
+    SYNC_PROFILES,
+    AdaptivePageSize,
+    DsClient,
+    SyncProfile,
+)
 from gsl_demarches_simplifiees.exceptions import DsServiceException
 from gsl_demarches_simplifiees.importer.dossier_converter import DossierConverter
 from gsl_demarches_simplifiees.importer.utils import (
     NOT_HANDLED_TERRITORIES,
     get_or_create_profile,
+    upsert_profiles,
+)
+from gsl_demarches_simplifiees.locks import dn_request_budget
+from gsl_demarches_simplifiees.models import (
+    Demarche,
+    Dossier,
+    DossierData,
+    FieldMapping,
+    GroupeInstructeur,
 )
-from gsl_demarches_simplifiees.models import Demarche, Dossier, DossierData
 from gsl_projet.services.projet_services import ProjetService
 
 logger = logging.getLogger(__name__)
 
 
-class _PageState(NamedTuple):
+class PageState(NamedTuple):
     cursor: str | None
     has_more: bool
     has_error: bool
 
 
+class PageRequest(NamedTuple):
+    dossiers_after: str | None
+    pending_deleted_after: str | None
+    deleted_after: str | None
+    include_dossiers: bool
+    include_pending_deleted: bool
+    include_deleted: bool
+
+
 def save_demarche_dossiers_from_ds(demarche_number):
     """
     Récupère les dossiers, pendingDeletedDossiers et deletedDossiers de la démarche
@@ -34,10 +65,20 @@ def save_demarche_dossiers_from_ds(demarche_number):
     un seul appel API les récupère simultanément ; sinon seuls les ensembles non
     épuisés sont inclus dans l'appel suivant.
 
+    Avec ``DS_SYNC_PIPELINED_FETCH``, la page N+1 est récupérée dans un thread
+    pendant l'enregistrement de la page N. Les curseurs ne sont sauvegardés
+    qu'une fois la page N traitée, comme en mode séquentiel.
+
+    Avec un ``DS_SYNC_PROFILE`` autre que "full", les pages ne contiennent que
+    l'état des dossiers : seuls les dossiers nouveaux ou modifiés depuis la
+    dernière sync sont récupérés en entier (cf. ``escalate_moved_dossiers``).
+
     :param demarche_number: numéro de la démarche
     """
     demarche = Demarche.objects.get(ds_number=demarche_number)
     client = DsClient()
+    sync_profile = SYNC_PROFILES[settings.DS_SYNC_PROFILE]
+    sync_started_at = timezone.now()
 
     if demarche.updated_since is None:
         _reinit_demarche_sync_state(demarche)
@@ -47,93 +88,140 @@ def save_demarche_dossiers_from_ds(demarche_number):
     pending_deleted_cursor = demarche.pending_deleted_cursor or None
     deleted_cursor = demarche.deleted_cursor or None
 
-    handled_departement_insee_codes = _get_handled_departement_insee_codes()
-    groupe_index = _get_or_refresh_groupe_index(demarche, demarche_number)
+    departement_filter = HandledDepartementFilter.for_demarche(demarche)
+    groupe_index = get_or_refresh_groupe_index(demarche, demarche_number)
+
+    process_page = (
+        process_dossiers_page_in_bulk
+        if settings.DS_SYNC_BULK_PAGE_INGESTION
+        else process_dossiers_page
+    )
 
     dossiers_count = 0
+    stats = Counter()
     has_more_dossiers = has_more_pending = has_more_deleted = True
     any_request_error = False
     dossiers_any_error = pending_any_error = deleted_any_error = False
 
-    while has_more_dossiers or has_more_pending or has_more_deleted:
-        demarche_data, has_errors = client.fetch_demarche_page(
-            demarche_number,
-            updated_since=api_updated_since,
-            dossiers_after=dossiers_cursor,
-            pending_deleted_after=pending_deleted_cursor,
-            deleted_after=deleted_cursor,
-            include_dossiers=has_more_dossiers,
-            include_pending_deleted=has_more_pending,
-            include_deleted=has_more_deleted,
-        )
-
-        if has_errors:
-            any_request_error = True
-
-        dossiers_result = pending_result = deleted_result = None
-
-        if has_more_dossiers:
-            dossiers_result, count = _process_dossiers_page(
-                demarche_data["dossiers"],
-                demarche,
-                handled_departement_insee_codes,
-                groupe_index,
+    prefetch_executor = (
+        ThreadPoolExecutor(max_workers=1, thread_name_prefix="ds-page-prefetch")
+        if settings.DS_SYNC_PIPELINED_FETCH
+        else None
+    )
+    page_fetcher = DemarchePageFetcher(
+        client, demarche_number, api_updated_since, prefetch_executor, sync_profile
+    )
+    # Client distinct : le fetcher peut utiliser le sien dans le thread de prefetch
+    escalation_client = DsClient()
+
+    with prefetch_executor or nullcontext():
+        while has_more_dossiers or has_more_pending or has_more_deleted:
+            page_request = PageRequest(
+                dossiers_after=dossiers_cursor,
+                pending_deleted_after=pending_deleted_cursor,
+                deleted_after=deleted_cursor,
+                include_dossiers=has_more_dossiers,
+                include_pending_deleted=has_more_pending,
+                include_deleted=has_more_deleted,
+            )
+            demarche_data, has_errors = page_fetcher.fetch(page_request)
+
+            if has_errors:
+                any_request_error = True
+
+            dossiers_result = pending_result = deleted_result = None
+
+            if has_more_dossiers:
+                all_escalated = escalate_moved_dossiers(
+                    demarche_data["dossiers"],
+                    sync_profile,
+                    escalation_client,
+                    demarche,
+                    stats,
+                )
+                dossiers_result, count = process_page(
+                    demarche_data["dossiers"],
+                    demarche,
+                    departement_filter,
+                    groupe_index,
+                    stats,
+                )
+                dossiers_count += count
+                if dossiers_result.has_error or not all_escalated:
+                    dossiers_any_error = True
+
+            if has_more_pending:
+                pending_result = process_deactivation_page(
+                    demarche_data["pendingDeletedDossiers"],
+                    Dossier.RAISON_DESACTIVATION_CORBEILLE,
+                    demarche.ds_number,
+                    "Error unhandled while deactivating pending deleted dossier",
+                )
+                if pending_result.has_error:
+                    pending_any_error = True
+
+            if has_more_deleted:
+                deleted_result = process_deactivation_page(
+                    demarche_data["deletedDossiers"],
+                    Dossier.RAISON_DESACTIVATION_SUPPRIME,
+                    demarche.ds_number,
+                    "Error unhandled while deactivating deleted dossier",
+                )
+                if deleted_result.has_error:
+                    deleted_any_error = True
+
+            has_more_dossiers, dossiers_cursor = advance_stream(
+                dossiers_result, dossiers_cursor
             )
-            dossiers_count += count
-            if dossiers_result.has_error:
-                dossiers_any_error = True
-
-        if has_more_pending:
-            pending_result = _process_deactivation_page(
-                demarche_data["pendingDeletedDossiers"],
-                Dossier.RAISON_DESACTIVATION_CORBEILLE,
-                demarche.ds_number,
-                "Error unhandled while deactivating pending deleted dossier",
+            has_more_pending, pending_deleted_cursor = advance_stream(
+                pending_result, pending_deleted_cursor
             )
-            if pending_result.has_error:
-                pending_any_error = True
-
-        if has_more_deleted:
-            deleted_result = _process_deactivation_page(
-                demarche_data["deletedDossiers"],
-                Dossier.RAISON_DESACTIVATION_SUPPRIME,
-                demarche.ds_number,
-                "Error unhandled while deactivating deleted dossier",
+            has_more_deleted, deleted_cursor = advance_stream(
+                deleted_result, deleted_cursor
             )
-            if deleted_result.has_error:
-                deleted_any_error = True
 
-        has_more_dossiers, dossiers_cursor = _advance_stream(
-            dossiers_result, dossiers_cursor
-        )
-        has_more_pending, pending_deleted_cursor = _advance_stream(
-            pending_result, pending_deleted_cursor
-        )
-        has_more_deleted, deleted_cursor = _advance_stream(
-            deleted_result, deleted_cursor
-        )
+            _save_cursors_after_page(
+                demarche,
+                any_request_error=any_request_error,
+                dossiers_cursor=dossiers_cursor,
+                dossiers_any_error=dossiers_any_error,
+                pending_deleted_cursor=pending_deleted_cursor,
+                pending_any_error=pending_any_error,
+                deleted_cursor=deleted_cursor,
+                deleted_any_error=deleted_any_error,
+            )
 
-        _save_cursors_after_page(
-            demarche,
-            any_request_error=any_request_error,
-            dossiers_cursor=dossiers_cursor,
-            dossiers_any_error=dossiers_any_error,
-            pending_deleted_cursor=pending_deleted_cursor,
-            pending_any_error=pending_any_error,
-            deleted_cursor=deleted_cursor,
-            deleted_any_error=deleted_any_error,
-        )
+    _save_last_synced_at(
+        demarche,
+        sync_started_at,
+        any_error=any_request_error
+        or dossiers_any_error
+        or pending_any_error
+        or deleted_any_error,
+    )
 
     logger.info(
         "Demarche dossiers has been updated from DN",
         extra={
             "demarche_ds_number": demarche_number,
             "dossiers_count": dossiers_count,
+            "sync_profile": sync_profile.name,
+            "pages_response_size": page_fetcher.response_size,
+            "escalated_dossiers_count": stats["escalated"],
+            "escalation_response_size": stats["escalation_response_size"],
+            "unchanged_dossiers_skipped_count": stats["unchanged_skipped"],
+            "raw_data_written_count": stats["raw_data_written"],
+            "raw_data_skipped_count": stats["raw_data_skipped"],
+            "rejected_dossiers_count": departement_filter.rejections.total(),
+            **{
+                f"rejected_{reason}_count": count
+                for reason, count in departement_filter.rejections.items()
+            },
         },
     )
 
 
-def _get_or_refresh_groupe_index(demarche: Demarche, demarche_number: int) -> dict:
+def get_or_refresh_groupe_index(demarche: Demarche, demarche_number: int) -> dict:
     groupe_index = _build_groupe_index_from_demarche(demarche)
     if not groupe_index:
         from gsl_demarches_simplifiees.importer.demarche import save_demarche_from_ds
@@ -144,12 +232,84 @@ def _get_or_refresh_groupe_index(demarche: Demarche, demarche_number: int) -> di
     return groupe_index
 
 
-def _process_dossiers_page(
+def escalate_moved_dossiers(
+    page: dict,
+    profile: SyncProfile,
+    client: DsClient,
+    demarche: Demarche,
+    stats: Counter,
+) -> bool:
+    """
+    Remplace les dossiers réduits d'une page (profil de sync autre que "full")
+    par les dossiers complets, pour ceux qui sont nouveaux ou dont la
+    ``dateDerniereModification`` est postérieure à celle enregistrée. Les
+    autres sont retirés de la page.
+
+    Retourne False si un dossier modifié n'a pas été renvoyé par DN, ou si la
+    requête d'un lot a échoué (les autres lots sont tout de même traités) : la
+    page est alors considérée en erreur et son curseur n'est pas sauvegardé.
+    """
+    if profile.is_full:
+        return True
+    nodes = [node for node in page["nodes"] if node is not None]
+    stored_dates = dict(
+        Dossier.objects.filter(ds_id__in=[node["id"] for node in nodes]).values_list(
+            "ds_id", "ds_date_derniere_modification"
+        )
+    )
+    moved_numbers = [
+        node["number"]
+        for node in nodes
+        if _has_moved_since(node, stored_dates.get(node["id"]))
+    ]
+    stats["unchanged_skipped"] += len(nodes) - len(moved_numbers)
+
+    full_dossiers = {}
+    for numbers in batched(moved_numbers, settings.DS_SYNC_ESCALATION_BATCH_SIZE):
+        try:
+            with dn_request_budget():
+                full_dossiers.update(client.get_dossiers(list(numbers)))
+        except DsServiceException as e:
+            # Les dossiers du lot restent manquants : page en erreur
+            logger.warning(
+                "Moved dossiers escalation failed",
+                extra={
+                    "demarche_ds_number": demarche.ds_number,
+                    "dossier_ds_numbers": list(numbers),
+                    "error": str(e),
+                },
+            )
+            continue
+        stats["escalation_response_size"] += client.last_response_size or 0
+    stats["escalated"] += len(full_dossiers)
+
+    missing_numbers = [n for n in moved_numbers if n not in full_dossiers]
+    if missing_numbers:
+        logger.warning(
+            "Moved dossiers not returned by DN",
+            extra={
+                "demarche_ds_number": demarche.ds_number,
+                "dossier_ds_numbers": missing_numbers,
+            },
+        )
+    page["nodes"] = [full_dossiers[n] for n in moved_numbers if n in full_dossiers]
+    return not missing_numbers
+
+
+def _has_moved_since(dossier_data: dict, stored_date) -> bool:
+    date_modif_ds = dossier_data.get("dateDerniereModification")
+    if stored_date is None or not date_modif_ds:
+        return True
+    return timezone.datetime.fromisoformat(date_modif_ds) > stored_date
+
+
+def process_dossiers_page(
     page: dict,
     demarche: Demarche,
-    handled_departement_insee_codes: Iterable[str],
+    departement_filter: "HandledDepartementFilter",
     groupe_index: dict,
-) -> tuple["_PageState", int]:
+    stats: Counter,
+) -> tuple["PageState", int]:
     has_error = False
     count = 0
     for dossier_data in page["nodes"]:
@@ -160,26 +320,123 @@ def _process_dossiers_page(
                 extra={"demarche_ds_number": demarche.ds_number, "i": count},
             )
             continue
-        try:
-            _create_or_update_dossier_from_ds_data(
-                dossier_data,
-                handled_departement_insee_codes,
-                demarche,
-                groupe_index=groupe_index,
+        if not _save_one_dossier_of_page(
+            dossier_data,
+            demarche,
+            departement_filter,
+            groupe_index,
+            stats,
+            count,
+        ):
+            has_error = True
+    return (
+        PageState(
+            cursor=page["pageInfo"]["endCursor"],
+            has_more=page["pageInfo"]["hasNextPage"],
+            has_error=has_error,
+        ),
+        count,
+    )
+
+
+def _save_one_dossier_of_page(
+    dossier_data: dict,
+    demarche: Demarche,
+    departement_filter: "HandledDepartementFilter",
+    groupe_index: dict,
+    stats: Counter,
+    i: int,
+) -> bool:
+    try:
+        _create_or_update_dossier_from_ds_data(
+            dossier_data,
+            departement_filter,
+            demarche,
+            groupe_index=groupe_index,
+            stats=stats,
+        )
+    except Exception as e:
+        logger.exception(
+            "Error unhandled while saving dossier from DN",
+            extra={
+                "demarche_ds_number": demarche.ds_number,
+                "dossier_ds_number": dossier_data["number"],
+                "error": str(e),
+                "i": i,
+            },
+        )
+        return False
+    return True
+
+
+def process_dossiers_page_in_bulk(
+    page: dict,
+    demarche: Demarche,
+    departement_filter: "HandledDepartementFilter",
+    groupe_index: dict,
+    stats: Counter,
+) -> tuple["PageState", int]:
+    """
+    Variante ensembliste de ``process_dossiers_page`` (cf.
+    ``DS_SYNC_BULK_PAGE_INGESTION``) : les dossiers de la page sont chargés en
+    une requête, les manquants créés par ``bulk_create``, les ``raw_data``
+    écrits par ``bulk_update`` et une seule tâche de rafraîchissement est
+    envoyée pour toute la page.
+
+    Une erreur sur un dossier n'affecte que ce dossier ; si l'écriture groupée
+    elle-même échoue, la page est rejouée dossier par dossier.
+    """
+    has_error = False
+    count = 0
+    handled_dossiers_data = {}
+    for dossier_data in page["nodes"]:
+        count += 1
+        if dossier_data is None:
+            logger.info(
+                "Dossier data is empty",
+                extra={"demarche_ds_number": demarche.ds_number, "i": count},
             )
+            continue
+        is_handled, _ = departement_filter.check(dossier_data)
+        if not is_handled:
+            logger.info(
+                "Dossier is not in a handled departement",
+                extra={
+                    "demarche_ds_number": demarche.ds_number,
+                    "dossier_ds_number": dossier_data["number"],
+                },
+            )
+            continue
+        handled_dossiers_data[dossier_data["id"]] = dossier_data
+
+    if handled_dossiers_data:
+        try:
+            if not _save_dossiers_page_in_bulk(
+                list(handled_dossiers_data.values()), demarche, groupe_index, stats
+            ):
+                has_error = True
         except Exception as e:
-            has_error = True
             logger.exception(
-                "Error unhandled while saving dossier from DN",
+                "Error unhandled while saving dossiers page from DN in bulk, "
+                "falling back to one dossier at a time",
                 extra={
                     "demarche_ds_number": demarche.ds_number,
-                    "dossier_ds_number": dossier_data["number"],
                     "error": str(e),
-                    "i": count,
                 },
             )
+            for i, dossier_data in enumerate(handled_dossiers_data.values(), 1):
+                if not _save_one_dossier_of_page(
+                    dossier_data,
+                    demarche,
+                    departement_filter,
+                    groupe_index,
+                    stats,
+                    i,
+                ):
+                    has_error = True
+
     return (
-        _PageState(
+        PageState(
             cursor=page["pageInfo"]["endCursor"],
             has_more=page["pageInfo"]["hasNextPage"],
             has_error=has_error,
@@ -188,9 +445,118 @@ def _process_dossiers_page(
     )
 
 
-def _process_deactivation_page(
+def _save_dossiers_page_in_bulk(
+    dossiers_data: list[dict], demarche: Demarche, groupe_index: dict, stats: Counter
+) -> bool:
+    """
+    Retourne False si au moins un dossier de la page n'a pas pu être enregistré.
+    """
+    has_error = False
+    saved_dossiers = []
+    with transaction.atomic():
+        dossiers_by_ds_id = {
+            dossier.ds_id: dossier
+            for dossier in Dossier.objects.filter(
+                ds_id__in=[dossier_data["id"] for dossier_data in dossiers_data]
+            ).select_related("ds_data", "ds_demarche")
+        }
+
+        new_dossiers = Dossier.objects.bulk_create(
+            [
+                Dossier(
+                    ds_id=dossier_data["id"],
+                    ds_number=dossier_data["number"],
+                    ds_demarche=demarche,
+                )
+                for dossier_data in dossiers_data
+                if dossier_data["id"] not in dossiers_by_ds_id
+            ]
+        )
+        for dossier in new_dossiers:
+            dossiers_by_ds_id[dossier.ds_id] = dossier
+
+        dossiers_without_data = [
+            dossier
+            for dossier in dossiers_by_ds_id.values()
+            if getattr(dossier, "ds_data", None) is None
+        ]
+        new_dossiers_data = DossierData.objects.bulk_create(
+            [DossierData(dossier=dossier) for dossier in dossiers_without_data]
+        )
+        for dossier, dossier_data_object in zip(
+            dossiers_without_data, new_dossiers_data
+        ):
+            dossier.ds_data = dossier_data_object
+
+        try:
+            with transaction.atomic():
+                refresh_dossiers_instructeurs(
+                    [
+                        (dossier_data, dossiers_by_ds_id[dossier_data["id"]])
+                        for dossier_data in dossiers_data
+                    ],
+                    groupe_index,
+                )
+            instructeurs_refreshed = True
+        except Exception as e:
+            logger.warning(
+                "Bulk instructeurs refresh failed, refreshing dossier by dossier",
+                extra={"demarche_ds_number": demarche.ds_number, "error": str(e)},
+            )
+            instructeurs_refreshed = False
+
+        now = timezone.now()
+        for dossier_data in dossiers_data:
+            dossier = dossiers_by_ds_id[dossier_data["id"]]
+            try:
+                # Savepoint : une erreur sur ce dossier ne doit pas invalider
+                # la transaction du reste de la page.
+                if not instructeurs_refreshed:
+                    with transaction.atomic():
+                        refresh_dossier_instructeurs(
+                            dossier_data, dossier, groupe_index=groupe_index
+                        )
+            except Exception as e:
+                has_error = True
+                logger.exception(
+                    "Error unhandled while saving dossier from DN",
+                    extra={
+                        "demarche_ds_number": demarche.ds_number,
+                        "dossier_ds_number": dossier_data["number"],
+                        "error": str(e),
+                    },
+                )
+                continue
+            if not dossier.ds_data.set_raw_data(dossier_data):
+                stats["raw_data_skipped"] += 1
+                continue
+            stats["raw_data_written"] += 1
+            dossier.ds_data.updated_at = now
+            dossier.updated_at = now
+            saved_dossiers.append(dossier)
+
+        DossierData.objects.bulk_update(
+            [dossier.ds_data for dossier in saved_dossiers],
+            ["raw_data", "raw_data_hash", "raw_data_archive", "updated_at"],
+        )
+        Dossier.objects.bulk_update(saved_dossiers, ["updated_at"])
+
+    if saved_dossiers:
+        from gsl_demarches_simplifiees.tasks import (
+            task_refresh_dossiers_from_saved_data,
+        )
+
+        task_refresh_dossiers_from_saved_data.apply_async(
+            ([dossier.ds_number for dossier in saved_dossiers],),
+            priority=TASK_PRIORITY_LOW,
+        )
+
+    return not has_error
+
+
+def process_deactivation_page(
     page: dict, raison: str, demarche_ds_number: int, log_message: str
-) -> "_PageState":
+) -> "PageState":
     has_error = False
     for deleted_data in page["nodes"]:
         try:
@@ -205,15 +571,15 @@ def _process_deactivation_page(
                     "error": str(e),
                 },
             )
-    return _PageState(
+    return PageState(
         cursor=page["pageInfo"]["endCursor"],
         has_more=page["pageInfo"]["hasNextPage"],
         has_error=has_error,
     )
 
 
-def _advance_stream(
-    result: "_PageState | None", current_cursor: str | None
+def advance_stream(
+    result: "PageState | None", current_cursor: str | None
 ) -> tuple[bool, str | None]:
     if result is None:
         return False, current_cursor
@@ -223,6 +589,194 @@ def _advance_stream(
     return result.has_more, next_cursor
 
 
+class DemarchePageFetcher:
+    """
+    Récupère les pages de ``getDemarcheDossiers``. Avec un ``prefetch_executor``,
+    la page suivante est demandée en arrière-plan dès réception de la page
+    courante ; elle n'est utilisée que si la requête suivante réellement
+    calculée par la boucle de sync est identique à celle anticipée.
+
+    La taille de page est pilotée par ``AdaptivePageSize`` : en cas de timeout
+    ou d'erreur DN, la même page (mêmes curseurs) est redemandée avec une
+    taille réduite, jusqu'à la taille minimale.
+
+    ``response_size`` cumule la taille des réponses reçues, pour comparer le
+    volume transféré selon le profil de sync.
+    """
+
+    def __init__(
+        self,
+        client: DsClient,
+        demarche_number: int,
+        updated_since,
+        prefetch_executor: ThreadPoolExecutor | None = None,
+        profile: SyncProfile = SYNC_PROFILE_FULL,
+    ):
+        self.client = client
+        self.demarche_number = demarche_number
+        self.updated_since = updated_since
+        self.prefetch_executor = prefetch_executor
+        self.profile = profile
+        self.page_size = AdaptivePageSize()
+        self.response_size = 0
+        self._prefetched = None
+
+    def fetch(self, page_request: PageRequest) -> tuple[dict, bool]:
+        prefetched, self._prefetched = self._prefetched, None
+        if prefetched is not None and prefetched[0] != page_request:
+            # Page anticipée inutile : on l'annule, ou on attend sa fin si elle
+            # est déjà partie, pour ne jamais avoir deux requêtes en parallèle.
+            prefetched[1].cancel()
+            wait([prefetched[1]])
+            prefetched = None
+
+        demarche_data, has_errors = self._fetch_with_retries(
+            page_request, prefetched[1] if prefetched is not None else None
+        )
+
+        if self.prefetch_executor is not None:
+            next_page_request = _predict_next_page_request(page_request, demarche_data)
+            if next_page_request is not None:
+                self._prefetched = (
+                    next_page_request,
+                    self.prefetch_executor.submit(
+                        self._fetch, next_page_request, self.page_size.page_size
+                    ),
+                )
+        return demarche_data, has_errors
+
+    def _fetch_with_retries(
+        self, page_request: PageRequest, prefetched: Future | None
+    ) -> tuple[dict, bool]:
+        """
+        Tourne dans le thread de la boucle de sync : la taille de page et les
+        compteurs ne sont modifiés qu'ici, jamais par le thread de préchargement.
+        """
+        while True:
+            page_size = self.page_size.page_size
+            try:
+                if prefetched is not None:
+                    future, prefetched = prefetched, None
+                    fetched = future.result()
+                else:
+                    fetched = self._fetch(page_request, page_size)
+            except (DsServiceException, requests.exceptions.Timeout) as e:
+                if not self.page_size.can_shrink:
+                    raise
+                self.page_size.shrink()
+                logger.warning(
+                    "DN page fetch failed, retrying with a smaller page size",
+                    extra={
+                        "demarche_ds_number": self.demarche_number,
+                        "page_size": page_size,
+                        "next_page_size": self.page_size.page_size,
+                        "error": str(e),
+                    },
+                )
+                continue
+
+            demarche_data, has_errors, response_size, elapsed = fetched
+            self.response_size += response_size or 0
+            self.page_size.record_success(elapsed, response_size, has_errors)
+            logger.info(
+                "DN demarche page fetched",
+                extra={
+                    "demarche_ds_number": self.demarche_number,
+                    "page_size": page_size,
+                    "next_page_size": self.page_size.page_size,
+                    "elapsed_ms": round(elapsed * 1000),
+                    "response_size": response_size,
+                    "sync_profile": self.profile.name,
+                    "has_errors": has_errors,
+                },
+            )
+            return demarche_data, has_errors
+
+    def _fetch(
+        self, page_request: PageRequest, page_size: int
+    ) -> tuple[dict, bool, int | None, float]:
+        """
+        Une requête DN, sans état partagé : peut tourner dans le thread de
+        préchargement. Retourne aussi la taille de la réponse et sa durée.
+        """
+        start = time.monotonic()
+        with dn_request_budget():
+            demarche_data, has_errors = self.client.fetch_demarche_page(
+                self.demarche_number,
+                updated_since=self.updated_since,
+                page_size=page_size,
+                profile=self.profile,
+                **page_request._asdict(),
+            )
+        return (
+            demarche_data,
+            has_errors,
+            self.client.last_response_size,
+            time.monotonic() - start,
+        )
+
+
+def _predict_next_page_request(
+    page_request: PageRequest, demarche_data: dict
+) -> PageRequest | None:
+    """
+    Anticipe la requête de la page suivante à partir des ``pageInfo`` de la page
+    courante, avec les règles de ``advance_stream``. Seuls ``endCursor`` et
+    ``hasNextPage`` entrent en jeu, donc la prédiction ne dépend pas du
+    traitement de la page.
+
+    Retourne None s'il n'y a pas de page suivante ou si la réponse est
+    inexploitable (le traitement de la page lèvera alors l'erreur).
+    """
+
+    def _predict(connection, include, cursor):
+        if not include:
+            return advance_stream(None, cursor)
+        page_info = demarche_data[connection]["pageInfo"]
+        return advance_stream(
+            PageState(
+                cursor=page_info["endCursor"],
+                has_more=page_info["hasNextPage"],
+                has_error=False,
+            ),
+            cursor,
+        )
+
+    try:
+        include_dossiers, dossiers_after = _predict(
+            "dossiers", page_request.include_dossiers, page_request.dossiers_after
+        )
+        include_pending_deleted, pending_deleted_after = _predict(
+            "pendingDeletedDossiers",
+            page_request.include_pending_deleted,
+            page_request.pending_deleted_after,
+        )
+        include_deleted, deleted_after = _predict(
+            "deletedDossiers", page_request.include_deleted, page_request.deleted_after
+        )
+    except (KeyError, TypeError):
+        return None
+
+    if not (include_dossiers or include_pending_deleted or include_deleted):
+        return None
+    return PageRequest(
+        dossiers_after=dossiers_after,
+        pending_deleted_after=pending_deleted_after,
+        deleted_after=deleted_after,
+        include_dossiers=include_dossiers,
+        include_pending_deleted=include_pending_deleted,
+        include_deleted=include_deleted,
+    )
+
+
+def _save_last_synced_at(demarche: "Demarche", sync_started_at, *, any_error: bool):
+    """Date de début de la dernière sync arrivée au bout sans aucune erreur."""
+    if any_error:
+        return
+    demarche.last_synced_at = sync_started_at
+    demarche.save(update_fields=["last_synced_at"])
+
+
 def _save_cursors_after_page(
     demarche: "Demarche",
     *,
@@ -282,9 +836,9 @@ def save_one_dossier_from_ds(
 def create_or_update_dossier_from_ds_number(ds_number: str):
     client = DsClient()
     dossier_data = client.get_one_dossier(ds_number)
-    handled_departement_insee_codes = _get_handled_departement_insee_codes()
     return _create_or_update_dossier_from_ds_data(
-        dossier_data, handled_departement_insee_codes
+        dossier_data,
+        HandledDepartementFilter(_get_handled_departement_insee_codes()),
     )
 
 
@@ -337,10 +891,10 @@ def import_one_dossier_from_ds(dossier_number: int):
             f"Le dossier #{dossier_number} existe déjà sur Turgot.",
         )
 
-    handled_departement_insee_codes = _get_handled_departement_insee_codes()
-    is_handled, departement = _is_dossier_in_handled_departement(
-        dossier_data, handled_departement_insee_codes
+    departement_filter = HandledDepartementFilter(
+        _get_handled_departement_insee_codes()
     )
+    is_handled, departement = departement_filter.check(dossier_data)
     if not is_handled:
         logger.info(
             "Dossier dans un territoire non géré, import ignoré",
@@ -355,7 +909,7 @@ def import_one_dossier_from_ds(dossier_number: int):
     # passer devant la sync de fond, d'où la priorité haute.
     _create_or_update_dossier_from_ds_data(
         dossier_data,
-        handled_departement_insee_codes,
+        departement_filter,
         refresh_priority=TASK_PRIORITY_HIGH,
     )
     return (
@@ -364,6 +918,60 @@ def import_one_dossier_from_ds(dossier_number: int):
     )
 
 
+# Relations lues par DossierConverter et get_perimetre_from_dossier
+_REFRESH_SELECT_RELATED = (
+    "ds_data",
+    "ds_demarche",
+    "ds_demandeur",
+    *(
+        field.name
+        for field in Dossier.MAPPED_FIELDS
+        if isinstance(field, models.ForeignKey)
+    ),
+)
+_REFRESH_PREFETCH_RELATED = tuple(
+    field.name
+    for field in Dossier.MAPPED_FIELDS
+    if isinstance(field, models.ManyToManyField)
+)
+
+
+def refresh_dossiers_from_saved_data(dossier_numbers: Iterable[int]) -> Counter:
+    """
+    Rafraîchit un lot de dossiers depuis leurs données DN enregistrées.
+
+    Les dossiers du lot et les relations lues par la conversion sont chargés en
+    quelques requêtes, puis convertis en une passe qui partage le cache des
+    données de référence et le plan de conversion de la démarche. Une erreur
+    sur un dossier est journalisée sans interrompre le reste du lot.
+    """
+    dossiers = (
+        Dossier.objects.filter(ds_number__in=dossier_numbers)
+        .select_related(*_REFRESH_SELECT_RELATED)
+        .prefetch_related(*_REFRESH_PREFETCH_RELATED)
+    )
+    stats = Counter()
+    for dossier in dossiers:
+        try:
+            refresh_dossier_from_saved_data(dossier)
+            stats["refreshed"] += 1
+        except Exception as e:
+            stats["failed"] += 1
+            logger.exception(
+                "Error unhandled while refreshing dossier from saved data",
+                extra={"dossier_ds_number": dossier.ds_number, "error": str(e)},
+            )
+
+    logger.info(
+        "Dossiers have been refreshed from saved data",
+        extra={
+            "refreshed_count": stats["refreshed"],
+            "failed_count": stats["failed"],
+        },
+    )
+    return stats
+
+
 def refresh_dossier_from_saved_data(dossier: Dossier):
     old_instruction_date = dossier.ds_date_passage_en_instruction
     old_construction_date = dossier.ds_date_passage_en_construction
@@ -371,7 +979,7 @@ def refresh_dossier_from_saved_data(dossier: Dossier):
     old_is_active = dossier.is_active
     old_raison = dossier.raison_desactivation
 
-    dossier_converter = DossierConverter(dossier.ds_data.raw_data, dossier)
+    dossier_converter = DossierConverter(dossier.ds_data.get_raw_data(), dossier)
     dossier_converter.fill_unmapped_fields()
     dossier_converter.convert_all_fields()
     dossier_converter.associate_perimetre()
@@ -381,7 +989,9 @@ def refresh_dossier_from_saved_data(dossier: Dossier):
         logger.exception(str(e), extra={"dossier_ds_number": dossier.ds_number})
         raise e
 
-    ProjetService.create_or_update_projet_and_co_from_dossier(dossier.ds_number)
+    ProjetService.create_or_update_projet_and_co_from_dossier(
+        dossier.ds_number, ds_dossier=dossier
+    )
     _create_dossier_event_actions(
         dossier,
         old_instruction_date,
@@ -475,7 +1085,7 @@ def refresh_dossier_instructeurs(
     Refreshes the instructeurs associated with a dossier based on data from Démarche Numérique.
 
     The DN payload only ships ``groupeInstructeur.id`` for the dossier; the list of
-    instructeurs is reconstructed locally from ``Demarche.raw_ds_data`` via
+    instructeurs is reconstructed locally from the GroupeInstructeur table via
     ``groupe_index``: ``{groupe_ds_id: [{"id": ..., "email": ...}, ...]}``.
 
     If ``groupe_index`` is None, it is built from ``dossier.ds_demarche``. If the
@@ -486,12 +1096,89 @@ def refresh_dossier_instructeurs(
     Assume ds_instructeur has been prefetch_related on dossier
     Noop if no changes, check only IDs does not check emails.
     """
+    instructeurs_data = _get_groupe_instructeurs_data(
+        dossier_data, dossier, groupe_index
+    )
+    if instructeurs_data is None:
+        return
+
+    # Remove instructeurs that are not in the new data
+    for profile in dossier.ds_instructeurs.all():
+        if profile.ds_id not in (i["id"] for i in instructeurs_data):
+            dossier.ds_instructeurs.remove(profile)
+
+    # Add instructeurs that are not already in the dossier
+    dossier_instructeurs_ids = [p.ds_id for p in dossier.ds_instructeurs.all()]
+    for instructeur_data in instructeurs_data:
+        if instructeur_data["id"] not in dossier_instructeurs_ids:
+            instructeur = get_or_create_profile(
+                instructeur_data["id"], instructeur_data["email"]
+            )
+            dossier.ds_instructeurs.add(instructeur)
+
+
+def refresh_dossiers_instructeurs(
+    dossiers: list[tuple[dict, Dossier]], groupe_index: dict
+):
+    """
+    Variante ensembliste de ``refresh_dossier_instructeurs`` pour une page de
+    ``(dossier_data, dossier)`` : les profils référencés sont upsertés en une
+    fois, puis la différence de la table d'association dossier ↔ profil est
+    appliquée pour toute la page par un ``bulk_create`` et un seul ``delete``.
+    """
+    instructeurs_by_dossier_pk = {}
+    for dossier_data, dossier in dossiers:
+        instructeurs_data = _get_groupe_instructeurs_data(
+            dossier_data, dossier, groupe_index
+        )
+        if instructeurs_data is not None:
+            instructeurs_by_dossier_pk[dossier.pk] = instructeurs_data
+    if not instructeurs_by_dossier_pk:
+        return
+
+    profiles_by_ds_id = upsert_profiles(
+        instructeur_data
+        for instructeurs_data in instructeurs_by_dossier_pk.values()
+        for instructeur_data in instructeurs_data
+    )
+    wanted = {
+        (dossier_pk, profiles_by_ds_id[instructeur_data["id"]].pk)
+        for dossier_pk, instructeurs_data in instructeurs_by_dossier_pk.items()
+        for instructeur_data in instructeurs_data
+    }
+
+    Membership = Dossier.ds_instructeurs.through
+    existing = {
+        (dossier_pk, profile_pk): membership_pk
+        for membership_pk, dossier_pk, profile_pk in Membership.objects.filter(
+            dossier_id__in=instructeurs_by_dossier_pk
+        ).values_list("pk", "dossier_id", "profile_id")
+    }
+    Membership.objects.bulk_create(
+        [
+            Membership(dossier_id=dossier_pk, profile_id=profile_pk)
+            for dossier_pk, profile_pk in wanted - existing.keys()
+        ]
+    )
+    removed = [pk for pair, pk in existing.items() if pair not in wanted]
+    if removed:
+        Membership.objects.filter(pk__in=removed).delete()
+
+
+def _get_groupe_instructeurs_data(
+    dossier_data, dossier: Dossier, groupe_index: dict | None
+) -> list[dict] | None:
+    """
+    Instructeurs du groupe du dossier d'après ``groupe_index``, ou None si le
+    payload n'indique pas de groupe ou que le groupe reste inconnu après un
+    rafraîchissement de la démarche.
+    """
     if "groupeInstructeur" not in dossier_data:
         # Should not happen except in tests
-        return
+        return None
     groupe_id = dossier_data["groupeInstructeur"].get("id")
     if not groupe_id:
-        return
+        return None
 
     if groupe_index is None:
         groupe_index = _build_groupe_index_from_demarche(dossier.ds_demarche)
@@ -515,21 +1202,7 @@ def refresh_dossier_instructeurs(
                 "groupe_ds_id": groupe_id,
             },
         )
-        return
-
-    # Remove instructeurs that are not in the new data
-    for profile in dossier.ds_instructeurs.all():
-        if profile.ds_id not in (i["id"] for i in instructeurs_data):
-            dossier.ds_instructeurs.remove(profile)
-
-    # Add instructeurs that are not already in the dossier
-    dossier_instructeurs_ids = [p.ds_id for p in dossier.ds_instructeurs.all()]
-    for instructeur_data in instructeurs_data:
-        if instructeur_data["id"] not in dossier_instructeurs_ids:
-            instructeur = get_or_create_profile(
-                instructeur_data["id"], instructeur_data["email"]
-            )
-            dossier.ds_instructeurs.add(instructeur)
+    return instructeurs_data
 
 
 ### Private methods
@@ -538,19 +1211,31 @@ def refresh_dossier_instructeurs(
 def _build_groupe_index_from_demarche(demarche: Demarche) -> dict[str, list[dict]]:
     """
     Build ``{groupe_ds_id: [{"id": profile_ds_id, "email": profile_email}, ...]}``
-    from ``demarche.raw_ds_data["groupeInstructeurs"]``. Returns an empty dict if
-    the raw data is missing.
+    from the GroupeInstructeur table of the demarche. Returns an empty dict if the
+    demarche has no groupe.
+
+    The table is filled from ``demarche.raw_ds_data`` the first time it is read
+    for a demarche saved before it existed.
     """
-    raw = demarche.raw_ds_data or {}
-    groupes = raw.get("groupeInstructeurs") or []
-    return {
-        groupe["id"]: [
-            {"id": instr["id"], "email": instr["email"]}
-            for instr in groupe.get("instructeurs", [])
-        ]
-        for groupe in groupes
-        if "id" in groupe
+    if not demarche.groupes_instructeurs.exists() and (demarche.raw_ds_data or {}).get(
+        "groupeInstructeurs"
+    ):
+        from gsl_demarches_simplifiees.importer.demarche import (
+            save_groupe_instructeurs,
+        )
+
+        save_groupe_instructeurs(demarche.raw_ds_data, demarche)
+
+    groupe_index = {
+        ds_id: []
+        for ds_id in demarche.groupes_instructeurs.values_list("ds_id", flat=True)
     }
+    memberships = GroupeInstructeur.instructeurs.through.objects.filter(
+        groupeinstructeur__demarche=demarche
+    ).values_list("groupeinstructeur__ds_id", "profile__ds_id", "profile__ds_email")
+    for groupe_ds_id, profile_ds_id, profile_email in memberships:
+        groupe_index[groupe_ds_id].append({"id": profile_ds_id, "email": profile_email})
+    return groupe_index
 
 
 def _deactivate_deleted_dossier(deleted_dossier_data: dict, raison: str):
@@ -595,19 +1280,32 @@ def _save_dossier_data_and_refresh_dossier_and_projet_and_co(
     refresh_only_if_dossier_has_been_updated: bool = True,
     groupe_index: dict | None = None,
     refresh_priority: int = TASK_PRIORITY_LOW,
+    skip_refresh_if_unchanged: bool = False,
+    stats: Counter | None = None,
 ):
+    """
+    Le ``raw_data`` n'est réécrit que si l'empreinte du payload DN a changé.
+    Avec ``skip_refresh_if_unchanged``, un payload inchangé ne déclenche pas
+    non plus le rafraîchissement du dossier.
+    """
     if refresh_only_if_dossier_has_been_updated:
         must_refresh_dossier = _has_dossier_been_updated_on_ds(dossier, dossier_data)
     else:
         must_refresh_dossier = True
 
     refresh_dossier_instructeurs(dossier_data, dossier, groupe_index=groupe_index)
-    if getattr(dossier, "ds_data", None) is None:
-        DossierData.objects.create(dossier=dossier, raw_data=dossier_data)
-    else:
-        dossier.ds_data.raw_data = dossier_data
-        dossier.ds_data.save()
-    dossier.save()
+    ds_data = getattr(dossier, "ds_data", None)
+    if ds_data is None:
+        ds_data = DossierData(dossier=dossier)
+    has_raw_data_changed = ds_data.set_raw_data(dossier_data)
+    if has_raw_data_changed:
+        ds_data.save()
+        dossier.save()
+    elif skip_refresh_if_unchanged:
+        must_refresh_dossier = False
+
+    if stats is not None:
+        stats["raw_data_written" if has_raw_data_changed else "raw_data_skipped"] += 1
 
     if must_refresh_dossier:
         if async_refresh:
@@ -652,10 +1350,11 @@ def _get_handled_departement_insee_codes():
 
 def _create_or_update_dossier_from_ds_data(
     dossier_data: dict | None,
-    handled_departement_insee_codes: Iterable[str],
+    departement_filter: "HandledDepartementFilter",
     demarche: Demarche | None = None,
     groupe_index: dict | None = None,
     refresh_priority: int = TASK_PRIORITY_LOW,
+    stats: Counter | None = None,
 ):
     ds_id = dossier_data["id"]
     ds_dossier_number = dossier_data["number"]
@@ -663,9 +1362,7 @@ def _create_or_update_dossier_from_ds_data(
         demarche_number = dossier_data["demarche"]["number"]
         demarche = Demarche.objects.get(ds_number=demarche_number)
 
-    must_create_or_update_dossier, _ = _is_dossier_in_handled_departement(
-        dossier_data, handled_departement_insee_codes
-    )
+    must_create_or_update_dossier, _ = departement_filter.check(dossier_data)
     if not must_create_or_update_dossier:
         logger.info(
             "Dossier is not in a handled departement",
@@ -693,28 +1390,82 @@ def _create_or_update_dossier_from_ds_data(
         refresh_only_if_dossier_has_been_updated=False,
         groupe_index=groupe_index,
         refresh_priority=refresh_priority,
+        skip_refresh_if_unchanged=True,
+        stats=stats,
     )
 
 
-def _is_dossier_in_handled_departement(
-    raw_data: dict, handled_departement_insee_codes: Iterable[str]
-) -> tuple[bool, str]:
-    champs = raw_data.get("champs", [])
-
-    for champ in champs:
-        if champ.get("label") == "Département ou collectivité du demandeur":
-            valeur = champ.get("stringValue", "").strip()
+class HandledDepartementFilter:
+    """
+    Filtre des dossiers des départements gérés, pour une synchronisation.
 
-            if not valeur:
-                return False, valeur
+    L'ensemble des codes INSEE gérés est résolu une seule fois. Le champ
+    « Département ou collectivité du demandeur » est repéré par son
+    champDescriptorId (connu par les FieldMapping de la démarche, ou appris au
+    premier dossier où le libellé apparaît), le libellé ne servant qu'en repli.
+    Les rejets sont décomptés par motif dans ``rejections``.
+    """
 
-            # Exemple valeur : "75 - Paris"
-            code_insee = valeur.split("-")[0].strip()
+    DEPARTEMENT_CHAMP_LABEL = "Département ou collectivité du demandeur"
 
-            return code_insee in set(handled_departement_insee_codes), valeur
+    def __init__(
+        self,
+        handled_departement_insee_codes: Iterable[str],
+        departement_champ_descriptor_ids: Iterable[str] = (),
+    ):
+        self.handled_departement_insee_codes = frozenset(
+            handled_departement_insee_codes
+        )
+        self.departement_champ_descriptor_ids = set(departement_champ_descriptor_ids)
+        self.rejections = Counter()
+
+    @classmethod
+    def for_demarche(cls, demarche: Demarche) -> "HandledDepartementFilter":
+        return cls(
+            _get_handled_departement_insee_codes(),
+            FieldMapping.objects.filter(
+                demarche=demarche, ds_field_label=cls.DEPARTEMENT_CHAMP_LABEL
+            ).values_list("ds_field_id", flat=True),
+        )
 
-    # Champ non trouvé
-    return False, "inconnu"
+    def check(self, raw_data: dict) -> tuple[bool, str]:
+        """
+        Retourne ``(est_géré, valeur du champ département)``.
+        """
+        champ = self._find_departement_champ(raw_data.get("champs", []))
+        if champ is None:
+            self.rejections["departement_missing"] += 1
+            return False, "inconnu"
+
+        valeur = champ.get("stringValue", "").strip()
+        if not valeur:
+            self.rejections["departement_empty"] += 1
+            return False, valeur
+
+        # Exemple valeur : "75 - Paris"
+        code_insee = valeur.split("-")[0].strip()
+        if code_insee not in self.handled_departement_insee_codes:
+            self.rejections["departement_not_handled"] += 1
+            return False, valeur
+        return True, valeur
+
+    def _find_departement_champ(self, champs: list[dict]) -> dict | None:
+        if self.departement_champ_descriptor_ids:
+            for champ in champs:
+                if (
+                    champ.get("champDescriptorId")
+                    in self.departement_champ_descriptor_ids
+                ):
+                    return champ
+
+        for champ in champs:
+            if champ.get("label") == self.DEPARTEMENT_CHAMP_LABEL:
+                if champ.get("champDescriptorId"):
+                    self.departement_champ_descriptor_ids.add(
+                        champ["champDescriptorId"]
+                    )
+                return champ
+        return None
 
 
 def _reinit_demarche_sync_state(demarche: Demarche):
@@ -2,10 +2,15 @@ import datetime
 from collections.abc import Iterable
 from itertools import chain
 from logging import getLogger
+from typing import Callable, NamedTuple
 
-from django.db import models
+from django.db import models, transaction
 
 from gsl_core.models import Adresse, Arrondissement, Departement
+from gsl_demarches_simplifiees.importer.reference_cache import (
+    bump_shared_generation,
+    reference_cache,
+)
 from gsl_demarches_simplifiees.importer.utils import (
     get_arrondissement_from_value,
     get_categorie_detr_from_value,
@@ -29,6 +34,60 @@ def camelcase(my_string):
     return f"{s[0].lower()}{s[1:]}"
 
 
+CONVERSION_PLAN_CACHE_TABLE = "conversion_plan"
+
+
+class FieldConversion(NamedTuple):
+    django_field: models.Field
+    inject: Callable
+
+
+def get_conversion_plan(demarche_id: int) -> dict[str, FieldConversion]:
+    """
+    Plan de conversion compilé d'une démarche : pour chaque ``ds_field_id``
+    mappé, le champ Django cible et la méthode d'injection correspondante.
+
+    Construit une fois depuis les FieldMapping actifs, puis servi depuis le
+    cache de référence tant que la génération partagée de la démarche n'a pas
+    changé : toute modification de ses FieldMapping, quel que soit le process
+    (admin, import-export, ``save_field_mappings``), l'invalide partout.
+    """
+    return reference_cache.get(
+        CONVERSION_PLAN_CACHE_TABLE,
+        demarche_id,
+        lambda: _compile_conversion_plan(demarche_id),
+        shared_generation=_conversion_plan_generation(demarche_id),
+    )
+
+
+def invalidate_conversion_plan(demarche_id: int):
+    reference_cache.discard(CONVERSION_PLAN_CACHE_TABLE, demarche_id)
+    # Après le commit : un worker qui recompilerait le plan avant verrait
+    # encore les anciens FieldMapping sous la nouvelle génération.
+    transaction.on_commit(
+        lambda: bump_shared_generation(_conversion_plan_generation(demarche_id))
+    )
+
+
+def _conversion_plan_generation(demarche_id: int) -> str:
+    return f"{CONVERSION_PLAN_CACHE_TABLE}:{demarche_id}"
+
+
+def _compile_conversion_plan(demarche_id: int) -> dict[str, FieldConversion]:
+    mappings = (
+        FieldMapping.actives.filter(demarche_id=demarche_id)
+        .exclude(django_field="")
+        .values_list("ds_field_id", "django_field")
+    )
+    plan = {}
+    for ds_field_id, django_field_name in mappings:
+        django_field = Dossier._meta.get_field(django_field_name)
+        plan[ds_field_id] = FieldConversion(
+            django_field, DossierConverter.get_injector(django_field)
+        )
+    return plan
+
+
 class DossierConverter:
     UNMAPPED_FIELDS = (
         "state",
@@ -47,15 +106,18 @@ class DossierConverter:
                 ds_dossier_data["champs"], ds_dossier_data["annotations"]
             )
         }
-        computed_mappings = FieldMapping.actives.filter(
-            ds_field_id__in=self.ds_field_id_to_field_data.keys(),
-        ).exclude(django_field="")
-
         self.ds_dossier_data = ds_dossier_data
         self.ds_demarche_revision = ds_dossier_data["demarche"]["revision"]["id"]
+        self.conversion_plan = {
+            ds_field_id: conversion
+            for ds_field_id, conversion in get_conversion_plan(
+                dossier.ds_demarche_id
+            ).items()
+            if ds_field_id in self.ds_field_id_to_field_data
+        }
         self.ds_field_id_to_django_field = {
-            mapping.ds_field_id: Dossier._meta.get_field(mapping.django_field)
-            for mapping in computed_mappings.all()
+            ds_field_id: conversion.django_field
+            for ds_field_id, conversion in self.conversion_plan.items()
         }
 
         self.dossier = dossier
@@ -92,20 +154,21 @@ class DossierConverter:
         self.dossier.ds_demandeur = demandeur
 
     def convert_all_fields(self):
-        for ds_field_id in self.ds_field_id_to_django_field:
-            ds_field_data = self.ds_field_id_to_field_data[ds_field_id]
-            django_field_object = self.ds_field_id_to_django_field[ds_field_id]
-            self.convert_one_field(ds_field_data, django_field_object)
+        for ds_field_id, conversion in self.conversion_plan.items():
+            self.convert_one_field(
+                self.ds_field_id_to_field_data[ds_field_id],
+                conversion.django_field,
+                conversion.inject,
+            )
 
-    def convert_one_field(self, ds_field_data, django_field_object):
+    def convert_one_field(self, ds_field_data, django_field_object, inject=None):
+        inject = inject or self.get_injector(django_field_object)
         try:
             label = ds_field_data["label"]
             injectable_value = self.extract_ds_data(ds_field_data)
 
             try:
-                self.inject_into_field(
-                    self.dossier, django_field_object, injectable_value, label
-                )
+                inject(self, self.dossier, django_field_object, injectable_value, label)
             except (
                 CategorieDetr.DoesNotExist,
                 Departement.DoesNotExist,
@@ -125,46 +188,23 @@ class DossierConverter:
 
     def extract_ds_data(self, ds_field_data):
         ds_typename = ds_field_data["__typename"]
+        try:
+            extract = self.EXTRACTORS[ds_typename]
+        except KeyError:
+            raise NotImplementedError(
+                f"DN Fields of type '{ds_typename}' are not supported"
+            )
+        return extract(self, ds_field_data)
 
-        if ds_typename == "CheckboxChamp":
-            return ds_field_data["checked"]
-
-        if ds_typename in (
-            "TextChamp",
-            "SiretChamp",
-            "DossierLinkChamp",
-            "CiviliteChamp",
-        ):
-            return ds_field_data["stringValue"]
-
-        if ds_typename == "DecimalNumberChamp":
-            return ds_field_data["decimalNumber"]
-
-        if ds_typename == "IntegerNumberChamp":
-            try:
-                return int(ds_field_data["integerNumber"])
-            except TypeError:
-                logger.warning(
-                    "Value of IntegerNumberChamp is uncorrect.",
-                    extra={"value": ds_field_data["integerNumber"]},
-                )
-                return None
-
-        if ds_typename == "MultipleDropDownListChamp":
-            return ds_field_data["values"]
-
-        if ds_typename == "LinkedDropDownListChamp":
-            return self._extract_linked_dropdown_list_value(ds_field_data)
-
-        if ds_typename == "AddressChamp":
-            return ds_field_data["address"] or ds_field_data["stringValue"]
-
-        if ds_typename == "DateChamp":
-            return self._extract_date_from_value(ds_field_data)
-
-        raise NotImplementedError(
-            f"DN Fields of type '{ds_typename}' are not supported"
-        )
+    def _extract_integer_number(self, ds_field_data):
+        try:
+            return int(ds_field_data["integerNumber"])
+        except TypeError:
+            logger.warning(
+                "Value of IntegerNumberChamp is uncorrect.",
+                extra={"value": ds_field_data["integerNumber"]},
+            )
+            return None
 
     def _prepare_address_for_injection(
         self, dossier: Dossier, django_field_object: models.Field, injectable_value
@@ -187,12 +227,46 @@ class DossierConverter:
                     arguments["demarche_revision"] = self.ds_demarche_revision
         return arguments
 
+    def _get_or_create_related(self, related_model, injectable_value):
+        arguments = self._get_related_model_get_or_create_arguments(
+            related_model, injectable_value
+        )
+        key = tuple(
+            sorted(
+                (name, getattr(value, "pk", value)) for name, value in arguments.items()
+            )
+        )
+        return reference_cache.get_or_create(
+            related_model._meta.label,
+            key,
+            lambda: related_model.objects.get_or_create(**arguments),
+        )
+
     def _extract_linked_dropdown_list_value(self, ds_field_data):
         secondary_value = ds_field_data["secondaryValue"]
         if secondary_value:
             return secondary_value
         return ds_field_data["primaryValue"]
 
+    @classmethod
+    def get_injector(cls, django_field_object: models.Field) -> Callable:
+        """Méthode d'injection adaptée au type du champ Django, résolue une fois
+        par champ dans le plan de conversion."""
+        if isinstance(django_field_object, models.ManyToManyField):
+            return cls._inject_many_to_many
+        if not isinstance(django_field_object, models.ForeignKey):
+            return cls._inject_value
+        related_model = django_field_object.related_model
+        if issubclass(related_model, Adresse):
+            return cls._inject_address
+        if issubclass(related_model, CategorieDetr):
+            return cls._inject_categorie_detr
+        if issubclass(related_model, Arrondissement):
+            return cls._inject_arrondissement
+        if issubclass(related_model, Departement):
+            return cls._inject_departement
+        return cls._inject_related_choice
+
     def inject_into_field(
         self,
         dossier: Dossier,
@@ -200,37 +274,53 @@ class DossierConverter:
         injectable_value,
         label: str,
     ):
-        if isinstance(django_field_object, models.ManyToManyField):
-            self._inject_into_manytomany_field(
-                dossier, django_field_object, injectable_value
-            )
-            return
+        self.get_injector(django_field_object)(
+            self, dossier, django_field_object, injectable_value, label
+        )
 
-        if isinstance(django_field_object, models.ForeignKey):
-            if issubclass(django_field_object.related_model, Adresse):
-                injectable_value = self._prepare_address_for_injection(
-                    dossier, django_field_object, injectable_value
-                )
-            elif issubclass(django_field_object.related_model, CategorieDetr):
-                departement = get_departement_from_field_label(label)
-                injectable_value = get_categorie_detr_from_value(
-                    injectable_value,
-                    departement,
-                    dossier.ds_demarche_number,
-                )
-            elif issubclass(django_field_object.related_model, Arrondissement):
-                injectable_value = get_arrondissement_from_value(injectable_value)
-            elif issubclass(django_field_object.related_model, Departement):
-                injectable_value = get_departement_from_value(injectable_value)
-            else:
-                injectable_value, _ = (
-                    django_field_object.related_model.objects.get_or_create(
-                        **self._get_related_model_get_or_create_arguments(
-                            django_field_object.related_model, injectable_value
-                        )
-                    )
-                )
+    def _inject_many_to_many(self, dossier, django_field_object, value, label):
+        self._inject_into_manytomany_field(dossier, django_field_object, value)
+
+    def _inject_address(self, dossier, django_field_object, value, label):
+        self._inject_value(
+            dossier,
+            django_field_object,
+            self._prepare_address_for_injection(dossier, django_field_object, value),
+            label,
+        )
+
+    def _inject_categorie_detr(self, dossier, django_field_object, value, label):
+        departement = get_departement_from_field_label(label)
+        self._inject_value(
+            dossier,
+            django_field_object,
+            get_categorie_detr_from_value(
+                value, departement, dossier.ds_demarche_number
+            ),
+            label,
+        )
+
+    def _inject_arrondissement(self, dossier, django_field_object, value, label):
+        self._inject_value(
+            dossier, django_field_object, get_arrondissement_from_value(value), label
+        )
+
+    def _inject_departement(self, dossier, django_field_object, value, label):
+        self._inject_value(
+            dossier, django_field_object, get_departement_from_value(value), label
+        )
+
+    def _inject_related_choice(self, dossier, django_field_object, value, label):
+        self._inject_value(
+            dossier,
+            django_field_object,
+            self._get_or_create_related(django_field_object.related_model, value),
+            label,
+        )
 
+    def _inject_value(
+        self, dossier, django_field_object: models.Field, injectable_value, label
+    ):
         if (
             isinstance(injectable_value, str)
             and not injectable_value
@@ -257,12 +347,9 @@ class DossierConverter:
         manager = dossier.__getattribute__(django_field_object.name)
         new_related = set()
         for value in injectable_value:
-            related, _ = django_field_object.related_model.objects.get_or_create(
-                **self._get_related_model_get_or_create_arguments(
-                    django_field_object.related_model, value
-                )
+            new_related.add(
+                self._get_or_create_related(django_field_object.related_model, value)
             )
-            new_related.add(related)
 
         existing = set(manager.all())
         for obj in existing - new_related:
@@ -294,3 +381,17 @@ class DossierConverter:
         else:
             self.dossier.is_active = True
             self.dossier.raison_desactivation = ""
+
+    EXTRACTORS = {
+        "CheckboxChamp": lambda self, data: data["checked"],
+        "TextChamp": lambda self, data: data["stringValue"],
+        "SiretChamp": lambda self, data: data["stringValue"],
+        "DossierLinkChamp": lambda self, data: data["stringValue"],
+        "CiviliteChamp": lambda self, data: data["stringValue"],
+        "DecimalNumberChamp": lambda self, data: data["decimalNumber"],
+        "IntegerNumberChamp": _extract_integer_number,
+        "MultipleDropDownListChamp": lambda self, data: data["values"],
+        "LinkedDropDownListChamp": _extract_linked_dropdown_list_value,
+        "AddressChamp": lambda self, data: data["address"] or data["stringValue"],
+        "DateChamp": _extract_date_from_value,
+    }
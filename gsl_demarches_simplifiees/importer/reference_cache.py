@@ -0,0 +1,159 @@
+import threading
+import time
+from logging import getLogger
+
+import redis
+from django.conf import settings
+from django.db import transaction
+
+logger = getLogger(__name__)
+
+# Génération commune à toutes les tables : incrémentée par
+# ``invalidate_reference_cache``
+REFERENCE_GENERATION = "reference"
+
+
+class ReferenceCache:
+    """
+    Cache mémoire, par worker, des données de référence lues lors de la
+    conversion des dossiers DN (départements, arrondissements, périmètres,
+    catégories, libellés de choix).
+
+    Ces tables sont petites et changent rarement : chaque valeur est chargée une
+    seule fois puis servie depuis la mémoire jusqu'à l'expiration du TTL
+    (DS_REFERENCE_CACHE_TTL) ou une invalidation explicite. Les exceptions du
+    chargement (ex. DoesNotExist) ne sont pas mises en cache.
+
+    Chaque valeur est gardée avec les générations partagées (Redis, cf.
+    ``_shared_generations``) lues au chargement : la génération commune
+    ``REFERENCE_GENERATION`` et, si précisée, celle de la valeur. Elle n'est
+    resservie que tant qu'elles n'ont pas changé : c'est ce qui propage aux
+    autres workers une invalidation faite dans un process.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tables: dict[str, dict] = {}
+        # Clés d'une ligne créée dans une transaction pas encore commitée
+        self._pending: set[tuple] = set()
+        self._expires_at = 0.0
+
+    def get(self, table: str, key, loader, shared_generation: str | None = None):
+        generations = _shared_generations(shared_generation)
+        found, value = self._lookup(table, key, generations)
+        if found:
+            return value
+
+        value = loader()
+        self._store(table, key, generations, value)
+        return value
+
+    def get_or_create(
+        self, table: str, key, get_or_create, shared_generation: str | None = None
+    ):
+        """
+        Comme ``get``, pour un chargeur qui retourne ``(valeur, créée)`` (ex.
+        ``objects.get_or_create``). Une ligne créée par l'appel n'est mise en
+        cache qu'au commit, et la clé n'est pas mise en cache d'ici là : si la
+        transaction est annulée, le cache ne garde pas une ligne inexistante.
+        """
+        generations = _shared_generations(shared_generation)
+        found, value = self._lookup(table, key, generations)
+        if found:
+            return value
+
+        value, created = get_or_create()
+        if not created:
+            self._store(table, key, generations, value)
+            return value
+
+        with self._lock:
+            self._pending.add((table, key))
+        transaction.on_commit(
+            lambda: self._store(table, key, generations, value, created=True)
+        )
+        return value
+
+    def _lookup(self, table: str, key, generations) -> tuple[bool, object]:
+        with self._lock:
+            if time.monotonic() >= self._expires_at:
+                self._tables = {}
+                self._pending = set()
+                self._expires_at = time.monotonic() + settings.DS_REFERENCE_CACHE_TTL
+            values = self._tables.setdefault(table, {})
+            if key in values and values[key][0] == generations:
+                return True, values[key][1]
+        return False, None
+
+    def _store(self, table: str, key, generations, value, created=False):
+        with self._lock:
+            if created:
+                self._pending.discard((table, key))
+            elif (table, key) in self._pending:
+                return
+            self._tables.setdefault(table, {})[key] = (generations, value)
+
+    def discard(self, table: str, key):
+        with self._lock:
+            self._tables.get(table, {}).pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._tables = {}
+            self._pending = set()
+            self._expires_at = 0.0
+
+
+reference_cache = ReferenceCache()
+
+
+def invalidate_reference_cache():
+    """À appeler dès que départements, arrondissements, périmètres, catégories
+    ou libellés de choix sont modifiés (import de démarche, import du COG).
+    Vide le cache du process et, au commit, celui des autres workers via la
+    génération partagée."""
+    reference_cache.clear()
+    transaction.on_commit(lambda: bump_shared_generation(REFERENCE_GENERATION))
+    logger.info("Reference cache invalidated")
+
+
+def bump_shared_generation(name: str):
+    """Invalide, dans tous les workers, les valeurs lues avec la génération ``name``."""
+    if not settings.DS_REFERENCE_CACHE_REDIS_URL:
+        return
+    try:
+        _redis_client().incr(_generation_key(name))
+    except redis.exceptions.RedisError as e:
+        logger.warning(
+            "Reference cache generation unavailable",
+            extra={"generation": name, "error": str(e)},
+        )
+
+
+def _shared_generations(name: str | None) -> tuple:
+    """
+    Générations commune et ``name`` (si fourni), partagées par tous les workers
+    et lues en un seul appel Redis. None si le partage est désactivé
+    (DS_REFERENCE_CACHE_REDIS_URL vide) ou si Redis est indisponible : seul le
+    TTL limite alors la durée de vie des valeurs.
+    """
+    names = [REFERENCE_GENERATION] if name is None else [REFERENCE_GENERATION, name]
+    if not settings.DS_REFERENCE_CACHE_REDIS_URL:
+        return (None,) * len(names)
+    try:
+        values = _redis_client().mget([_generation_key(n) for n in names])
+    except redis.exceptions.RedisError as e:
+        logger.warning(
+            "Reference cache generation unavailable",
+            extra={"generation": names, "error": str(e)},
+        )
+        return (None,) * len(names)
+    return tuple(int(value or 0) for value in values)
+
+
+def _generation_key(name: str) -> str:
+    return f"gsl:reference-cache:generation:{name}"
+
+
+def _redis_client():
+    return redis.Redis.from_url(settings.DS_REFERENCE_CACHE_REDIS_URL)
@@ -0,0 +1,376 @@
+"""
+Synchronisation initiale d'une démarche découpée en lots (cf. DS_INIT_SYNC_SHARDS).
+
+La période qui va de la date choisie au lancement est divisée en fenêtres de
+``dateDerniereModification``. Chaque fenêtre devient un DemarcheSyncShard,
+parcouru par sa propre tâche Celery (``task_sync_demarche_shard``) : la
+requête part de ``updatedSince`` = début de la fenêtre et le lot s'arrête au
+premier dossier modifié après sa fin (DN renvoie les dossiers par date de
+modification croissante). Un lot supplémentaire parcourt les dossiers
+supprimés ou en attente de suppression.
+
+Chaque lot sauvegarde son curseur après chaque page traitée sans erreur : une
+nouvelle tentative reprend là où le lot s'était arrêté, sans toucher aux
+autres. Un dossier modifié pendant la synchronisation sort de sa fenêtre ; il
+est repris par le dernier lot (sans fin) ou par la sync incrémentale suivante.
+
+Tant qu'un lot est en attente ou en cours, la sync incrémentale de la
+démarche est suspendue. Un lot qui a épuisé ses DS_INIT_SYNC_SHARD_MAX_RETRIES
+tentatives passe « en échec » et ne la bloque plus. Une fois tous les lots
+d'une synchronisation terminés ou en échec, la sync incrémentale repart de la
+date de lancement, ou du début de la fenêtre du premier lot en échec : comme
+en sync normale, un dossier qui échoue retient le curseur au lieu de bloquer
+la démarche.
+
+Chaque page traitée met à jour ``updated_at`` du lot et prolonge son verrou
+(DS_INIT_SYNC_SHARD_STALE_AFTER). Un lot « en cours » sans battement depuis ce
+délai (worker tué) est renvoyé par ``redispatch_stale_sync_shards``.
+"""
+
+from collections import Counter
+from datetime import datetime, timedelta
+from logging import getLogger
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Min
+from django.utils import timezone
+
+from gsl.celery import TASK_PRIORITY_LOW
+from gsl_demarches_simplifiees.ds_client import SYNC_PROFILES, DsClient
+from gsl_demarches_simplifiees.exceptions import DsServiceException
+from gsl_demarches_simplifiees.importer.dossier import (
+    DemarchePageFetcher,
+    HandledDepartementFilter,
+    PageRequest,
+    advance_stream,
+    escalate_moved_dossiers,
+    get_or_refresh_groupe_index,
+    process_deactivation_page,
+    process_dossiers_page,
+    process_dossiers_page_in_bulk,
+)
+from gsl_demarches_simplifiees.models import Demarche, DemarcheSyncShard, Dossier
+
+logger = getLogger(__name__)
+
+
+def start_sharded_demarche_sync(
+    demarche: Demarche, updated_since: datetime, shards_count: int
+) -> list[DemarcheSyncShard]:
+    """
+    Crée les lots de la synchronisation initiale et envoie une tâche par lot
+    une fois la transaction validée.
+    """
+    now = timezone.now()
+    shards = DemarcheSyncShard.objects.bulk_create(
+        [
+            DemarcheSyncShard(
+                demarche=demarche,
+                kind=DemarcheSyncShard.KIND_DOSSIERS,
+                window_start=window_start,
+                window_end=window_end,
+                sync_started_at=now,
+            )
+            for window_start, window_end in split_sync_window(
+                updated_since, now, shards_count
+            )
+        ]
+        + [
+            DemarcheSyncShard(
+                demarche=demarche,
+                kind=DemarcheSyncShard.KIND_DELETIONS,
+                window_start=updated_since,
+                sync_started_at=now,
+            )
+        ]
+    )
+    transaction.on_commit(lambda: _dispatch_shards([shard.pk for shard in shards]))
+    logger.info(
+        "Sharded demarche sync started",
+        extra={
+            "demarche_ds_number": demarche.ds_number,
+            "updated_since": updated_since,
+            "shards_count": len(shards),
+        },
+    )
+    return shards
+
+
+def _dispatch_shards(shard_pks: list[int]):
+    from gsl_demarches_simplifiees.tasks import task_sync_demarche_shard
+
+    for shard_pk in shard_pks:
+        task_sync_demarche_shard.apply_async((shard_pk,), priority=TASK_PRIORITY_LOW)
+
+
+def split_sync_window(
+    start: datetime, end: datetime, shards_count: int
+) -> list[tuple[datetime, datetime | None]]:
+    """
+    Découpe [start, end) en ``shards_count`` fenêtres de même durée. La
+    dernière n'a pas de fin, pour inclure les dossiers modifiés depuis ``end``.
+    """
+    if shards_count <= 1 or start >= end:
+        return [(start, None)]
+    step = (end - start) / shards_count
+    bounds = [start + step * i for i in range(shards_count)]
+    return list(zip(bounds, bounds[1:] + [None]))
+
+
+def has_active_sync_shards(demarche_number: int) -> bool:
+    return DemarcheSyncShard.objects.filter(
+        demarche__ds_number=demarche_number,
+        status__in=DemarcheSyncShard.ACTIVE_STATUSES,
+    ).exists()
+
+
+def sync_demarche_shard(shard: DemarcheSyncShard, heartbeat=None) -> Counter:
+    """
+    Parcourt le lot depuis ses curseurs. ``heartbeat`` est appelé après chaque
+    page (prolongation du verrou du lot).
+
+    En cas d'erreur, l'exception est propagée pour que la tâche retente le
+    lot : il repasse « en attente », ou « en échec » s'il a épuisé ses
+    tentatives.
+    """
+    shard.status = DemarcheSyncShard.STATUS_RUNNING
+    shard.attempts += 1
+    shard.save(update_fields=["status", "attempts", "updated_at"])
+
+    stats = Counter()
+    heartbeat = heartbeat or (lambda: None)
+    try:
+        if shard.kind == DemarcheSyncShard.KIND_DELETIONS:
+            _sync_deletions_shard(shard, heartbeat)
+        else:
+            _sync_dossiers_shard(shard, stats, heartbeat)
+    except Exception as e:
+        shard.status = (
+            DemarcheSyncShard.STATUS_FAILED
+            if shard.retries_exhausted
+            else DemarcheSyncShard.STATUS_PENDING
+        )
+        shard.last_error = str(e)
+        shard.save(update_fields=["status", "last_error", "updated_at"])
+        if shard.status == DemarcheSyncShard.STATUS_FAILED:
+            _finish_sharded_sync_if_complete(shard)
+        raise
+
+    shard.status = DemarcheSyncShard.STATUS_DONE
+    shard.last_error = ""
+    shard.finished_at = timezone.now()
+    shard.save(update_fields=["status", "last_error", "finished_at", "updated_at"])
+    logger.info(
+        "Demarche sync shard done",
+        extra={
+            "demarche_ds_number": shard.demarche.ds_number,
+            "shard_id": shard.pk,
+            "kind": shard.kind,
+            "attempts": shard.attempts,
+            "dossiers_count": shard.dossiers_count,
+            "raw_data_written_count": stats["raw_data_written"],
+            "raw_data_skipped_count": stats["raw_data_skipped"],
+        },
+    )
+    _finish_sharded_sync_if_complete(shard)
+    return stats
+
+
+def _sync_dossiers_shard(shard: DemarcheSyncShard, stats: Counter, heartbeat):
+    demarche = shard.demarche
+    sync_profile = SYNC_PROFILES[settings.DS_SYNC_PROFILE]
+    departement_filter = HandledDepartementFilter.for_demarche(demarche)
+    groupe_index = get_or_refresh_groupe_index(demarche, demarche.ds_number)
+    process_page = (
+        process_dossiers_page_in_bulk
+        if settings.DS_SYNC_BULK_PAGE_INGESTION
+        else process_dossiers_page
+    )
+    page_fetcher = DemarchePageFetcher(
+        DsClient(), demarche.ds_number, shard.window_start, profile=sync_profile
+    )
+    escalation_client = DsClient()
+
+    # Comme pour la sync incrémentale, le parcours continue après une page en
+    # erreur mais le curseur sauvegardé reste celui de la dernière page sans erreur.
+    cursor = shard.sync_cursor or None
+    any_error = False
+    has_more = True
+    while has_more:
+        demarche_data, has_errors = page_fetcher.fetch(
+            PageRequest(
+                dossiers_after=cursor,
+                pending_deleted_after=None,
+                deleted_after=None,
+                include_dossiers=True,
+                include_pending_deleted=False,
+                include_deleted=False,
+            )
+        )
+        page = demarche_data["dossiers"]
+        window_reached = _drop_dossiers_past_window(page, shard.window_end)
+        all_escalated = escalate_moved_dossiers(
+            page, sync_profile, escalation_client, demarche, stats
+        )
+        result, count = process_page(
+            page, demarche, departement_filter, groupe_index, stats
+        )
+        has_more, cursor = advance_stream(result, cursor)
+        has_more = has_more and not window_reached
+
+        shard.dossiers_count += count
+        any_error = any_error or has_errors or result.has_error or not all_escalated
+        if not any_error:
+            shard.sync_cursor = cursor or ""
+        shard.save(update_fields=["sync_cursor", "dossiers_count", "updated_at"])
+        heartbeat()
+
+    if any_error:
+        raise DsServiceException(
+            log_message="DN sync shard ended with page errors",
+            extra={"demarche_ds_number": demarche.ds_number, "shard_id": shard.pk},
+        )
+
+
+def _drop_dossiers_past_window(page: dict, window_end: datetime | None) -> bool:
+    """
+    Retire de la page les dossiers modifiés après la fin de la fenêtre.
+    Retourne True si la fin de la fenêtre est atteinte.
+    """
+    if window_end is None:
+        return False
+    for i, node in enumerate(page["nodes"]):
+        date_modif_ds = node and node.get("dateDerniereModification")
+        if date_modif_ds and datetime.fromisoformat(date_modif_ds) >= window_end:
+            page["nodes"] = page["nodes"][:i]
+            return True
+    return False
+
+
+def _sync_deletions_shard(shard: DemarcheSyncShard, heartbeat):
+    demarche_number = shard.demarche.ds_number
+    page_fetcher = DemarchePageFetcher(DsClient(), demarche_number, shard.window_start)
+    streams = {
+        "pendingDeletedDossiers": (
+            "pending_deleted_cursor",
+            Dossier.RAISON_DESACTIVATION_CORBEILLE,
+            "Error unhandled while deactivating pending deleted dossier",
+        ),
+        "deletedDossiers": (
+            "deleted_cursor",
+            Dossier.RAISON_DESACTIVATION_SUPPRIME,
+            "Error unhandled while deactivating deleted dossier",
+        ),
+    }
+    cursors = {
+        connection: getattr(shard, cursor_field) or None
+        for connection, (cursor_field, _, _) in streams.items()
+    }
+    has_more = dict.fromkeys(streams, True)
+    any_error = dict.fromkeys(streams, False)
+
+    while any(has_more.values()):
+        demarche_data, has_errors = page_fetcher.fetch(
+            PageRequest(
+                dossiers_after=None,
+                pending_deleted_after=cursors["pendingDeletedDossiers"],
+                deleted_after=cursors["deletedDossiers"],
+                include_dossiers=False,
+                include_pending_deleted=has_more["pendingDeletedDossiers"],
+                include_deleted=has_more["deletedDossiers"],
+            )
+        )
+        for connection, (cursor_field, raison, log_message) in streams.items():
+            if not has_more[connection]:
+                continue
+            result = process_deactivation_page(
+                demarche_data[connection], raison, demarche_number, log_message
+            )
+            has_more[connection], cursors[connection] = advance_stream(
+                result, cursors[connection]
+            )
+            any_error[connection] = (
+                any_error[connection] or has_errors or result.has_error
+            )
+            if not any_error[connection]:
+                setattr(shard, cursor_field, cursors[connection] or "")
+        shard.save(
+            update_fields=["pending_deleted_cursor", "deleted_cursor", "updated_at"]
+        )
+        heartbeat()
+
+    if any(any_error.values()):
+        raise DsServiceException(
+            log_message="DN sync shard ended with page errors",
+            extra={"demarche_ds_number": demarche_number, "shard_id": shard.pk},
+        )
+
+
+def _finish_sharded_sync_if_complete(shard: DemarcheSyncShard) -> bool:
+    """
+    Une fois tous les lots de la synchronisation terminés ou en échec, la sync
+    incrémentale repart, sans curseur, de la date de lancement de la
+    synchronisation initiale, ou du début de fenêtre du premier lot en échec.
+    """
+    with transaction.atomic():
+        demarche = Demarche.objects.select_for_update().get(pk=shard.demarche_id)
+        shards = DemarcheSyncShard.objects.filter(
+            demarche=demarche, sync_started_at=shard.sync_started_at
+        )
+        if shards.filter(status__in=DemarcheSyncShard.ACTIVE_STATUSES).exists():
+            return False
+        failed_shards = shards.filter(status=DemarcheSyncShard.STATUS_FAILED)
+        updated_since = (
+            failed_shards.aggregate(Min("window_start"))["window_start__min"]
+            or shard.sync_started_at
+        )
+        demarche.updated_since = updated_since
+        demarche.last_synced_at = shard.sync_started_at
+        demarche.sync_cursor = ""
+        demarche.pending_deleted_cursor = ""
+        demarche.deleted_cursor = ""
+        demarche.save(
+            update_fields=[
+                "updated_since",
+                "last_synced_at",
+                "sync_cursor",
+                "pending_deleted_cursor",
+                "deleted_cursor",
+            ]
+        )
+
+    logger.info(
+        "Sharded demarche sync finished",
+        extra={
+            "demarche_ds_number": demarche.ds_number,
+            "updated_since": updated_since,
+            "failed_shards_count": failed_shards.count(),
+        },
+    )
+    return True
+
+
+def redispatch_stale_sync_shards() -> list[int]:
+    """
+    Renvoie les lots « en cours » dont le dernier battement date de plus de
+    DS_INIT_SYNC_SHARD_STALE_AFTER (worker tué en cours de lot). Leur verrou a
+    expiré entre-temps ; la nouvelle tentative reprend à leur curseur.
+    """
+    now = timezone.now()
+    stale_shards = DemarcheSyncShard.objects.filter(
+        status=DemarcheSyncShard.STATUS_RUNNING,
+        updated_at__lt=now - timedelta(seconds=settings.DS_INIT_SYNC_SHARD_STALE_AFTER),
+    )
+    shard_pks = list(stale_shards.values_list("pk", flat=True))
+    if not shard_pks:
+        return []
+    # Nouveau battement : le lot n'est pas renvoyé à chaque passage tant que
+    # la tâche attend dans la file.
+    DemarcheSyncShard.objects.filter(pk__in=shard_pks).update(updated_at=now)
+    _dispatch_shards(shard_pks)
+    logger.warning(
+        "Stale demarche sync shards re-dispatched",
+        extra={"shard_ids": shard_pks},
+    )
+    return shard_pks
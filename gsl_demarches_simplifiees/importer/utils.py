@@ -1,9 +1,11 @@
 import re
+from collections.abc import Iterable
 from logging import getLogger
 
 from django.utils import timezone
 
 from gsl_core.models import Arrondissement, Departement, Perimetre
+from gsl_demarches_simplifiees.importer.reference_cache import reference_cache
 from gsl_demarches_simplifiees.models import CategorieDetr, Demarche, Dossier, Profile
 
 logger = getLogger(__name__)
@@ -31,6 +33,38 @@ def get_or_create_profile(ds_id: str, ds_email: str) -> Profile:
     return profile
 
 
+def upsert_profiles(instructeurs_data: Iterable[dict]) -> dict[str, Profile]:
+    """
+    Variante ensembliste de ``get_or_create_profile`` pour les profils
+    ``{"id": ..., "email": ...}`` donnés, renvoyés indexés par ``ds_id`` : une
+    lecture, puis un seul upsert pour les profils absents ou dont l'e-mail a
+    changé.
+    """
+    emails_by_ds_id = {
+        instructeur["id"]: instructeur["email"] for instructeur in instructeurs_data
+    }
+    if not emails_by_ds_id:
+        return {}
+    profiles = Profile.objects.in_bulk(emails_by_ds_id, field_name="ds_id")
+    stale_ds_ids = [
+        ds_id
+        for ds_id, email in emails_by_ds_id.items()
+        if ds_id not in profiles or profiles[ds_id].ds_email != email
+    ]
+    if stale_ds_ids:
+        Profile.objects.bulk_create(
+            [
+                Profile(ds_id=ds_id, ds_email=emails_by_ds_id[ds_id])
+                for ds_id in stale_ds_ids
+            ],
+            update_conflicts=True,
+            unique_fields=["ds_id"],
+            update_fields=["ds_email", "updated_at"],
+        )
+        profiles.update(Profile.objects.in_bulk(stale_ds_ids, field_name="ds_id"))
+    return profiles
+
+
 def get_departement_from_field_label(label: str) -> Departement | None:
     """
     Extract département from a field label following the pattern:
@@ -45,7 +79,7 @@ def get_departement_from_field_label(label: str) -> Departement | None:
         return None
 
     try:
-        return Departement.objects.get(insee_code=insee_code)
+        return _get_departement(insee_code)
     except Departement.DoesNotExist:
         logger.exception(
             "Departement not found.",
@@ -74,8 +108,12 @@ def get_arrondissement_from_value(value: str) -> Arrondissement | None:
     departement_insee_code = match.group(1).strip()
     name = match.group(2).strip()
     try:
-        return Arrondissement.objects.get(
-            name=name, departement__insee_code=departement_insee_code
+        return reference_cache.get(
+            "arrondissement",
+            (name, departement_insee_code),
+            lambda: Arrondissement.objects.get(
+                name=name, departement__insee_code=departement_insee_code
+            ),
         )
     except Arrondissement.DoesNotExist:
         logger.exception(
@@ -102,7 +140,7 @@ def get_departement_from_value(value: str) -> Departement | None:
         raise ValueError(f"Departement not found in field value: {value}")
     insee_code = match.group(1).strip()
     try:
-        return Departement.objects.get(insee_code=insee_code)
+        return _get_departement(insee_code)
     except Departement.DoesNotExist:
         logger.exception(
             "Departement not found.",
@@ -114,11 +152,23 @@ def get_departement_from_value(value: str) -> Departement | None:
         raise
 
 
+def _get_departement(insee_code: str) -> Departement:
+    return reference_cache.get(
+        "departement",
+        insee_code,
+        lambda: Departement.objects.get(insee_code=insee_code),
+    )
+
+
 def get_perimetre_from_dossier(dossier: Dossier) -> Perimetre | None:
     arrondissement = dossier.porteur_de_projet_arrondissement
     if arrondissement is not None:
         try:
-            return Perimetre.objects.get(arrondissement=arrondissement)
+            return reference_cache.get(
+                "perimetre_arrondissement",
+                arrondissement.pk,
+                lambda: Perimetre.objects.get(arrondissement=arrondissement),
+            )
         except Perimetre.DoesNotExist:
             logger.exception(
                 "Perimetre not found.",
@@ -131,7 +181,13 @@ def get_perimetre_from_dossier(dossier: Dossier) -> Perimetre | None:
     departement = dossier.porteur_de_projet_departement
     if departement is not None:
         try:
-            return Perimetre.objects.get(departement=departement, arrondissement=None)
+            return reference_cache.get(
+                "perimetre_departement",
+                departement.pk,
+                lambda: Perimetre.objects.get(
+                    departement=departement, arrondissement=None
+                ),
+            )
         except Perimetre.DoesNotExist:
             logger.exception(
                 "Perimetre not found.",
@@ -156,23 +212,37 @@ def get_perimetre_from_dossier(dossier: Dossier) -> Perimetre | None:
 def get_categorie_detr_from_value(
     value: str, departement: Departement, ds_demarche_number: str
 ) -> CategorieDetr | None:
-    demarche = Demarche.objects.get(ds_number=ds_demarche_number)
-    categorie, created = CategorieDetr.objects.get_or_create(
-        demarche=demarche,
-        label=value,
-        departement=departement,
-        defaults={
-            "active": False,
-            "deactivated_at": timezone.now(),
-        },
+    demarche_id = reference_cache.get(
+        "demarche_id",
+        ds_demarche_number,
+        lambda: Demarche.objects.values_list("pk", flat=True).get(
+            ds_number=ds_demarche_number
+        ),
     )
-    if created:
-        logger.info(
-            "CategorieDetr created.",
-            extra={
-                "ds_demarche_number": ds_demarche_number,
-                "value": value,
-                "departement": departement,
+
+    def _get_or_create_categorie():
+        categorie, created = CategorieDetr.objects.get_or_create(
+            demarche_id=demarche_id,
+            label=value,
+            departement=departement,
+            defaults={
+                "active": False,
+                "deactivated_at": timezone.now(),
             },
         )
-    return categorie
+        if created:
+            logger.info(
+                "CategorieDetr created.",
+                extra={
+                    "ds_demarche_number": ds_demarche_number,
+                    "value": value,
+                    "departement": departement,
+                },
+            )
+        return categorie, created
+
+    return reference_cache.get_or_create(
+        "categorie_detr",
+        (demarche_id, value, departement.pk),
+        _get_or_create_categorie,
+    )
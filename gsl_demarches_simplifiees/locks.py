@@ -1,9 +1,13 @@
 import logging
+import time
+import uuid
 from contextlib import contextmanager
 
 import redis
 from django.conf import settings
 
+from gsl_core.locks import LeaseSemaphore
+
 logger = logging.getLogger(__name__)
 
 
@@ -39,3 +43,122 @@ def demarche_sync_lock(demarche_number, timeout):
                     "(sync longer than DS_SYNC_LOCK_TIMEOUT?)",
                     demarche_number,
                 )
+
+
+@contextmanager
+def demarche_sync_shard_lock(shard_pk, timeout):
+    """Verrou Redis non bloquant, par lot de synchronisation initiale : une
+    nouvelle tentative du lot ne tourne pas en même temps que la précédente.
+
+    Yield le verrou s'il a été acquis, None sinon. Le TTL est court : le lot
+    le prolonge (``lock.reacquire()``) après chaque page, et un worker tué
+    libère le lot au plus tard ``timeout`` secondes après sa dernière page.
+    """
+    client = redis.Redis.from_url(settings.CELERY_BROKER_URL)
+    lock = client.lock(f"ds:demarche-sync-shard:{shard_pk}", timeout=timeout)
+    acquired = lock.acquire(blocking=False)
+    try:
+        yield lock if acquired else None
+    finally:
+        if acquired:
+            try:
+                lock.release()
+            except redis.exceptions.LockError:
+                logger.warning("DS sync shard %s lock expired before release", shard_pk)
+
+
+@contextmanager
+def ds_mutations_drain_lock(timeout):
+    """Verrou Redis non bloquant garantissant qu'un seul drainage de l'outbox
+    des mutations DN tourne à la fois. Yield True si le verrou a été acquis."""
+    client = redis.Redis.from_url(settings.CELERY_BROKER_URL)
+    lock = client.lock("ds:mutations-drain", timeout=timeout)
+    acquired = lock.acquire(blocking=False)
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            try:
+                lock.release()
+            except redis.exceptions.LockError:
+                logger.warning("DN mutations drain lock expired before release")
+
+
+# Seau à jetons : KEYS[1] = hash {tokens, ts}, ARGV = débit/s, capacité, now (s)
+_TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return allowed
+"""
+
+DN_RATE_BUCKET_KEY = "ds:api-budget:tokens"
+DN_IN_FLIGHT_KEY = "ds:api-budget:in-flight"
+# Un créneau non libéré (worker tué) est récupéré après ce délai (secondes)
+_IN_FLIGHT_SLOT_TTL = 5 * 60
+_IN_FLIGHT_POLL_INTERVAL = 0.1
+
+
+class DnRequestBudgetTimeout(Exception):
+    """Le budget global de requêtes DN n'a pas été obtenu dans le délai imparti."""
+
+
+@contextmanager
+def dn_request_budget():
+    """Budget Redis partagé par toutes les syncs de démarches pour appeler DN.
+
+    Attend (bloquant) un créneau parmi DS_API_MAX_IN_FLIGHT requêtes simultanées
+    puis un jeton du seau DS_API_RATE_LIMIT_PER_SECOND, et libère le créneau en
+    sortie. Lève DnRequestBudgetTimeout au-delà de DS_API_RATE_BUDGET_MAX_WAIT.
+    Sans limite configurée, ne contacte pas Redis.
+    """
+    rate = settings.DS_API_RATE_LIMIT_PER_SECOND
+    max_in_flight = settings.DS_API_MAX_IN_FLIGHT
+    if rate <= 0 and max_in_flight <= 0:
+        yield
+        return
+
+    client = redis.Redis.from_url(settings.CELERY_BROKER_URL)
+    deadline = time.monotonic() + settings.DS_API_RATE_BUDGET_MAX_WAIT
+    slot = uuid.uuid4().hex
+
+    if max_in_flight > 0:
+        in_flight = LeaseSemaphore(client, DN_IN_FLIGHT_KEY, _IN_FLIGHT_SLOT_TTL)
+        _wait_for_budget(
+            lambda: in_flight.acquire(max_in_flight, slot),
+            deadline,
+            _IN_FLIGHT_POLL_INTERVAL,
+        )
+    try:
+        if rate > 0:
+            take_token = client.register_script(_TOKEN_BUCKET_SCRIPT)
+            _wait_for_budget(
+                lambda: take_token(
+                    keys=[DN_RATE_BUCKET_KEY],
+                    args=[rate, max(rate, 1), time.time()],
+                ),
+                deadline,
+                1 / rate,
+            )
+        yield
+    finally:
+        if max_in_flight > 0:
+            in_flight.release(slot)
+
+
+def _wait_for_budget(acquire, deadline, poll_interval):
+    while not acquire():
+        if time.monotonic() >= deadline:
+            raise DnRequestBudgetTimeout
+        time.sleep(poll_interval)
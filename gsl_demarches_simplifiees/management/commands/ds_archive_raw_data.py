@@ -0,0 +1,47 @@
+from itertools import batched
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from gsl_demarches_simplifiees.models import DossierData
+from gsl_demarches_simplifiees.raw_data_archive import (
+    compact_raw_data,
+    compress_raw_data,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Passe en stockage froid les DossierData enregistrés avant l'activation "
+        "de DS_RAW_DATA_COLD_STORAGE : payload complet archivé compressé, "
+        "raw_data réduit aux champs lus par la conversion."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size doit être positif")
+
+        pks = DossierData.objects.filter(
+            raw_data__isnull=False, raw_data_archive__isnull=True
+        ).values_list("pk", flat=True)
+        archived = 0
+        for batch_pks in batched(pks.iterator(), options["batch_size"]):
+            with transaction.atomic():
+                dossiers_data = list(
+                    DossierData.objects.filter(pk__in=batch_pks).select_for_update()
+                )
+                for dossier_data in dossiers_data:
+                    dossier_data.raw_data_archive = compress_raw_data(
+                        dossier_data.raw_data
+                    )
+                    dossier_data.raw_data = compact_raw_data(dossier_data.raw_data)
+                DossierData.objects.bulk_update(
+                    dossiers_data, ["raw_data", "raw_data_archive"]
+                )
+            archived += len(dossiers_data)
+            self.stdout.write(f"{archived} DossierData archivés")
+
+        self.stdout.write(self.style.SUCCESS(f"Terminé : {archived} archivés"))
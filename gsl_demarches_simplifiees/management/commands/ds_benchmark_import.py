@@ -0,0 +1,379 @@
+import copy
+import json
+import logging
+import resource
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+from unittest import mock
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from gsl.celery import app as celery_app
+from gsl_core.models import Arrondissement, Departement, Perimetre, Region
+from gsl_demarches_simplifiees.ds_client import DsClient
+from gsl_demarches_simplifiees.importer.demarche import save_field_mappings
+from gsl_demarches_simplifiees.importer.dossier import save_demarche_dossiers_from_ds
+from gsl_demarches_simplifiees.importer.dossier_converter import DossierConverter
+from gsl_demarches_simplifiees.importer.reference_cache import (
+    invalidate_reference_cache,
+)
+from gsl_demarches_simplifiees.models import Demarche
+
+FIXTURE_DOSSIER = (
+    Path(__file__).resolve().parents[2] / "tests" / "ds_fixtures" / "dossier_data.json"
+)
+BENCHMARK_DEMARCHE_NUMBER = 999_000_001
+BENCHMARK_GROUPE_ID = "BENCHMARK-GROUPE"
+BENCHMARK_DOSSIER_NUMBER_OFFSET = 900_000_000
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    """
+    python manage.py ds_benchmark_import --synthetic 100 1000 10000 100000
+    python manage.py ds_benchmark_import --record 12345 --pages-dir /tmp/pages
+    python manage.py ds_benchmark_import --pages-dir /tmp/pages
+    """
+
+    help = (
+        "Benchmark hors ligne de l'import des dossiers DN : rejoue des pages "
+        "getDemarcheDossiers (enregistrées ou synthétiques) via un DsClient "
+        "bouchonné, exécute save_demarche_dossiers_from_ds et les tâches de "
+        "rafraîchissement en mode eager, puis annule toutes les écritures."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--synthetic",
+            type=int,
+            nargs="+",
+            default=[],
+            help="Volumes de dossiers synthétiques à importer (un run par volume)",
+        )
+        parser.add_argument(
+            "--pages-dir",
+            type=Path,
+            help="Dossier de pages getDemarcheDossiers enregistrées (*.json)",
+        )
+        parser.add_argument(
+            "--record",
+            type=int,
+            metavar="DEMARCHE_NUMBER",
+            help="Enregistre dans --pages-dir les pages DN de cette démarche",
+        )
+        parser.add_argument("--page-size", type=int, default=100)
+
+    def handle(self, *args, **options):
+        if options["record"]:
+            if not options["pages_dir"]:
+                raise CommandError("--record nécessite --pages-dir")
+            self.record_pages(options["record"], options["pages_dir"])
+            return
+
+        if connection.vendor != "postgresql":
+            self.stderr.write(
+                self.style.WARNING(
+                    f"Base {connection.vendor} : les chiffres ne sont pas "
+                    "représentatifs de la production (PostgreSQL)."
+                )
+            )
+
+        runs = [
+            (f"synthetic-{count}", _SyntheticPages(count, options["page_size"]))
+            for count in options["synthetic"]
+        ]
+        if options["pages_dir"]:
+            runs.append(
+                (str(options["pages_dir"]), _RecordedPages(options["pages_dir"]))
+            )
+        if not runs:
+            raise CommandError("Indiquer --synthetic et/ou --pages-dir")
+
+        for name, pages in runs:
+            self.report(name, self.run(pages))
+
+    def record_pages(self, demarche_number, pages_dir: Path):
+        pages_dir.mkdir(parents=True, exist_ok=True)
+        client = DsClient()
+        cursor, page_number, has_next_page = None, 0, True
+        while has_next_page:
+            demarche_data, _ = client.fetch_demarche_page(
+                demarche_number,
+                dossiers_after=cursor,
+                include_pending_deleted=False,
+                include_deleted=False,
+            )
+            page_number += 1
+            (pages_dir / f"page-{page_number:05d}.json").write_text(
+                json.dumps(demarche_data)
+            )
+            page_info = demarche_data["dossiers"]["pageInfo"]
+            cursor, has_next_page = page_info["endCursor"], page_info["hasNextPage"]
+        self.stdout.write(
+            self.style.SUCCESS(f"{page_number} page(s) enregistrée(s) dans {pages_dir}")
+        )
+
+    def run(self, pages) -> dict:
+        metrics = Counter()
+        try:
+            with transaction.atomic(), ExitStack() as stack:
+                demarche = _prepare_benchmark_demarche(pages.template)
+                stack.enter_context(_eager_celery())
+                stack.enter_context(_count_errors(metrics))
+                stack.enter_context(connection.execute_wrapper(_count_queries(metrics)))
+                stack.enter_context(_replay_fetch(pages, metrics))
+                for method in (
+                    "__init__",
+                    "fill_unmapped_fields",
+                    "convert_all_fields",
+                    "associate_perimetre",
+                ):
+                    stack.enter_context(_timed(DossierConverter, method, metrics))
+
+                start = time.perf_counter()
+                save_demarche_dossiers_from_ds(demarche.ds_number)
+                metrics["total_seconds"] = time.perf_counter() - start
+                raise _Rollback
+        except _Rollback:
+            pass
+        finally:
+            invalidate_reference_cache()
+        metrics["peak_rss_mb"] = (
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        )
+        return metrics
+
+    def report(self, name, metrics):
+        total = metrics["total_seconds"] or 1e-9
+        dossiers = metrics["dossiers"] or 1
+        fetch = metrics["fetch_seconds"]
+        convert = metrics["convert_seconds"]
+        persist = max(total - fetch - convert, 0)
+        self.stdout.write(
+            f"{name}: {metrics['dossiers']} dossiers en {total:.1f}s "
+            f"| {metrics['dossiers'] / total:.1f} dossiers/s "
+            f"| {metrics['queries'] / dossiers:.1f} requêtes/dossier "
+            f"| fetch {fetch / total:.0%} convert {convert / total:.0%} "
+            f"persist {persist / total:.0%} "
+            f"| pic RSS {metrics['peak_rss_mb']:.0f} Mo "
+            f"| {metrics['errors']} erreur(s)"
+        )
+
+
+class _SyntheticPages:
+    """Pages générées à la volée à partir du dossier de test ``dossier_data.json``."""
+
+    def __init__(self, count, page_size):
+        self.count = count
+        self.page_size = page_size
+        self.template = add_benchmark_territory(json.loads(FIXTURE_DOSSIER.read_text()))
+
+    def __iter__(self):
+        for start in range(0, self.count, self.page_size):
+            end = min(start + self.page_size, self.count)
+            yield _page(
+                [self._dossier(i) for i in range(start, end)],
+                has_next_page=end < self.count,
+                end_cursor=str(end),
+            )
+
+    def _dossier(self, i):
+        dossier = copy.deepcopy(self.template)
+        dossier["id"] = f"BENCHMARK-DOSSIER-{i}"
+        dossier["number"] = BENCHMARK_DOSSIER_NUMBER_OFFSET + i
+        dossier["dateDerniereModification"] = timezone.now().isoformat()
+        return dossier
+
+
+class _RecordedPages:
+    def __init__(self, pages_dir: Path):
+        self.files = sorted(pages_dir.glob("*.json"))
+        if not self.files:
+            raise CommandError(f"Aucune page *.json dans {pages_dir}")
+        self.template = next(
+            (node for page in self for node in page["dossiers"]["nodes"] if node),
+            None,
+        )
+
+    def __iter__(self):
+        for file in self.files:
+            page = json.loads(file.read_text())
+            yield page.get("data", {}).get("demarche", page)
+
+
+def _page(nodes, has_next_page, end_cursor):
+    empty = {"nodes": [], "pageInfo": {"hasNextPage": False, "endCursor": None}}
+    return {
+        "dossiers": {
+            "nodes": nodes,
+            "pageInfo": {"hasNextPage": has_next_page, "endCursor": end_cursor},
+        },
+        "pendingDeletedDossiers": empty,
+        "deletedDossiers": copy.deepcopy(empty),
+    }
+
+
+def _prepare_benchmark_demarche(template) -> Demarche:
+    """Territoire, périmètres, démarche et correspondances de champs du benchmark,
+    créés dans la transaction annulée en fin de run."""
+    region, _ = Region.objects.get_or_create(
+        insee_code="44", defaults={"name": "Grand Est"}
+    )
+    departement, _ = Departement.objects.get_or_create(
+        insee_code="67", defaults={"name": "Bas-Rhin", "region": region}
+    )
+    arrondissement, _ = Arrondissement.objects.get_or_create(
+        insee_code="672",
+        defaults={"name": "Haguenau-Wissembourg", "departement": departement},
+    )
+    Perimetre.objects.get_or_create(
+        arrondissement=None, departement=departement, region=departement.region
+    )
+    Perimetre.objects.get_or_create(
+        arrondissement=arrondissement, departement=departement, region=region
+    )
+
+    demarche = Demarche.objects.create(
+        ds_id="BENCHMARK-DEMARCHE",
+        ds_number=BENCHMARK_DEMARCHE_NUMBER,
+        ds_title="Benchmark import",
+        ds_state=Demarche.STATE_PUBLIEE,
+        updated_since=timezone.now(),
+        raw_ds_data={
+            "groupeInstructeurs": [{"id": BENCHMARK_GROUPE_ID, "instructeurs": []}]
+        },
+    )
+    if template:
+        save_field_mappings(
+            {
+                "activeRevision": {
+                    "champDescriptors": [
+                        {
+                            "__typename": f"{champ['__typename']}Descriptor",
+                            "id": champ["id"],
+                            "label": champ["label"],
+                        }
+                        for champ in template["champs"] + template["annotations"]
+                    ],
+                    "annotationDescriptors": [],
+                }
+            },
+            demarche,
+        )
+    return demarche
+
+
+@contextmanager
+def _eager_celery():
+    previous = celery_app.conf.task_always_eager
+    celery_app.conf.task_always_eager = True
+    try:
+        yield
+    finally:
+        celery_app.conf.task_always_eager = previous
+
+
+class _ErrorCounter(logging.Handler):
+    def __init__(self, metrics):
+        super().__init__(level=logging.ERROR)
+        self.metrics = metrics
+
+    def emit(self, record):
+        self.metrics["errors"] += 1
+
+
+@contextmanager
+def _count_errors(metrics):
+    handler = _ErrorCounter(metrics)
+    root_logger = logging.getLogger()
+    root_logger.addHandler(handler)
+    try:
+        yield
+    finally:
+        root_logger.removeHandler(handler)
+
+
+def _count_queries(metrics):
+    def wrapper(execute, sql, params, many, context):
+        metrics["queries"] += 1
+        return execute(sql, params, many, context)
+
+    return wrapper
+
+
+@contextmanager
+def _replay_fetch(pages, metrics):
+    """Remplace l'appel réseau par les pages rejouées, dans l'ordre, en
+    rattachant chaque dossier à la démarche et au groupe du benchmark."""
+    page_iterator = iter(pages)
+
+    def fetch_demarche_page(client, demarche_number, *args, **kwargs):
+        start = time.perf_counter()
+        page = next(page_iterator, None) or _page([], False, None)
+        for node in page["dossiers"]["nodes"]:
+            if node:
+                _attach_to_benchmark(node)
+                metrics["dossiers"] += 1
+        metrics["fetch_seconds"] += time.perf_counter() - start
+        return page, False
+
+    with mock.patch.object(DsClient, "fetch_demarche_page", fetch_demarche_page):
+        yield
+
+
+def _attach_to_benchmark(dossier):
+    dossier["number"] = dossier["number"] % BENCHMARK_DOSSIER_NUMBER_OFFSET + (
+        BENCHMARK_DOSSIER_NUMBER_OFFSET
+    )
+    dossier["groupeInstructeur"] = {"id": BENCHMARK_GROUPE_ID, "instructeurs": []}
+    dossier["demarche"]["number"] = BENCHMARK_DEMARCHE_NUMBER
+
+
+def add_benchmark_territory(dossier):
+    """Rattache le dossier au Bas-Rhin / Haguenau-Wissembourg, territoire créé
+    par le benchmark, avec les libellés de champs du formulaire DETR/DSIL."""
+    dossier["champs"] = [
+        champ
+        for champ in dossier["champs"]
+        if champ["id"] not in {"BENCHMARK-DEPARTEMENT", "BENCHMARK-ARRONDISSEMENT"}
+    ] + [
+        {
+            "id": "BENCHMARK-DEPARTEMENT",
+            "__typename": "TextChamp",
+            "label": "Département ou collectivité du demandeur",
+            "stringValue": "67 - Bas-Rhin",
+        },
+        {
+            "id": "BENCHMARK-ARRONDISSEMENT",
+            "__typename": "TextChamp",
+            "label": "Arrondissement du demandeur - Bas-Rhin",
+            "stringValue": "67 - Bas-Rhin - arrondissement de Haguenau-Wissembourg",
+        },
+    ]
+    for champ in dossier["champs"]:
+        if champ["label"] == "Département du porteur de projet":
+            champ["primaryValue"] = "67 - Bas-Rhin"
+            champ["secondaryValue"] = None
+    return dossier
+
+
+@contextmanager
+def _timed(cls, method_name, metrics):
+    original = getattr(cls, method_name)
+
+    def timed(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return original(self, *args, **kwargs)
+        finally:
+            metrics["convert_seconds"] += time.perf_counter() - start
+
+    with mock.patch.object(cls, method_name, timed):
+        yield
@@ -2,7 +2,7 @@ import mimetypes
 from datetime import datetime
 from pathlib import Path
 
-from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files import File
 from django.core.management.base import BaseCommand, CommandError
 
 from gsl_demarches_simplifiees.ds_client import DsClient, DsMutator
@@ -34,15 +34,11 @@ class Command(BaseCommand):
         if content_type != "application/pdf":
             raise CommandError(f"File is not a PDF: {file_path}")
 
-        # Prepare a Django UploadedFile compatible object
+        # Django File streamed from disk, as for the documents stored on S3
         filename_date = datetime.now().strftime("%Y%m%d-%H%M%S")
-        uploaded = SimpleUploadedFile(
-            name=f"test_upload_{filename_date}.pdf",
-            content=file_path.read_bytes(),
-            content_type=content_type,
-        )
-
         mutator = DsMutator()
-        blob_id = mutator._upload_attachment(dossier_id, uploaded)
+        with file_path.open("rb") as f:
+            uploaded = File(f, name=f"test_upload_{filename_date}.pdf")
+            blob_id = mutator._upload_attachment(dossier_id, uploaded)
 
         self.stdout.write(self.style.SUCCESS(f"Uploaded. signedBlobId: {blob_id}"))
@@ -0,0 +1,19 @@
+# Generated by Django 6.0.7 on 2026-10-17 22:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("gsl_demarches_simplifiees", "0058_demarche_deleted_cursor_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="dossierdata",
+            name="raw_data_hash",
+            field=models.CharField(
+                blank=True, default="", verbose_name="Empreinte des données DS brutes"
+            ),
+        ),
+    ]
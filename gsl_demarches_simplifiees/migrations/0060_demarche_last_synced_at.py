@@ -0,0 +1,21 @@
+# Generated by Django 6.0.7 on 2026-10-17 22:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("gsl_demarches_simplifiees", "0059_dossierdata_raw_data_hash"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="demarche",
+            name="last_synced_at",
+            field=models.DateTimeField(
+                blank=True,
+                null=True,
+                verbose_name="Dernière synchronisation complète des dossiers",
+            ),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 6.0.7 on 2026-10-17 23:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("gsl_demarches_simplifiees", "0061_dsmutation"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="demarche",
+            name="descriptors_hash",
+            field=models.CharField(
+                blank=True,
+                default="",
+                verbose_name="Empreinte des descripteurs de la révision active",
+            ),
+        ),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 6.0.7 on 2026-10-17 23:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("gsl_demarches_simplifiees", "0062_demarche_descriptors_hash"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="GroupeInstructeur",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(
+                        auto_now_add=True, verbose_name="Date de création"
+                    ),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(
+                        auto_now=True, verbose_name="Date de modification"
+                    ),
+                ),
+                ("ds_id", models.CharField(verbose_name="Identifiant DS")),
+                (
+                    "ds_number",
+                    models.IntegerField(
+                        blank=True, null=True, verbose_name="Numéro DS"
+                    ),
+                ),
+                (
+                    "label",
+                    models.CharField(blank=True, default="", verbose_name="Libellé"),
+                ),
+                (
+                    "demarche",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="groupes_instructeurs",
+                        to="gsl_demarches_simplifiees.demarche",
+                        verbose_name="Démarche",
+                    ),
+                ),
+                (
+                    "instructeurs",
+                    models.ManyToManyField(
+                        blank=True,
+                        related_name="groupes_instructeurs",
+                        to="gsl_demarches_simplifiees.profile",
+                        verbose_name="Instructeurs",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Groupe instructeur",
+                "verbose_name_plural": "Groupes instructeurs",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("demarche", "ds_id"),
+                        name="unique_groupe_instructeur_ds_id_per_demarche",
+                    )
+                ],
+            },
+        ),
+    ]
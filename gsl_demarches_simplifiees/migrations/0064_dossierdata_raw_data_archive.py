@@ -0,0 +1,21 @@
+# Generated by Django 6.0.7 on 2026-10-17 23:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("gsl_demarches_simplifiees", "0063_groupeinstructeur"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="dossierdata",
+            name="raw_data_archive",
+            field=models.BinaryField(
+                blank=True,
+                null=True,
+                verbose_name="Données DS brutes complètes (compressées)",
+            ),
+        ),
+    ]
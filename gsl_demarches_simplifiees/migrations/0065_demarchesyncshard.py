@@ -0,0 +1,144 @@
+# Generated by Django 6.0.7 on 2026-10-17 23:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("gsl_demarches_simplifiees", "0064_dossierdata_raw_data_archive"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DemarcheSyncShard",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(
+                        auto_now_add=True, verbose_name="Date de création"
+                    ),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(
+                        auto_now=True, verbose_name="Date de modification"
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("dossiers", "Dossiers"),
+                            (
+                                "deletions",
+                                "Dossiers supprimés ou en attente de suppression",
+                            ),
+                        ],
+                        default="dossiers",
+                        verbose_name="Type",
+                    ),
+                ),
+                (
+                    "window_start",
+                    models.DateTimeField(verbose_name="Modifiés à partir du"),
+                ),
+                (
+                    "window_end",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="Modifiés avant le"
+                    ),
+                ),
+                (
+                    "sync_started_at",
+                    models.DateTimeField(
+                        verbose_name="Début de la synchronisation initiale"
+                    ),
+                ),
+                (
+                    "sync_cursor",
+                    models.TextField(
+                        blank=True,
+                        default="",
+                        verbose_name="Curseur de synchronisation DS",
+                    ),
+                ),
+                (
+                    "pending_deleted_cursor",
+                    models.TextField(
+                        blank=True,
+                        default="",
+                        verbose_name="Curseur de synchronisation des dossiers en attente de suppression",
+                    ),
+                ),
+                (
+                    "deleted_cursor",
+                    models.TextField(
+                        blank=True,
+                        default="",
+                        verbose_name="Curseur de synchronisation des dossiers supprimés",
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "En attente"),
+                            ("running", "En cours"),
+                            ("done", "Terminé"),
+                            ("failed", "En échec"),
+                        ],
+                        default="pending",
+                        verbose_name="Statut",
+                    ),
+                ),
+                (
+                    "attempts",
+                    models.PositiveIntegerField(default=0, verbose_name="Tentatives"),
+                ),
+                (
+                    "dossiers_count",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Dossiers traités"
+                    ),
+                ),
+                (
+                    "last_error",
+                    models.TextField(blank=True, verbose_name="Dernière erreur"),
+                ),
+                (
+                    "finished_at",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="Terminé le"
+                    ),
+                ),
+                (
+                    "demarche",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="sync_shards",
+                        to="gsl_demarches_simplifiees.demarche",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Lot de synchronisation initiale",
+                "verbose_name_plural": "Lots de synchronisation initiale",
+                "ordering": ("demarche", "kind", "window_start"),
+                "indexes": [
+                    models.Index(
+                        fields=["demarche", "status"], name="ds_sync_shard_demarche_idx"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,45 @@
+import hashlib
+import json
+
+from django.db import migrations
+
+BATCH_SIZE = 500
+
+
+def compute_raw_data_hash(raw_data) -> str:
+    """Same as DossierData.compute_raw_data_hash, frozen for this migration."""
+    canonical = json.dumps(
+        raw_data, sort_keys=True, separators=(",", ":"), ensure_ascii=False
+    )
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def backfill_raw_data_hash(apps, schema_editor):
+    """
+    Fill raw_data_hash for the rows stored before it existed, so that the
+    first sync after the deployment skips the unchanged payloads instead of
+    rewriting every DossierData.
+    """
+    DossierData = apps.get_model("gsl_demarches_simplifiees", "DossierData")
+    to_update = []
+    for dossier_data in (
+        DossierData.objects.filter(raw_data_hash="", raw_data__isnull=False)
+        .only("pk", "raw_data")
+        .iterator(chunk_size=BATCH_SIZE)
+    ):
+        dossier_data.raw_data_hash = compute_raw_data_hash(dossier_data.raw_data)
+        to_update.append(dossier_data)
+        if len(to_update) >= BATCH_SIZE:
+            DossierData.objects.bulk_update(to_update, ["raw_data_hash"])
+            to_update = []
+    DossierData.objects.bulk_update(to_update, ["raw_data_hash"])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("gsl_demarches_simplifiees", "0065_demarchesyncshard"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_raw_data_hash, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+from django.db import migrations
+
+TASK_NAME = "Envoi des mutations DN en attente"
+
+
+def schedule_ds_mutations_drain(apps, schema_editor):
+    """Drain de l'outbox chaque minute : envoie les nouvelles tentatives
+    (next_attempt_at) et ce qu'un déclenchement après commit aurait manqué."""
+    IntervalSchedule = apps.get_model("django_celery_beat", "IntervalSchedule")
+    PeriodicTask = apps.get_model("django_celery_beat", "PeriodicTask")
+    every_minute, _ = IntervalSchedule.objects.get_or_create(every=1, period="minutes")
+    PeriodicTask.objects.get_or_create(
+        name=TASK_NAME,
+        defaults={
+            "task": "gsl_demarches_simplifiees.tasks.task_drain_ds_mutations",
+            "interval": every_minute,
+        },
+    )
+
+
+def unschedule_ds_mutations_drain(apps, schema_editor):
+    PeriodicTask = apps.get_model("django_celery_beat", "PeriodicTask")
+    PeriodicTask.objects.filter(name=TASK_NAME).delete()
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("gsl_demarches_simplifiees", "0066_backfill_dossierdata_raw_data_hash"),
+        ("django_celery_beat", "0019_alter_periodictasks_options"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            schedule_ds_mutations_drain, unschedule_ds_mutations_drain
+        ),
+    ]
@@ -1,5 +1,9 @@
+import hashlib
+import json
+import uuid
 from logging import getLogger
 
+from django.conf import settings
 from django.db import models
 from django.urls import reverse
 from django.utils import timezone
@@ -13,6 +17,11 @@ from gsl_core.models import (
     Departement,
     Perimetre,
 )
+from gsl_demarches_simplifiees.raw_data_archive import (
+    compact_raw_data,
+    compress_raw_data,
+    decompress_raw_data,
+)
 from gsl_projet.constants import (
     ANNUAIRE_ENTREPRISE_URL,
     DOTATION_DETR,
@@ -65,6 +74,9 @@ class Demarche(BaseModel):
     active_revision_date = models.DateTimeField(
         "Date de publication de la révision active", blank=True, null=True
     )
+    descriptors_hash = models.CharField(
+        "Empreinte des descripteurs de la révision active", blank=True, default=""
+    )
     updated_since = models.DateTimeField(
         "Valeur pour le curseur de synchronisation DS", blank=True, null=True
     )
@@ -81,6 +93,9 @@ class Demarche(BaseModel):
         blank=True,
         default="",
     )
+    last_synced_at = models.DateTimeField(
+        "Dernière synchronisation complète des dossiers", blank=True, null=True
+    )
 
     class Meta:
         verbose_name = "Démarche"
@@ -184,6 +199,12 @@ class DossierData(BaseModel):
         verbose_name="Dossier",
     )
     raw_data = models.JSONField("Données DS brutes", null=True, blank=True)
+    raw_data_hash = models.CharField(
+        "Empreinte des données DS brutes", blank=True, default=""
+    )
+    raw_data_archive = models.BinaryField(
+        "Données DS brutes complètes (compressées)", null=True, blank=True
+    )
 
     class Meta:
         verbose_name = "Données de dossier DN"
@@ -194,6 +215,43 @@ class DossierData(BaseModel):
             return f"Données de dossier #{self.raw_data['number']}"
         return "Données de dossier (vide)"
 
+    @staticmethod
+    def compute_raw_data_hash(raw_data) -> str:
+        """
+        SHA-256 of the canonicalised payload (sorted keys, compact separators),
+        so that two payloads that only differ by key order share the same hash.
+        """
+        canonical = json.dumps(
+            raw_data, sort_keys=True, separators=(",", ":"), ensure_ascii=False
+        )
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    def set_raw_data(self, raw_data) -> bool:
+        """
+        Set raw_data and its hash. Return False (and leave the instance
+        untouched) if the payload is the same as the one already stored.
+        """
+        raw_data_hash = self.compute_raw_data_hash(raw_data)
+        if self.raw_data_hash == raw_data_hash:
+            return False
+        if settings.DS_RAW_DATA_COLD_STORAGE:
+            self.raw_data = compact_raw_data(raw_data)
+            self.raw_data_archive = compress_raw_data(raw_data)
+        else:
+            self.raw_data = raw_data
+            self.raw_data_archive = None
+        self.raw_data_hash = raw_data_hash
+        return True
+
+    def get_raw_data(self):
+        """
+        Payload DN complet, réhydraté depuis l'archive compressée s'il a été
+        enregistré en stockage froid.
+        """
+        if self.raw_data_archive:
+            return decompress_raw_data(self.raw_data_archive)
+        return self.raw_data
+
 
 class DossierQuerySet(models.QuerySet):
     def for_user(self, user: Collegue):
@@ -1016,6 +1074,42 @@ class Profile(BaseModel):
         return f"Profil {self.ds_email}"
 
 
+class GroupeInstructeur(BaseModel):
+    """
+    Groupe instructeur d'une démarche DN et ses instructeurs, tenus à jour par le
+    rafraîchissement de la démarche (cf. save_groupe_instructeurs).
+    """
+
+    demarche = models.ForeignKey(
+        Demarche,
+        on_delete=models.CASCADE,
+        related_name="groupes_instructeurs",
+        verbose_name="Démarche",
+    )
+    ds_id = models.CharField("Identifiant DS")
+    ds_number = models.IntegerField("Numéro DS", null=True, blank=True)
+    label = models.CharField("Libellé", blank=True, default="")
+    instructeurs = models.ManyToManyField(
+        Profile,
+        related_name="groupes_instructeurs",
+        verbose_name="Instructeurs",
+        blank=True,
+    )
+
+    class Meta:
+        verbose_name = "Groupe instructeur"
+        verbose_name_plural = "Groupes instructeurs"
+        constraints = (
+            models.UniqueConstraint(
+                fields=("demarche", "ds_id"),
+                name="unique_groupe_instructeur_ds_id_per_demarche",
+            ),
+        )
+
+    def __str__(self):
+        return f"Groupe instructeur {self.label} (#{self.ds_number})"
+
+
 def mapping_field_choices():
     return tuple(
         (field.name, f"{field.name} - {field.verbose_name}")
@@ -1067,3 +1161,131 @@ class FieldMapping(BaseModel):
         if self.django_field:
             return str(Dossier._meta.get_field(self.django_field).__class__)[32:-2]
         return None
+
+
+class DsMutation(BaseModel):
+    """
+    Outbox of the DN write-back mutations: a row is written in the same
+    transaction as the DotationProjet transition, then sent to DN by
+    ``task_drain_ds_mutations`` (see ``gsl_demarches_simplifiees.outbox``).
+    """
+
+    KIND_ANNOTATIONS = "annotations"
+    KIND_REPASSER_EN_INSTRUCTION = "repasser_en_instruction"
+    KIND_CHOICES = (
+        (KIND_ANNOTATIONS, "Modification des annotations"),
+        (KIND_REPASSER_EN_INSTRUCTION, "Repasser en instruction"),
+    )
+
+    STATUS_PENDING = "pending"
+    STATUS_SENT = "sent"
+    STATUS_COALESCED = "coalesced"
+    STATUS_DEAD = "dead"
+    STATUS_CHOICES = (
+        (STATUS_PENDING, "En attente"),
+        (STATUS_SENT, "Envoyée"),
+        (STATUS_COALESCED, "Remplacée par une mutation plus récente"),
+        (STATUS_DEAD, "Abandonnée"),
+    )
+
+    idempotency_key = models.UUIDField(
+        "Clé d'idempotence", default=uuid.uuid4, unique=True, editable=False
+    )
+    dossier = models.ForeignKey(
+        Dossier, on_delete=models.CASCADE, related_name="ds_mutations"
+    )
+    instructeur = models.ForeignKey(
+        Collegue, on_delete=models.PROTECT, verbose_name="Instructeur"
+    )
+    kind = models.CharField("Type", choices=KIND_CHOICES)
+    payload = models.JSONField("Paramètres", default=dict, blank=True)
+    status = models.CharField("Statut", choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField("Tentatives", default=0)
+    next_attempt_at = models.DateTimeField("Prochaine tentative", default=timezone.now)
+    last_error = models.TextField("Dernière erreur", blank=True)
+    sent_at = models.DateTimeField("Envoyée le", null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Mutation DN"
+        verbose_name_plural = "Mutations DN"
+        indexes = (
+            models.Index(
+                fields=("status", "next_attempt_at"),
+                name="ds_mutation_status_next_idx",
+            ),
+        )
+
+    def __str__(self):
+        return f"Mutation DN {self.pk}"
+
+
+class DemarcheSyncShard(BaseModel):
+    """
+    One independent part of a sharded initial sync of a démarche (see
+    ``gsl_demarches_simplifiees.importer.sharded_sync``): a window of
+    ``updatedSince`` walked by its own Celery task, with its own cursors.
+    """
+
+    KIND_DOSSIERS = "dossiers"
+    KIND_DELETIONS = "deletions"
+    KIND_CHOICES = (
+        (KIND_DOSSIERS, "Dossiers"),
+        (KIND_DELETIONS, "Dossiers supprimés ou en attente de suppression"),
+    )
+
+    STATUS_PENDING = "pending"
+    STATUS_RUNNING = "running"
+    STATUS_DONE = "done"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = (
+        (STATUS_PENDING, "En attente"),
+        (STATUS_RUNNING, "En cours"),
+        (STATUS_DONE, "Terminé"),
+        (STATUS_FAILED, "En échec"),
+    )
+    # A failed shard has used up its retries: it no longer holds back the
+    # incremental sync, which takes over from the start of its window.
+    ACTIVE_STATUSES = (STATUS_PENDING, STATUS_RUNNING)
+
+    demarche = models.ForeignKey(
+        Demarche, on_delete=models.CASCADE, related_name="sync_shards"
+    )
+    kind = models.CharField("Type", choices=KIND_CHOICES, default=KIND_DOSSIERS)
+    window_start = models.DateTimeField("Modifiés à partir du")
+    window_end = models.DateTimeField("Modifiés avant le", null=True, blank=True)
+    sync_started_at = models.DateTimeField("Début de la synchronisation initiale")
+    sync_cursor = models.TextField(
+        "Curseur de synchronisation DS", blank=True, default=""
+    )
+    pending_deleted_cursor = models.TextField(
+        "Curseur de synchronisation des dossiers en attente de suppression",
+        blank=True,
+        default="",
+    )
+    deleted_cursor = models.TextField(
+        "Curseur de synchronisation des dossiers supprimés",
+        blank=True,
+        default="",
+    )
+    status = models.CharField("Statut", choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField("Tentatives", default=0)
+    dossiers_count = models.PositiveIntegerField("Dossiers traités", default=0)
+    last_error = models.TextField("Dernière erreur", blank=True)
+    finished_at = models.DateTimeField("Terminé le", null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Lot de synchronisation initiale"
+        verbose_name_plural = "Lots de synchronisation initiale"
+        ordering = ("demarche", "kind", "window_start")
+        indexes = (
+            models.Index(
+                fields=("demarche", "status"), name="ds_sync_shard_demarche_idx"
+            ),
+        )
+
+    def __str__(self):
+        return f"Lot {self.pk} de la démarche {self.demarche_id}"
+
+    @property
+    def retries_exhausted(self) -> bool:
+        return self.attempts >= settings.DS_INIT_SYNC_SHARD_MAX_RETRIES
@@ -0,0 +1,331 @@
+"""
+Outbox des mutations DN (write-back).
+
+Les transitions de DotationProjet enregistrent la mutation DN à effectuer dans
+la table DsMutation, dans la même transaction que le changement de statut :
+l'interface répond à la vitesse de la base, et la mutation n'existe que si la
+transition est validée. ``drain_ds_mutations`` (tâche task_drain_ds_mutations)
+envoie ensuite les mutations en attente :
+
+- les changements d'état d'un dossier passent avant ses annotations ;
+- les annotations sont des valeurs absolues : seule la plus récente de chaque
+  dossier et de chaque dotation (montant, assiette, taux) est envoyée, les
+  précédentes sont marquées comme remplacées ;
+- les annotations sont envoyées par lots (mutations aliasées), sous le budget
+  global de requêtes DN ;
+- chaque mutation porte sa clé d'idempotence comme ``clientMutationId`` (une
+  par alias dans un lot) : un renvoi après une réponse perdue est identifiable
+  côté DN et dans les logs ;
+- une erreur de connexion est retentée avec un backoff exponentiel, jusqu'à
+  DS_MUTATIONS_MAX_ATTEMPTS ; une mutation refusée par DN est abandonnée
+  (statut « dead ») et loggée en erreur. Si DN refuse tout un lot d'un coup,
+  ses mutations sont d'abord renvoyées une par une.
+"""
+
+from collections import Counter, defaultdict
+from datetime import timedelta
+from itertools import batched
+from logging import getLogger
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from gsl.celery import TASK_PRIORITY_HIGH
+from gsl_core.models import Collegue
+from gsl_demarches_simplifiees.exceptions import DsConnectionError, DsServiceException
+from gsl_demarches_simplifiees.locks import DnRequestBudgetTimeout, dn_request_budget
+from gsl_demarches_simplifiees.models import Dossier, DsMutation
+from gsl_demarches_simplifiees.services import DotationAnnotationsUpdate, DsService
+
+logger = getLogger(__name__)
+
+
+def enqueue_annotations_update(
+    dossier: Dossier, user: Collegue, **annotations
+) -> DsMutation:
+    """
+    Différé de ``DsService.update_ds_annotations_for_one_dotation`` : mêmes
+    paramètres, hors ``dossier`` et ``user``.
+    """
+    return _enqueue(dossier, user, DsMutation.KIND_ANNOTATIONS, annotations)
+
+
+def enqueue_repasser_en_instruction(dossier: Dossier, user: Collegue) -> DsMutation:
+    return _enqueue(dossier, user, DsMutation.KIND_REPASSER_EN_INSTRUCTION, {})
+
+
+def _enqueue(dossier: Dossier, user: Collegue, kind: str, payload: dict):
+    mutation = DsMutation.objects.create(
+        dossier=dossier, instructeur=user, kind=kind, payload=payload
+    )
+    transaction.on_commit(_trigger_drain)
+    return mutation
+
+
+def _trigger_drain():
+    from gsl_demarches_simplifiees.tasks import task_drain_ds_mutations
+
+    task_drain_ds_mutations.apply_async(priority=TASK_PRIORITY_HIGH)
+
+
+def drain_ds_mutations() -> Counter:
+    """
+    Envoie les mutations en attente arrivées à échéance, dans la limite de
+    DS_MUTATIONS_DRAIN_LIMIT. ``stats["limit_reached"]`` indique qu'il en
+    reste probablement d'autres à envoyer.
+    """
+    now = timezone.now()
+    due = list(
+        DsMutation.objects.filter(
+            status=DsMutation.STATUS_PENDING, next_attempt_at__lte=now
+        )
+        .select_related("dossier", "instructeur")
+        .order_by("pk")[: settings.DS_MUTATIONS_DRAIN_LIMIT]
+    )
+    stats = Counter(
+        due=len(due), limit_reached=int(len(due) == settings.DS_MUTATIONS_DRAIN_LIMIT)
+    )
+
+    blocked_dossier_ids = _blocked_dossier_ids(now)
+
+    try:
+        for mutation in due:
+            if (
+                mutation.kind == DsMutation.KIND_REPASSER_EN_INSTRUCTION
+                and mutation.dossier_id not in blocked_dossier_ids
+                and not _send_repasser_en_instruction(mutation, stats)
+            ):
+                blocked_dossier_ids.add(mutation.dossier_id)
+
+        _send_annotations(
+            _coalesce_annotations(
+                [
+                    mutation
+                    for mutation in due
+                    if mutation.kind == DsMutation.KIND_ANNOTATIONS
+                    and mutation.dossier_id not in blocked_dossier_ids
+                ],
+                stats,
+            ),
+            stats,
+        )
+    except DnRequestBudgetTimeout:
+        # Les mutations non envoyées restent en attente, sans tentative décomptée
+        logger.warning("DN request budget exhausted, outbox drain interrupted")
+        stats["budget_exhausted"] = 1
+        stats["limit_reached"] = 0
+
+    logger.info("DN mutations outbox drained", extra=dict(stats))
+    return stats
+
+
+def has_due_ds_mutations() -> bool:
+    """
+    Indique s'il reste des mutations en attente qu'un drain enverrait
+    maintenant : échues, et dont le dossier n'attend pas la nouvelle tentative
+    d'un changement d'état.
+    """
+    now = timezone.now()
+    return (
+        DsMutation.objects.filter(
+            status=DsMutation.STATUS_PENDING, next_attempt_at__lte=now
+        )
+        .exclude(dossier_id__in=_blocked_dossier_ids(now))
+        .exists()
+    )
+
+
+def _blocked_dossier_ids(now) -> set[int]:
+    """
+    Dossiers dont un changement d'état attend une nouvelle tentative : leurs
+    autres mutations attendent aussi, pour que DN les reçoive dans l'ordre.
+    """
+    return set(
+        DsMutation.objects.filter(
+            status=DsMutation.STATUS_PENDING,
+            kind=DsMutation.KIND_REPASSER_EN_INSTRUCTION,
+            next_attempt_at__gt=now,
+        ).values_list("dossier_id", flat=True)
+    )
+
+
+def _send_repasser_en_instruction(mutation: DsMutation, stats: Counter) -> bool:
+    try:
+        with dn_request_budget():
+            DsService().repasser_en_instruction(
+                mutation.dossier,
+                mutation.instructeur,
+                client_mutation_id=str(mutation.idempotency_key),
+            )
+    except DsServiceException as e:
+        _record_failure(mutation, e, stats)
+        return False
+    _mark_sent(mutation, stats)
+    return True
+
+
+def _coalesce_annotations(mutations: list[DsMutation], stats: Counter):
+    """
+    Garde, pour chaque dossier, la mutation la plus récente de chaque dotation
+    mise à jour (montant, assiette, taux). Une mutation sans dotation à mettre
+    à jour ne porte que les dotations cochées : toute mutation plus récente du
+    dossier la remplace. Les dotations cochées sont une valeur du dossier : les
+    mutations gardées reçoivent toutes la plus récente.
+    """
+    latest_by_key = {}
+    latest_by_dossier = {}
+    for mutation in mutations:
+        latest_by_key[_coalescing_key(mutation)] = mutation
+        latest_by_dossier[mutation.dossier_id] = mutation
+
+    kept = [
+        mutation
+        for mutation in mutations
+        if latest_by_key[_coalescing_key(mutation)] is mutation
+        and not _is_superseded(mutation, latest_by_dossier)
+    ]
+
+    superseded_pks = [
+        pending.pk
+        for pending in DsMutation.objects.filter(
+            dossier_id__in=latest_by_dossier,
+            kind=DsMutation.KIND_ANNOTATIONS,
+            status=DsMutation.STATUS_PENDING,
+        ).only("pk", "dossier_id", "payload")
+        if _is_superseded(pending, latest_by_dossier)
+        or (
+            _coalescing_key(pending) in latest_by_key
+            and pending.pk < latest_by_key[_coalescing_key(pending)].pk
+        )
+    ]
+    stats["coalesced"] += DsMutation.objects.filter(pk__in=superseded_pks).update(
+        status=DsMutation.STATUS_COALESCED, updated_at=timezone.now()
+    )
+
+    for mutation in kept:
+        checked = latest_by_dossier[mutation.dossier_id].payload.get(
+            "dotations_to_be_checked"
+        )
+        if mutation.payload.get("dotations_to_be_checked") != checked:
+            # Enregistré : un renvoi ultérieur ne repasse pas une valeur périmée
+            mutation.payload = {**mutation.payload, "dotations_to_be_checked": checked}
+            DsMutation.objects.filter(pk=mutation.pk).update(payload=mutation.payload)
+    return kept
+
+
+def _coalescing_key(mutation: DsMutation) -> tuple:
+    return (mutation.dossier_id, mutation.payload.get("annotations_dotation_to_update"))
+
+
+def _is_superseded(mutation: DsMutation, latest_by_dossier: dict) -> bool:
+    return (
+        mutation.payload.get("annotations_dotation_to_update") is None
+        and mutation.pk < latest_by_dossier[mutation.dossier_id].pk
+    )
+
+
+def _send_annotations(mutations: list[DsMutation], stats: Counter):
+    by_instructeur = defaultdict(list)
+    for mutation in mutations:
+        by_instructeur[mutation.instructeur].append(mutation)
+
+    ds_service = DsService()
+    for instructeur, instructeur_mutations in by_instructeur.items():
+        for chunk in batched(instructeur_mutations, settings.DS_ANNOTATIONS_BATCH_SIZE):
+            errors = _send_annotations_chunk(ds_service, instructeur, chunk)
+            if len(chunk) > 1 and _chunk_rejected_as_a_whole(chunk, errors):
+                # Document refusé en entier (ex. variable invalide pour un seul
+                # dossier) : chaque mutation est renvoyée seule, pour que seule
+                # la fautive soit abandonnée.
+                stats["chunks_split"] += 1
+                errors = {}
+                for mutation in chunk:
+                    errors.update(
+                        _send_annotations_chunk(ds_service, instructeur, (mutation,))
+                    )
+            for mutation in chunk:
+                if mutation.dossier_id in errors:
+                    _record_failure(mutation, errors[mutation.dossier_id], stats)
+                else:
+                    _mark_sent(mutation, stats)
+
+
+def _send_annotations_chunk(
+    ds_service: DsService, instructeur: Collegue, chunk: tuple[DsMutation, ...]
+) -> dict:
+    with dn_request_budget():
+        return ds_service.update_ds_annotations_for_many_dossiers(
+            instructeur,
+            [
+                DotationAnnotationsUpdate(
+                    mutation.dossier,
+                    **mutation.payload,
+                    client_mutation_id=str(mutation.idempotency_key),
+                )
+                for mutation in chunk
+            ],
+        )
+
+
+def _chunk_rejected_as_a_whole(chunk: tuple[DsMutation, ...], errors: dict) -> bool:
+    """
+    Un échec au niveau du document est rapporté par le service avec la même
+    exception pour tous les dossiers du lot. Une erreur de connexion n'est pas
+    concernée : tout le lot est retenté plus tard.
+    """
+    chunk_errors = {id(errors.get(mutation.dossier_id)) for mutation in chunk}
+    error = errors.get(chunk[0].dossier_id)
+    return (
+        error is not None
+        and len(chunk_errors) == 1
+        and not isinstance(error, DsConnectionError)
+    )
+
+
+def _mark_sent(mutation: DsMutation, stats: Counter):
+    now = timezone.now()
+    DsMutation.objects.filter(pk=mutation.pk, status=DsMutation.STATUS_PENDING).update(
+        status=DsMutation.STATUS_SENT,
+        attempts=F("attempts") + 1,
+        sent_at=now,
+        last_error="",
+        updated_at=now,
+    )
+    stats["sent"] += 1
+
+
+def _record_failure(mutation: DsMutation, error: Exception, stats: Counter):
+    now = timezone.now()
+    attempts = mutation.attempts + 1
+    update = {"attempts": attempts, "last_error": str(error), "updated_at": now}
+
+    if (
+        isinstance(error, DsConnectionError)
+        and attempts < settings.DS_MUTATIONS_MAX_ATTEMPTS
+    ):
+        delay = min(
+            settings.DS_MUTATIONS_RETRY_BACKOFF * 2 ** (attempts - 1),
+            settings.DS_MUTATIONS_RETRY_MAX_DELAY,
+        )
+        update["next_attempt_at"] = now + timedelta(seconds=delay)
+        stats["retried"] += 1
+    else:
+        update["status"] = DsMutation.STATUS_DEAD
+        stats["dead"] += 1
+        logger.error(
+            "DN mutation dead-lettered",
+            extra={
+                "ds_mutation_id": mutation.pk,
+                "idempotency_key": str(mutation.idempotency_key),
+                "dossier_ds_number": mutation.dossier.ds_number,
+                "kind": mutation.kind,
+                "attempts": attempts,
+                "error": str(error),
+            },
+        )
+
+    DsMutation.objects.filter(pk=mutation.pk, status=DsMutation.STATUS_PENDING).update(
+        **update
+    )
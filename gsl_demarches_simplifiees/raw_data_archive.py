@@ -0,0 +1,56 @@
+"""
+Stockage froid des payloads DN de DossierData (cf. DS_RAW_DATA_COLD_STORAGE).
+
+Le JSONB ``raw_data`` ne garde que ce que DossierConverter peut lire : les
+champs de premier niveau du dossier et les champs / annotations des types
+importés (IMPORTED_DS_FIELDS). Le payload complet (pièces jointes, répétitions,
+cartes…) est archivé compressé dans ``raw_data_archive`` et réhydraté par
+``DossierData.get_raw_data``.
+
+Compression zstd. Les archives zlib écrites auparavant restent lisibles : le
+codec est reconnu à la lecture (numéro magique des trames zstd), sans
+réécriture des archives existantes.
+"""
+
+import json
+import zlib
+
+import zstandard
+from django.conf import settings
+
+ZSTD_FRAME_MAGIC = b"\x28\xb5\x2f\xfd"
+
+
+def compress_raw_data(raw_data) -> bytes:
+    payload = json.dumps(raw_data, separators=(",", ":"), ensure_ascii=False).encode()
+    return zstandard.ZstdCompressor(level=settings.DS_RAW_DATA_ARCHIVE_LEVEL).compress(
+        payload
+    )
+
+
+def decompress_raw_data(archive) -> dict:
+    archive = bytes(archive)
+    if archive.startswith(ZSTD_FRAME_MAGIC):
+        payload = zstandard.ZstdDecompressor().decompress(archive)
+    else:
+        # Archive antérieure au passage à zstd
+        payload = zlib.decompress(archive)
+    return json.loads(payload)
+
+
+def compact_raw_data(raw_data: dict) -> dict:
+    from gsl_demarches_simplifiees.importer.demarche import IMPORTED_DS_FIELDS
+
+    imported_champ_types = {
+        descriptor_type.removesuffix("Descriptor")
+        for descriptor_type in IMPORTED_DS_FIELDS
+    }
+    compact = dict(raw_data)
+    for key in ("champs", "annotations"):
+        if key in raw_data:
+            compact[key] = [
+                champ
+                for champ in raw_data[key] or []
+                if champ.get("__typename") in imported_champ_types
+            ]
+    return compact
@@ -1,9 +1,12 @@
 from datetime import datetime
+from itertools import batched
 from logging import getLogger
-from typing import List, Literal
+from typing import List, Literal, NamedTuple
 
+from django.conf import settings
 from django.core.exceptions import FieldDoesNotExist
 from django.core.files.uploadedfile import UploadedFile
+from django.utils import timezone
 
 from gsl_core.models import Collegue
 from gsl_demarches_simplifiees.ds_client import DsMutator
@@ -19,6 +22,29 @@ from gsl_projet.constants import DOTATION_DSIL, POSSIBLE_DOTATIONS
 logger = getLogger(__name__)
 
 
+class DotationAnnotationsUpdate(NamedTuple):
+    """Arguments of ``update_ds_annotations_for_one_dotation`` for one dossier."""
+
+    dossier: Dossier
+    dotations_to_be_checked: list[POSSIBLE_DOTATIONS]
+    annotations_dotation_to_update: POSSIBLE_DOTATIONS | None = None
+    assiette: float | None = None
+    montant: float | None = None
+    taux: float | None = None
+    # clientMutationId of the DN mutation (DS_CLIENT_ID if None)
+    client_mutation_id: str | None = None
+
+
+class CheckboxAnnotationsUpdate(NamedTuple):
+    """Arguments of ``update_checkboxes_annotations`` for one dossier."""
+
+    dossier: Dossier
+    annotations_to_update: dict[str, bool]
+    text_annotations_to_update: dict[str, str] | None = None
+    # clientMutationId of the DN mutation (DS_CLIENT_ID if None)
+    client_mutation_id: str | None = None
+
+
 class DsService:
     MUTATION_KEYS = {
         "dismiss": "dossierClasserSansSuite",
@@ -59,9 +85,11 @@ class DsService:
         dossier.save()
         return results
 
-    def repasser_en_instruction(self, dossier: Dossier, user: Collegue):
+    def repasser_en_instruction(
+        self, dossier: Dossier, user: Collegue, client_mutation_id: str | None = None
+    ):
         results = self.mutator.dossier_repasser_en_instruction(
-            dossier.ds_id, user.ds_id
+            dossier.ds_id, user.ds_id, client_mutation_id=client_mutation_id
         )
         self._check_results(results, dossier, user, "repasser_en_instruction")
         dossier.ds_state = Dossier.STATE_EN_INSTRUCTION
@@ -119,89 +147,230 @@ class DsService:
         montant: float | None = None,
         taux: float | None = None,
     ):
-        if annotations_dotation_to_update is None:
-            if assiette is not None or montant is not None or taux is not None:
+        annotations = self._build_dotation_annotations(
+            lambda field: self._get_ds_field_id(dossier, field),
+            DotationAnnotationsUpdate(
+                dossier,
+                dotations_to_be_checked,
+                annotations_dotation_to_update,
+                assiette,
+                montant,
+                taux,
+            ),
+        )
+
+        results = self.mutator.dossier_modifier_annotations(
+            dossier.ds_id, user.ds_id, annotations
+        )
+        self._check_results(results, dossier, user, "annotations", value=annotations)
+        self._update_updated_at_from_multiple_annotations(dossier, results)
+        return results
+
+    def update_ds_annotations_for_many_dossiers(
+        self, user: Collegue, updates: list["DotationAnnotationsUpdate"]
+    ) -> dict[int, DsServiceException | ValueError]:
+        """
+        Multi-dossier mode of ``update_ds_annotations_for_one_dotation``.
+
+        Used by the DN outbox drain (``outbox.drain_ds_mutations``), which sends the
+        pending dotation annotations of an instructeur together.
+
+        Field ids are resolved once per démarche, mutations are sent by chunks
+        of ``DS_ANNOTATIONS_BATCH_SIZE`` aliased mutations per DN request, and
+        ``ds_date_derniere_modification`` is written with a single bulk update.
+        A failing dossier does not stop the others.
+
+        :return: errors by dossier pk, for the dossiers that were not updated.
+        """
+        return self._update_annotations_for_many_dossiers(
+            user, updates, self._build_dotation_annotations
+        )
+
+    def update_checkboxes_annotations(
+        self,
+        dossier: Dossier,
+        user: Collegue,
+        annotations_to_update: dict[str, bool],
+        text_annotations_to_update: dict[str, str] = None,
+    ):
+        """
+        Used by ``ProjetForm.save`` (one projet at a time). To update many
+        dossiers, use ``update_checkboxes_annotations_for_many_dossiers``.
+        """
+        annotations = self._build_checkbox_annotations(
+            lambda field: self._get_ds_field_id(dossier, field),
+            CheckboxAnnotationsUpdate(
+                dossier, annotations_to_update, text_annotations_to_update
+            ),
+        )
+        results = self.mutator.dossier_modifier_annotations(
+            dossier.ds_id, user.ds_id, annotations
+        )
+        self._check_results(results, dossier, user, "annotations", value=annotations)
+        self._update_updated_at_from_multiple_annotations(dossier, results)
+        return results
+
+    def update_checkboxes_annotations_for_many_dossiers(
+        self, user: Collegue, updates: list["CheckboxAnnotationsUpdate"]
+    ) -> dict[int, DsServiceException]:
+        """
+        Multi-dossier mode of ``update_checkboxes_annotations``, for bulk edits
+        of the projets' zonages (QPV, CRTE, budget vert...): same batching and
+        error handling as ``update_ds_annotations_for_many_dossiers``. No view
+        uses it yet: ``ProjetForm.save`` edits one projet and keeps the
+        single-dossier mode.
+
+        :return: errors by dossier pk, for the dossiers that were not updated.
+        """
+        return self._update_annotations_for_many_dossiers(
+            user, updates, self._build_checkbox_annotations
+        )
+
+    # Private
+
+    def _update_annotations_for_many_dossiers(
+        self, user: Collegue, updates: list, build_annotations
+    ) -> dict[int, DsServiceException | ValueError]:
+        field_ids = self._get_ds_field_ids_by_demarche(
+            {update.dossier.ds_demarche_id for update in updates}
+        )
+        errors = {}
+        to_send = []
+        for update in updates:
+            dossier = update.dossier
+            try:
+                annotations = build_annotations(
+                    lambda field: self._get_ds_field_id_from(field_ids, dossier, field),
+                    update,
+                )
+            except (FieldError, ValueError) as e:
+                errors[dossier.pk] = e
+                continue
+            to_send.append((dossier, annotations, update.client_mutation_id))
+
+        updated_dossiers = []
+        for chunk in batched(to_send, settings.DS_ANNOTATIONS_BATCH_SIZE):
+            updated_dossiers += self._send_annotations_chunk(user, chunk, errors)
+
+        Dossier.objects.bulk_update(
+            updated_dossiers, ["ds_date_derniere_modification", "updated_at"]
+        )
+        logger.info(
+            "DN annotations updated in batch",
+            extra={
+                "user_id": user.id,
+                "dossier_count": len(updates),
+                "error_count": len(errors),
+            },
+        )
+        return errors
+
+    def _build_checkbox_annotations(
+        self, get_field_id, update: "CheckboxAnnotationsUpdate"
+    ) -> list[dict]:
+        annotations = [
+            {
+                "id": get_field_id(annotation_key),
+                "value": {"checkbox": bool(annotation_value)},
+            }
+            for annotation_key, annotation_value in update.annotations_to_update.items()
+        ]
+        if update.text_annotations_to_update:
+            for (
+                annotation_key,
+                annotation_value,
+            ) in update.text_annotations_to_update.items():
+                annotations.append(
+                    {
+                        "id": get_field_id(annotation_key),
+                        "value": {"text": annotation_value},
+                    }
+                )
+        return annotations
+
+    def _build_dotation_annotations(
+        self, get_field_id, update: "DotationAnnotationsUpdate"
+    ) -> list[dict]:
+        if update.annotations_dotation_to_update is None:
+            if (
+                update.assiette is not None
+                or update.montant is not None
+                or update.taux is not None
+            ):
                 raise ValueError(
                     "annotations_dotation_to_update must be provided if assiette, montant or taux are provided"
                 )
 
         annotations = [
             {
-                "id": self._get_ds_field_id(dossier, "annotations_dotation"),
-                "value": {"multipleDropDownList": dotations_to_be_checked},
+                "id": get_field_id("annotations_dotation"),
+                "value": {"multipleDropDownList": update.dotations_to_be_checked},
             }
         ]
 
-        if annotations_dotation_to_update:
+        if update.annotations_dotation_to_update:
             suffix = (
-                "dsil" if annotations_dotation_to_update == DOTATION_DSIL else "detr"
+                "dsil"
+                if update.annotations_dotation_to_update == DOTATION_DSIL
+                else "detr"
             )
 
-            if assiette is not None:
+            if update.assiette is not None:
                 annotations.append(
                     {
-                        "id": self._get_ds_field_id(
-                            dossier, f"annotations_assiette_{suffix}"
-                        ),
-                        "value": {"decimalNumber": assiette},
+                        "id": get_field_id(f"annotations_assiette_{suffix}"),
+                        "value": {"decimalNumber": update.assiette},
                     }
                 )
-            if montant is not None:
+            if update.montant is not None:
                 annotations.append(
                     {
-                        "id": self._get_ds_field_id(
-                            dossier, f"annotations_montant_accorde_{suffix}"
-                        ),
-                        "value": {"decimalNumber": montant},
+                        "id": get_field_id(f"annotations_montant_accorde_{suffix}"),
+                        "value": {"decimalNumber": update.montant},
                     }
                 )
-            if taux is not None:
+            if update.taux is not None:
                 annotations.append(
                     {
-                        "id": self._get_ds_field_id(
-                            dossier, f"annotations_taux_{suffix}"
-                        ),
-                        "value": {"decimalNumber": round(taux, 3)},
+                        "id": get_field_id(f"annotations_taux_{suffix}"),
+                        "value": {"decimalNumber": round(update.taux, 3)},
                     }
                 )
+        return annotations
 
-        results = self.mutator.dossier_modifier_annotations(
-            dossier.ds_id, user.ds_id, annotations
-        )
-        self._check_results(results, dossier, user, "annotations", value=annotations)
-        self._update_updated_at_from_multiple_annotations(dossier, results)
-        return results
-
-    def update_checkboxes_annotations(
+    def _send_annotations_chunk(
         self,
-        dossier: Dossier,
         user: Collegue,
-        annotations_to_update: dict[str, bool],
-        text_annotations_to_update: dict[str, str] = None,
-    ):
-        annotations = [
-            {
-                "id": self._get_ds_field_id(dossier, annotation_key),
-                "value": {"checkbox": bool(annotation_value)},
-            }
-            for annotation_key, annotation_value in annotations_to_update.items()
-        ]
-        if text_annotations_to_update:
-            for annotation_key, annotation_value in text_annotations_to_update.items():
-                annotations.append(
-                    {
-                        "id": self._get_ds_field_id(dossier, annotation_key),
-                        "value": {"text": annotation_value},
-                    }
-                )
-        results = self.mutator.dossier_modifier_annotations(
-            dossier.ds_id, user.ds_id, annotations
-        )
-        self._check_results(results, dossier, user, "annotations", value=annotations)
-        self._update_updated_at_from_multiple_annotations(dossier, results)
-        return results
+        chunk: tuple[tuple[Dossier, list[dict], str | None], ...],
+        errors: dict,
+    ) -> list[Dossier]:
+        try:
+            results_by_dossier = self.mutator.dossiers_modifier_annotations(
+                self._get_instructeur_id(user),
+                [(dossier.ds_id, annotations) for dossier, annotations, _ in chunk],
+                client_mutation_ids=[
+                    client_mutation_id for _, _, client_mutation_id in chunk
+                ],
+            )
+        except DsServiceException as e:
+            errors.update({dossier.pk: e for dossier, _, _ in chunk})
+            return []
 
-    # Private
+        updated_dossiers = []
+        for (dossier, annotations, _), results in zip(chunk, results_by_dossier):
+            try:
+                self._check_results(
+                    results, dossier, user, "annotations", value=annotations
+                )
+            except DsServiceException as e:
+                errors[dossier.pk] = e
+                continue
+            updated_at = self._get_most_recent_updated_at(results)
+            if updated_at:
+                dossier.ds_date_derniere_modification = updated_at
+                dossier.updated_at = timezone.now()
+                updated_dossiers.append(dossier)
+        return updated_dossiers
 
     def _update_updated_at(self, dossier: Dossier, results: dict):
         updated_at = results.get("data", {}).get("updatedAt")
@@ -212,6 +381,12 @@ class DsService:
     def _update_updated_at_from_multiple_annotations(
         self, dossier: Dossier, results: dict
     ):
+        most_recent_updated_at = self._get_most_recent_updated_at(results)
+        if most_recent_updated_at:
+            dossier.ds_date_derniere_modification = most_recent_updated_at
+            dossier.save()
+
+    def _get_most_recent_updated_at(self, results: dict) -> datetime | None:
         most_recent_updated_at = None
         annotations = (
             results.get("data", {})
@@ -224,10 +399,7 @@ class DsService:
                 most_recent_updated_at is None or updated_at > most_recent_updated_at
             ):
                 most_recent_updated_at = updated_at
-
-        if most_recent_updated_at:
-            dossier.ds_date_derniere_modification = most_recent_updated_at
-            dossier.save()
+        return most_recent_updated_at
 
     def _get_instructeur_id(self, user: Collegue) -> str:
         instructeur_id = user.ds_id
@@ -244,20 +416,41 @@ class DsService:
             return ds_field.ds_field_id
 
         except FieldMapping.DoesNotExist:
-            field_name = field
-            try:
-                field_name = Dossier._meta.get_field(field).verbose_name
-            except FieldDoesNotExist:
-                pass
+            raise self._field_error(dossier, field)
+
+    def _get_ds_field_ids_by_demarche(
+        self, demarche_ids: set[int]
+    ) -> dict[int, dict[str, str]]:
+        field_ids = {demarche_id: {} for demarche_id in demarche_ids}
+        for demarche_id, django_field, ds_field_id in FieldMapping.actives.filter(
+            demarche__in=demarche_ids, django_field__startswith="annotations_"
+        ).values_list("demarche_id", "django_field", "ds_field_id"):
+            field_ids[demarche_id][django_field] = ds_field_id
+        return field_ids
+
+    def _get_ds_field_id_from(
+        self, field_ids: dict[int, dict[str, str]], dossier: Dossier, field: str
+    ) -> str:
+        try:
+            return field_ids[dossier.ds_demarche_id][field]
+        except KeyError:
+            raise self._field_error(dossier, field)
 
-            raise FieldError(
-                f'Le champ "{field_name}" n\'existe pas dans la démarche {dossier.ds_demarche_number}.',
-                extra={
-                    "field_name": field_name,
-                    "demarche_ds_number": dossier.ds_demarche_number,
-                    "dossier_ds_number": dossier.ds_number,
-                },
-            )
+    def _field_error(self, dossier: Dossier, field: str) -> FieldError:
+        field_name = field
+        try:
+            field_name = Dossier._meta.get_field(field).verbose_name
+        except FieldDoesNotExist:
+            pass
+
+        return FieldError(
+            f'Le champ "{field_name}" n\'existe pas dans la démarche {dossier.ds_demarche_number}.',
+            extra={
+                "field_name": field_name,
+                "demarche_ds_number": dossier.ds_demarche_number,
+                "dossier_ds_number": dossier.ds_number,
+            },
+        )
 
     def _check_results(
         self,
@@ -0,0 +1,13 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from gsl_demarches_simplifiees.importer.dossier_converter import (
+    invalidate_conversion_plan,
+)
+from gsl_demarches_simplifiees.models import FieldMapping
+
+
+@receiver(post_save, sender=FieldMapping)
+@receiver(post_delete, sender=FieldMapping)
+def invalidate_conversion_plan_on_field_mapping_change(sender, instance, **kwargs):
+    invalidate_conversion_plan(instance.demarche_id)
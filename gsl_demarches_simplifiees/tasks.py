@@ -3,20 +3,33 @@ from datetime import datetime
 
 from celery import shared_task
 from django.conf import settings
+from django.db.models import F
 from django.utils import timezone
 
-from gsl.celery import priority_for_dispatch_count
+from gsl.celery import TASK_PRIORITY_HIGH, priority_for_dispatch_count
 from gsl_demarches_simplifiees.importer.demarche import (
     refresh_field_mappings_on_demarche,
     save_demarche_from_ds,
 )
 from gsl_demarches_simplifiees.importer.dossier import (
     refresh_dossier_from_saved_data,
+    refresh_dossiers_from_saved_data,
     save_demarche_dossiers_from_ds,
     save_one_dossier_from_ds,
 )
-from gsl_demarches_simplifiees.locks import demarche_sync_lock
-from gsl_demarches_simplifiees.models import Demarche, Dossier
+from gsl_demarches_simplifiees.importer.sharded_sync import (
+    has_active_sync_shards,
+    redispatch_stale_sync_shards,
+    start_sharded_demarche_sync,
+    sync_demarche_shard,
+)
+from gsl_demarches_simplifiees.locks import (
+    demarche_sync_lock,
+    demarche_sync_shard_lock,
+    ds_mutations_drain_lock,
+)
+from gsl_demarches_simplifiees.models import Demarche, DemarcheSyncShard, Dossier
+from gsl_demarches_simplifiees.outbox import drain_ds_mutations, has_due_ds_mutations
 
 logger = logging.getLogger(__name__)
 
@@ -47,9 +60,30 @@ def task_save_demarche_from_ds(
 ## Refresh dossiers
 ### from DN
 #### of every published demarches — incremental sync using stored updated_since + cursor
+#### Les syncs tournent en parallèle sur les workers ; leurs appels DN partagent
+#### le budget Redis global (cf. dn_request_budget). Les démarches les plus en
+#### retard sont envoyées en premier.
 @shared_task
 def task_fetch_new_or_modified_ds_dossiers_for_every_published_demarche():
-    for d in Demarche.objects.filter(ds_state=Demarche.STATE_PUBLIEE):
+    now = timezone.now()
+    demarches = Demarche.objects.filter(ds_state=Demarche.STATE_PUBLIEE).order_by(
+        F("updated_since").asc(nulls_first=True),
+        F("last_synced_at").asc(nulls_first=True),
+    )
+    for d in demarches:
+        logger.info(
+            "DN dossiers sync lag",
+            extra={
+                "demarche_ds_number": d.ds_number,
+                "updated_since": d.updated_since,
+                "last_synced_at": d.last_synced_at,
+                "sync_lag_seconds": (
+                    round((now - d.last_synced_at).total_seconds())
+                    if d.last_synced_at
+                    else None
+                ),
+            },
+        )
         task_save_demarche_dossiers_from_ds.delay(d.ds_number)
 
 
@@ -65,20 +99,32 @@ def task_save_demarche_dossiers_from_ds(demarche_number):
                 demarche_number,
             )
             return
+        if has_active_sync_shards(demarche_number):
+            logger.info(
+                "A sharded DS init sync is running for demarche %s, skipping.",
+                demarche_number,
+            )
+            return
         return save_demarche_dossiers_from_ds(demarche_number)
 
 
 #### init sync for one demarche from a given date
 @shared_task
-def task_init_demarche_sync(demarche_number, updated_since_iso: str):
+def task_init_demarche_sync(
+    demarche_number, updated_since_iso: str, shards_count: int | None = None
+):
     """
     Initialise (ou réinitialise) la synchronisation d'une démarche à partir d'une date donnée.
 
     Met à jour demarche.updated_since avec la date fournie, réinitialise demarche.sync_cursor,
     puis lance un premier appel sans curseur pour commencer la synchronisation.
 
+    Avec plus d'un lot, la synchronisation est découpée en lots indépendants
+    (cf. ``importer.sharded_sync``) au lieu d'un parcours unique.
+
     :param demarche_number: numéro de la démarche
     :param updated_since_iso: date/heure en ISO à partir de laquelle récupérer les dossiers
+    :param shards_count: nombre de lots, DS_INIT_SYNC_SHARDS par défaut
     """
     updated_since = datetime.fromisoformat(updated_since_iso.replace("Z", "+00:00"))
     if timezone.is_naive(updated_since):
@@ -93,7 +139,17 @@ def task_init_demarche_sync(demarche_number, updated_since_iso: str):
                 demarche_number,
             )
             return
+        if has_active_sync_shards(demarche_number):
+            logger.info(
+                "A sharded DS init sync is running for demarche %s, skipping init.",
+                demarche_number,
+            )
+            return
         demarche = Demarche.objects.get(ds_number=demarche_number)
+        shards_count = shards_count or settings.DS_INIT_SYNC_SHARDS
+        if shards_count > 1:
+            start_sharded_demarche_sync(demarche, updated_since, shards_count)
+            return
         demarche.updated_since = updated_since
         demarche.sync_cursor = ""
         demarche.pending_deleted_cursor = ""
@@ -110,6 +166,33 @@ def task_init_demarche_sync(demarche_number, updated_since_iso: str):
         return save_demarche_dossiers_from_ds(demarche_number)
 
 
+#### one shard of a sharded init sync — retried alone, from its own cursors
+@shared_task(bind=True, max_retries=None)
+def task_sync_demarche_shard(self, shard_pk):
+    with demarche_sync_shard_lock(
+        shard_pk, timeout=settings.DS_INIT_SYNC_SHARD_STALE_AFTER
+    ) as lock:
+        if lock is None:
+            logger.info("DS sync shard %s is already running, skipping.", shard_pk)
+            return
+        shard = DemarcheSyncShard.objects.select_related("demarche").get(pk=shard_pk)
+        if shard.status == DemarcheSyncShard.STATUS_DONE:
+            return
+        try:
+            return dict(sync_demarche_shard(shard, heartbeat=lock.reacquire))
+        except Exception as e:
+            if shard.retries_exhausted:
+                raise
+            raise self.retry(exc=e, countdown=settings.DS_INIT_SYNC_SHARD_RETRY_DELAY)
+
+
+#### shards whose worker died mid-run — to be scheduled every few minutes
+#### (django_celery_beat)
+@shared_task
+def task_redispatch_stale_sync_shards():
+    return redispatch_stale_sync_shards()
+
+
 #### of one dossier
 @shared_task
 def task_save_one_dossier_from_ds(
@@ -130,8 +213,32 @@ def task_refresh_dossier_from_saved_data(dossier_number):
     refresh_dossier_from_saved_data(dossier)
 
 
+#### of several dossiers (one page of a DN sync, admin mass action)
+@shared_task
+def task_refresh_dossiers_from_saved_data(dossier_numbers):
+    refresh_dossiers_from_saved_data(dossier_numbers)
+
+
 ## Refresh demarche field mappings
 ## from saved data if existing else from DN
 @shared_task
 def task_refresh_field_mappings_from_demarche_data(demarche_number):
     return refresh_field_mappings_on_demarche(demarche_number)
+
+
+## Send DN write-back mutations from the outbox
+## Dispatched after each enqueued mutation ; also scheduled every minute
+## (django_celery_beat, migration 0067) so that postponed retries are sent.
+@shared_task
+def task_drain_ds_mutations():
+    with ds_mutations_drain_lock(settings.DS_MUTATIONS_DRAIN_LOCK_TIMEOUT) as acquired:
+        if not acquired:
+            logger.info("DN mutations outbox drain already running")
+            return
+        stats = drain_ds_mutations()
+
+    # Checked once the lock is released: a mutation committed during the drain
+    # triggered a drain that found the lock taken, and is not in this batch.
+    # Budget exhausted: the next scheduled drain takes over.
+    if not stats["budget_exhausted"] and has_due_ds_mutations():
+        task_drain_ds_mutations.apply_async(priority=TASK_PRIORITY_HIGH)
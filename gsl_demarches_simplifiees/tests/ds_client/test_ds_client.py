@@ -2,11 +2,20 @@ import logging
 from unittest.mock import patch
 
 import pytest
+import requests
 import responses
 from django.conf import settings
 from django.utils import timezone
 
-from gsl_demarches_simplifiees.ds_client import DsClient
+from gsl_demarches_simplifiees.ds_client import (
+    SYNC_PROFILE_INSTRUCTION,
+    SYNC_PROFILE_STATE_ONLY,
+    AdaptivePageSize,
+    DsClient,
+    DsMutator,
+    get_ds_session,
+)
+from gsl_demarches_simplifiees.exceptions import DsConnectionError
 
 
 @responses.activate
@@ -157,6 +166,76 @@ def test_fetch_demarche_page_propagates_has_errors_true():
         assert has_errors is True
 
 
+def test_fetch_demarche_page_fetches_full_dossiers_by_default():
+    client = DsClient()
+
+    with patch.object(
+        client,
+        "launch_graphql_query",
+        return_value=(_make_fetch_page_response(), False),
+    ) as mock_query:
+        client.fetch_demarche_page(123)
+
+        variables = mock_query.call_args[1]["variables"]
+        assert variables["includeChamps"] is True
+        assert variables["includeAnnotations"] is True
+        assert variables["includeDemandeur"] is True
+
+
+@pytest.mark.parametrize(
+    "profile, expected",
+    (
+        (SYNC_PROFILE_INSTRUCTION, (False, True, False)),
+        (SYNC_PROFILE_STATE_ONLY, (False, False, False)),
+    ),
+)
+def test_fetch_demarche_page_passes_the_sync_profile_flags(profile, expected):
+    client = DsClient()
+
+    with patch.object(
+        client,
+        "launch_graphql_query",
+        return_value=(_make_fetch_page_response(), False),
+    ) as mock_query:
+        client.fetch_demarche_page(123, profile=profile)
+
+        variables = mock_query.call_args[1]["variables"]
+        assert (
+            variables["includeChamps"],
+            variables["includeAnnotations"],
+            variables["includeDemandeur"],
+        ) == expected
+
+
+def test_get_dossiers_fetches_full_dossiers_under_aliases():
+    client = DsClient()
+    dossier = {"id": "DOSS-1", "number": 20240001}
+
+    with patch.object(
+        client,
+        "launch_graphql_query",
+        return_value=({"data": {"dossier0": dossier, "dossier1": None}}, True),
+    ) as mock_query:
+        result = client.get_dossiers([20240001, 20240002])
+
+        query = mock_query.call_args[1]["query"]
+        variables = mock_query.call_args[1]["variables"]
+        assert "dossier1: dossier(number: $number1)" in query
+        assert "fragment DossierFragment on Dossier" in query
+        assert variables["number0"] == 20240001
+        assert variables["number1"] == 20240002
+        assert variables["includeChamps"] is True
+        assert result == {20240001: dossier}
+
+
+def test_get_dossiers_without_numbers_sends_no_request():
+    client = DsClient()
+
+    with patch.object(client, "launch_graphql_query") as mock_query:
+        assert client.get_dossiers([]) == {}
+        mock_query.assert_not_called()
+
+
 @responses.activate
 def test_launch_graphql_query_returns_has_errors_false_when_no_errors():
     responses.add(
@@ -194,3 +273,142 @@ def test_launch_graphql_query_returns_has_errors_true_for_non_fatal_errors(caplo
     assert has_errors is True
     assert results["data"] == {"demarche": {}}
     assert "DN request error" in caplog.text
+
+
+@responses.activate
+def test_launch_graphql_query_records_response_size():
+    responses.add(
+        responses.POST,
+        settings.DS_API_URL,
+        body=b'{"data": {"demarche": {}}}',
+        status=200,
+        content_type="application/json",
+    )
+
+    client = DsClient()
+    client.launch_graphql_query("someOperation")
+
+    assert client.last_response_size == len(b'{"data": {"demarche": {}}}')
+
+
+def _page_size(**kwargs):
+    params = dict(
+        initial=50,
+        minimum=10,
+        maximum=100,
+        fast_seconds=2,
+        slow_seconds=10,
+        small_bytes=1000,
+    )
+    params.update(kwargs)
+    return AdaptivePageSize(**params)
+
+
+def test_adaptive_page_size_grows_on_fast_and_small_responses_up_to_maximum():
+    page_size = _page_size()
+
+    page_size.record_success(0.5, 100, has_errors=False)
+    assert page_size.page_size == 75
+    page_size.record_success(0.5, 100, has_errors=False)
+    assert page_size.page_size == 100
+    page_size.record_success(0.5, 100, has_errors=False)
+    assert page_size.page_size == 100
+
+
+@pytest.mark.parametrize(
+    "elapsed, response_size",
+    ((0.5, 5000), (5, 100), (0.5, None)),
+)
+def test_adaptive_page_size_keeps_size_on_large_or_average_responses(
+    elapsed, response_size
+):
+    page_size = _page_size()
+
+    page_size.record_success(elapsed, response_size, has_errors=False)
+
+    assert page_size.page_size == 50
+
+
+def test_adaptive_page_size_shrinks_on_slow_responses_and_errors_down_to_minimum():
+    page_size = _page_size()
+
+    page_size.record_success(12, 100, has_errors=False)
+    assert page_size.page_size == 25
+    page_size.record_success(0.5, 100, has_errors=True)
+    assert page_size.page_size == 12
+    assert page_size.can_shrink
+    page_size.shrink()
+    assert page_size.page_size == 10
+    assert not page_size.can_shrink
+
+
+# --- session, timeouts et nouvelles tentatives ------------------------------
+
+
+def test_clients_share_the_thread_session():
+    assert get_ds_session() is get_ds_session()
+
+
+@responses.activate
+@patch("gsl_demarches_simplifiees.ds_client.time.sleep")
+def test_query_is_retried_on_transient_status_codes(mock_sleep, caplog):
+    responses.add(responses.POST, settings.DS_API_URL, status=503)
+    responses.add(
+        responses.POST, settings.DS_API_URL, status=429, headers={"Retry-After": "4"}
+    )
+    responses.add(responses.POST, settings.DS_API_URL, json={"data": {"demarche": {}}})
+
+    with caplog.at_level(logging.INFO):
+        results, has_errors = DsClient().launch_graphql_query("getDemarche")
+
+    assert results == {"data": {"demarche": {}}}
+    assert len(responses.calls) == 3
+    assert [c.args[0] for c in mock_sleep.call_args_list] == [
+        settings.DS_API_RETRY_BACKOFF,
+        4,
+    ]
+    record = next(r for r in caplog.records if r.message == "DN request")
+    assert record.operation_name == "getDemarche"
+    assert record.retries == 2
+    assert record.status_code == 200
+
+
+@responses.activate
+@patch("gsl_demarches_simplifiees.ds_client.time.sleep")
+def test_query_gives_up_after_max_retries(mock_sleep):
+    responses.add(
+        responses.POST,
+        settings.DS_API_URL,
+        body=requests.exceptions.ConnectionError("reset by peer"),
+    )
+
+    with pytest.raises(DsConnectionError):
+        DsClient().launch_graphql_query("getDemarche")
+
+    assert len(responses.calls) == settings.DS_API_MAX_RETRIES + 1
+
+
+@responses.activate
+@patch("gsl_demarches_simplifiees.ds_client.time.sleep")
+def test_mutation_is_never_retried(mock_sleep):
+    responses.add(responses.POST, settings.DS_API_URL, status=503)
+
+    with pytest.raises(DsConnectionError):
+        DsMutator().launch_graphql_query("dossierAccepter")
+
+    assert len(responses.calls) == 1
+    mock_sleep.assert_not_called()
+
+
+@responses.activate
+def test_timeout_raises_ds_connection_error():
+    responses.add(
+        responses.POST,
+        settings.DS_API_URL,
+        body=requests.exceptions.ReadTimeout("read timeout"),
+    )
+
+    with pytest.raises(DsConnectionError):
+        DsClient().launch_graphql_query("getDemarche")
+
+    assert len(responses.calls) == 1
@@ -1,6 +1,22 @@
+import base64
+import hashlib
+import json
 from unittest.mock import patch
 
-from gsl_demarches_simplifiees.ds_client import DsMutator
+import pytest
+import responses
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
+from requests.exceptions import ConnectionError
+
+from gsl_demarches_simplifiees.ds_client import (
+    DsMutator,
+    _ChunkedFileReader,
+    get_ds_session,
+    get_upload_session,
+)
+from gsl_demarches_simplifiees.exceptions import DsConnectionError
 
 
 def test_dossier_classer_sans_suite():
@@ -17,4 +33,154 @@ def test_dossier_classer_sans_suite():
             "instructeur_id",
             "motivation",
             None,
+            client_mutation_id=None,
         )
+
+
+UPLOAD_URL = "https://storage.example.com/direct-upload"
+
+
+def _direct_upload_response():
+    return {
+        "data": {
+            "createDirectUpload": {
+                "directUpload": {
+                    "url": UPLOAD_URL,
+                    "headers": json.dumps({"Content-MD5": "checksum"}),
+                    "signedBlobId": "signed-blob-id",
+                }
+            }
+        }
+    }
+
+
+@override_settings(DS_UPLOAD_CHUNK_SIZE=4)
+def test_upload_attachment_checksum_is_computed_by_chunks():
+    file = SimpleUploadedFile("arrete.pdf", b"%PDF-1.4 signed arrete")
+    ds_mutator = DsMutator()
+
+    with patch.object(
+        ds_mutator,
+        "launch_graphql_query",
+        return_value=(_direct_upload_response(), False),
+    ) as mock_query:
+        with patch.object(ds_mutator, "_put_attachment") as mock_put:
+            mock_put.return_value.status_code = 200
+            blob_id = ds_mutator._upload_attachment("dossier_id", file)
+
+    assert blob_id == "signed-blob-id"
+    upload_input = mock_query.call_args.args[1]["input"]
+    assert upload_input["byteSize"] == 22
+    assert (
+        upload_input["checksum"]
+        == base64.b64encode(hashlib.md5(b"%PDF-1.4 signed arrete").digest()).decode()
+    )
+
+
+@override_settings(DS_UPLOAD_CHUNK_SIZE=4)
+def test_chunked_file_reader_caps_reads_to_chunk_size():
+    reader = _ChunkedFileReader(SimpleUploadedFile("arrete.pdf", b"0123456789"))
+
+    assert reader.len == 10
+    assert reader.read() == b"0123"
+    assert reader.read(8192) == b"4567"
+    assert reader.read(2) == b"89"
+    assert reader.read() == b""
+
+
+@responses.activate
+@patch("gsl_demarches_simplifiees.ds_client.time.sleep")
+def test_upload_attachment_is_replayed_on_transient_failure(mock_sleep):
+    responses.add(responses.PUT, UPLOAD_URL, status=503)
+    responses.add(responses.PUT, UPLOAD_URL, body=ConnectionError("reset"))
+    responses.add(responses.PUT, UPLOAD_URL, status=200)
+    file = SimpleUploadedFile("arrete.pdf", b"%PDF-1.4 signed arrete")
+    ds_mutator = DsMutator()
+
+    with patch.object(
+        ds_mutator,
+        "launch_graphql_query",
+        return_value=(_direct_upload_response(), False),
+    ) as mock_query:
+        blob_id = ds_mutator._upload_attachment("dossier_id", file)
+
+    assert blob_id == "signed-blob-id"
+    mock_query.assert_called_once()
+    assert len(responses.calls) == 3
+    assert mock_sleep.call_count == 2
+    assert responses.calls[-1].request.headers["Content-Length"] == "22"
+    assert responses.calls[-1].request.headers["Content-MD5"] == "checksum"
+
+
+@responses.activate
+@patch("gsl_demarches_simplifiees.ds_client.time.sleep")
+def test_upload_attachment_raises_on_rejected_upload(mock_sleep):
+    responses.add(responses.PUT, UPLOAD_URL, status=403, body="Forbidden")
+    file = SimpleUploadedFile("arrete.pdf", b"%PDF-1.4 signed arrete")
+    ds_mutator = DsMutator()
+
+    with patch.object(
+        ds_mutator,
+        "launch_graphql_query",
+        return_value=(_direct_upload_response(), False),
+    ):
+        with pytest.raises(DsConnectionError):
+            ds_mutator._upload_attachment("dossier_id", file)
+
+    assert len(responses.calls) == 1
+    mock_sleep.assert_not_called()
+
+
+def test_upload_session_is_separate_from_the_dn_session():
+    # Une seule connexion poolée par session : l'upload ne doit pas fermer
+    # les connexions keep-alive vers DN
+    assert get_upload_session() is get_upload_session()
+    assert get_upload_session() is not get_ds_session()
+
+
+@responses.activate
+def test_dossiers_modifier_annotations_sends_aliased_mutations():
+    responses.add(
+        responses.POST,
+        settings.DS_API_URL,
+        json={
+            "data": {
+                "dossier0": {
+                    "annotations": [{"id": "a", "updatedAt": "2025-12-08T11:26:17Z"}],
+                    "errors": None,
+                },
+                "dossier1": None,
+            },
+            "errors": [{"message": "Dossier introuvable", "path": ["dossier1"]}],
+        },
+    )
+    annotations = [{"id": "a", "value": {"checkbox": True}}]
+
+    results = DsMutator().dossiers_modifier_annotations(
+        "instructeur_id",
+        [("dossier_a", annotations), ("dossier_b", annotations)],
+        client_mutation_ids=["key-a", None],
+    )
+
+    body = json.loads(responses.calls[0].request.body)
+    assert body["variables"]["input0"]["clientMutationId"] == "key-a"
+    assert body["variables"]["input1"]["clientMutationId"] == settings.DS_CLIENT_ID
+    assert body["operationName"] == "dossiersModifierAnnotations"
+    assert "dossier1: dossierModifierAnnotations(input: $input1)" in body["query"]
+    assert body["variables"]["input0"]["dossierId"] == "dossier_a"
+    assert body["variables"]["input1"]["dossierId"] == "dossier_b"
+    assert body["variables"]["input1"]["annotations"] == annotations
+    assert results == [
+        {
+            "data": {
+                "dossierModifierAnnotations": {
+                    "annotations": [{"id": "a", "updatedAt": "2025-12-08T11:26:17Z"}],
+                    "errors": None,
+                }
+            }
+        },
+        {
+            "data": {"dossierModifierAnnotations": None},
+            "errors": [{"message": "Dossier introuvable", "path": ["dossier1"]}],
+        },
+    ]
@@ -2,8 +2,10 @@ import datetime
 import json
 import logging
 from pathlib import Path
+from unittest.mock import patch
 
 import pytest
+from django.test import override_settings
 
 from gsl_core.models import Adresse
 from gsl_core.tests.factories import (
@@ -11,7 +13,11 @@ from gsl_core.tests.factories import (
     DepartementFactory,
     RegionFactory,
 )
-from gsl_demarches_simplifiees.importer.dossier_converter import DossierConverter
+from gsl_demarches_simplifiees.importer.demarche import save_field_mappings
+from gsl_demarches_simplifiees.importer.dossier_converter import (
+    DossierConverter,
+    get_conversion_plan,
+)
 from gsl_demarches_simplifiees.models import (
     Demarche,
     Dossier,
@@ -896,3 +902,125 @@ def test_cofinancements_avec_montants_empty_m2m(
     result = dossier.cofinancements_avec_montants
 
     assert result == []
+
+
+# tests plan de conversion compilé
+
+
+def test_conversion_plan_is_compiled_once_per_demarche(
+    ds_dossier_data, dossier, django_assert_num_queries
+):
+    FieldMapping.objects.create(
+        ds_field_id="TEST_ID_un_champ_hors_annotation",
+        django_field=Dossier._MAPPED_CHAMPS_FIELDS[0].name,
+        demarche=dossier.ds_demarche,
+    )
+    DossierConverter(ds_dossier_data, dossier)
+
+    with django_assert_num_queries(0):
+        converter = DossierConverter(ds_dossier_data, dossier)
+
+    assert converter.ds_field_id_to_django_field == {
+        "TEST_ID_un_champ_hors_annotation": Dossier._MAPPED_CHAMPS_FIELDS[0]
+    }
+
+
+def test_conversion_plan_ignores_mappings_of_other_demarches(ds_dossier_data, dossier):
+    other_demarche = Demarche.objects.create(
+        ds_id="autre-demarche", ds_number=999, ds_state=Demarche.STATE_PUBLIEE
+    )
+    FieldMapping.objects.create(
+        ds_field_id="TEST_ID_un_champ_hors_annotation",
+        django_field=Dossier._MAPPED_CHAMPS_FIELDS[0].name,
+        demarche=other_demarche,
+    )
+
+    converter = DossierConverter(ds_dossier_data, dossier)
+
+    assert converter.ds_field_id_to_django_field == {}
+
+
+def test_save_field_mappings_invalidates_conversion_plan(demarche):
+    assert get_conversion_plan(demarche.pk) == {}
+
+    save_field_mappings(
+        {
+            "activeRevision": {
+                "champDescriptors": [
+                    {
+                        "__typename": "TextChampDescriptor",
+                        "id": "FIELD_ID_NOM",
+                        "label": "Nom du porteur de projet",
+                    }
+                ],
+                "annotationDescriptors": [],
+            }
+        },
+        demarche,
+    )
+
+    plan = get_conversion_plan(demarche.pk)
+    assert plan["FIELD_ID_NOM"].django_field == Dossier._meta.get_field(
+        "porteur_de_projet_nom"
+    )
+
+
+def test_field_mapping_change_invalidates_conversion_plan(demarche):
+    assert get_conversion_plan(demarche.pk) == {}
+
+    # Modification faite hors de save_field_mappings (admin, import-export)
+    FieldMapping.objects.create(
+        demarche=demarche,
+        ds_field_id="FIELD_ID_NOM",
+        django_field="porteur_de_projet_nom",
+    )
+
+    assert list(get_conversion_plan(demarche.pk)) == ["FIELD_ID_NOM"]
+
+
+@override_settings(DS_REFERENCE_CACHE_REDIS_URL="redis://localhost:6379")
+@patch("gsl_demarches_simplifiees.importer.reference_cache.redis.Redis.from_url")
+def test_conversion_plan_is_recompiled_when_shared_generation_changes(
+    mock_from_url, demarche
+):
+    redis_client = mock_from_url.return_value
+    redis_client.mget.return_value = [b"3", b"1"]
+    assert get_conversion_plan(demarche.pk) == {}
+
+    # Un autre process modifie les FieldMapping et incrémente la génération
+    FieldMapping.objects.bulk_create(
+        [
+            FieldMapping(
+                demarche=demarche,
+                ds_field_id="FIELD_ID_NOM",
+                django_field="porteur_de_projet_nom",
+            )
+        ]
+    )
+    assert get_conversion_plan(demarche.pk) == {}
+    redis_client.mget.return_value = [b"3", b"2"]
+
+    assert list(get_conversion_plan(demarche.pk)) == ["FIELD_ID_NOM"]
+    redis_client.mget.assert_called_with(
+        [
+            "gsl:reference-cache:generation:reference",
+            f"gsl:reference-cache:generation:conversion_plan:{demarche.pk}",
+        ]
+    )
+
+
+@override_settings(DS_REFERENCE_CACHE_REDIS_URL="redis://localhost:6379")
+@patch("gsl_demarches_simplifiees.importer.reference_cache.redis.Redis.from_url")
+def test_field_mapping_change_bumps_shared_generation_on_commit(
+    mock_from_url, demarche, django_capture_on_commit_callbacks
+):
+    with django_capture_on_commit_callbacks(execute=False) as callbacks:
+        FieldMapping.objects.create(demarche=demarche, ds_field_id="FIELD_ID_NOM")
+    mock_from_url.return_value.incr.assert_not_called()
+
+    for callback in callbacks:
+        callback()
+
+    mock_from_url.return_value.incr.assert_called_once_with(
+        f"gsl:reference-cache:generation:conversion_plan:{demarche.pk}"
+    )
@@ -1,30 +1,42 @@
+import json
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 from unittest.mock import patch
 
 import pytest
+import requests
 from django.contrib import messages
+from django.test import override_settings
 from django.utils.timezone import datetime
 
-from gsl_core.tests.factories import DepartementFactory
+from gsl_core.tests.factories import DepartementFactory, PerimetreDepartementalFactory
 from gsl_demarches_simplifiees.ds_client import DsClient
 from gsl_demarches_simplifiees.exceptions import DsConnectionError, DsServiceException
 from gsl_demarches_simplifiees.importer.dossier import (
+    DemarchePageFetcher,
+    HandledDepartementFilter,
+    PageRequest,
     _get_handled_departement_insee_codes,
-    _is_dossier_in_handled_departement,
     _reinit_demarche_sync_state,
     _save_cursors_after_page,
     _save_dossier_data_and_refresh_dossier_and_projet_and_co,
     import_one_dossier_from_ds,
     refresh_dossier_instructeurs,
+    refresh_dossiers_from_saved_data,
+    refresh_dossiers_instructeurs,
     save_demarche_dossiers_from_ds,
     save_one_dossier_from_ds,
 )
-from gsl_demarches_simplifiees.models import Dossier, Profile
+from gsl_demarches_simplifiees.models import Dossier, DossierData, Profile
 from gsl_demarches_simplifiees.tests.factories import (
     DemarcheFactory,
     DossierDataFactory,
     DossierFactory,
+    FieldMappingFactory,
 )
+from gsl_projet.models import Projet
 
 
 def _make_demarche_page(
@@ -379,6 +391,7 @@ def test_save_demarche_dossiers_from_ds_error_on_page_continues_but_skips_cursor
     assert mock_fetch.call_count == 2
     demarche.refresh_from_db()
     assert demarche.sync_cursor == initial_cursor
+    assert demarche.last_synced_at is None
 
 
 def test_save_one_dossier_from_ds_error_with_invalid_ds_response():
@@ -467,6 +480,42 @@ def test_refresh_dossier_instructeurs():
     assert dossier.ds_instructeurs.count() == 2
 
 
+@pytest.mark.django_db
+def test_refresh_dossiers_instructeurs_applies_the_page_diff_in_bulk(
+    django_assert_num_queries,
+):
+    first, second = DossierFactory.create_batch(2)
+    profile_a = Profile.objects.create(ds_id="A-1", ds_email="a@example.com")
+    profile_b = Profile.objects.create(ds_id="B-2", ds_email="b@example.com")
+    first.ds_instructeurs.add(profile_a, profile_b)
+    groupe_index = {
+        "GROUPE-1": [
+            {"id": "B-2", "email": "b@example.com"},
+            {"id": "C-3", "email": "c@example.com"},
+        ],
+        "GROUPE-2": [{"id": "A-1", "email": "a@example.com"}],
+    }
+    dossiers = [
+        ({"groupeInstructeur": {"id": "GROUPE-1"}}, first),
+        ({"groupeInstructeur": {"id": "GROUPE-2"}}, second),
+    ]
+
+    # lecture des profils, upsert de C, relecture de C, lecture des
+    # appartenances, bulk_create, delete
+    with django_assert_num_queries(6):
+        refresh_dossiers_instructeurs(dossiers, groupe_index)
+
+    assert set(first.ds_instructeurs.values_list("ds_id", flat=True)) == {
+        "B-2",
+        "C-3",
+    }
+    assert set(second.ds_instructeurs.values_list("ds_id", flat=True)) == {"A-1"}
+
+    # Rien ne change : une lecture des profils et une des appartenances
+    with django_assert_num_queries(2):
+        refresh_dossiers_instructeurs(dossiers, groupe_index)
+
+
 @pytest.mark.django_db
 def test_refresh_dossier_instructeurs_builds_index_from_demarche_raw_data():
     """When no groupe_index is passed, it is rebuilt from Demarche.raw_ds_data."""
@@ -496,6 +545,11 @@ def test_refresh_dossier_instructeurs_builds_index_from_demarche_raw_data():
 
     current_ids = set(dossier.ds_instructeurs.values_list("ds_id", flat=True))
     assert current_ids == {"A-1", "B-2"}
+    # L'index est désormais servi par la table GroupeInstructeur
+    assert set(demarche.groupes_instructeurs.values_list("ds_id", flat=True)) == {
+        "GROUPE-1",
+        "GROUPE-2",
+    }
 
 
 @pytest.mark.django_db
@@ -587,10 +641,10 @@ def test_has_dossier_been_updated_on_ds():
     assert _has_dossier_been_updated_on_ds(dossier, ds_data_older) is False
 
 
-# test _is_dossier_in_handled_departement
+# test HandledDepartementFilter
 
 
-def test_is_dossier_in_handled_departement_department_found_and_in_active_list():
+def test_handled_departement_filter_department_found_and_in_active_list():
     """Test when department field is found and code is in handled departments."""
     raw_data = {
         "champs": [
@@ -601,12 +655,12 @@ def test_is_dossier_in_handled_departement_department_found_and_in_active_list()
         ]
     }
     departements_actifs = ["75", "13", "69"]
-    is_active, label = _is_dossier_in_handled_departement(raw_data, departements_actifs)
+    is_active, label = HandledDepartementFilter(departements_actifs).check(raw_data)
     assert is_active is True
     assert label == "75 - Paris"
 
 
-def test_is_dossier_in_handled_departement_department_found_but_not_in_active_list():
+def test_handled_departement_filter_department_found_but_not_in_active_list():
     """Test when department field is found but code is NOT in active departments."""
     raw_data = {
         "champs": [
@@ -617,12 +671,12 @@ def test_is_dossier_in_handled_departement_department_found_but_not_in_active_li
         ]
     }
     departements_actifs = ["13", "69", "92"]
-    is_active, label = _is_dossier_in_handled_departement(raw_data, departements_actifs)
+    is_active, label = HandledDepartementFilter(departements_actifs).check(raw_data)
     assert is_active is False
     assert label == "75 - Paris"
 
 
-def test_is_dossier_in_handled_departement_empty_value():
+def test_handled_departement_filter_empty_value():
     """Test when department field is found but value is empty."""
     raw_data = {
         "champs": [
@@ -633,12 +687,12 @@ def test_is_dossier_in_handled_departement_empty_value():
         ]
     }
     departements_actifs = ["75", "13", "69"]
-    is_active, label = _is_dossier_in_handled_departement(raw_data, departements_actifs)
+    is_active, label = HandledDepartementFilter(departements_actifs).check(raw_data)
     assert is_active is False
     assert label == ""
 
 
-def test_is_dossier_in_handled_departement_whitespace_only_value():
+def test_handled_departement_filter_whitespace_only_value():
     """Test when department field has only whitespace."""
     raw_data = {
         "champs": [
@@ -649,12 +703,12 @@ def test_is_dossier_in_handled_departement_whitespace_only_value():
         ]
     }
     departements_actifs = ["75", "13", "69"]
-    is_active, label = _is_dossier_in_handled_departement(raw_data, departements_actifs)
+    is_active, label = HandledDepartementFilter(departements_actifs).check(raw_data)
     assert is_active is False
     assert label == ""
 
 
-def test_is_dossier_in_handled_departement_field_not_found():
+def test_handled_departement_filter_field_not_found():
     """Test when department field is not found in champs."""
     raw_data = {
         "champs": [
@@ -662,30 +716,30 @@ def test_is_dossier_in_handled_departement_field_not_found():
         ]
     }
     departements_actifs = ["75", "13", "69"]
-    is_active, label = _is_dossier_in_handled_departement(raw_data, departements_actifs)
+    is_active, label = HandledDepartementFilter(departements_actifs).check(raw_data)
     assert is_active is False
     assert label == "inconnu"
 
 
-def test_is_dossier_in_handled_departement_no_champs_key():
+def test_handled_departement_filter_no_champs_key():
     """Test when champs key is missing from raw_data."""
     raw_data = {}
     departements_actifs = ["75", "13", "69"]
-    is_active, label = _is_dossier_in_handled_departement(raw_data, departements_actifs)
+    is_active, label = HandledDepartementFilter(departements_actifs).check(raw_data)
     assert is_active is False
     assert label == "inconnu"
 
 
-def test_is_dossier_in_handled_departement_empty_champs():
+def test_handled_departement_filter_empty_champs():
     """Test when champs is an empty list."""
     raw_data = {"champs": []}
     departements_actifs = ["75", "13", "69"]
-    is_active, label = _is_dossier_in_handled_departement(raw_data, departements_actifs)
+    is_active, label = HandledDepartementFilter(departements_actifs).check(raw_data)
     assert is_active is False
     assert label == "inconnu"
 
 
-def test_is_dossier_in_handled_departement_with_whitespace_in_code():
+def test_handled_departement_filter_with_whitespace_in_code():
     """Test when department code has whitespace that should be stripped."""
     raw_data = {
         "champs": [
@@ -696,12 +750,12 @@ def test_is_dossier_in_handled_departement_with_whitespace_in_code():
         ]
     }
     departements_actifs = ["75", "13", "69"]
-    is_active, label = _is_dossier_in_handled_departement(raw_data, departements_actifs)
+    is_active, label = HandledDepartementFilter(departements_actifs).check(raw_data)
     assert is_active is True
     assert label == "75  - Paris"
 
 
-def test_is_dossier_in_handled_departement_with_different_format():
+def test_handled_departement_filter_with_different_format():
     """Test with different format variations."""
     raw_data = {
         "champs": [
@@ -712,12 +766,12 @@ def test_is_dossier_in_handled_departement_with_different_format():
         ]
     }
     departements_actifs = ["13", "69"]
-    is_active, label = _is_dossier_in_handled_departement(raw_data, departements_actifs)
+    is_active, label = HandledDepartementFilter(departements_actifs).check(raw_data)
     assert is_active is True
     assert label == "13- Bouches-du-Rhône"
 
 
-def test_is_dossier_in_handled_departement_with_list_of_strings():
+def test_handled_departement_filter_with_list_of_strings():
     """Test that it works with list of strings for active departments."""
     raw_data = {
         "champs": [
@@ -728,12 +782,12 @@ def test_is_dossier_in_handled_departement_with_list_of_strings():
         ]
     }
     departements_actifs = ["69", "75"]
-    is_active, label = _is_dossier_in_handled_departement(raw_data, departements_actifs)
+    is_active, label = HandledDepartementFilter(departements_actifs).check(raw_data)
     assert is_active is True
     assert label == "69 - Rhône"
 
 
-def test_is_dossier_in_handled_departement_with_set():
+def test_handled_departement_filter_with_set():
     """Test that it works with a set for active departments."""
     raw_data = {
         "champs": [
@@ -744,12 +798,12 @@ def test_is_dossier_in_handled_departement_with_set():
         ]
     }
     departements_actifs = {"92", "75", "13"}
-    is_active, label = _is_dossier_in_handled_departement(raw_data, departements_actifs)
+    is_active, label = HandledDepartementFilter(departements_actifs).check(raw_data)
     assert is_active is True
     assert label == "92 - Hauts-de-Seine"
 
 
-def test_is_dossier_in_handled_departement_no_stringValue_key():
+def test_handled_departement_filter_no_stringValue_key():
     """Test when stringValue key is missing from the champ."""
     raw_data = {
         "champs": [
@@ -759,12 +813,12 @@ def test_is_dossier_in_handled_departement_no_stringValue_key():
         ]
     }
     departements_actifs = ["75", "13", "69"]
-    is_active, label = _is_dossier_in_handled_departement(raw_data, departements_actifs)
+    is_active, label = HandledDepartementFilter(departements_actifs).check(raw_data)
     assert is_active is False
     assert label == ""
 
 
-def test_is_dossier_in_handled_departement_not_handled_territory():
+def test_handled_departement_filter_not_handled_territory():
     """A dossier in a NOT_HANDLED_TERRITORIES code is not handled."""
     raw_data = {
         "champs": [
@@ -777,11 +831,59 @@ def test_is_dossier_in_handled_departement_not_handled_territory():
     # The handled set is what _get_handled_departement_insee_codes would return:
     # every real departement minus the special territories. "987" is excluded.
     handled_codes = ["75", "13", "69"]
-    is_handled, label = _is_dossier_in_handled_departement(raw_data, handled_codes)
+    is_handled, label = HandledDepartementFilter(handled_codes).check(raw_data)
     assert is_handled is False
     assert label == "987 - Polynésie"
 
 
+def test_handled_departement_filter_matches_by_champ_descriptor_id():
+    departement_filter = HandledDepartementFilter(["67"])
+    first = {
+        "champs": [
+            {
+                "champDescriptorId": "Q2hhbXAtMQ==",
+                "label": "Département ou collectivité du demandeur",
+                "stringValue": "67 - Bas-Rhin",
+            }
+        ]
+    }
+    assert departement_filter.check(first) == (True, "67 - Bas-Rhin")
+    assert departement_filter.departement_champ_descriptor_ids == {"Q2hhbXAtMQ=="}
+
+    # Le libellé a changé sur DN : le champ reste reconnu par son descripteur
+    renamed = {
+        "champs": [
+            {
+                "champDescriptorId": "Q2hhbXAtMQ==",
+                "label": "Département du demandeur",
+                "stringValue": "68 - Haut-Rhin",
+            }
+        ]
+    }
+    assert departement_filter.check(renamed) == (False, "68 - Haut-Rhin")
+    assert departement_filter.check({"champs": []}) == (False, "inconnu")
+    assert departement_filter.rejections == {
+        "departement_not_handled": 1,
+        "departement_missing": 1,
+    }
+
+
+@pytest.mark.django_db
+def test_handled_departement_filter_for_demarche_uses_field_mappings():
+    demarche = DemarcheFactory()
+    FieldMappingFactory(
+        demarche=demarche,
+        ds_field_id="Q2hhbXAtMQ==",
+        ds_field_label="Département ou collectivité du demandeur",
+    )
+    DepartementFactory(insee_code="67")
+
+    departement_filter = HandledDepartementFilter.for_demarche(demarche)
+
+    assert departement_filter.departement_champ_descriptor_ids == {"Q2hhbXAtMQ=="}
+    assert "67" in departement_filter.handled_departement_insee_codes
+
+
 # test _get_handled_departement_insee_codes
 
 
@@ -1113,6 +1215,25 @@ def test_save_demarche_dossiers_from_ds_saves_cursor_after_first_successful_page
     assert demarche.sync_cursor == "cursor-page-1"
 
 
+@pytest.mark.django_db
+def test_save_demarche_dossiers_from_ds_saves_last_synced_at_when_no_request_error():
+    demarche_number = 123
+    demarche = DemarcheFactory(
+        ds_number=demarche_number,
+        updated_since="2025-01-01T00:00:00+00:00",
+        raw_ds_data={"groupeInstructeurs": [{"id": "GROUPE-1", "instructeurs": []}]},
+    )
+
+    with patch(
+        "gsl_demarches_simplifiees.ds_client.DsClient.fetch_demarche_page",
+        return_value=(_make_demarche_page(), False),
+    ):
+        save_demarche_dossiers_from_ds(demarche_number)
+
+    demarche.refresh_from_db()
+    assert demarche.last_synced_at is not None
+
+
 @pytest.mark.django_db
 def test_save_demarche_dossiers_from_ds_request_error_keeps_cursors():
     """Quand la seule page a une erreur DS, le curseur initial est conservé."""
@@ -1135,6 +1256,7 @@ def test_save_demarche_dossiers_from_ds_request_error_keeps_cursors():
 
     demarche.refresh_from_db()
     assert demarche.sync_cursor == initial_cursor
+    assert demarche.last_synced_at is None
 
 
 # tests _reinit_demarche_sync_state
@@ -1182,3 +1304,596 @@ def test_save_demarche_dossiers_from_ds_calls_reinit_when_updated_since_is_none(
             save_demarche_dossiers_from_ds(demarche_number)
 
     mock_reinit.assert_called_once_with(demarche)
+
+
+# tests ingestion ensembliste (DS_SYNC_BULK_PAGE_INGESTION)
+
+
+@pytest.mark.django_db
+@override_settings(DS_SYNC_BULK_PAGE_INGESTION=True)
+def test_save_demarche_dossiers_from_ds_in_bulk_creates_updates_and_dispatches_once():
+    demarche_number = 123
+    demarche = DemarcheFactory(
+        ds_number=demarche_number,
+        updated_since="2025-01-01T00:00:00+00:00",
+        raw_ds_data={
+            "groupeInstructeurs": [
+                {
+                    "id": "GROUPE-1",
+                    "instructeurs": [{"id": "A-1", "email": "a@example.com"}],
+                }
+            ]
+        },
+    )
+    existing = DossierFactory(ds_id="DOSS-1", ds_number=20240001, ds_demarche=demarche)
+    DossierDataFactory(dossier=existing, raw_data={"some_field": "some_value"})
+
+    ds_dossiers = [
+        {**_ds_dossier("DOSS-1", 20240001), "groupeInstructeur": {"id": "GROUPE-1"}},
+        {**_ds_dossier("DOSS-2", 20240002), "groupeInstructeur": {"id": "GROUPE-1"}},
+        _ds_dossier("DOSS-3", 20240003, departement_code="988"),
+        None,
+    ]
+
+    with patch(
+        "gsl_demarches_simplifiees.ds_client.DsClient.fetch_demarche_page",
+        return_value=(
+            _make_demarche_page(dossiers=ds_dossiers, end_cursor="c1"),
+            False,
+        ),
+    ):
+        with patch(
+            "gsl_demarches_simplifiees.importer.dossier._get_handled_departement_insee_codes",
+            return_value=["75"],
+        ):
+            with patch(
+                "gsl_demarches_simplifiees.tasks.task_refresh_dossiers_from_saved_data.apply_async"
+            ) as mock_refresh:
+                save_demarche_dossiers_from_ds(demarche_number)
+
+    mock_refresh.assert_called_once_with(([20240001, 20240002],), priority=9)
+    assert Dossier.objects.count() == 2
+    assert not Dossier.objects.filter(ds_id="DOSS-3").exists()
+    for ds_dossier in ds_dossiers[:2]:
+        dossier = Dossier.objects.get(ds_id=ds_dossier["id"])
+        assert dossier.ds_demarche == demarche
+        assert dossier.ds_data.raw_data == ds_dossier
+        assert list(dossier.ds_instructeurs.values_list("ds_id", flat=True)) == ["A-1"]
+    demarche.refresh_from_db()
+    assert demarche.sync_cursor == "c1"
+
+
+@pytest.mark.django_db
+@override_settings(DS_SYNC_BULK_PAGE_INGESTION=True)
+def test_save_demarche_dossiers_from_ds_in_bulk_isolates_dossier_errors():
+    demarche_number = 123
+    demarche = DemarcheFactory(
+        ds_number=demarche_number,
+        sync_cursor="old-cursor",
+        updated_since="2025-01-01T00:00:00+00:00",
+        raw_ds_data={"groupeInstructeurs": [{"id": "GROUPE-1", "instructeurs": []}]},
+    )
+    ds_dossiers = [_ds_dossier("DOSS-1", 20240001), _ds_dossier("DOSS-2", 20240002)]
+
+    def _refresh_instructeurs(dossier_data, dossier, groupe_index=None):
+        if dossier_data["id"] == "DOSS-1":
+            raise Exception("boom")
+
+    with patch(
+        "gsl_demarches_simplifiees.ds_client.DsClient.fetch_demarche_page",
+        return_value=(
+            _make_demarche_page(dossiers=ds_dossiers, end_cursor="c1"),
+            False,
+        ),
+    ):
+        with patch(
+            "gsl_demarches_simplifiees.importer.dossier._get_handled_departement_insee_codes",
+            return_value=["75"],
+        ):
+            with (
+                patch(
+                    "gsl_demarches_simplifiees.importer.dossier.refresh_dossiers_instructeurs",
+                    side_effect=Exception("bulk boom"),
+                ),
+                patch(
+                    "gsl_demarches_simplifiees.importer.dossier.refresh_dossier_instructeurs",
+                    side_effect=_refresh_instructeurs,
+                ),
+            ):
+                with patch(
+                    "gsl_demarches_simplifiees.tasks.task_refresh_dossiers_from_saved_data.apply_async"
+                ) as mock_refresh:
+                    save_demarche_dossiers_from_ds(demarche_number)
+
+    mock_refresh.assert_called_once_with(([20240002],), priority=9)
+    assert Dossier.objects.get(ds_id="DOSS-2").ds_data.raw_data == ds_dossiers[1]
+    demarche.refresh_from_db()
+    assert demarche.sync_cursor == "old-cursor"
+
+
+@pytest.mark.django_db
+@override_settings(DS_SYNC_BULK_PAGE_INGESTION=True)
+def test_save_demarche_dossiers_from_ds_in_bulk_falls_back_to_one_dossier_at_a_time():
+    demarche_number = 123
+    DemarcheFactory(
+        ds_number=demarche_number,
+        updated_since="2025-01-01T00:00:00+00:00",
+        raw_ds_data={"groupeInstructeurs": [{"id": "GROUPE-1", "instructeurs": []}]},
+    )
+    ds_dossiers = [_ds_dossier("DOSS-1", 20240001), _ds_dossier("DOSS-2", 20240002)]
+
+    with patch(
+        "gsl_demarches_simplifiees.ds_client.DsClient.fetch_demarche_page",
+        return_value=(_make_demarche_page(dossiers=ds_dossiers), False),
+    ):
+        with patch(
+            "gsl_demarches_simplifiees.importer.dossier._get_handled_departement_insee_codes",
+            return_value=["75"],
+        ):
+            with patch(
+                "gsl_demarches_simplifiees.importer.dossier._save_dossiers_page_in_bulk",
+                side_effect=Exception("boom"),
+            ):
+                with patch(
+                    "gsl_demarches_simplifiees.importer.dossier._create_or_update_dossier_from_ds_data"
+                ) as mock_one_by_one:
+                    save_demarche_dossiers_from_ds(demarche_number)
+
+    assert mock_one_by_one.call_count == 2
+
+
+# tests empreinte du raw_data
+
+
+@pytest.mark.django_db
+def test_save_demarche_dossiers_from_ds_skips_unchanged_raw_data(caplog):
+    caplog.set_level(logging.INFO)
+    demarche_number = 123
+    demarche = DemarcheFactory(
+        ds_number=demarche_number,
+        updated_since="2025-01-01T00:00:00+00:00",
+        raw_ds_data={"groupeInstructeurs": [{"id": "GROUPE-1", "instructeurs": []}]},
+    )
+    unchanged_payload = _ds_dossier("DOSS-1", 20240001)
+    unchanged = DossierFactory(ds_id="DOSS-1", ds_number=20240001, ds_demarche=demarche)
+    unchanged_data = DossierDataFactory(dossier=unchanged)
+    unchanged_data.set_raw_data(unchanged_payload)
+    unchanged_data.save()
+
+    ds_dossiers = [unchanged_payload, _ds_dossier("DOSS-2", 20240002)]
+
+    with patch(
+        "gsl_demarches_simplifiees.ds_client.DsClient.fetch_demarche_page",
+        return_value=(_make_demarche_page(dossiers=ds_dossiers), False),
+    ):
+        with patch(
+            "gsl_demarches_simplifiees.importer.dossier._get_handled_departement_insee_codes",
+            return_value=["75"],
+        ):
+            with patch(
+                "gsl_demarches_simplifiees.tasks.task_refresh_dossier_from_saved_data.apply_async"
+            ) as mock_refresh:
+                save_demarche_dossiers_from_ds(demarche_number)
+
+    mock_refresh.assert_called_once_with((20240002,), priority=9)
+    new_dossier = Dossier.objects.get(ds_id="DOSS-2")
+    assert new_dossier.ds_data.raw_data == ds_dossiers[1]
+    assert new_dossier.ds_data.raw_data_hash == DossierData.compute_raw_data_hash(
+        ds_dossiers[1]
+    )
+    record = next(
+        r
+        for r in caplog.records
+        if r.message == "Demarche dossiers has been updated from DN"
+    )
+    assert record.raw_data_written_count == 1
+    assert record.raw_data_skipped_count == 1
+
+
+@pytest.mark.django_db
+@override_settings(DS_SYNC_BULK_PAGE_INGESTION=True)
+def test_save_demarche_dossiers_from_ds_in_bulk_skips_unchanged_raw_data():
+    demarche_number = 123
+    demarche = DemarcheFactory(
+        ds_number=demarche_number,
+        updated_since="2025-01-01T00:00:00+00:00",
+        raw_ds_data={"groupeInstructeurs": [{"id": "GROUPE-1", "instructeurs": []}]},
+    )
+    unchanged_payload = _ds_dossier("DOSS-1", 20240001)
+    unchanged = DossierFactory(ds_id="DOSS-1", ds_number=20240001, ds_demarche=demarche)
+    unchanged_data = DossierDataFactory(dossier=unchanged)
+    unchanged_data.set_raw_data(unchanged_payload)
+    unchanged_data.save()
+
+    ds_dossiers = [unchanged_payload, _ds_dossier("DOSS-2", 20240002)]
+
+    with patch(
+        "gsl_demarches_simplifiees.ds_client.DsClient.fetch_demarche_page",
+        return_value=(_make_demarche_page(dossiers=ds_dossiers), False),
+    ):
+        with patch(
+            "gsl_demarches_simplifiees.importer.dossier._get_handled_departement_insee_codes",
+            return_value=["75"],
+        ):
+            with patch(
+                "gsl_demarches_simplifiees.tasks.task_refresh_dossiers_from_saved_data.apply_async"
+            ) as mock_refresh:
+                save_demarche_dossiers_from_ds(demarche_number)
+
+    mock_refresh.assert_called_once_with(([20240002],), priority=9)
+    assert Dossier.objects.get(ds_id="DOSS-2").ds_data.raw_data == ds_dossiers[1]
+
+
+# tests récupération anticipée de la page suivante (DS_SYNC_PIPELINED_FETCH)
+
+
+@pytest.mark.django_db
+@override_settings(DS_SYNC_PIPELINED_FETCH=True)
+def test_save_demarche_dossiers_from_ds_pipelined_fetches_next_page_while_persisting():
+    demarche_number = 123
+    demarche = DemarcheFactory(
+        ds_number=demarche_number,
+        sync_cursor="",
+        updated_since="2025-01-01T00:00:00+00:00",
+        raw_ds_data={"groupeInstructeurs": [{"id": "GROUPE-1", "instructeurs": []}]},
+    )
+    dossier_to_delete = DossierFactory(ds_number=20249999, is_active=True)
+
+    page1 = _make_demarche_page(
+        dossiers=[_ds_dossier("DOSS-1", 20240001)],
+        deleted=[{"number": 20249999}],
+        end_cursor="dossiers-cursor-1",
+        has_more_dossiers=True,
+        pending_cursor="pending-cursor-final",
+        deleted_cursor="deleted-cursor-final",
+    )
+    page2 = _make_demarche_page(
+        dossiers=[_ds_dossier("DOSS-2", 20240002)],
+        end_cursor="dossiers-cursor-2",
+    )
+    page2_requested = threading.Event()
+
+    def _fetch(*args, **kwargs):
+        if kwargs["dossiers_after"] is None:
+            return page1, False
+        page2_requested.set()
+        return page2, False
+
+    cursors_while_persisting = {}
+
+    def _save_dossier(dossier_data, *args, **kwargs):
+        if dossier_data["id"] == "DOSS-1":
+            cursors_while_persisting["page2_requested"] = page2_requested.wait(5)
+            demarche.refresh_from_db()
+            cursors_while_persisting["sync_cursor"] = demarche.sync_cursor
+
+    with patch(
+        "gsl_demarches_simplifiees.ds_client.DsClient.fetch_demarche_page",
+        side_effect=_fetch,
+    ) as mock_fetch:
+        with patch(
+            "gsl_demarches_simplifiees.importer.dossier._create_or_update_dossier_from_ds_data",
+            side_effect=_save_dossier,
+        ):
+            save_demarche_dossiers_from_ds(demarche_number)
+
+    # La page 2 est demandée pendant l'enregistrement de la page 1, mais le
+    # curseur de la page 1 n'est pas encore sauvegardé à ce moment-là.
+    assert cursors_while_persisting == {"page2_requested": True, "sync_cursor": ""}
+    assert mock_fetch.call_count == 2
+    second_call_kwargs = mock_fetch.call_args_list[1][1]
+    assert second_call_kwargs["dossiers_after"] == "dossiers-cursor-1"
+    assert second_call_kwargs["include_dossiers"] is True
+    assert second_call_kwargs["include_pending_deleted"] is False
+    assert second_call_kwargs["include_deleted"] is False
+
+    dossier_to_delete.refresh_from_db()
+    assert dossier_to_delete.is_active is False
+    demarche.refresh_from_db()
+    assert demarche.sync_cursor == "dossiers-cursor-2"
+    assert demarche.pending_deleted_cursor == "pending-cursor-final"
+    assert demarche.deleted_cursor == "deleted-cursor-final"
+
+
+@pytest.mark.django_db
+@override_settings(DS_SYNC_PIPELINED_FETCH=True)
+def test_save_demarche_dossiers_from_ds_pipelined_keeps_cursor_on_page_error():
+    demarche_number = 123
+    initial_cursor = "old-cursor"
+    demarche = DemarcheFactory(
+        ds_number=demarche_number,
+        sync_cursor=initial_cursor,
+        updated_since="2025-01-01T00:00:00+00:00",
+        raw_ds_data={"groupeInstructeurs": [{"id": "GROUPE-1", "instructeurs": []}]},
+    )
+    page1 = _make_demarche_page(
+        dossiers=[{"id": "DOSS-BAD", "number": 99999, "champs": []}],
+        end_cursor="cursor-1",
+        has_more_dossiers=True,
+    )
+    page2 = _make_demarche_page(end_cursor="cursor-2")
+
+    with patch(
+        "gsl_demarches_simplifiees.ds_client.DsClient.fetch_demarche_page",
+        side_effect=[(page1, False), (page2, False)],
+    ) as mock_fetch:
+        with patch(
+            "gsl_demarches_simplifiees.importer.dossier._create_or_update_dossier_from_ds_data",
+            side_effect=Exception("boom"),
+        ):
+            save_demarche_dossiers_from_ds(demarche_number)
+
+    assert mock_fetch.call_count == 2
+    demarche.refresh_from_db()
+    assert demarche.sync_cursor == initial_cursor
+
+
+def test_page_fetcher_waits_for_unused_prefetch_before_fetching():
+    client = DsClient()
+    calls = []
+    prefetch_started = threading.Event()
+    release_prefetch = threading.Event()
+
+    def _fetch(*args, dossiers_after, **kwargs):
+        if dossiers_after == "cursor-1":
+            prefetch_started.set()
+            release_prefetch.wait(5)
+            client.last_response_size = 1000
+        else:
+            client.last_response_size = 10
+        calls.append(dossiers_after)
+        return _make_demarche_page(end_cursor="cursor-1", has_more_dossiers=True), False
+
+    def _request(dossiers_after):
+        return PageRequest(
+            dossiers_after=dossiers_after,
+            pending_deleted_after=None,
+            deleted_after=None,
+            include_dossiers=True,
+            include_pending_deleted=False,
+            include_deleted=False,
+        )
+
+    with (
+        patch.object(client, "fetch_demarche_page", side_effect=_fetch),
+        ThreadPoolExecutor(max_workers=1) as executor,
+    ):
+        fetcher = DemarchePageFetcher(client, 123, None, prefetch_executor=executor)
+        fetcher.fetch(_request(None))
+        assert prefetch_started.wait(5)
+        threading.Timer(0.05, release_prefetch.set).start()
+        # La boucle demande une autre page que celle anticipée
+        fetcher.fetch(_request("other-cursor"))
+
+    # La requête réelle part une fois la page anticipée terminée, et seules
+    # les pages utilisées sont comptées.
+    assert calls[:3] == [None, "cursor-1", "other-cursor"]
+    assert fetcher.response_size == 20
+
+
+# tests taille de page adaptative
+
+
+@pytest.mark.django_db
+@override_settings(DS_SYNC_PAGE_SIZE_INITIAL=50, DS_SYNC_PAGE_SIZE_MIN=10)
+def test_save_demarche_dossiers_from_ds_retries_same_page_with_smaller_size_on_timeout():
+    demarche_number = 123
+    demarche = DemarcheFactory(
+        ds_number=demarche_number,
+        sync_cursor="old-cursor",
+        updated_since="2025-01-01T00:00:00+00:00",
+        raw_ds_data={"groupeInstructeurs": [{"id": "GROUPE-1", "instructeurs": []}]},
+    )
+    page = _make_demarche_page(end_cursor="new-cursor")
+
+    with patch(
+        "gsl_demarches_simplifiees.ds_client.DsClient.fetch_demarche_page",
+        side_effect=[requests.exceptions.ReadTimeout("timeout"), (page, False)],
+    ) as mock_fetch:
+        save_demarche_dossiers_from_ds(demarche_number)
+
+    assert mock_fetch.call_count == 2
+    first_call, second_call = mock_fetch.call_args_list
+    assert first_call.kwargs["page_size"] == 50
+    assert second_call.kwargs["page_size"] == 25
+    assert first_call.kwargs["dossiers_after"] == "old-cursor"
+    assert second_call.kwargs["dossiers_after"] == "old-cursor"
+    demarche.refresh_from_db()
+    assert demarche.sync_cursor == "new-cursor"
+
+
+@pytest.mark.django_db
+@override_settings(DS_SYNC_PAGE_SIZE_INITIAL=20, DS_SYNC_PAGE_SIZE_MIN=10)
+def test_save_demarche_dossiers_from_ds_gives_up_at_minimum_page_size():
+    demarche_number = 123
+    demarche = DemarcheFactory(
+        ds_number=demarche_number,
+        sync_cursor="old-cursor",
+        updated_since="2025-01-01T00:00:00+00:00",
+        raw_ds_data={"groupeInstructeurs": [{"id": "GROUPE-1", "instructeurs": []}]},
+    )
+
+    with patch(
+        "gsl_demarches_simplifiees.ds_client.DsClient.fetch_demarche_page",
+        side_effect=DsConnectionError(),
+    ) as mock_fetch:
+        with pytest.raises(DsConnectionError):
+            save_demarche_dossiers_from_ds(demarche_number)
+
+    assert [c.kwargs["page_size"] for c in mock_fetch.call_args_list] == [20, 10]
+    demarche.refresh_from_db()
+    assert demarche.sync_cursor == "old-cursor"
+
+
+# tests profils de sync (DS_SYNC_PROFILE)
+
+
+def _reduced_dossier(ds_id, number, date_derniere_modification):
+    return {
+        "id": ds_id,
+        "number": number,
+        "dateDerniereModification": date_derniere_modification,
+    }
+
+
+@pytest.mark.django_db
+@override_settings(DS_SYNC_PROFILE="state-only", DS_SYNC_BULK_PAGE_INGESTION=True)
+def test_save_demarche_dossiers_from_ds_escalates_only_moved_dossiers():
+    demarche_number = 123
+    demarche = DemarcheFactory(
+        ds_number=demarche_number,
+        updated_since="2025-01-01T00:00:00+00:00",
+        raw_ds_data={"groupeInstructeurs": [{"id": "GROUPE-1", "instructeurs": []}]},
+    )
+    for ds_id, number in (("DOSS-1", 20240001), ("DOSS-3", 20240003)):
+        DossierDataFactory(
+            dossier=DossierFactory(
+                ds_id=ds_id,
+                ds_number=number,
+                ds_demarche=demarche,
+                ds_date_derniere_modification="2025-02-01T00:00:00+00:00",
+            ),
+            raw_data={"some_field": "some_value"},
+        )
+    page = _make_demarche_page(
+        dossiers=[
+            _reduced_dossier("DOSS-1", 20240001, "2025-02-01T00:00:00+00:00"),
+            _reduced_dossier("DOSS-2", 20240002, "2025-01-15T00:00:00+00:00"),
+            _reduced_dossier("DOSS-3", 20240003, "2025-03-01T00:00:00+01:00"),
+        ],
+        end_cursor="c1",
+    )
+    full_dossiers = {
+        20240002: _ds_dossier("DOSS-2", 20240002),
+        20240003: _ds_dossier("DOSS-3", 20240003),
+    }
+
+    with (
+        patch(
+            "gsl_demarches_simplifiees.ds_client.DsClient.fetch_demarche_page",
+            return_value=(page, False),
+        ) as mock_fetch,
+        patch(
+            "gsl_demarches_simplifiees.ds_client.DsClient.get_dossiers",
+            return_value=full_dossiers,
+        ) as mock_get_dossiers,
+        patch(
+            "gsl_demarches_simplifiees.importer.dossier._get_handled_departement_insee_codes",
+            return_value=["75"],
+        ),
+        patch(
+            "gsl_demarches_simplifiees.tasks.task_refresh_dossiers_from_saved_data.apply_async"
+        ) as mock_refresh,
+    ):
+        save_demarche_dossiers_from_ds(demarche_number)
+
+    assert mock_fetch.call_args.kwargs["profile"].name == "state-only"
+    mock_get_dossiers.assert_called_once_with([20240002, 20240003])
+    mock_refresh.assert_called_once_with(([20240002, 20240003],), priority=9)
+    assert Dossier.objects.get(ds_id="DOSS-1").ds_data.raw_data == {
+        "some_field": "some_value"
+    }
+    demarche.refresh_from_db()
+    assert demarche.sync_cursor == "c1"
+
+
+@pytest.mark.django_db
+@override_settings(DS_SYNC_PROFILE="instruction")
+def test_save_demarche_dossiers_from_ds_keeps_cursor_when_escalation_is_incomplete():
+    demarche_number = 123
+    demarche = DemarcheFactory(
+        ds_number=demarche_number,
+        sync_cursor="old-cursor",
+        updated_since="2025-01-01T00:00:00+00:00",
+        raw_ds_data={"groupeInstructeurs": [{"id": "GROUPE-1", "instructeurs": []}]},
+    )
+    page = _make_demarche_page(
+        dossiers=[_reduced_dossier("DOSS-1", 20240001, "2025-02-01T00:00:00+00:00")],
+        end_cursor="new-cursor",
+    )
+
+    with (
+        patch(
+            "gsl_demarches_simplifiees.ds_client.DsClient.fetch_demarche_page",
+            return_value=(page, False),
+        ),
+        patch(
+            "gsl_demarches_simplifiees.ds_client.DsClient.get_dossiers",
+            return_value={},
+        ),
+        patch(
+            "gsl_demarches_simplifiees.importer.dossier._create_or_update_dossier_from_ds_data"
+        ) as mock_save,
+    ):
+        save_demarche_dossiers_from_ds(demarche_number)
+
+    mock_save.assert_not_called()
+    demarche.refresh_from_db()
+    assert demarche.sync_cursor == "old-cursor"
+
+
+@pytest.mark.django_db
+@override_settings(DS_SYNC_PROFILE="instruction", DS_SYNC_ESCALATION_BATCH_SIZE=1)
+def test_save_demarche_dossiers_from_ds_keeps_cursor_when_escalation_request_fails():
+    demarche_number = 123
+    demarche = DemarcheFactory(
+        ds_number=demarche_number,
+        sync_cursor="old-cursor",
+        updated_since="2025-01-01T00:00:00+00:00",
+        raw_ds_data={"groupeInstructeurs": [{"id": "GROUPE-1", "instructeurs": []}]},
+    )
+    page = _make_demarche_page(
+        dossiers=[
+            _reduced_dossier("DOSS-1", 20240001, "2025-02-01T00:00:00+00:00"),
+            _reduced_dossier("DOSS-2", 20240002, "2025-02-01T00:00:00+00:00"),
+        ],
+        end_cursor="new-cursor",
+    )
+    full_dossier = _ds_dossier("DOSS-2", 20240002)
+
+    with (
+        patch(
+            "gsl_demarches_simplifiees.ds_client.DsClient.fetch_demarche_page",
+            return_value=(page, False),
+        ),
+        patch(
+            "gsl_demarches_simplifiees.ds_client.DsClient.get_dossiers",
+            side_effect=[DsConnectionError(), {20240002: full_dossier}],
+        ),
+        patch(
+            "gsl_demarches_simplifiees.importer.dossier._create_or_update_dossier_from_ds_data"
+        ) as mock_save,
+    ):
+        save_demarche_dossiers_from_ds(demarche_number)
+
+    # Le lot en échec n'empêche pas d'enregistrer les autres dossiers
+    assert [c.args[0]["id"] for c in mock_save.call_args_list] == ["DOSS-2"]
+    demarche.refresh_from_db()
+    assert demarche.sync_cursor == "old-cursor"
+
+
+# tests rafraîchissement par lot depuis les données enregistrées
+
+
+@pytest.mark.django_db
+def test_refresh_dossiers_from_saved_data_refreshes_the_whole_batch():
+    with open(
+        Path(__file__).parent / ".." / "ds_fixtures" / "dossier_data.json"
+    ) as handle:
+        raw_data = json.load(handle)
+    demarche = DemarcheFactory()
+    dossiers = [DossierFactory(ds_demarche=demarche, ds_state="") for _ in range(3)]
+    for dossier in dossiers:
+        DossierData.objects.create(dossier=dossier, raw_data=raw_data)
+
+    with patch(
+        "gsl_demarches_simplifiees.importer.dossier_converter.get_perimetre_from_dossier",
+        return_value=PerimetreDepartementalFactory(),
+    ):
+        stats = refresh_dossiers_from_saved_data([d.ds_number for d in dossiers])
+
+    assert stats == {"refreshed": 3}
+    for dossier in dossiers:
+        dossier.refresh_from_db()
+        assert dossier.ds_state == raw_data["state"]
+        assert Projet.objects.filter(dossier_ds=dossier).exists()
@@ -11,6 +11,7 @@ from gsl_core.tests.factories import DepartementFactory
 from gsl_demarches_simplifiees.importer.demarche import (
     _get_departement_from_field_mapping,
     _save_categorie_detr_from_field,
+    compute_descriptors_hash,
     save_categories_dsil,
     save_demarche_from_ds,
     save_field_mappings,
@@ -22,6 +23,7 @@ from gsl_demarches_simplifiees.models import (
     CategorieDsil,
     Demarche,
     FieldMapping,
+    GroupeInstructeur,
     Profile,
 )
 from gsl_demarches_simplifiees.tests.factories import (
@@ -213,6 +215,45 @@ def test_save_groupe_instructeurs_updates_email_if_changed(
     assert Profile.objects.count() == 2
 
 
+def test_save_groupe_instructeurs_syncs_groupes_and_memberships(demarche):
+    demarche_data = {
+        "groupeInstructeurs": [
+            {
+                "id": "GROUPE-1",
+                "number": 1,
+                "label": "Bas-Rhin",
+                "instructeurs": [
+                    {"id": "A-1", "email": "a@example.com"},
+                    {"id": "B-2", "email": "b@example.com"},
+                ],
+            },
+            {"id": "GROUPE-2", "number": 2, "label": "Haut-Rhin", "instructeurs": []},
+        ]
+    }
+    save_groupe_instructeurs(demarche_data, demarche)
+
+    demarche_data["groupeInstructeurs"] = [
+        {
+            "id": "GROUPE-1",
+            "number": 1,
+            "label": "Bas-Rhin (67)",
+            "instructeurs": [
+                {"id": "B-2", "email": "b@example.com"},
+                {"id": "C-3", "email": "c@example.com"},
+            ],
+        }
+    ]
+    save_groupe_instructeurs(demarche_data, demarche)
+
+    groupe = GroupeInstructeur.objects.get(demarche=demarche)
+    assert (groupe.ds_id, groupe.ds_number, groupe.label) == (
+        "GROUPE-1",
+        1,
+        "Bas-Rhin (67)",
+    )
+    assert set(groupe.instructeurs.values_list("ds_id", flat=True)) == {"B-2", "C-3"}
+
+
 def test_computer_mappings_are_created(demarche, demarche_data_without_dossier):
     assert FieldMapping.objects.count() == 0
 
@@ -1061,3 +1102,55 @@ def test_save_categorie_detr_with_some_categories_with_children_and_some_without
     assert categories[3].label == "Catégorie D"
     assert categories[3].rank == 6
     assert categories[3].parent_label == "Parent 4"
+
+
+@patch("gsl_demarches_simplifiees.importer.demarche.save_categories_detr")
+def test_save_demarche_from_ds_skips_mappings_when_descriptors_are_unchanged(
+    _save_categories_detr, demarche_data_without_dossier
+):
+    with patch(
+        "gsl_demarches_simplifiees.ds_client.DsClient.get_demarche",
+        return_value={"data": {"demarche": demarche_data_without_dossier}},
+    ):
+        save_demarche_from_ds(131016)
+        demarche = Demarche.objects.get(ds_number=131016)
+        assert demarche.descriptors_hash == compute_descriptors_hash(
+            demarche_data_without_dossier
+        )
+
+        with patch(
+            "gsl_demarches_simplifiees.importer.demarche.save_field_mappings"
+        ) as save_field_mappings_mock:
+            save_demarche_from_ds(131016)
+        save_field_mappings_mock.assert_not_called()
+
+        demarche_data_without_dossier["activeRevision"]["champDescriptors"][0][
+            "label"
+        ] += " (modifié)"
+        with patch(
+            "gsl_demarches_simplifiees.importer.demarche.save_field_mappings"
+        ) as save_field_mappings_mock:
+            save_demarche_from_ds(131016)
+        save_field_mappings_mock.assert_called_once()
+
+
+def test_save_field_mappings_writes_the_diff_in_bulk(
+    demarche, demarche_data_without_dossier, django_assert_max_num_queries
+):
+    save_field_mappings(demarche_data_without_dossier, demarche)
+    descriptors = demarche_data_without_dossier["activeRevision"]["champDescriptors"]
+    removed = next(d for d in descriptors if d["__typename"] == "TextChampDescriptor")
+    descriptors.remove(removed)
+    renamed = next(d for d in descriptors if d["__typename"] == "TextChampDescriptor")
+    renamed["label"] = "Nouveau libellé"
+
+    # lecture + création + mise à jour + désactivation, quel que soit le nombre
+    # de descripteurs
+    with django_assert_max_num_queries(4):
+        save_field_mappings(demarche_data_without_dossier, demarche)
+
+    assert not FieldMapping.objects.get(ds_field_id=removed["id"]).is_active
+    assert (
+        FieldMapping.objects.get(ds_field_id=renamed["id"]).ds_field_label
+        == "Nouveau libellé"
+    )
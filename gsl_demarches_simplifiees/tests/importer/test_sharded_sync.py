@@ -0,0 +1,295 @@
+from datetime import UTC, datetime, timedelta
+from unittest.mock import MagicMock, patch
+
+import pytest
+from django.test import override_settings
+from django.utils import timezone
+
+from gsl_demarches_simplifiees.exceptions import DsServiceException
+from gsl_demarches_simplifiees.importer.sharded_sync import (
+    has_active_sync_shards,
+    redispatch_stale_sync_shards,
+    split_sync_window,
+    start_sharded_demarche_sync,
+    sync_demarche_shard,
+)
+from gsl_demarches_simplifiees.models import DemarcheSyncShard, Dossier
+from gsl_demarches_simplifiees.tests.factories import DemarcheFactory, DossierFactory
+
+pytestmark = pytest.mark.django_db
+
+WINDOW_START = datetime(2025, 1, 1, tzinfo=UTC)
+WINDOW_END = datetime(2025, 2, 1, tzinfo=UTC)
+
+
+def _page(nodes, end_cursor=None, has_next_page=False):
+    return {
+        "nodes": nodes,
+        "pageInfo": {"hasNextPage": has_next_page, "endCursor": end_cursor},
+    }
+
+
+def _demarche_page(dossiers=None, pending_deleted=None, deleted=None):
+    return {
+        "dossiers": dossiers or _page([]),
+        "pendingDeletedDossiers": pending_deleted or _page([]),
+        "deletedDossiers": deleted or _page([]),
+    }
+
+
+def _ds_dossier(ds_id, number, date_derniere_modification):
+    return {
+        "id": ds_id,
+        "number": number,
+        "dateDerniereModification": date_derniere_modification,
+    }
+
+
+@pytest.fixture
+def demarche():
+    return DemarcheFactory(
+        sync_cursor="old-cursor",
+        raw_ds_data={"groupeInstructeurs": [{"id": "GROUPE-1", "instructeurs": []}]},
+    )
+
+
+def _shard(demarche, **kwargs):
+    return DemarcheSyncShard.objects.create(
+        demarche=demarche,
+        window_start=WINDOW_START,
+        sync_started_at=WINDOW_END,
+        **kwargs,
+    )
+
+
+def test_split_sync_window_in_windows_of_equal_duration():
+    windows = split_sync_window(WINDOW_START, WINDOW_START + timedelta(days=3), 3)
+
+    assert windows == [
+        (WINDOW_START, WINDOW_START + timedelta(days=1)),
+        (WINDOW_START + timedelta(days=1), WINDOW_START + timedelta(days=2)),
+        (WINDOW_START + timedelta(days=2), None),
+    ]
+
+
+def test_split_sync_window_keeps_a_single_open_window_for_one_shard():
+    assert split_sync_window(WINDOW_START, WINDOW_END, 1) == [(WINDOW_START, None)]
+
+
+def test_start_sharded_demarche_sync_dispatches_one_task_per_shard(
+    demarche, django_capture_on_commit_callbacks
+):
+    with patch(
+        "gsl_demarches_simplifiees.tasks.task_sync_demarche_shard.apply_async"
+    ) as mock_apply_async:
+        with django_capture_on_commit_callbacks(execute=True):
+            shards = start_sharded_demarche_sync(demarche, WINDOW_START, 3)
+
+    assert [shard.kind for shard in shards] == [
+        DemarcheSyncShard.KIND_DOSSIERS,
+        DemarcheSyncShard.KIND_DOSSIERS,
+        DemarcheSyncShard.KIND_DOSSIERS,
+        DemarcheSyncShard.KIND_DELETIONS,
+    ]
+    assert shards[2].window_end is None
+    assert mock_apply_async.call_count == 4
+    assert has_active_sync_shards(demarche.ds_number)
+
+
+def test_dossiers_shard_stops_at_the_end_of_its_window(demarche):
+    shard = _shard(demarche, window_end=WINDOW_END)
+    first_page = _page(
+        [_ds_dossier("DOSS-1", 20240001, "2025-01-10T00:00:00+00:00")],
+        end_cursor="c1",
+        has_next_page=True,
+    )
+    second_page = _page(
+        [
+            _ds_dossier("DOSS-2", 20240002, "2025-01-20T00:00:00+00:00"),
+            _ds_dossier("DOSS-3", 20240003, "2025-02-01T00:00:00+00:00"),
+        ],
+        end_cursor="c2",
+        has_next_page=True,
+    )
+
+    with (
+        patch(
+            "gsl_demarches_simplifiees.ds_client.DsClient.fetch_demarche_page",
+            side_effect=[
+                (_demarche_page(dossiers=first_page), False),
+                (_demarche_page(dossiers=second_page), False),
+            ],
+        ) as mock_fetch,
+        patch(
+            "gsl_demarches_simplifiees.importer.dossier._create_or_update_dossier_from_ds_data"
+        ) as mock_save,
+    ):
+        sync_demarche_shard(shard)
+
+    assert mock_fetch.call_count == 2
+    assert mock_fetch.call_args_list[0].kwargs["updated_since"] == WINDOW_START
+    assert mock_fetch.call_args_list[0].kwargs["include_deleted"] is False
+    assert mock_fetch.call_args_list[1].kwargs["dossiers_after"] == "c1"
+    assert [call.args[0]["id"] for call in mock_save.call_args_list] == [
+        "DOSS-1",
+        "DOSS-2",
+    ]
+    shard.refresh_from_db()
+    assert shard.status == DemarcheSyncShard.STATUS_DONE
+    assert shard.sync_cursor == "c2"
+    assert shard.dossiers_count == 2
+    assert shard.attempts == 1
+
+
+def test_last_finished_shard_resumes_the_incremental_sync(demarche):
+    _shard(demarche, window_end=WINDOW_START, status=DemarcheSyncShard.STATUS_DONE)
+    shard = _shard(demarche)
+
+    with patch(
+        "gsl_demarches_simplifiees.ds_client.DsClient.fetch_demarche_page",
+        return_value=(_demarche_page(), False),
+    ):
+        sync_demarche_shard(shard)
+
+    demarche.refresh_from_db()
+    assert demarche.updated_since == WINDOW_END
+    assert demarche.last_synced_at == WINDOW_END
+    assert demarche.sync_cursor == ""
+    assert not has_active_sync_shards(demarche.ds_number)
+
+
+def test_shard_with_page_errors_keeps_its_last_clean_cursor_for_its_retry(demarche):
+    other_shard = _shard(demarche, window_end=WINDOW_START)
+    shard = _shard(demarche, sync_cursor="c0")
+    pages = [
+        (_demarche_page(dossiers=_page([], "c1", True)), False),
+        (_demarche_page(dossiers=_page([], "c2", True)), True),
+        (_demarche_page(dossiers=_page([], "c3", False)), False),
+    ]
+
+    with patch(
+        "gsl_demarches_simplifiees.ds_client.DsClient.fetch_demarche_page",
+        side_effect=pages,
+    ) as mock_fetch:
+        with pytest.raises(DsServiceException):
+            sync_demarche_shard(shard)
+
+    assert [c.kwargs["dossiers_after"] for c in mock_fetch.call_args_list] == [
+        "c0",
+        "c1",
+        "c2",
+    ]
+    shard.refresh_from_db()
+    assert shard.status == DemarcheSyncShard.STATUS_PENDING
+    assert shard.sync_cursor == "c1"
+    assert has_active_sync_shards(demarche.ds_number)
+    other_shard.refresh_from_db()
+    assert other_shard.status == DemarcheSyncShard.STATUS_PENDING
+    demarche.refresh_from_db()
+    assert demarche.sync_cursor == "old-cursor"
+
+
+@override_settings(DS_INIT_SYNC_SHARD_MAX_RETRIES=3)
+def test_shard_out_of_retries_releases_the_incremental_sync(demarche):
+    _shard(demarche, window_end=WINDOW_START, status=DemarcheSyncShard.STATUS_DONE)
+    failing_start = WINDOW_START + timedelta(days=3)
+    shard = DemarcheSyncShard.objects.create(
+        demarche=demarche,
+        window_start=failing_start,
+        sync_started_at=WINDOW_END,
+        attempts=2,
+    )
+
+    with patch(
+        "gsl_demarches_simplifiees.ds_client.DsClient.fetch_demarche_page",
+        return_value=(_demarche_page(), True),
+    ):
+        with pytest.raises(DsServiceException):
+            sync_demarche_shard(shard)
+
+    shard.refresh_from_db()
+    assert shard.status == DemarcheSyncShard.STATUS_FAILED
+    assert shard.retries_exhausted
+    assert not has_active_sync_shards(demarche.ds_number)
+    # La sync incrémentale reprend la fenêtre du lot en échec
+    demarche.refresh_from_db()
+    assert demarche.updated_since == failing_start
+    assert demarche.sync_cursor == ""
+
+
+def test_finished_run_ignores_shards_of_a_previous_run(demarche):
+    DemarcheSyncShard.objects.create(
+        demarche=demarche,
+        window_start=WINDOW_START - timedelta(days=365),
+        sync_started_at=WINDOW_START,
+        status=DemarcheSyncShard.STATUS_FAILED,
+    )
+    shard = _shard(demarche)
+
+    with patch(
+        "gsl_demarches_simplifiees.ds_client.DsClient.fetch_demarche_page",
+        return_value=(_demarche_page(), False),
+    ):
+        sync_demarche_shard(shard)
+
+    demarche.refresh_from_db()
+    assert demarche.updated_since == WINDOW_END
+
+
+def test_shard_heartbeat_called_after_each_page(demarche):
+    shard = _shard(demarche)
+    heartbeat = MagicMock()
+    pages = [
+        (_demarche_page(dossiers=_page([], "c1", True)), False),
+        (_demarche_page(dossiers=_page([], "c2", False)), False),
+    ]
+
+    with patch(
+        "gsl_demarches_simplifiees.ds_client.DsClient.fetch_demarche_page",
+        side_effect=pages,
+    ):
+        sync_demarche_shard(shard, heartbeat=heartbeat)
+
+    assert heartbeat.call_count == 2
+
+
+@override_settings(DS_INIT_SYNC_SHARD_STALE_AFTER=600)
+def test_redispatch_stale_running_shards(demarche):
+    stale = _shard(demarche, status=DemarcheSyncShard.STATUS_RUNNING)
+    _shard(demarche, status=DemarcheSyncShard.STATUS_RUNNING)  # battement récent
+    failed = _shard(demarche, status=DemarcheSyncShard.STATUS_FAILED)
+    DemarcheSyncShard.objects.filter(pk__in=[stale.pk, failed.pk]).update(
+        updated_at=timezone.now() - timedelta(minutes=11)
+    )
+
+    with patch(
+        "gsl_demarches_simplifiees.tasks.task_sync_demarche_shard.apply_async"
+    ) as mock_apply_async:
+        assert redispatch_stale_sync_shards() == [stale.pk]
+        # Le battement est renouvelé : pas de nouvel envoi au passage suivant
+        assert redispatch_stale_sync_shards() == []
+
+    mock_apply_async.assert_called_once()
+    assert mock_apply_async.call_args.args[0] == (stale.pk,)
+
+
+def test_deletions_shard_deactivates_deleted_dossiers(demarche):
+    dossier = DossierFactory(ds_number=20240001, ds_demarche=demarche)
+    shard = _shard(demarche, kind=DemarcheSyncShard.KIND_DELETIONS)
+    page = _demarche_page(
+        deleted=_page([{"id": "DOSS-1", "number": 20240001}], end_cursor="d1")
+    )
+
+    with patch(
+        "gsl_demarches_simplifiees.ds_client.DsClient.fetch_demarche_page",
+        return_value=(page, False),
+    ) as mock_fetch:
+        sync_demarche_shard(shard)
+
+    assert mock_fetch.call_args.kwargs["include_dossiers"] is False
+    dossier.refresh_from_db()
+    assert dossier.is_active is False
+    assert dossier.raison_desactivation == Dossier.RAISON_DESACTIVATION_SUPPRIME
+    shard.refresh_from_db()
+    assert shard.deleted_cursor == "d1"
+    assert shard.status == DemarcheSyncShard.STATUS_DONE
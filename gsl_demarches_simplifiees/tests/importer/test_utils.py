@@ -1,3 +1,5 @@
+from unittest import mock
+
 import pytest
 
 from gsl_core.models import Arrondissement, Departement
@@ -6,6 +8,10 @@ from gsl_core.tests.factories import (
     DepartementFactory,
     RegionFactory,
 )
+from gsl_demarches_simplifiees.importer.reference_cache import (
+    ReferenceCache,
+    invalidate_reference_cache,
+)
 from gsl_demarches_simplifiees.importer.utils import (
     get_arrondissement_from_value,
     get_categorie_detr_from_value,
@@ -287,3 +293,130 @@ def test_get_categorie_detr_from_value_does_not_log_when_existing(caplog):
         r for r in caplog.records if "CategorieDetr created" in r.message
     ]
     assert len(created_records) == 0
+
+
+# tests cache des données de référence
+
+
+@pytest.mark.django_db
+def test_reference_lookups_are_cached_until_invalidated(django_assert_num_queries):
+    region = RegionFactory()
+    dep_87 = DepartementFactory(region=region, insee_code="87", name="Haute-Vienne")
+
+    with django_assert_num_queries(1):
+        assert get_departement_from_value("87 - Haute-Vienne") == dep_87
+        assert (
+            get_departement_from_field_label(
+                "Catégories prioritaires (87 - Haute-Vienne)"
+            )
+            == dep_87
+        )
+
+    invalidate_reference_cache()
+
+    with django_assert_num_queries(1):
+        assert get_departement_from_value("87 - Haute-Vienne") == dep_87
+
+
+@pytest.mark.django_db
+def test_reference_cache_does_not_cache_missing_rows():
+    region = RegionFactory()
+    with pytest.raises(Departement.DoesNotExist):
+        get_departement_from_value("87 - Haute-Vienne")
+
+    dep_87 = DepartementFactory(region=region, insee_code="87", name="Haute-Vienne")
+
+    assert get_departement_from_value("87 - Haute-Vienne") == dep_87
+
+
+def test_reference_cache_expires_after_ttl(settings):
+    settings.DS_REFERENCE_CACHE_TTL = 60
+    cache = ReferenceCache()
+    loader = mock.Mock(side_effect=["first", "second"])
+
+    with mock.patch(
+        "gsl_demarches_simplifiees.importer.reference_cache.time.monotonic",
+        side_effect=[0, 0, 30, 61, 61],
+    ):
+        assert cache.get("table", "key", loader) == "first"
+        assert cache.get("table", "key", loader) == "first"
+        assert cache.get("table", "key", loader) == "second"
+
+    assert loader.call_count == 2
+
+
+@pytest.mark.django_db
+def test_reference_cache_caches_created_categorie_only_on_commit(
+    django_capture_on_commit_callbacks,
+):
+    demarche = DemarcheFactory(ds_number=131018)
+    departement = DepartementFactory(region=RegionFactory())
+
+    with django_capture_on_commit_callbacks(execute=False) as callbacks:
+        created = get_categorie_detr_from_value(
+            "Nouvelle catégorie", departement, demarche.ds_number
+        )
+    # Transaction annulée : la ligne créée n'existe plus
+    CategorieDetr.objects.filter(pk=created.pk).delete()
+
+    recreated = get_categorie_detr_from_value(
+        "Nouvelle catégorie", departement, demarche.ds_number
+    )
+    assert recreated.pk != created.pk
+    assert len(callbacks) == 1
+
+
+@pytest.mark.django_db
+def test_reference_cache_caches_created_categorie_once_committed(
+    django_capture_on_commit_callbacks, django_assert_num_queries
+):
+    demarche = DemarcheFactory(ds_number=131019)
+    departement = DepartementFactory(region=RegionFactory())
+
+    with django_capture_on_commit_callbacks(execute=True):
+        created = get_categorie_detr_from_value(
+            "Nouvelle catégorie", departement, demarche.ds_number
+        )
+
+    with django_assert_num_queries(0):
+        assert (
+            get_categorie_detr_from_value(
+                "Nouvelle catégorie", departement, demarche.ds_number
+            )
+            == created
+        )
+
+
+def test_reference_cache_reloads_when_another_worker_invalidates(settings):
+    settings.DS_REFERENCE_CACHE_REDIS_URL = "redis://localhost:6379"
+    cache = ReferenceCache()
+    loader = mock.Mock(side_effect=["first", "second"])
+
+    with mock.patch(
+        "gsl_demarches_simplifiees.importer.reference_cache.redis.Redis.from_url"
+    ) as mock_from_url:
+        mock_from_url.return_value.mget.return_value = [b"1"]
+        assert cache.get("table", "key", loader) == "first"
+        assert cache.get("table", "key", loader) == "first"
+        mock_from_url.return_value.mget.return_value = [b"2"]
+        assert cache.get("table", "key", loader) == "second"
+
+    assert loader.call_count == 2
+
+
+@pytest.mark.django_db
+def test_invalidate_reference_cache_bumps_shared_generation_on_commit(
+    settings, django_capture_on_commit_callbacks
+):
+    settings.DS_REFERENCE_CACHE_REDIS_URL = "redis://localhost:6379"
+
+    with mock.patch(
+        "gsl_demarches_simplifiees.importer.reference_cache.redis.Redis.from_url"
+    ) as mock_from_url:
+        with django_capture_on_commit_callbacks(execute=True):
+            invalidate_reference_cache()
+            mock_from_url.return_value.incr.assert_not_called()
+
+    mock_from_url.return_value.incr.assert_called_once_with(
+        "gsl:reference-cache:generation:reference"
+    )
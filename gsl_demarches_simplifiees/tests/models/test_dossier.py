@@ -1,7 +1,16 @@
+import json
+import zlib
+
 import pytest
+from django.test import override_settings
 
 from gsl_core.tests.factories import CollegueFactory
 from gsl_demarches_simplifiees.models import Dossier, DossierData
+from gsl_demarches_simplifiees.raw_data_archive import (
+    ZSTD_FRAME_MAGIC,
+    compress_raw_data,
+    decompress_raw_data,
+)
 from gsl_demarches_simplifiees.tests.factories import (
     DossierDataFactory,
     DossierFactory,
@@ -145,3 +154,65 @@ def test_is_instructeur_returns_false_for_user_without_ds_profile():
 
     assert user.ds_id == ""
     assert dossier.is_instructeur(user) is False
+
+
+def test_dossier_data_raw_data_hash_ignores_key_order():
+    assert DossierData.compute_raw_data_hash(
+        {"a": 1, "b": [{"c": "é", "d": None}]}
+    ) == DossierData.compute_raw_data_hash({"b": [{"d": None, "c": "é"}], "a": 1})
+    assert DossierData.compute_raw_data_hash(
+        {"a": 1}
+    ) != DossierData.compute_raw_data_hash({"a": 2})
+
+
+def test_dossier_data_set_raw_data_returns_false_when_unchanged():
+    dossier_data = DossierData()
+
+    assert dossier_data.set_raw_data({"number": 1}) is True
+    assert dossier_data.raw_data == {"number": 1}
+    assert dossier_data.set_raw_data({"number": 1}) is False
+    assert dossier_data.set_raw_data({"number": 2}) is True
+    assert dossier_data.raw_data == {"number": 2}
+
+
+@override_settings(DS_RAW_DATA_COLD_STORAGE=True)
+def test_dossier_data_cold_storage_keeps_converter_champs_and_archives_payload():
+    raw_data = {
+        "number": 1,
+        "state": "en_instruction",
+        "champs": [
+            {"id": "1", "__typename": "TextChamp", "stringValue": "Projet"},
+            {"id": "2", "__typename": "PieceJustificativeChamp", "files": [{}]},
+        ],
+        "annotations": [{"id": "3", "__typename": "RepetitionChamp", "rows": []}],
+    }
+    dossier_data = DossierDataFactory(dossier=DossierFactory())
+
+    assert dossier_data.set_raw_data(raw_data) is True
+    dossier_data.save()
+    dossier_data.refresh_from_db()
+
+    assert dossier_data.raw_data == {
+        "number": 1,
+        "state": "en_instruction",
+        "champs": [{"id": "1", "__typename": "TextChamp", "stringValue": "Projet"}],
+        "annotations": [],
+    }
+    assert dossier_data.get_raw_data() == raw_data
+    assert dossier_data.raw_data_hash == DossierData.compute_raw_data_hash(raw_data)
+    assert dossier_data.set_raw_data(raw_data) is False
+
+
+def test_raw_data_archive_is_zstd_and_legacy_zlib_archives_stay_readable():
+    raw_data = {"number": 1, "champs": [{"id": "1"}]}
+
+    assert compress_raw_data(raw_data).startswith(ZSTD_FRAME_MAGIC)
+    assert decompress_raw_data(compress_raw_data(raw_data)) == raw_data
+    legacy_archive = zlib.compress(json.dumps(raw_data).encode())
+    assert decompress_raw_data(legacy_archive) == raw_data
+
+
+def test_dossier_data_get_raw_data_without_archive():
+    dossier_data = DossierData(raw_data={"number": 1})
+
+    assert dossier_data.get_raw_data() == {"number": 1}
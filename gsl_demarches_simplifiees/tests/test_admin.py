@@ -2,6 +2,7 @@ from unittest import mock
 
 import pytest
 from django.contrib import admin
+from django.test import override_settings
 
 from gsl_demarches_simplifiees.admin import DossierAdmin
 from gsl_demarches_simplifiees.models import Dossier
@@ -15,30 +16,33 @@ def dossier_admin():
 
 @pytest.mark.django_db
 def test_refresh_from_db_small_queryset_uses_high_priority(dossier_admin, rf):
-    DossierFactory.create_batch(3)
+    dossiers = DossierFactory.create_batch(3)
     queryset = Dossier.objects.all()
 
     with mock.patch(
-        "gsl_demarches_simplifiees.admin.task_refresh_dossier_from_saved_data.apply_async"
+        "gsl_demarches_simplifiees.admin.task_refresh_dossiers_from_saved_data.apply_async"
     ) as mock_apply:
         dossier_admin.refresh_from_db(rf.get("/"), queryset)
 
-    assert mock_apply.call_count == 3
-    for call in mock_apply.call_args_list:
-        assert call.kwargs["priority"] == 0
+    mock_apply.assert_called_once()
+    assert sorted(mock_apply.call_args.args[0][0]) == sorted(
+        d.ds_number for d in dossiers
+    )
+    assert mock_apply.call_args.kwargs["priority"] == 0
 
 
 @pytest.mark.django_db
-def test_refresh_from_db_mass_queryset_uses_low_priority(dossier_admin, rf):
+@override_settings(DS_REFRESH_BATCH_SIZE=4)
+def test_refresh_from_db_mass_queryset_uses_low_priority_batches(dossier_admin, rf):
     DossierFactory.create_batch(10)
     queryset = Dossier.objects.all()
 
     with mock.patch(
-        "gsl_demarches_simplifiees.admin.task_refresh_dossier_from_saved_data.apply_async"
+        "gsl_demarches_simplifiees.admin.task_refresh_dossiers_from_saved_data.apply_async"
     ) as mock_apply:
         dossier_admin.refresh_from_db(rf.get("/"), queryset)
 
-    assert mock_apply.call_count == 10
+    assert [len(call.args[0][0]) for call in mock_apply.call_args_list] == [4, 4, 2]
     for call in mock_apply.call_args_list:
         assert call.kwargs["priority"] == 9
 
@@ -0,0 +1,75 @@
+import json
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+
+from gsl_demarches_simplifiees.management.commands.ds_benchmark_import import (
+    FIXTURE_DOSSIER,
+    add_benchmark_territory,
+)
+from gsl_demarches_simplifiees.models import Demarche, Dossier
+from gsl_demarches_simplifiees.tests.factories import (
+    DossierDataFactory,
+    DossierFactory,
+)
+
+
+@pytest.mark.django_db
+def test_ds_benchmark_import_synthetic_imports_then_rolls_back():
+    out = StringIO()
+
+    call_command(
+        "ds_benchmark_import", "--synthetic", "3", "--page-size", "2", stdout=out
+    )
+
+    assert "synthetic-3: 3 dossiers" in out.getvalue()
+    assert "requêtes/dossier" in out.getvalue()
+    assert "| 0 erreur(s)" in out.getvalue()
+    assert not Demarche.objects.exists()
+    assert not Dossier.objects.exists()
+
+
+@pytest.mark.django_db
+def test_ds_benchmark_import_replays_recorded_pages(tmp_path):
+    dossier = add_benchmark_territory(json.loads(FIXTURE_DOSSIER.read_text()))
+    empty = {"nodes": [], "pageInfo": {"hasNextPage": False, "endCursor": None}}
+    (tmp_path / "page-00001.json").write_text(
+        json.dumps(
+            {
+                "data": {
+                    "demarche": {
+                        "dossiers": {
+                            "nodes": [dossier],
+                            "pageInfo": {"hasNextPage": False, "endCursor": "1"},
+                        },
+                        "pendingDeletedDossiers": empty,
+                        "deletedDossiers": empty,
+                    }
+                }
+            }
+        )
+    )
+    out = StringIO()
+
+    call_command("ds_benchmark_import", "--pages-dir", str(tmp_path), stdout=out)
+
+    assert f"{tmp_path}: 1 dossiers" in out.getvalue()
+    assert "| 0 erreur(s)" in out.getvalue()
+    assert not Dossier.objects.exists()
+
+
+@pytest.mark.django_db
+def test_ds_archive_raw_data_moves_existing_payloads_to_cold_storage():
+    raw_data = {
+        "number": 1,
+        "champs": [{"id": "1", "__typename": "PieceJustificativeChamp"}],
+        "annotations": [],
+    }
+    dossier_data = DossierDataFactory(dossier=DossierFactory(), raw_data=raw_data)
+
+    call_command("ds_archive_raw_data", "--batch-size", "1", stdout=StringIO())
+
+    dossier_data.refresh_from_db()
+    assert dossier_data.raw_data == {"number": 1, "champs": [], "annotations": []}
+    assert dossier_data.get_raw_data() == raw_data
@@ -3,8 +3,16 @@ from unittest.mock import MagicMock, patch
 
 import pytest
 from django.conf import settings
-
-from gsl_demarches_simplifiees.locks import demarche_sync_lock
+from django.test import override_settings
+from django.utils import timezone
+
+from gsl_demarches_simplifiees.locks import (
+    DN_IN_FLIGHT_KEY,
+    DnRequestBudgetTimeout,
+    demarche_sync_lock,
+    dn_request_budget,
+)
+from gsl_demarches_simplifiees.models import DemarcheSyncShard
 from gsl_demarches_simplifiees.tasks import (
     task_init_demarche_sync,
     task_save_demarche_dossiers_from_ds,
@@ -32,6 +40,7 @@ def test_save_dossiers_skips_when_lock_held(mock_lock, mock_save):
     mock_save.assert_not_called()
 
 
+@pytest.mark.django_db
 @patch("gsl_demarches_simplifiees.tasks.save_demarche_dossiers_from_ds")
 @patch("gsl_demarches_simplifiees.tasks.demarche_sync_lock")
 def test_save_dossiers_runs_when_lock_free(mock_lock, mock_save):
@@ -45,6 +54,43 @@ def test_save_dossiers_runs_when_lock_free(mock_lock, mock_save):
     mock_lock.assert_called_once_with(123, timeout=settings.DS_SYNC_LOCK_TIMEOUT)
 
 
+@pytest.mark.django_db
+@patch("gsl_demarches_simplifiees.tasks.save_demarche_dossiers_from_ds")
+@patch("gsl_demarches_simplifiees.tasks.demarche_sync_lock")
+def test_save_dossiers_skips_while_a_sharded_init_sync_is_running(mock_lock, mock_save):
+    mock_lock.return_value = _fake_lock(True)
+    demarche = DemarcheFactory()
+    DemarcheSyncShard.objects.create(
+        demarche=demarche,
+        window_start=timezone.now(),
+        sync_started_at=timezone.now(),
+        status=DemarcheSyncShard.STATUS_RUNNING,
+    )
+
+    result = task_save_demarche_dossiers_from_ds(demarche.ds_number)
+
+    assert result is None
+    mock_save.assert_not_called()
+
+
+@pytest.mark.django_db
+@patch("gsl_demarches_simplifiees.tasks.save_demarche_dossiers_from_ds")
+@patch("gsl_demarches_simplifiees.tasks.demarche_sync_lock")
+def test_save_dossiers_runs_despite_a_shard_out_of_retries(mock_lock, mock_save):
+    mock_lock.return_value = _fake_lock(True)
+    demarche = DemarcheFactory()
+    DemarcheSyncShard.objects.create(
+        demarche=demarche,
+        window_start=timezone.now(),
+        sync_started_at=timezone.now(),
+        status=DemarcheSyncShard.STATUS_FAILED,
+    )
+
+    task_save_demarche_dossiers_from_ds(demarche.ds_number)
+
+    mock_save.assert_called_once_with(demarche.ds_number)
+
+
 # --- task_init_demarche_sync -----------------------------------------------
 
 
@@ -94,6 +140,24 @@ def test_init_sync_resets_cursors_when_lock_free(mock_lock, mock_save):
     assert demarche.deleted_cursor == ""
 
 
+@pytest.mark.django_db
+@patch("gsl_demarches_simplifiees.tasks.start_sharded_demarche_sync")
+@patch("gsl_demarches_simplifiees.tasks.save_demarche_dossiers_from_ds")
+@patch("gsl_demarches_simplifiees.tasks.demarche_sync_lock")
+def test_init_sync_with_several_shards_starts_a_sharded_sync(
+    mock_lock, mock_save, mock_start
+):
+    mock_lock.return_value = _fake_lock(True)
+    demarche = DemarcheFactory()
+
+    task_init_demarche_sync(demarche.ds_number, "2026-01-01T00:00:00Z", 4)
+
+    mock_save.assert_not_called()
+    mock_start.assert_called_once()
+    assert mock_start.call_args.args[0] == demarche
+    assert mock_start.call_args.args[2] == 4
+
+
 # --- demarche_sync_lock context manager ------------------------------------
 
 
@@ -125,3 +189,61 @@ def test_lock_yields_false_and_does_not_release_when_held(mock_from_url):
         assert acquired is False
 
     lock.release.assert_not_called()
+
+
+# --- dn_request_budget context manager -------------------------------------
+
+
+def _budget_client(take_slot_results, take_token_results):
+    """Client Redis factice : register_script renvoie le script du sémaphore
+    puis celui du seau à jetons, dans l'ordre d'appel de dn_request_budget."""
+    client = MagicMock()
+    take_slot = MagicMock(side_effect=take_slot_results)
+    take_token = MagicMock(side_effect=take_token_results)
+    client.register_script.side_effect = [take_slot, take_token]
+    return client, take_slot, take_token
+
+
+@patch("gsl_demarches_simplifiees.locks.redis.Redis.from_url")
+def test_budget_does_not_use_redis_when_unlimited(mock_from_url):
+    with override_settings(DS_API_RATE_LIMIT_PER_SECOND=0, DS_API_MAX_IN_FLIGHT=0):
+        with dn_request_budget():
+            pass
+
+    mock_from_url.assert_not_called()
+
+
+@patch("gsl_demarches_simplifiees.locks.time.sleep")
+@patch("gsl_demarches_simplifiees.locks.redis.Redis.from_url")
+@override_settings(DS_API_RATE_LIMIT_PER_SECOND=2, DS_API_MAX_IN_FLIGHT=3)
+def test_budget_waits_for_slot_and_token_then_releases_slot(mock_from_url, mock_sleep):
+    client, take_slot, take_token = _budget_client([0, 1], [0, 0, 1])
+    mock_from_url.return_value = client
+
+    with dn_request_budget():
+        client.zrem.assert_not_called()
+
+    assert take_slot.call_count == 2
+    assert take_slot.call_args.kwargs["args"][0] == 3
+    assert take_token.call_count == 3
+    assert take_token.call_args.kwargs["args"][0] == 2
+    slot = take_slot.call_args.kwargs["args"][3]
+    client.zrem.assert_called_once_with(DN_IN_FLIGHT_KEY, slot)
+
+
+@patch("gsl_demarches_simplifiees.locks.time.sleep")
+@patch("gsl_demarches_simplifiees.locks.redis.Redis.from_url")
+@override_settings(
+    DS_API_RATE_LIMIT_PER_SECOND=2,
+    DS_API_MAX_IN_FLIGHT=3,
+    DS_API_RATE_BUDGET_MAX_WAIT=0,
+)
+def test_budget_raises_on_timeout_and_releases_slot(mock_from_url, mock_sleep):
+    client, _, _ = _budget_client([1], [0])
+    mock_from_url.return_value = client
+
+    with pytest.raises(DnRequestBudgetTimeout):
+        with dn_request_budget():
+            pytest.fail("le budget ne devait pas être accordé")
+
+    client.zrem.assert_called_once()
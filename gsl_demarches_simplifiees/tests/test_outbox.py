@@ -0,0 +1,368 @@
+import logging
+from datetime import timedelta
+from unittest.mock import patch
+
+import pytest
+from django.test import override_settings
+from django.utils import timezone
+
+from gsl_core.tests.factories import CollegueFactory
+from gsl_demarches_simplifiees.exceptions import (
+    DsConnectionError,
+    DsServiceException,
+    UserRightsError,
+)
+from gsl_demarches_simplifiees.locks import DnRequestBudgetTimeout
+from gsl_demarches_simplifiees.models import DsMutation
+from gsl_demarches_simplifiees.outbox import (
+    drain_ds_mutations,
+    enqueue_annotations_update,
+    enqueue_repasser_en_instruction,
+    has_due_ds_mutations,
+)
+from gsl_demarches_simplifiees.services import DotationAnnotationsUpdate
+from gsl_demarches_simplifiees.tests.factories import DossierFactory
+from gsl_projet.constants import DOTATION_DETR, DOTATION_DSIL
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def user():
+    return CollegueFactory()
+
+
+@pytest.fixture
+def mock_ds_service():
+    with patch("gsl_demarches_simplifiees.outbox.DsService") as mock_ds_service:
+        mock_ds_service.return_value.update_ds_annotations_for_many_dossiers.return_value = {}
+        yield mock_ds_service.return_value
+
+
+def test_enqueue_triggers_the_drain_on_commit(user, django_capture_on_commit_callbacks):
+    dossier = DossierFactory()
+
+    with patch(
+        "gsl_demarches_simplifiees.tasks.task_drain_ds_mutations.apply_async"
+    ) as mock_apply_async:
+        with django_capture_on_commit_callbacks(execute=True):
+            mutation = enqueue_annotations_update(
+                dossier, user, dotations_to_be_checked=[DOTATION_DETR]
+            )
+        mock_apply_async.assert_called_once()
+
+    assert mutation.status == DsMutation.STATUS_PENDING
+    assert mutation.payload == {"dotations_to_be_checked": [DOTATION_DETR]}
+
+
+def test_drain_sends_only_the_latest_annotations_of_each_dossier_and_dotation(
+    user, mock_ds_service
+):
+    dossier, other_dossier = DossierFactory.create_batch(2)
+    unchecked = enqueue_annotations_update(dossier, user, dotations_to_be_checked=[])
+    old = enqueue_annotations_update(
+        dossier,
+        user,
+        dotations_to_be_checked=[DOTATION_DETR],
+        annotations_dotation_to_update=DOTATION_DETR,
+        montant=4000.0,
+    )
+    latest = enqueue_annotations_update(
+        dossier,
+        user,
+        dotations_to_be_checked=[DOTATION_DETR],
+        annotations_dotation_to_update=DOTATION_DETR,
+        montant=5000.0,
+    )
+    other = enqueue_annotations_update(
+        other_dossier, user, dotations_to_be_checked=[DOTATION_DSIL]
+    )
+
+    stats = drain_ds_mutations()
+
+    mock_ds_service.update_ds_annotations_for_many_dossiers.assert_called_once_with(
+        user,
+        [
+            DotationAnnotationsUpdate(
+                dossier,
+                [DOTATION_DETR],
+                DOTATION_DETR,
+                montant=5000.0,
+                client_mutation_id=str(latest.idempotency_key),
+            ),
+            DotationAnnotationsUpdate(
+                other_dossier,
+                [DOTATION_DSIL],
+                client_mutation_id=str(other.idempotency_key),
+            ),
+        ],
+    )
+    for mutation in (unchecked, old, latest, other):
+        mutation.refresh_from_db()
+    assert unchecked.status == old.status == DsMutation.STATUS_COALESCED
+    assert latest.status == other.status == DsMutation.STATUS_SENT
+    assert latest.attempts == 1
+    assert latest.sent_at is not None
+    assert stats["sent"] == 2
+    assert stats["coalesced"] == 2
+
+
+def test_drain_keeps_the_annotations_of_each_accepted_dotation(user, mock_ds_service):
+    dossier = DossierFactory()
+    detr = enqueue_annotations_update(
+        dossier,
+        user,
+        dotations_to_be_checked=[DOTATION_DETR],
+        annotations_dotation_to_update=DOTATION_DETR,
+        assiette=10000.0,
+        montant=5000.0,
+        taux=50.0,
+    )
+    dsil = enqueue_annotations_update(
+        dossier,
+        user,
+        dotations_to_be_checked=[DOTATION_DSIL, DOTATION_DETR],
+        annotations_dotation_to_update=DOTATION_DSIL,
+        montant=3000.0,
+    )
+
+    stats = drain_ds_mutations()
+
+    # Les montants DETR sont envoyés, avec les dotations cochées les plus récentes
+    mock_ds_service.update_ds_annotations_for_many_dossiers.assert_called_once_with(
+        user,
+        [
+            DotationAnnotationsUpdate(
+                dossier,
+                [DOTATION_DSIL, DOTATION_DETR],
+                DOTATION_DETR,
+                assiette=10000.0,
+                montant=5000.0,
+                taux=50.0,
+                client_mutation_id=str(detr.idempotency_key),
+            ),
+            DotationAnnotationsUpdate(
+                dossier,
+                [DOTATION_DSIL, DOTATION_DETR],
+                DOTATION_DSIL,
+                montant=3000.0,
+                client_mutation_id=str(dsil.idempotency_key),
+            ),
+        ],
+    )
+    detr.refresh_from_db()
+    assert detr.status == DsMutation.STATUS_SENT
+    assert detr.payload["dotations_to_be_checked"] == [DOTATION_DSIL, DOTATION_DETR]
+    assert stats["sent"] == 2
+    assert stats["coalesced"] == 0
+
+
+@override_settings(DS_ANNOTATIONS_BATCH_SIZE=2)
+def test_drain_sends_annotations_by_chunks_per_instructeur(mock_ds_service):
+    first_user, second_user = CollegueFactory.create_batch(2)
+    for dossier in DossierFactory.create_batch(3):
+        enqueue_annotations_update(dossier, first_user, dotations_to_be_checked=[])
+    enqueue_annotations_update(
+        DossierFactory(), second_user, dotations_to_be_checked=[]
+    )
+
+    drain_ds_mutations()
+
+    calls = mock_ds_service.update_ds_annotations_for_many_dossiers.call_args_list
+    assert [(call.args[0], len(call.args[1])) for call in calls] == [
+        (first_user, 2),
+        (first_user, 1),
+        (second_user, 1),
+    ]
+
+
+def test_drain_sends_state_mutation_before_annotations(user, mock_ds_service):
+    dossier = DossierFactory()
+    enqueue_repasser_en_instruction(dossier, user)
+    enqueue_annotations_update(dossier, user, dotations_to_be_checked=[])
+
+    drain_ds_mutations()
+
+    assert [call[0] for call in mock_ds_service.method_calls] == [
+        "repasser_en_instruction",
+        "update_ds_annotations_for_many_dossiers",
+    ]
+    assert not DsMutation.objects.filter(status=DsMutation.STATUS_PENDING).exists()
+
+
+def test_drain_sends_the_idempotency_key_as_client_mutation_id(user, mock_ds_service):
+    dossier = DossierFactory()
+    mutation = enqueue_repasser_en_instruction(dossier, user)
+
+    drain_ds_mutations()
+
+    mock_ds_service.repasser_en_instruction.assert_called_once_with(
+        dossier, user, client_mutation_id=str(mutation.idempotency_key)
+    )
+
+
+@override_settings(DS_MUTATIONS_RETRY_BACKOFF=60)
+def test_drain_retries_connection_errors_and_holds_the_dossier_annotations(
+    user, mock_ds_service
+):
+    dossier, other_dossier = DossierFactory.create_batch(2)
+    state = enqueue_repasser_en_instruction(dossier, user)
+    annotations = enqueue_annotations_update(dossier, user, dotations_to_be_checked=[])
+    other = enqueue_annotations_update(other_dossier, user, dotations_to_be_checked=[])
+    mock_ds_service.repasser_en_instruction.side_effect = DsConnectionError()
+
+    stats = drain_ds_mutations()
+
+    for mutation in (state, annotations, other):
+        mutation.refresh_from_db()
+    assert state.status == DsMutation.STATUS_PENDING
+    assert state.attempts == 1
+    assert state.next_attempt_at > timezone.now() + timedelta(seconds=50)
+    assert state.last_error == DsConnectionError.DEFAULT_MESSAGE
+    assert annotations.status == DsMutation.STATUS_PENDING
+    assert annotations.attempts == 0
+    assert other.status == DsMutation.STATUS_SENT
+    assert stats["retried"] == 1
+
+    # The next drain keeps holding the annotations while the state mutation waits
+    mock_ds_service.update_ds_annotations_for_many_dossiers.reset_mock()
+    drain_ds_mutations()
+    mock_ds_service.update_ds_annotations_for_many_dossiers.assert_not_called()
+
+
+def test_drain_dead_letters_mutations_rejected_by_dn(user, mock_ds_service, caplog):
+    dossier = DossierFactory()
+    mutation = enqueue_annotations_update(dossier, user, dotations_to_be_checked=[])
+    mock_ds_service.update_ds_annotations_for_many_dossiers.return_value = {
+        dossier.pk: UserRightsError()
+    }
+
+    with caplog.at_level(logging.ERROR):
+        stats = drain_ds_mutations()
+
+    mutation.refresh_from_db()
+    assert mutation.status == DsMutation.STATUS_DEAD
+    assert mutation.attempts == 1
+    assert stats["dead"] == 1
+    record = next(r for r in caplog.records if r.msg == "DN mutation dead-lettered")
+    assert record.idempotency_key == str(mutation.idempotency_key)
+    assert record.dossier_ds_number == dossier.ds_number
+
+
+@override_settings(DS_MUTATIONS_MAX_ATTEMPTS=3)
+def test_drain_dead_letters_after_max_attempts(user, mock_ds_service):
+    dossier = DossierFactory()
+    mutation = enqueue_repasser_en_instruction(dossier, user)
+    DsMutation.objects.filter(pk=mutation.pk).update(attempts=2)
+    mock_ds_service.repasser_en_instruction.side_effect = DsConnectionError()
+
+    drain_ds_mutations()
+
+    mutation.refresh_from_db()
+    assert mutation.status == DsMutation.STATUS_DEAD
+    assert mutation.attempts == 3
+
+
+def test_drain_stops_without_counting_an_attempt_when_budget_is_exhausted(
+    user, mock_ds_service
+):
+    mutation = enqueue_repasser_en_instruction(DossierFactory(), user)
+
+    with patch(
+        "gsl_demarches_simplifiees.outbox.dn_request_budget",
+        side_effect=DnRequestBudgetTimeout,
+    ):
+        stats = drain_ds_mutations()
+
+    mutation.refresh_from_db()
+    assert mutation.status == DsMutation.STATUS_PENDING
+    assert mutation.attempts == 0
+    assert stats["budget_exhausted"] == 1
+    mock_ds_service.repasser_en_instruction.assert_not_called()
+
+
+def test_drain_ignores_mutations_not_yet_due(user, mock_ds_service):
+    mutation = enqueue_repasser_en_instruction(DossierFactory(), user)
+    DsMutation.objects.filter(pk=mutation.pk).update(
+        next_attempt_at=timezone.now() + timedelta(minutes=5)
+    )
+
+    stats = drain_ds_mutations()
+
+    assert stats["due"] == 0
+    mock_ds_service.repasser_en_instruction.assert_not_called()
+
+
+def test_request_failure_is_recorded_on_every_mutation_of_the_chunk(
+    user, mock_ds_service
+):
+    dossiers = DossierFactory.create_batch(2)
+    for dossier in dossiers:
+        enqueue_annotations_update(dossier, user, dotations_to_be_checked=[])
+    error = DsServiceException("Erreur DN")
+    mock_ds_service.update_ds_annotations_for_many_dossiers.return_value = {
+        dossier.pk: error for dossier in dossiers
+    }
+
+    drain_ds_mutations()
+
+    assert set(DsMutation.objects.values_list("status", "last_error")) == {
+        (DsMutation.STATUS_DEAD, "Erreur DN")
+    }
+
+
+def test_rejected_chunk_is_resent_one_mutation_at_a_time(user, mock_ds_service):
+    good_dossier, bad_dossier = DossierFactory.create_batch(2)
+    good = enqueue_annotations_update(good_dossier, user, dotations_to_be_checked=[])
+    bad = enqueue_annotations_update(bad_dossier, user, dotations_to_be_checked=[])
+    error = DsServiceException("Variable $input1 invalide")
+    mock_ds_service.update_ds_annotations_for_many_dossiers.side_effect = [
+        {good_dossier.pk: error, bad_dossier.pk: error},
+        {},
+        {bad_dossier.pk: error},
+    ]
+
+    stats = drain_ds_mutations()
+
+    calls = mock_ds_service.update_ds_annotations_for_many_dossiers.call_args_list
+    assert [len(call.args[1]) for call in calls] == [2, 1, 1]
+    good.refresh_from_db()
+    bad.refresh_from_db()
+    assert good.status == DsMutation.STATUS_SENT
+    assert bad.status == DsMutation.STATUS_DEAD
+    assert stats["chunks_split"] == 1
+
+
+def test_chunk_connection_failure_is_not_resent_one_by_one(user, mock_ds_service):
+    dossiers = DossierFactory.create_batch(2)
+    for dossier in dossiers:
+        enqueue_annotations_update(dossier, user, dotations_to_be_checked=[])
+    error = DsConnectionError()
+    mock_ds_service.update_ds_annotations_for_many_dossiers.return_value = {
+        dossier.pk: error for dossier in dossiers
+    }
+
+    drain_ds_mutations()
+
+    mock_ds_service.update_ds_annotations_for_many_dossiers.assert_called_once()
+    assert set(DsMutation.objects.values_list("status", flat=True)) == {
+        DsMutation.STATUS_PENDING
+    }
+
+
+def test_has_due_ds_mutations_ignores_postponed_and_blocked_mutations(user):
+    later = timezone.now() + timedelta(minutes=5)
+    postponed = enqueue_annotations_update(
+        DossierFactory(), user, dotations_to_be_checked=[]
+    )
+    DsMutation.objects.filter(pk=postponed.pk).update(next_attempt_at=later)
+    blocked_dossier = DossierFactory()
+    retried = enqueue_repasser_en_instruction(blocked_dossier, user)
+    DsMutation.objects.filter(pk=retried.pk).update(next_attempt_at=later)
+    enqueue_annotations_update(blocked_dossier, user, dotations_to_be_checked=[])
+
+    assert not has_due_ds_mutations()
+
+    enqueue_annotations_update(DossierFactory(), user, dotations_to_be_checked=[])
+
+    assert has_due_ds_mutations()
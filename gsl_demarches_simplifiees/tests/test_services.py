@@ -5,11 +5,16 @@ from datetime import timezone as dt_timezone
 from unittest.mock import MagicMock, patch
 
 import pytest
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 
 from gsl_core.tests.factories import CollegueFactory
 from gsl_demarches_simplifiees.models import Dossier, FieldMapping
 from gsl_demarches_simplifiees.services import (
+    CheckboxAnnotationsUpdate,
+    DotationAnnotationsUpdate,
     DsService,
     DsServiceException,
     FieldError,
@@ -17,6 +22,7 @@ from gsl_demarches_simplifiees.services import (
     UserRightsError,
 )
 from gsl_demarches_simplifiees.tests.factories import (
+    DemarcheFactory,
     DossierFactory,
     FieldMappingFactory,
     ProfileFactory,
@@ -1263,3 +1269,194 @@ class TestTransformMessage:
         messages = ["Une erreur"]
         out = ds._transform_message(messages)
         assert out == "Une erreur"
+
+
+class TestUpdateDsAnnotationsForManyDossiers:
+    @pytest.fixture
+    def demarche(self):
+        demarche = DemarcheFactory()
+        for django_field, ds_field_id in (
+            ("annotations_dotation", "field_dotations"),
+            ("annotations_assiette_detr", "field_assiette_detr"),
+            ("annotations_montant_accorde_detr", "field_montant_detr"),
+            ("annotations_taux_detr", "field_taux_detr"),
+        ):
+            FieldMappingFactory(
+                demarche=demarche, django_field=django_field, ds_field_id=ds_field_id
+            )
+        return demarche
+
+    @staticmethod
+    def _success(updated_at):
+        return {
+            "data": {
+                "dossierModifierAnnotations": {
+                    "annotations": [{"id": "field_dotations", "updatedAt": updated_at}],
+                    "errors": None,
+                }
+            }
+        }
+
+    @override_settings(DS_ANNOTATIONS_BATCH_SIZE=2)
+    def test_sends_chunks_and_bulk_updates_dates(self, user, demarche):
+        dossiers = DossierFactory.create_batch(3, ds_demarche=demarche)
+        ds_service = DsService()
+        updates = [
+            DotationAnnotationsUpdate(
+                dossier, [DOTATION_DETR], DOTATION_DETR, 1000.0, 500.0, 50.0
+            )
+            for dossier in dossiers
+        ]
+
+        with patch.object(ds_service, "mutator") as mock_mutator:
+            mock_mutator.dossiers_modifier_annotations.side_effect = [
+                [
+                    self._success("2025-12-08T11:26:17+01:00"),
+                    self._success("2025-12-08T11:35:14+01:00"),
+                ],
+                [self._success("2025-12-09T09:00:00+01:00")],
+            ]
+            with CaptureQueriesContext(connection) as queries:
+                errors = ds_service.update_ds_annotations_for_many_dossiers(
+                    user, updates
+                )
+
+        assert errors == {}
+        assert len(queries) == 2  # field ids + bulk update
+        calls = mock_mutator.dossiers_modifier_annotations.call_args_list
+        assert [len(call.args[1]) for call in calls] == [2, 1]
+        dossier_id, annotations = calls[0].args[1][0]
+        assert dossier_id == dossiers[0].ds_id
+        assert annotations == [
+            {"id": "field_dotations", "value": {"multipleDropDownList": ["DETR"]}},
+            {"id": "field_assiette_detr", "value": {"decimalNumber": 1000.0}},
+            {"id": "field_montant_detr", "value": {"decimalNumber": 500.0}},
+            {"id": "field_taux_detr", "value": {"decimalNumber": 50.0}},
+        ]
+        for dossier, expected in zip(
+            dossiers,
+            (
+                "2025-12-08T11:26:17+01:00",
+                "2025-12-08T11:35:14+01:00",
+                "2025-12-09T09:00:00+01:00",
+            ),
+        ):
+            dossier.refresh_from_db()
+            assert dossier.ds_date_derniere_modification == datetime.fromisoformat(
+                expected
+            )
+
+    def test_failing_dossiers_do_not_stop_the_others(self, user, demarche):
+        ok, rejected, unmapped = (
+            DossierFactory(ds_demarche=demarche, ds_date_derniere_modification=None),
+            DossierFactory(ds_demarche=demarche, ds_date_derniere_modification=None),
+            DossierFactory(ds_date_derniere_modification=None),
+        )
+        ds_service = DsService()
+
+        with patch.object(ds_service, "mutator") as mock_mutator:
+            mock_mutator.dossiers_modifier_annotations.return_value = [
+                self._success("2025-12-08T11:26:17+01:00"),
+                {
+                    "data": {
+                        "dossierModifierAnnotations": {
+                            "annotations": None,
+                            "errors": [
+                                {
+                                    "message": "L’instructeur n’a pas les droits d’accès à ce dossier"
+                                }
+                            ],
+                        }
+                    }
+                },
+            ]
+            errors = ds_service.update_ds_annotations_for_many_dossiers(
+                user,
+                [
+                    DotationAnnotationsUpdate(ok, [DOTATION_DETR]),
+                    DotationAnnotationsUpdate(rejected, [DOTATION_DETR]),
+                    DotationAnnotationsUpdate(unmapped, [DOTATION_DETR]),
+                ],
+            )
+
+        assert set(errors) == {rejected.pk, unmapped.pk}
+        assert isinstance(errors[rejected.pk], UserRightsError)
+        assert isinstance(errors[unmapped.pk], FieldError)
+        ok.refresh_from_db()
+        rejected.refresh_from_db()
+        assert ok.ds_date_derniere_modification is not None
+        assert rejected.ds_date_derniere_modification is None
+
+    def test_request_failure_marks_the_whole_chunk_as_failed(self, user, demarche):
+        dossiers = DossierFactory.create_batch(2, ds_demarche=demarche)
+        ds_service = DsService()
+
+        with patch.object(ds_service, "mutator") as mock_mutator:
+            mock_mutator.dossiers_modifier_annotations.side_effect = DsServiceException(
+                "DN request returned errors"
+            )
+            errors = ds_service.update_ds_annotations_for_many_dossiers(
+                user,
+                [DotationAnnotationsUpdate(d, [DOTATION_DETR]) for d in dossiers],
+            )
+
+        assert set(errors) == {dossier.pk for dossier in dossiers}
+
+
+class TestUpdateCheckboxesAnnotationsForManyDossiers:
+    @override_settings(DS_ANNOTATIONS_BATCH_SIZE=2)
+    def test_sends_checkbox_and_text_annotations_in_chunks(self, user):
+        demarche = DemarcheFactory()
+        for django_field, ds_field_id in (
+            ("annotations_is_qpv", "field_qpv"),
+            ("annotations_contrat_local", "field_contrat_local"),
+        ):
+            FieldMappingFactory(
+                demarche=demarche, django_field=django_field, ds_field_id=ds_field_id
+            )
+        dossiers = DossierFactory.create_batch(
+            3, ds_demarche=demarche, ds_date_derniere_modification=None
+        )
+        unmapped = DossierFactory(ds_date_derniere_modification=None)
+        ds_service = DsService()
+
+        with patch.object(ds_service, "mutator") as mock_mutator:
+            mock_mutator.dossiers_modifier_annotations.side_effect = [
+                [
+                    TestUpdateDsAnnotationsForManyDossiers._success(
+                        "2025-12-08T11:26:17+01:00"
+                    )
+                ]
+                * 2,
+                [
+                    TestUpdateDsAnnotationsForManyDossiers._success(
+                        "2025-12-09T09:00:00+01:00"
+                    )
+                ],
+            ]
+            errors = ds_service.update_checkboxes_annotations_for_many_dossiers(
+                user,
+                [
+                    CheckboxAnnotationsUpdate(
+                        dossier,
+                        {"annotations_is_qpv": True},
+                        {"annotations_contrat_local": "Contrat"},
+                    )
+                    for dossier in [*dossiers, unmapped]
+                ],
+            )
+
+        assert set(errors) == {unmapped.pk}
+        assert isinstance(errors[unmapped.pk], FieldError)
+        calls = mock_mutator.dossiers_modifier_annotations.call_args_list
+        assert [len(call.args[1]) for call in calls] == [2, 1]
+        assert calls[0].args[1][0] == (
+            dossiers[0].ds_id,
+            [
+                {"id": "field_qpv", "value": {"checkbox": True}},
+                {"id": "field_contrat_local", "value": {"text": "Contrat"}},
+            ],
+        )
+        for dossier in dossiers:
+            dossier.refresh_from_db()
+            assert dossier.ds_date_derniere_modification is not None
@@ -1,9 +1,19 @@
+import logging
+from collections import Counter
+from datetime import timedelta
 from unittest import mock
 
 import pytest
+from django.utils import timezone
 
-from gsl_demarches_simplifiees.tasks import task_refresh_every_demarche
-from gsl_demarches_simplifiees.tests.factories import DemarcheFactory
+from gsl_demarches_simplifiees.models import Demarche
+from gsl_demarches_simplifiees.tasks import (
+    task_drain_ds_mutations,
+    task_fetch_new_or_modified_ds_dossiers_for_every_published_demarche,
+    task_refresh_dossiers_from_saved_data,
+    task_refresh_every_demarche,
+)
+from gsl_demarches_simplifiees.tests.factories import DemarcheFactory, DossierFactory
 
 
 @pytest.mark.django_db
@@ -32,3 +42,105 @@ def test_refresh_every_demarche_uses_low_priority_for_mass_batch():
     assert mock_apply.call_count == 10
     for call in mock_apply.call_args_list:
         assert call.kwargs["priority"] == 9
+
+
+@pytest.mark.django_db
+def test_refresh_dossiers_from_saved_data_isolates_failures(caplog):
+    caplog.set_level(logging.INFO)
+    dossiers = DossierFactory.create_batch(3)
+
+    def _refresh(dossier):
+        if dossier.ds_number == dossiers[0].ds_number:
+            raise Exception("boom")
+
+    with mock.patch(
+        "gsl_demarches_simplifiees.importer.dossier.refresh_dossier_from_saved_data",
+        side_effect=_refresh,
+    ) as mock_refresh:
+        task_refresh_dossiers_from_saved_data([d.ds_number for d in dossiers])
+
+    assert mock_refresh.call_count == 3
+    record = next(
+        r
+        for r in caplog.records
+        if r.message == "Dossiers have been refreshed from saved data"
+    )
+    assert record.refreshed_count == 2
+    assert record.failed_count == 1
+
+
+@pytest.mark.django_db
+def test_fetch_every_published_demarche_dispatches_oldest_first_and_logs_lag(caplog):
+    caplog.set_level(logging.INFO)
+    now = timezone.now()
+    recent = DemarcheFactory(
+        ds_state=Demarche.STATE_PUBLIEE,
+        updated_since=now - timedelta(days=1),
+        last_synced_at=now - timedelta(minutes=10),
+    )
+    oldest = DemarcheFactory(
+        ds_state=Demarche.STATE_PUBLIEE, updated_since=now - timedelta(days=30)
+    )
+    never_synced = DemarcheFactory(ds_state=Demarche.STATE_PUBLIEE, updated_since=None)
+    DemarcheFactory(ds_state=Demarche.STATE_CLOSE)
+
+    with mock.patch(
+        "gsl_demarches_simplifiees.tasks.task_save_demarche_dossiers_from_ds.delay"
+    ) as mock_delay:
+        task_fetch_new_or_modified_ds_dossiers_for_every_published_demarche()
+
+    assert [c.args[0] for c in mock_delay.call_args_list] == [
+        never_synced.ds_number,
+        oldest.ds_number,
+        recent.ds_number,
+    ]
+    lags = {
+        r.demarche_ds_number: r.sync_lag_seconds
+        for r in caplog.records
+        if r.message == "DN dossiers sync lag"
+    }
+    assert lags[never_synced.ds_number] is None
+    assert 590 <= lags[recent.ds_number] <= 610
+
+
+@mock.patch("gsl_demarches_simplifiees.tasks.drain_ds_mutations")
+@mock.patch("gsl_demarches_simplifiees.tasks.ds_mutations_drain_lock")
+def test_drain_ds_mutations_skips_when_another_drain_runs(mock_lock, mock_drain):
+    mock_lock.return_value.__enter__.return_value = False
+
+    task_drain_ds_mutations()
+
+    mock_drain.assert_not_called()
+
+
+@pytest.mark.parametrize(
+    "has_due, budget_exhausted, dispatch_count",
+    ((True, 0, 1), (False, 0, 0), (True, 1, 0)),
+)
+@mock.patch("gsl_demarches_simplifiees.tasks.task_drain_ds_mutations.apply_async")
+@mock.patch("gsl_demarches_simplifiees.tasks.has_due_ds_mutations")
+@mock.patch("gsl_demarches_simplifiees.tasks.drain_ds_mutations")
+@mock.patch("gsl_demarches_simplifiees.tasks.ds_mutations_drain_lock")
+def test_drain_ds_mutations_continues_while_mutations_are_due(
+    mock_lock,
+    mock_drain,
+    mock_has_due,
+    mock_apply,
+    has_due,
+    budget_exhausted,
+    dispatch_count,
+):
+    lock_released = []
+    mock_lock.return_value.__enter__.return_value = True
+    mock_lock.return_value.__exit__.side_effect = lambda *args: lock_released.append(
+        True
+    )
+    mock_drain.return_value = Counter(budget_exhausted=budget_exhausted)
+    # Vérifié après la libération du verrou : une mutation arrivée pendant le
+    # drain n'attend pas le prochain passage planifié
+    mock_has_due.side_effect = lambda: bool(lock_released) and has_due
+
+    task_drain_ds_mutations()
+
+    mock_drain.assert_called_once()
+    assert mock_apply.call_count == dispatch_count
@@ -56,7 +56,7 @@ def view_demarche_json(request, demarche_ds_number):
 def view_dossier_json(request, dossier_ds_number):
     dossier = get_object_or_404(Dossier, ds_number=dossier_ds_number)
     return JsonResponse(
-        dossier.ds_data.raw_data
+        dossier.ds_data.get_raw_data()
         if (dossier.ds_data and dossier.ds_data.raw_data)
         else {}
     )
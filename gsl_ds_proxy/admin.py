@@ -1,6 +1,9 @@
+import redis
 from django import forms
+from django.conf import settings
 from django.contrib import admin, messages
 
+from gsl_ds_proxy.cache import CACHE_HIT, CACHE_MISS, get_cache_stats
 from gsl_ds_proxy.models import ProxyToken
 
 _MAX_EMAILS_IN_LABEL = 5
@@ -23,7 +26,13 @@ def _format_groupe_choice(groupe):
 class ProxyTokenAdminForm(forms.ModelForm):
     class Meta:
         model = ProxyToken
-        fields = ("label", "demarche", "groupe_instructeur_ds_id", "is_active")
+        fields = (
+            "label",
+            "demarche",
+            "groupe_instructeur_ds_id",
+            "is_active",
+            "max_concurrent_requests",
+        )
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -62,7 +71,7 @@ class ProxyTokenAdmin(admin.ModelAdmin):
         "groupe_instructeur_label",
     )
     list_filter = ("is_active", "demarche")
-    readonly_fields = ("key_hash", "created_at", "updated_at")
+    readonly_fields = ("key_hash", "created_at", "updated_at", "cache_stats")
 
     def groupe_instructeur_label(self, obj):
         if not obj.groupe_instructeur_ds_id or not obj.demarche_id:
@@ -77,6 +86,17 @@ class ProxyTokenAdmin(admin.ModelAdmin):
 
     groupe_instructeur_label.short_description = "Groupe instructeur"
 
+    def cache_stats(self, obj):
+        if not settings.DS_PROXY_CACHE_ENABLED or not obj.pk:
+            return "Cache désactivé"
+        try:
+            stats = get_cache_stats(obj.pk)
+        except redis.exceptions.RedisError:
+            return "Indisponible"
+        return f"{stats[CACHE_HIT]} hits / {stats[CACHE_MISS]} misses"
+
+    cache_stats.short_description = "Cache des réponses"
+
     def save_model(self, request, obj, form, change):
         super().save_model(request, obj, form, change)
         plaintext = getattr(obj, "_plaintext_key", None)
@@ -0,0 +1,118 @@
+"""Cache court des réponses du proxy DS (opt-in : DS_PROXY_CACHE_ENABLED).
+
+Beaucoup de partenaires interrogent la même requête toutes les quelques
+minutes. La réponse filtrée est mise en cache dans Redis, pour une durée
+courte et propre à chaque opération (DS_PROXY_CACHE_TTL,
+DS_PROXY_CACHE_TTL_BY_OPERATION), sous une clé qui dépend :
+
+- du document GraphQL normalisé (``PreparedOperation.normalized_hash`` :
+  espaces et commentaires n'entrent pas en compte) et de l'opération choisie ;
+- des variables ;
+- de la démarche et du groupe instructeur du token : deux tokens qui voient
+  les mêmes dossiers partagent les entrées, les autres jamais.
+
+Seules les requêtes en lecture (pas de mutation) sont mises en cache, et
+uniquement les réponses complètes (sans erreur DS) et plus petites que
+DS_PROXY_CACHE_MAX_BYTES. Une panne Redis équivaut à un cache vide.
+Les hits / misses sont comptés par token dans Redis et loggés par requête.
+"""
+
+import hashlib
+import json
+import logging
+
+import redis
+from django.conf import settings
+from graphql import OperationType
+
+logger = logging.getLogger(__name__)
+
+CACHE_HIT = "hit"
+CACHE_MISS = "miss"
+
+
+class ProxyResponseCache:
+    def __init__(self, key, ttl, proxy_token_id):
+        self.key = key
+        self.ttl = ttl
+        self.proxy_token_id = proxy_token_id
+
+    @classmethod
+    def for_request(cls, prepared, variables, proxy_token):
+        """Retourne le cache de cette requête, ou None si elle n'est pas cachable."""
+        if not settings.DS_PROXY_CACHE_ENABLED:
+            return None
+        if prepared.operation.operation is not OperationType.QUERY:
+            return None
+        ttl = settings.DS_PROXY_CACHE_TTL_BY_OPERATION.get(
+            prepared.operation_name, settings.DS_PROXY_CACHE_TTL
+        )
+        if ttl <= 0:
+            return None
+        fingerprint = json.dumps(
+            [
+                prepared.normalized_hash,
+                prepared.operation_name,
+                variables or {},
+                proxy_token.demarche.ds_number,
+                proxy_token.groupe_instructeur_ds_id,
+            ],
+            sort_keys=True,
+        )
+        digest = hashlib.sha256(fingerprint.encode()).hexdigest()
+        return cls(f"ds-proxy:cache:{digest}", ttl, proxy_token.id)
+
+    def get(self) -> bytes | None:
+        try:
+            client = _redis_client()
+            payload = client.get(self.key)
+            client.hincrby(
+                _stats_key(self.proxy_token_id),
+                CACHE_HIT if payload is not None else CACHE_MISS,
+            )
+        except redis.exceptions.RedisError as e:
+            logger.warning(
+                "DS proxy: response cache unavailable", extra={"error": str(e)}
+            )
+            return None
+        return payload
+
+    def tee(self, chunks):
+        """Transmet les chunks de la réponse et les enregistre à la fin du flux,
+        si la réponse entière tient dans DS_PROXY_CACHE_MAX_BYTES."""
+        buffered = []
+        size = 0
+        for chunk in chunks:
+            if buffered is not None:
+                size += len(chunk)
+                if size > settings.DS_PROXY_CACHE_MAX_BYTES:
+                    buffered = None
+                else:
+                    buffered.append(chunk)
+            yield chunk
+        if buffered is not None:
+            self.set(b"".join(buffered))
+
+    def set(self, payload: bytes):
+        try:
+            _redis_client().set(self.key, payload, ex=self.ttl)
+        except redis.exceptions.RedisError as e:
+            logger.warning(
+                "DS proxy: response cache unavailable", extra={"error": str(e)}
+            )
+
+
+def get_cache_stats(proxy_token_id) -> dict[str, int]:
+    stats = _redis_client().hgetall(_stats_key(proxy_token_id))
+    return {
+        CACHE_HIT: int(stats.get(CACHE_HIT.encode(), 0)),
+        CACHE_MISS: int(stats.get(CACHE_MISS.encode(), 0)),
+    }
+
+
+def _stats_key(proxy_token_id):
+    return f"ds-proxy:cache-stats:{proxy_token_id}"
+
+
+def _redis_client():
+    return redis.Redis.from_url(settings.DS_PROXY_CACHE_REDIS_URL)
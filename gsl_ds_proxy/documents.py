@@ -0,0 +1,109 @@
+"""Documents GraphQL déjà validés par le proxy DS, et requêtes persistées.
+
+Les partenaires envoient presque toujours les mêmes quelques documents. Le
+résultat de l'analyse et des vérifications qui ne dépendent que du document
+(parse, choix de l'opération, champ racine, champs de démarche autorisés) est
+gardé dans un cache LRU par worker (DS_PROXY_PREPARED_QUERY_CACHE_SIZE), sous
+l'empreinte sha256 du texte de la requête et le nom d'opération demandé. Les
+vérifications liées au token et aux variables restent faites à chaque requête.
+
+Requêtes persistées (protocole « Automatic Persisted Queries » d'Apollo) : le
+client peut n'envoyer que ``extensions.persistedQuery.sha256Hash``. Si le
+proxy ne connaît pas l'empreinte, il répond ``PersistedQueryNotFound`` et le
+client renvoie la requête complète avec son empreinte ; le texte est alors
+enregistré dans Redis (DS_PROXY_PERSISTED_QUERY_TTL), partagé par les workers.
+Seuls les documents valides sont enregistrés.
+"""
+
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import NamedTuple
+
+import redis
+from django.conf import settings
+from graphql import print_ast
+from graphql.language.ast import DocumentNode, OperationDefinitionNode
+
+logger = logging.getLogger(__name__)
+
+
+class PreparedOperation(NamedTuple):
+    query: str
+    doc: DocumentNode
+    operation: OperationDefinitionNode
+    operation_name: str | None
+    root_field: str
+    # Empreinte du document normalisé (print_ast) : indifférente aux espaces
+    # et aux commentaires, utilisée par le cache des réponses.
+    normalized_hash: str
+
+
+def document_hash(query: str) -> str:
+    return hashlib.sha256(query.encode()).hexdigest()
+
+
+def normalized_document_hash(doc: DocumentNode) -> str:
+    return document_hash(print_ast(doc))
+
+
+class PreparedOperationCache:
+    """Cache LRU, par worker, des opérations validées."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._operations: OrderedDict[tuple, PreparedOperation] = OrderedDict()
+
+    def get(self, key: tuple) -> PreparedOperation | None:
+        with self._lock:
+            prepared = self._operations.get(key)
+            if prepared is not None:
+                self._operations.move_to_end(key)
+            return prepared
+
+    def put(self, key: tuple, prepared: PreparedOperation):
+        with self._lock:
+            self._operations[key] = prepared
+            self._operations.move_to_end(key)
+            while len(self._operations) > settings.DS_PROXY_PREPARED_QUERY_CACHE_SIZE:
+                self._operations.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._operations.clear()
+
+
+prepared_operations = PreparedOperationCache()
+
+
+def load_persisted_query(sha256_hash: str) -> str | None:
+    try:
+        query = _redis_client().get(_persisted_query_key(sha256_hash))
+    except redis.exceptions.RedisError as e:
+        logger.warning(
+            "DS proxy: persisted queries unavailable", extra={"error": str(e)}
+        )
+        return None
+    return query.decode() if query is not None else None
+
+
+def store_persisted_query(sha256_hash: str, query: str):
+    try:
+        _redis_client().set(
+            _persisted_query_key(sha256_hash),
+            query,
+            ex=settings.DS_PROXY_PERSISTED_QUERY_TTL,
+        )
+    except redis.exceptions.RedisError as e:
+        logger.warning(
+            "DS proxy: persisted queries unavailable", extra={"error": str(e)}
+        )
+
+
+def _persisted_query_key(sha256_hash):
+    return f"ds-proxy:persisted-query:{sha256_hash}"
+
+
+def _redis_client():
+    return redis.Redis.from_url(settings.DS_PROXY_CACHE_REDIS_URL)
@@ -1,4 +1,12 @@
-import copy
+import json
+
+# Same three connections as views._DEMARCHE_DOSSIER_CONNECTIONS.
+_DOSSIER_CONNECTIONS = ("dossiers", "pendingDeletedDossiers", "deletedDossiers")
+
+# Depth of the dossier nodes in a getDemarche response:
+# root > data > demarche > connection > nodes > node.
+_NODE_DEPTH = 5
+_CHUNK_SIZE = 64 * 1024
 
 
 def _dossier_is_visible(dossier, allowed_groupe_ds_id):
@@ -10,44 +18,94 @@ def _dossier_is_visible(dossier, allowed_groupe_ds_id):
 
 
 def _filter_dossier_nodes(dossiers_container, allowed_groupe_ds_id):
-    """Filter nodes[] inside a dossiers connection object in-place."""
+    """Return a copy of a dossiers connection object with filtered nodes[].
+
+    Only the connection dict and the nodes list are new; the dossiers are
+    shared with the original.
+    """
     nodes = dossiers_container.get("nodes")
     if nodes is None:
-        return
-    dossiers_container["nodes"] = [
-        node for node in nodes if _dossier_is_visible(node, allowed_groupe_ds_id)
-    ]
+        return dossiers_container
+    return {
+        **dossiers_container,
+        "nodes": [
+            node for node in nodes if _dossier_is_visible(node, allowed_groupe_ds_id)
+        ],
+    }
 
 
 def filter_response(response_data, allowed_groupe_ds_id):
     """Filter a DS GraphQL response to only include authorized dossiers.
 
-    Returns a new dict (deep copy), leaving the original unchanged.
+    Returns a new dict, leaving the original unchanged. Only the containers on
+    the path to the filtered nodes are copied: a page of dossiers is not
+    duplicated in memory.
     """
-    result = copy.deepcopy(response_data)
+    result = dict(response_data)
     data = result.get("data")
     if not data:
         return result
+    data = result["data"] = dict(data)
 
-    # getDemarche → data.demarche.dossiers.nodes[]
+    # getDemarche → data.demarche.<connection>.nodes[]
     demarche = data.get("demarche")
     if demarche and isinstance(demarche, dict):
-        dossiers = demarche.get("dossiers")
-        if dossiers and isinstance(dossiers, dict):
-            _filter_dossier_nodes(dossiers, allowed_groupe_ds_id)
-
-        for connection_field in ("pendingDeletedDossiers", "deletedDossiers"):
+        demarche = data["demarche"] = dict(demarche)
+        for connection_field in _DOSSIER_CONNECTIONS:
             connection = demarche.get(connection_field)
             if connection and isinstance(connection, dict):
-                _filter_dossier_nodes(connection, allowed_groupe_ds_id)
+                demarche[connection_field] = _filter_dossier_nodes(
+                    connection, allowed_groupe_ds_id
+                )
 
     # getDossier → data.dossier (single dossier)
     dossier = data.get("dossier")
     if dossier and isinstance(dossier, dict) and "number" in dossier:
         if not _dossier_is_visible(dossier, allowed_groupe_ds_id):
             data["dossier"] = None
-            result.setdefault("errors", []).append(
-                {"message": "Dossier non autorisé pour ce token."}
-            )
+            result["errors"] = [
+                *result.get("errors", []),
+                {"message": "Dossier non autorisé pour ce token."},
+            ]
 
     return result
+
+
+def iter_json_bytes(payload, chunk_size=_CHUNK_SIZE):
+    """Serialise ``payload`` as JSON, in chunks of about ``chunk_size`` bytes.
+
+    Same output as ``json.dumps(payload).encode()``, without building the
+    whole document: containers down to the dossier nodes are written piece by
+    piece and each node is encoded on its own, so a large page is never held
+    twice (as dicts and as a string) in memory.
+    """
+    buffer = []
+    size = 0
+    for part in _iter_json(payload, _NODE_DEPTH):
+        buffer.append(part)
+        size += len(part)
+        if size >= chunk_size:
+            yield "".join(buffer).encode()
+            buffer = []
+            size = 0
+    if buffer:
+        yield "".join(buffer).encode()
+
+
+def _iter_json(value, depth):
+    if depth == 0 or not value or not isinstance(value, (dict, list)):
+        yield json.dumps(value)
+        return
+    if isinstance(value, dict):
+        yield "{"
+        for i, (key, item) in enumerate(value.items()):
+            yield f"{', ' if i else ''}{json.dumps(key)}: "
+            yield from _iter_json(item, depth - 1)
+        yield "}"
+        return
+    yield "["
+    for i, item in enumerate(value):
+        if i:
+            yield ", "
+        yield from _iter_json(item, depth - 1)
+    yield "]"
@@ -1,33 +1,88 @@
 import logging
+import math
+import time
+import uuid
+from typing import NamedTuple
 
 import redis
 from django.conf import settings
 
+from gsl_core.locks import LeaseSemaphore
+
 logger = logging.getLogger(__name__)
 
+_POLL_INTERVAL = 0.05
+
+
+class TokenSlot(NamedTuple):
+    key: str
+    slot_id: str
+    queue_wait_ms: int
+
 
-def acquire_token_lock(token_id):
-    """Verrou Redis non bloquant : une requête proxy en vol par token.
+def acquire_token_slot(token_id, max_concurrency):
+    """Sémaphore Redis : au plus ``max_concurrency`` requêtes proxy en vol par token.
 
-    Retourne l'objet lock si acquis, None s'il est déjà détenu (une autre
-    requête du même token tourne déjà).
+    Si tous les créneaux sont pris, la requête attend dans une file courte
+    (DS_PROXY_TOKEN_QUEUE_SIZE requêtes au plus, pendant
+    DS_PROXY_TOKEN_QUEUE_TIMEOUT secondes au plus). Retourne le TokenSlot
+    acquis, ou None si la file est pleine ou l'attente trop longue.
     """
     client = redis.Redis.from_url(settings.CELERY_BROKER_URL)
-    lock = client.lock(
-        f"ds-proxy:token:{token_id}",
-        timeout=settings.DS_PROXY_TOKEN_LOCK_TIMEOUT,
-    )
-    return lock if lock.acquire(blocking=False) else None
+    key = f"ds-proxy:token:{token_id}:slots"
+    slots = LeaseSemaphore(client, key, settings.DS_PROXY_TOKEN_LOCK_TIMEOUT)
+    slot_id = uuid.uuid4().hex
+    started_at = time.monotonic()
+
+    def _take():
+        return slots.acquire(max_concurrency, slot_id)
 
+    if _take():
+        return TokenSlot(key, slot_id, 0)
 
-def release_token_lock(lock, token_id):
+    # La file est elle aussi un sémaphore à baux datés : la place d'un process
+    # mort pendant l'attente est récupérée une fois le délai d'attente passé.
+    queue_timeout = settings.DS_PROXY_TOKEN_QUEUE_TIMEOUT
+    waiters = LeaseSemaphore(
+        client, f"ds-proxy:token:{token_id}:waiters", math.ceil(queue_timeout) + 1
+    )
+    if not waiters.acquire(settings.DS_PROXY_TOKEN_QUEUE_SIZE, slot_id):
+        _log_rejection(token_id, "queue_full", started_at)
+        return None
     try:
-        lock.release()
-    except redis.exceptions.LockError:
-        # TTL expiré avant la fin du forward : le verrou ne nous appartient
-        # plus. On laisse passer (try étroit, type ciblé).
+        deadline = started_at + queue_timeout
+        while time.monotonic() < deadline:
+            time.sleep(_POLL_INTERVAL)
+            if _take():
+                return TokenSlot(key, slot_id, _elapsed_ms(started_at))
+        _log_rejection(token_id, "wait_timeout", started_at)
+        return None
+    finally:
+        waiters.release(slot_id)
+
+
+def _elapsed_ms(started_at):
+    return int((time.monotonic() - started_at) * 1000)
+
+
+def _log_rejection(token_id, reason, started_at):
+    logger.warning(
+        "DS proxy: token slot rejected",
+        extra={
+            "proxy_token_id": token_id,
+            "reason": reason,
+            "queue_wait_ms": _elapsed_ms(started_at),
+        },
+    )
+
+
+def release_token_slot(slot, token_id):
+    client = redis.Redis.from_url(settings.CELERY_BROKER_URL)
+    slots = LeaseSemaphore(client, slot.key, settings.DS_PROXY_TOKEN_LOCK_TIMEOUT)
+    if not slots.release(slot.slot_id):
+        # TTL expiré avant la fin du forward : le créneau a déjà été récupéré.
         logger.warning(
-            "DS proxy token lock for token %s expired before release "
+            "DS proxy token slot for token %s expired before release "
             "(request longer than DS_PROXY_TOKEN_LOCK_TIMEOUT?)",
             token_id,
         )
@@ -0,0 +1,22 @@
+# Generated by Django 6.0.7 on 2026-10-17 23:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("gsl_ds_proxy", "0002_groupe_instructeur"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="proxytoken",
+            name="max_concurrent_requests",
+            field=models.PositiveSmallIntegerField(
+                blank=True,
+                help_text="Par défaut : DS_PROXY_TOKEN_MAX_CONCURRENCY.",
+                null=True,
+                verbose_name="Requêtes simultanées maximum",
+            ),
+        ),
+    ]
@@ -1,6 +1,7 @@
 import hashlib
 import secrets
 
+from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.db import models
 
@@ -29,6 +30,12 @@ class ProxyToken(BaseModel):
         db_index=True,
     )
     is_active = models.BooleanField("Actif", default=True)
+    max_concurrent_requests = models.PositiveSmallIntegerField(
+        "Requêtes simultanées maximum",
+        null=True,
+        blank=True,
+        help_text="Par défaut : DS_PROXY_TOKEN_MAX_CONCURRENCY.",
+    )
 
     class Meta:
         verbose_name = "Token proxy DS"
@@ -37,6 +44,10 @@ class ProxyToken(BaseModel):
     def __str__(self):
         return self.label
 
+    @property
+    def concurrency_limit(self) -> int:
+        return self.max_concurrent_requests or settings.DS_PROXY_TOKEN_MAX_CONCURRENCY
+
     @staticmethod
     def hash_key(plaintext: str) -> str:
         return hashlib.sha256(plaintext.encode("utf-8")).hexdigest()
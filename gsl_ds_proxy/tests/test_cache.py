@@ -0,0 +1,129 @@
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import redis
+from django.test import override_settings
+from graphql import OperationDefinitionNode, parse
+
+from gsl_ds_proxy.cache import ProxyResponseCache
+from gsl_ds_proxy.documents import PreparedOperation, normalized_document_hash
+
+_QUERY = "query getDemarche($demarcheNumber: Int!) { demarche(number: $demarcheNumber) { number } }"
+
+
+def _token(groupe_instructeur_ds_id="GROUPE-1", token_id=7):
+    return SimpleNamespace(
+        id=token_id,
+        demarche=SimpleNamespace(ds_number=123),
+        groupe_instructeur_ds_id=groupe_instructeur_ds_id,
+    )
+
+
+def _cache(query=_QUERY, variables=None, token=None):
+    doc = parse(query)
+    operation = next(
+        d for d in doc.definitions if isinstance(d, OperationDefinitionNode)
+    )
+    prepared = PreparedOperation(
+        query=query,
+        doc=doc,
+        operation=operation,
+        operation_name=operation.name.value if operation.name else None,
+        root_field="demarche",
+        normalized_hash=normalized_document_hash(doc),
+    )
+    return ProxyResponseCache.for_request(
+        prepared, variables or {"demarcheNumber": 123}, token or _token()
+    )
+
+
+@override_settings(DS_PROXY_CACHE_ENABLED=False)
+def test_no_cache_when_disabled():
+    assert _cache() is None
+
+
+@override_settings(DS_PROXY_CACHE_ENABLED=True)
+def test_key_ignores_query_formatting_and_comments():
+    reformatted = """
+    # même requête, autrement écrite
+    query getDemarche($demarcheNumber: Int!) {
+      demarche(number: $demarcheNumber) {
+        number
+      }
+    }
+    """
+    assert _cache(reformatted).key == _cache().key
+
+
+@override_settings(DS_PROXY_CACHE_ENABLED=True)
+def test_key_depends_on_variables_and_allowed_groupe():
+    key = _cache().key
+
+    assert _cache(variables={"demarcheNumber": 456}).key != key
+    assert _cache(token=_token("GROUPE-2")).key != key
+    # Même périmètre : l'entrée est partagée entre tokens
+    assert _cache(token=_token(token_id=8)).key == key
+
+
+@override_settings(
+    DS_PROXY_CACHE_ENABLED=True,
+    DS_PROXY_CACHE_TTL=60,
+    DS_PROXY_CACHE_TTL_BY_OPERATION={"getDemarche": 300, "getDossier": 0},
+)
+def test_ttl_by_operation():
+    assert _cache().ttl == 300
+    assert _cache("query getDossier { dossier(number: 1) { number } }") is None
+    assert _cache("query other { demarche(number: 1) { number } }").ttl == 60
+
+
+@override_settings(DS_PROXY_CACHE_ENABLED=True)
+def test_no_cache_for_mutations():
+    assert _cache("mutation { dossierAccepter { id } }") is None
+
+
+@override_settings(DS_PROXY_CACHE_ENABLED=True)
+@patch("gsl_ds_proxy.cache.redis.Redis.from_url")
+def test_get_counts_hits_and_misses_per_token(mock_from_url):
+    client = MagicMock()
+    client.get.side_effect = [None, b'{"data": {}}']
+    mock_from_url.return_value = client
+    cache = _cache()
+
+    assert cache.get() is None
+    assert cache.get() == b'{"data": {}}'
+
+    assert [c.args for c in client.hincrby.call_args_list] == [
+        ("ds-proxy:cache-stats:7", "miss"),
+        ("ds-proxy:cache-stats:7", "hit"),
+    ]
+
+
+@override_settings(DS_PROXY_CACHE_ENABLED=True)
+@patch("gsl_ds_proxy.cache.redis.Redis.from_url")
+def test_get_is_a_miss_when_redis_is_down(mock_from_url, caplog):
+    mock_from_url.return_value.get.side_effect = redis.exceptions.ConnectionError()
+
+    assert _cache().get() is None
+    assert "DS proxy: response cache unavailable" in caplog.messages
+
+
+@override_settings(
+    DS_PROXY_CACHE_ENABLED=True, DS_PROXY_CACHE_TTL=60, DS_PROXY_CACHE_MAX_BYTES=10
+)
+@patch("gsl_ds_proxy.cache.redis.Redis.from_url")
+def test_tee_stores_the_whole_response_once_streamed(mock_from_url):
+    cache = _cache("query other { demarche(number: 1) { number } }")
+
+    assert list(cache.tee(iter([b"abc", b"def"]))) == [b"abc", b"def"]
+
+    mock_from_url.return_value.set.assert_called_once_with(cache.key, b"abcdef", ex=60)
+
+
+@override_settings(DS_PROXY_CACHE_ENABLED=True, DS_PROXY_CACHE_MAX_BYTES=5)
+@patch("gsl_ds_proxy.cache.redis.Redis.from_url")
+def test_tee_does_not_store_responses_over_max_bytes(mock_from_url):
+    cache = _cache()
+
+    assert list(cache.tee(iter([b"abc", b"def"]))) == [b"abc", b"def"]
+
+    mock_from_url.return_value.set.assert_not_called()
@@ -0,0 +1,46 @@
+from unittest.mock import MagicMock, patch
+
+import redis
+from django.test import override_settings
+
+from gsl_ds_proxy.documents import (
+    PreparedOperationCache,
+    load_persisted_query,
+    store_persisted_query,
+)
+
+
+@override_settings(DS_PROXY_PREPARED_QUERY_CACHE_SIZE=2)
+def test_prepared_operation_cache_evicts_least_recently_used():
+    cache = PreparedOperationCache()
+    cache.put(("a", None), "A")
+    cache.put(("b", None), "B")
+    cache.get(("a", None))
+    cache.put(("c", None), "C")
+
+    assert cache.get(("a", None)) == "A"
+    assert cache.get(("b", None)) is None
+    assert cache.get(("c", None)) == "C"
+
+
+@override_settings(DS_PROXY_PERSISTED_QUERY_TTL=3600)
+@patch("gsl_ds_proxy.documents.redis.Redis.from_url")
+def test_persisted_query_round_trip(mock_from_url):
+    client = MagicMock()
+    client.get.return_value = b"query { demarche { number } }"
+    mock_from_url.return_value = client
+
+    store_persisted_query("abc", "query { demarche { number } }")
+
+    client.set.assert_called_once_with(
+        "ds-proxy:persisted-query:abc", "query { demarche { number } }", ex=3600
+    )
+    assert load_persisted_query("abc") == "query { demarche { number } }"
+
+
+@patch("gsl_ds_proxy.documents.redis.Redis.from_url")
+def test_persisted_query_unknown_when_redis_is_down(mock_from_url, caplog):
+    mock_from_url.return_value.get.side_effect = redis.exceptions.ConnectionError()
+
+    assert load_persisted_query("abc") is None
+    assert "DS proxy: persisted queries unavailable" in caplog.messages
@@ -1,6 +1,8 @@
-from django.test import TestCase
+import json
 
-from gsl_ds_proxy.filters import filter_response
+from django.test import SimpleTestCase, TestCase
+
+from gsl_ds_proxy.filters import filter_response, iter_json_bytes
 
 
 def _make_dossier(number, groupe_id):
@@ -53,6 +55,12 @@ class FilterResponseDemarcheTest(TestCase):
         result = filter_response(response, "GROUPE-A")
         self.assertEqual(result["data"]["demarche"]["dossiers"]["nodes"], [])
 
+    def test_shares_visible_dossiers_with_original(self):
+        dossier = _make_dossier(1, "GROUPE-A")
+        response = self._make_demarche_response([dossier])
+        result = filter_response(response, "GROUPE-A")
+        self.assertIs(result["data"]["demarche"]["dossiers"]["nodes"][0], dossier)
+
     def test_does_not_mutate_original(self):
         response = self._make_demarche_response(
             [
@@ -260,3 +268,41 @@ class FilterResponsePassthroughTest(TestCase):
         response = {"data": {"demarche": {"title": "Test"}}}
         result = filter_response(response, "GROUPE-A")
         self.assertEqual(result["data"]["demarche"]["title"], "Test")
+
+
+class IterJsonBytesTest(SimpleTestCase):
+    def test_matches_json_dumps_whatever_the_chunk_size(self):
+        payload = {
+            "data": {
+                "demarche": {
+                    "number": 1,
+                    "dossiers": {
+                        "pageInfo": {"hasNextPage": True, "endCursor": "abc"},
+                        "nodes": [
+                            {"number": 1, "champs": [{"label": "é", "v": None}]},
+                            {"number": 2, "champs": []},
+                        ],
+                    },
+                    "deletedDossiers": {"nodes": []},
+                }
+            },
+            "errors": [{"message": "Timeout", "path": ["demarche", 0]}],
+        }
+        for chunk_size in (1, 16, 64 * 1024):
+            with self.subTest(chunk_size=chunk_size):
+                chunks = list(iter_json_bytes(payload, chunk_size=chunk_size))
+                self.assertEqual(b"".join(chunks), json.dumps(payload).encode())
+
+    def test_yields_several_chunks_for_a_large_page(self):
+        payload = {
+            "data": {
+                "demarche": {
+                    "dossiers": {
+                        "nodes": [{"number": i, "label": "x" * 100} for i in range(50)]
+                    }
+                }
+            }
+        }
+        chunks = list(iter_json_bytes(payload, chunk_size=1024))
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(json.loads(b"".join(chunks)), payload)
@@ -1,62 +1,119 @@
 from unittest.mock import MagicMock, patch
 
-import redis
 from django.test import override_settings
 
-from gsl_ds_proxy.locks import acquire_token_lock, release_token_lock
+from gsl_ds_proxy.locks import TokenSlot, acquire_token_slot, release_token_slot
+
+
+def _redis_client(take_slot_results, joins_queue=True):
+    """Client Redis factice : register_script renvoie le sémaphore des créneaux,
+    qui répond successivement ``take_slot_results``, puis celui de la file."""
+    client = MagicMock()
+    take_slot = MagicMock(side_effect=take_slot_results)
+    join_queue = MagicMock(return_value=int(joins_queue))
+    client.register_script.side_effect = [take_slot, join_queue]
+    return client, take_slot, join_queue
 
 
 @override_settings(DS_PROXY_TOKEN_LOCK_TIMEOUT=90)
 @patch("gsl_ds_proxy.locks.redis.Redis.from_url")
-def test_acquire_returns_lock_when_free(mock_from_url):
-    lock = MagicMock()
-    lock.acquire.return_value = True
-    client = MagicMock()
-    client.lock.return_value = lock
+def test_acquire_returns_a_slot_when_one_is_free(mock_from_url):
+    client, take_slot, join_queue = _redis_client([1])
     mock_from_url.return_value = client
 
-    result = acquire_token_lock(7)
+    slot = acquire_token_slot(7, 3)
 
-    assert result is lock
-    client.lock.assert_called_once_with("ds-proxy:token:7", timeout=90)
-    lock.acquire.assert_called_once_with(blocking=False)
+    assert slot.key == "ds-proxy:token:7:slots"
+    assert slot.queue_wait_ms == 0
+    kwargs = take_slot.call_args.kwargs
+    assert kwargs["keys"] == ["ds-proxy:token:7:slots"]
+    assert kwargs["args"][0] == 3
+    assert kwargs["args"][2] == 90
+    assert kwargs["args"][3] == slot.slot_id
+    join_queue.assert_not_called()
 
 
+@override_settings(DS_PROXY_TOKEN_QUEUE_SIZE=2, DS_PROXY_TOKEN_QUEUE_TIMEOUT=10)
+@patch("gsl_ds_proxy.locks.time.sleep")
 @patch("gsl_ds_proxy.locks.redis.Redis.from_url")
-def test_acquire_returns_none_when_held(mock_from_url):
-    lock = MagicMock()
-    lock.acquire.return_value = False
-    client = MagicMock()
-    client.lock.return_value = lock
+def test_acquire_waits_in_the_queue_until_a_slot_is_released(mock_from_url, mock_sleep):
+    client, take_slot, join_queue = _redis_client([0, 0, 1])
     mock_from_url.return_value = client
 
-    assert acquire_token_lock(7) is None
+    slot = acquire_token_slot(7, 1)
+
+    assert isinstance(slot, TokenSlot)
+    assert take_slot.call_count == 3
+    assert mock_sleep.call_count == 2
+    # Place dans la file : bail daté, récupéré après le délai d'attente
+    kwargs = join_queue.call_args.kwargs
+    assert kwargs["keys"] == ["ds-proxy:token:7:waiters"]
+    assert kwargs["args"][0] == 2
+    assert kwargs["args"][2] == 11
+    assert kwargs["args"][3] == slot.slot_id
+    client.zrem.assert_called_once_with("ds-proxy:token:7:waiters", slot.slot_id)
 
 
+@override_settings(DS_PROXY_TOKEN_QUEUE_SIZE=2)
+@patch("gsl_ds_proxy.locks.time.sleep")
 @patch("gsl_ds_proxy.locks.redis.Redis.from_url")
-def test_distinct_tokens_use_distinct_keys(mock_from_url):
-    client = MagicMock()
-    client.lock.return_value.acquire.return_value = True
+def test_acquire_rejects_immediately_when_the_queue_is_full(
+    mock_from_url, mock_sleep, caplog
+):
+    client, _, _ = _redis_client([0], joins_queue=False)
+    mock_from_url.return_value = client
+
+    assert acquire_token_slot(7, 1) is None
+
+    mock_sleep.assert_not_called()
+    client.zrem.assert_not_called()
+    record = next(r for r in caplog.records if r.msg == "DS proxy: token slot rejected")
+    assert record.reason == "queue_full"
+
+
+@override_settings(DS_PROXY_TOKEN_QUEUE_SIZE=2, DS_PROXY_TOKEN_QUEUE_TIMEOUT=0)
+@patch("gsl_ds_proxy.locks.redis.Redis.from_url")
+def test_acquire_rejects_after_the_queue_timeout(mock_from_url, caplog):
+    client, _, _ = _redis_client([0])
     mock_from_url.return_value = client
 
-    acquire_token_lock(1)
-    acquire_token_lock(2)
+    assert acquire_token_slot(7, 1) is None
 
-    keys = [call.args[0] for call in client.lock.call_args_list]
-    assert keys == ["ds-proxy:token:1", "ds-proxy:token:2"]
+    record = next(r for r in caplog.records if r.msg == "DS proxy: token slot rejected")
+    assert record.reason == "wait_timeout"
+    assert client.zrem.call_args.args[0] == "ds-proxy:token:7:waiters"
 
 
-def test_release_calls_lock_release():
-    lock = MagicMock()
-    release_token_lock(lock, 7)
-    lock.release.assert_called_once_with()
+@patch("gsl_ds_proxy.locks.redis.Redis.from_url")
+def test_distinct_tokens_use_distinct_keys(mock_from_url):
+    take_slot = MagicMock(return_value=1)
+    mock_from_url.return_value.register_script.return_value = take_slot
+
+    acquire_token_slot(1, 1)
+    acquire_token_slot(2, 1)
+
+    keys = [call.kwargs["keys"][0] for call in take_slot.call_args_list]
+    assert keys == ["ds-proxy:token:1:slots", "ds-proxy:token:2:slots"]
+
+
+@patch("gsl_ds_proxy.locks.redis.Redis.from_url")
+def test_release_removes_the_slot(mock_from_url):
+    client = MagicMock()
+    client.zrem.return_value = 1
+    mock_from_url.return_value = client
+
+    release_token_slot(TokenSlot("ds-proxy:token:7:slots", "abc", 0), 7)
+
+    client.zrem.assert_called_once_with("ds-proxy:token:7:slots", "abc")
 
 
-def test_release_swallows_lock_error_when_ttl_expired():
-    lock = MagicMock()
-    lock.release.side_effect = redis.exceptions.LockError("not owned")
+@patch("gsl_ds_proxy.locks.redis.Redis.from_url")
+def test_release_tolerates_an_expired_slot(mock_from_url, caplog):
+    client = MagicMock()
+    client.zrem.return_value = 0
+    mock_from_url.return_value = client
 
-    # Must not raise: the TTL expired and the lock is no longer ours.
-    release_token_lock(lock, 7)
+    # Must not raise: the TTL expired and the slot was already reclaimed.
+    release_token_slot(TokenSlot("ds-proxy:token:7:slots", "abc", 0), 7)
 
-    lock.release.assert_called_once_with()
+    assert "expired before release" in caplog.text
@@ -0,0 +1,79 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+import requests
+from django.test import override_settings
+
+from gsl_ds_proxy import upstream
+
+
+@pytest.fixture
+def session():
+    session = MagicMock()
+    session.post.return_value.content = b'{"data": {}}'
+    with patch("gsl_ds_proxy.upstream.get_upstream_session", return_value=session):
+        yield session
+
+
+def _post():
+    return upstream.post(
+        "https://ds.test/graphql",
+        json={"query": "{ demarche { number } }"},
+        headers={},
+        timeout=(5, 55),
+        log_extra={"request_id": "abc"},
+    )
+
+
+@pytest.fixture
+def fresh_session():
+    upstream._session = None
+    yield
+    upstream._session = None
+
+
+@override_settings(DS_PROXY_UPSTREAM_POOL_SIZE=4)
+def test_upstream_session_is_shared_and_keeps_no_cookies(fresh_session):
+    session = upstream.get_upstream_session()
+
+    assert upstream.get_upstream_session() is session
+    adapter = session.get_adapter("https://ds.test/graphql")
+    assert adapter._pool_maxsize == 4
+    assert adapter.poolmanager.pool_classes_by_scheme["https"] is (
+        upstream._TimedHTTPSConnectionPool
+    )
+    assert session.cookies.get_policy().allowed_domains() == ()
+
+
+def test_post_reads_the_body_and_logs_upstream_timings(session, caplog):
+    caplog.set_level("INFO", logger="gsl_ds_proxy.upstream")
+
+    response = _post()
+
+    assert response is session.post.return_value
+    assert session.post.call_args.kwargs["stream"] is True
+    assert session.post.call_args.kwargs["timeout"] == (5, 55)
+    (record,) = [r for r in caplog.records if r.msg == "DS proxy: upstream timings"]
+    assert record.request_id == "abc"
+    assert record.connection_reused is True
+    assert record.connect_ms == 0
+    assert record.response_size == len(b'{"data": {}}')
+    assert record.pool_exhausted is False
+    assert upstream._in_flight == 0
+
+
+@override_settings(DS_PROXY_UPSTREAM_POOL_SIZE=1)
+def test_post_reports_pool_exhaustion(session, caplog):
+    with patch("gsl_ds_proxy.upstream._in_flight", 1):
+        _post()
+
+    assert "DS proxy: upstream pool exhausted" in caplog.messages
+
+
+def test_post_releases_its_pool_slot_on_error(session):
+    session.post.side_effect = requests.exceptions.ConnectTimeout()
+
+    with pytest.raises(requests.exceptions.Timeout):
+        _post()
+
+    assert upstream._in_flight == 0
@@ -1,13 +1,18 @@
 import json
-from unittest.mock import MagicMock, patch
+from unittest.mock import patch
 
 from django.test import TestCase, override_settings
+from graphql import parse
 
 from gsl_demarches_simplifiees.tests.factories import (
     DemarcheFactory,
 )
+from gsl_ds_proxy.documents import document_hash, prepared_operations
+from gsl_ds_proxy.locks import TokenSlot
 from gsl_ds_proxy.tests.factories import ProxyTokenFactory
 
+_FAKE_SLOT = TokenSlot("ds-proxy:token:1:slots", "slot", 0)
+
 
 def _read_stream(response):
     return b"".join(response.streaming_content)
@@ -28,15 +33,15 @@ class GraphqlProxyViewTest(TestCase):
         self.url = "/ds-proxy/graphql/"
         self.headers = {"HTTP_AUTHORIZATION": f"Bearer {self.token.plaintext_key}"}
 
-        # The per-token Redis lock is exercised on its own in
+        # The per-token Redis semaphore is exercised on its own in
         # GraphqlProxyTokenLockTest; here we neutralise it (always acquired,
         # no-op release) so the rest of the suite doesn't need a live Redis.
         acquire_patcher = patch(
-            "gsl_ds_proxy.views.acquire_token_lock", return_value=MagicMock()
+            "gsl_ds_proxy.views.acquire_token_slot", return_value=_FAKE_SLOT
         )
         self.mock_acquire = acquire_patcher.start()
         self.addCleanup(acquire_patcher.stop)
-        release_patcher = patch("gsl_ds_proxy.views.release_token_lock")
+        release_patcher = patch("gsl_ds_proxy.views.release_token_slot")
         self.mock_release = release_patcher.start()
         self.addCleanup(release_patcher.stop)
 
@@ -104,7 +109,7 @@ class GraphqlProxyViewTest(TestCase):
         response = self.client.get(self.url, **self.headers)
         self.assertEqual(response.status_code, 405)
 
-    @patch("gsl_ds_proxy.views.requests.post")
+    @patch("gsl_ds_proxy.views.upstream.post")
     def test_successful_proxy(self, mock_post):
         ds_response_data = {
             "data": {
@@ -151,7 +156,7 @@ class GraphqlProxyViewTest(TestCase):
             "Bearer test-ds-token",
         )
 
-    @patch("gsl_ds_proxy.views.requests.post")
+    @patch("gsl_ds_proxy.views.upstream.post")
     def test_ds_connection_error(self, mock_post):
         import requests as req
 
@@ -165,7 +170,7 @@ class GraphqlProxyViewTest(TestCase):
             "Erreur de connexion à Démarches Simplifiées.",
         )
 
-    @patch("gsl_ds_proxy.views.requests.post")
+    @patch("gsl_ds_proxy.views.upstream.post")
     def test_ds_http_error(self, mock_post):
         import requests as req
 
@@ -179,7 +184,7 @@ class GraphqlProxyViewTest(TestCase):
             data["errors"][0]["message"], "Erreur de Démarches Simplifiées."
         )
 
-    @patch("gsl_ds_proxy.views.requests.post")
+    @patch("gsl_ds_proxy.views.upstream.post")
     def test_upstream_errors_forwarded_when_data_null(self, mock_post):
         upstream = {
             "data": None,
@@ -197,7 +202,7 @@ class GraphqlProxyViewTest(TestCase):
         self.assertIn(upstream["errors"][0], errors)
         self.assertNotIn("La requête doit inclure", raw)
 
-    @patch("gsl_ds_proxy.views.requests.post")
+    @patch("gsl_ds_proxy.views.upstream.post")
     def test_upstream_errors_forwarded_when_data_empty(self, mock_post):
         upstream = {
             "data": {},
@@ -215,7 +220,7 @@ class GraphqlProxyViewTest(TestCase):
         self.assertIn(upstream["errors"][0], errors)
         self.assertNotIn("La requête doit inclure", raw)
 
-    @patch("gsl_ds_proxy.views.requests.post")
+    @patch("gsl_ds_proxy.views.upstream.post")
     def test_upstream_errors_forwarded_for_getDossier(self, mock_post):
         upstream = {
             "data": {"dossier": None},
@@ -252,7 +257,7 @@ class GraphqlProxyViewTest(TestCase):
         )
         self.assertEqual(response.status_code, 403)
 
-    @patch("gsl_ds_proxy.views.requests.post")
+    @patch("gsl_ds_proxy.views.upstream.post")
     def test_getDossier_of_token_demarche_allowed(self, mock_post):
         mock_post.return_value.status_code = 200
         mock_post.return_value.raise_for_status.return_value = None
@@ -276,7 +281,7 @@ class GraphqlProxyViewTest(TestCase):
         data = _parse_stream(response)
         self.assertIn("data", data)
 
-    @patch("gsl_ds_proxy.views.requests.post")
+    @patch("gsl_ds_proxy.views.upstream.post")
     def test_getDossier_of_other_demarche_rejected(self, mock_post):
         mock_post.return_value.status_code = 200
         mock_post.return_value.raise_for_status.return_value = None
@@ -300,7 +305,7 @@ class GraphqlProxyViewTest(TestCase):
         data = _parse_stream(response)
         self.assertIn("errors", data)
 
-    @patch("gsl_ds_proxy.views.requests.post")
+    @patch("gsl_ds_proxy.views.upstream.post")
     def test_getDossier_without_demarche_in_response_rejected(self, mock_post):
         mock_post.return_value.status_code = 200
         mock_post.return_value.raise_for_status.return_value = None
@@ -336,7 +341,7 @@ class GraphqlProxyViewTest(TestCase):
         )
         self.assertEqual(response.status_code, 403)
 
-    @patch("gsl_ds_proxy.views.requests.post")
+    @patch("gsl_ds_proxy.views.upstream.post")
     def test_arbitrary_operation_name_allowed_when_root_field_is_demarche(
         self, mock_post
     ):
@@ -386,7 +391,7 @@ class GraphqlProxyViewTest(TestCase):
         )
         self.assertEqual(response.status_code, 403)
 
-    @patch("gsl_ds_proxy.views.requests.post")
+    @patch("gsl_ds_proxy.views.upstream.post")
     def test_introspection_query_allowed_with_arbitrary_name(self, mock_post):
         introspection_payload = {"data": {"__schema": {"types": [{"name": "Query"}]}}}
         mock_post.return_value.status_code = 200
@@ -414,7 +419,7 @@ class GraphqlProxyViewTest(TestCase):
         )
         self.assertEqual(response.status_code, 403)
 
-    @patch("gsl_ds_proxy.views.requests.post")
+    @patch("gsl_ds_proxy.views.upstream.post")
     def test_getDemarche_response_with_wrong_demarche_number_rejected(self, mock_post):
         mock_post.return_value.status_code = 200
         mock_post.return_value.raise_for_status.return_value = None
@@ -437,7 +442,7 @@ class GraphqlProxyViewTest(TestCase):
         data = _parse_stream(response)
         self.assertIn("errors", data)
 
-    @patch("gsl_ds_proxy.views.requests.post")
+    @patch("gsl_ds_proxy.views.upstream.post")
     def test_getDemarche_response_without_number_field_rejected(self, mock_post):
         mock_post.return_value.status_code = 200
         mock_post.return_value.raise_for_status.return_value = None
@@ -473,7 +478,7 @@ class GraphqlProxyViewTest(TestCase):
         response = self._post({"query": "subscription { dossierUpdated { id } }"})
         self.assertEqual(response.status_code, 403)
 
-    @patch("gsl_ds_proxy.views.requests.post")
+    @patch("gsl_ds_proxy.views.upstream.post")
     def test_query_with_leading_comment_parsed(self, mock_post):
         mock_post.return_value.status_code = 200
         mock_post.return_value.raise_for_status.return_value = None
@@ -495,7 +500,7 @@ class GraphqlProxyViewTest(TestCase):
         data = _parse_stream(response)
         self.assertEqual(data["data"]["demarche"]["number"], self.demarche.ds_number)
 
-    @patch("gsl_ds_proxy.views.requests.post")
+    @patch("gsl_ds_proxy.views.upstream.post")
     def test_ds_timeout_returns_in_band_error(self, mock_post):
         import requests as req
 
@@ -509,7 +514,7 @@ class GraphqlProxyViewTest(TestCase):
             "Délai d'attente dépassé pour Démarches Simplifiées.",
         )
 
-    @patch("gsl_ds_proxy.views.requests.post")
+    @patch("gsl_ds_proxy.views.upstream.post")
     def test_query_forwarded_verbatim(self, mock_post):
         """The proxy should not rewrite the query — it's forwarded as sent."""
         mock_post.return_value.status_code = 200
@@ -554,7 +559,7 @@ class GraphqlProxyViewTest(TestCase):
         response = self._post({"query": "fragment DossierFields on Dossier { number }"})
         self.assertEqual(response.status_code, 400)
 
-    @patch("gsl_ds_proxy.views.requests.post")
+    @patch("gsl_ds_proxy.views.upstream.post")
     def test_shorthand_query_accepted(self, mock_post):
         mock_post.return_value.status_code = 200
         mock_post.return_value.raise_for_status.return_value = None
@@ -576,7 +581,7 @@ class GraphqlProxyViewTest(TestCase):
         data = _parse_stream(response)
         self.assertEqual(data["data"]["demarche"]["number"], self.demarche.ds_number)
 
-    @patch("gsl_ds_proxy.views.requests.post")
+    @patch("gsl_ds_proxy.views.upstream.post")
     def test_getDemarche_groupeInstructeurs_field_rejected(self, mock_post):
         response = self._post(
             {
@@ -596,7 +601,7 @@ class GraphqlProxyViewTest(TestCase):
             "Champ démarche non autorisé : `groupeInstructeurs`.",
         )
 
-    @patch("gsl_ds_proxy.views.requests.post")
+    @patch("gsl_ds_proxy.views.upstream.post")
     def test_getDossier_demarche_groupeInstructeurs_field_rejected(self, mock_post):
         response = self._post(
             {
@@ -616,7 +621,7 @@ class GraphqlProxyViewTest(TestCase):
             "Champ démarche non autorisé : `groupeInstructeurs`.",
         )
 
-    @patch("gsl_ds_proxy.views.requests.post")
+    @patch("gsl_ds_proxy.views.upstream.post")
     def test_getDemarche_allowed_fields_pass(self, mock_post):
         ds_response_data = {
             "data": {
@@ -669,7 +674,7 @@ class GraphqlProxyViewTest(TestCase):
         )
         self.assertEqual(response.status_code, 400)
 
-    @patch("gsl_ds_proxy.views.requests.post")
+    @patch("gsl_ds_proxy.views.upstream.post")
     def test_ds_post_called_with_timeout(self, mock_post):
         mock_post.return_value.status_code = 200
         mock_post.return_value.raise_for_status.return_value = None
@@ -691,7 +696,7 @@ class GraphqlProxyViewTest(TestCase):
         _read_stream(response)
         self.assertEqual(mock_post.call_args.kwargs["timeout"], (5, 55))
 
-    @patch("gsl_ds_proxy.views.requests.post")
+    @patch("gsl_ds_proxy.views.upstream.post")
     def test_first_byte_is_heartbeat_space(self, mock_post):
         mock_post.return_value.status_code = 200
         mock_post.return_value.raise_for_status.return_value = None
@@ -713,7 +718,7 @@ class GraphqlProxyViewTest(TestCase):
         first_chunk = next(iter(response.streaming_content))
         self.assertEqual(first_chunk, b" ")
 
-    @patch("gsl_ds_proxy.views.requests.post")
+    @patch("gsl_ds_proxy.views.upstream.post")
     def test_final_payload_is_valid_json_with_leading_heartbeat(self, mock_post):
         ds_data = {
             "data": {
@@ -738,7 +743,7 @@ class GraphqlProxyViewTest(TestCase):
         self.assertTrue(stream_bytes.startswith(b" "))
         self.assertEqual(json.loads(stream_bytes.lstrip()), ds_data)
 
-    @patch("gsl_ds_proxy.views.requests.post")
+    @patch("gsl_ds_proxy.views.upstream.post")
     def test_connection_error_during_streaming_yields_graphql_error_with_200(
         self, mock_post
     ):
@@ -754,7 +759,7 @@ class GraphqlProxyViewTest(TestCase):
             "Erreur de connexion à Démarches Simplifiées.",
         )
 
-    @patch("gsl_ds_proxy.views.requests.post")
+    @patch("gsl_ds_proxy.views.upstream.post")
     def test_scope_check_failure_during_streaming_yields_graphql_error_with_200(
         self, mock_post
     ):
@@ -861,7 +866,7 @@ class GraphqlProxyViewTest(TestCase):
         body = json.loads(response.content)
         self.assertTrue(body["errors"][0]["extensions"]["requestId"])
 
-    @patch("gsl_ds_proxy.views.requests.post")
+    @patch("gsl_ds_proxy.views.upstream.post")
     def test_request_id_in_streamed_ds_http_error(self, mock_post):
         import requests as req
 
@@ -872,7 +877,7 @@ class GraphqlProxyViewTest(TestCase):
         data = _parse_stream(response)
         self.assertTrue(data["errors"][0]["extensions"]["requestId"])
 
-    @patch("gsl_ds_proxy.views.requests.post")
+    @patch("gsl_ds_proxy.views.upstream.post")
     def test_request_id_in_streamed_timeout(self, mock_post):
         import requests as req
 
@@ -882,7 +887,7 @@ class GraphqlProxyViewTest(TestCase):
         data = _parse_stream(response)
         self.assertTrue(data["errors"][0]["extensions"]["requestId"])
 
-    @patch("gsl_ds_proxy.views.requests.post")
+    @patch("gsl_ds_proxy.views.upstream.post")
     def test_request_id_in_streamed_connection_error(self, mock_post):
         import requests as req
 
@@ -892,7 +897,7 @@ class GraphqlProxyViewTest(TestCase):
         data = _parse_stream(response)
         self.assertTrue(data["errors"][0]["extensions"]["requestId"])
 
-    @patch("gsl_ds_proxy.views.requests.post")
+    @patch("gsl_ds_proxy.views.upstream.post")
     def test_request_id_in_scope_error_after_response(self, mock_post):
         mock_post.return_value.status_code = 200
         mock_post.return_value.raise_for_status.return_value = None
@@ -915,7 +920,7 @@ class GraphqlProxyViewTest(TestCase):
     # Upstream DS errors preserved with scope error
     # ------------------------------------------------------------------
 
-    @patch("gsl_ds_proxy.views.requests.post")
+    @patch("gsl_ds_proxy.views.upstream.post")
     def test_scope_error_preserves_upstream_ds_errors(self, mock_post):
         """When DS returns partial errors AND data fails scope check, both
         the upstream errors and our scope rejection are returned."""
@@ -953,7 +958,7 @@ class GraphqlProxyViewTest(TestCase):
         self.assertEqual(len(scope_messages), 1)
         self.assertIsNone(data["data"])
 
-    @patch("gsl_ds_proxy.views.requests.post")
+    @patch("gsl_ds_proxy.views.upstream.post")
     def test_verbatim_forward_prepends_request_id_marker(self, mock_post):
         """DS errors + null data: forward verbatim AND add our request_id
         marker so the partner can correlate with our logs."""
@@ -981,7 +986,7 @@ class GraphqlProxyViewTest(TestCase):
     # Logging enrichment
     # ------------------------------------------------------------------
 
-    @patch("gsl_ds_proxy.views.requests.post")
+    @patch("gsl_ds_proxy.views.upstream.post")
     def test_logging_extra_on_connection_error(self, mock_post):
         import requests as req
 
@@ -997,7 +1002,7 @@ class GraphqlProxyViewTest(TestCase):
         self.assertTrue(record.request_id)
         self.assertIsInstance(record.elapsed_ms, int)
 
-    @patch("gsl_ds_proxy.views.requests.post")
+    @patch("gsl_ds_proxy.views.upstream.post")
     def test_logging_extra_on_timeout(self, mock_post):
         import requests as req
 
@@ -1013,7 +1018,7 @@ class GraphqlProxyViewTest(TestCase):
         self.assertTrue(record.request_id)
         self.assertIsInstance(record.elapsed_ms, int)
 
-    @patch("gsl_ds_proxy.views.requests.post")
+    @patch("gsl_ds_proxy.views.upstream.post")
     def test_logging_extra_on_http_error(self, mock_post):
         import requests as req
 
@@ -1039,7 +1044,7 @@ class GraphqlProxyViewTest(TestCase):
     def _request_log_records(records):
         return [r for r in records if r.getMessage() == "DS proxy: request"]
 
-    @patch("gsl_ds_proxy.views.requests.post")
+    @patch("gsl_ds_proxy.views.upstream.post")
     def test_request_log_on_successful_getDemarche(self, mock_post):
         mock_post.return_value.status_code = 200
         mock_post.return_value.raise_for_status.return_value = None
@@ -1076,7 +1081,7 @@ class GraphqlProxyViewTest(TestCase):
         self.assertTrue(record.request_id)
         self.assertIsInstance(record.elapsed_ms, int)
 
-    @patch("gsl_ds_proxy.views.requests.post")
+    @patch("gsl_ds_proxy.views.upstream.post")
     def test_request_log_counts_all_demarche_connections(self, mock_post):
         mock_post.return_value.status_code = 200
         mock_post.return_value.raise_for_status.return_value = None
@@ -1112,7 +1117,7 @@ class GraphqlProxyViewTest(TestCase):
         self.assertEqual(record.ds_results_count, 4)
         self.assertEqual(record.filtered_out_count, 2)
 
-    @patch("gsl_ds_proxy.views.requests.post")
+    @patch("gsl_ds_proxy.views.upstream.post")
     def test_request_log_on_authorized_getDossier(self, mock_post):
         mock_post.return_value.status_code = 200
         mock_post.return_value.raise_for_status.return_value = None
@@ -1142,7 +1147,7 @@ class GraphqlProxyViewTest(TestCase):
         self.assertEqual(record.ds_results_count, 1)
         self.assertEqual(record.filtered_out_count, 0)
 
-    @patch("gsl_ds_proxy.views.requests.post")
+    @patch("gsl_ds_proxy.views.upstream.post")
     def test_request_log_on_filtered_getDossier(self, mock_post):
         mock_post.return_value.status_code = 200
         mock_post.return_value.raise_for_status.return_value = None
@@ -1171,7 +1176,7 @@ class GraphqlProxyViewTest(TestCase):
         self.assertEqual(record.ds_results_count, 1)
         self.assertEqual(record.filtered_out_count, 1)
 
-    @patch("gsl_ds_proxy.views.requests.post")
+    @patch("gsl_ds_proxy.views.upstream.post")
     def test_request_log_on_verbatim_forward(self, mock_post):
         upstream_errors = [
             {"message": "Field 'demaarche' doesn't exist on type 'Query'"},
@@ -1192,7 +1197,7 @@ class GraphqlProxyViewTest(TestCase):
         self.assertEqual(record.ds_errors_count, len(upstream_errors))
         self.assertEqual(record.filtered_out_count, 0)
 
-    @patch("gsl_ds_proxy.views.requests.post")
+    @patch("gsl_ds_proxy.views.upstream.post")
     def test_request_log_on_scope_error(self, mock_post):
         mock_post.return_value.status_code = 200
         mock_post.return_value.raise_for_status.return_value = None
@@ -1219,7 +1224,7 @@ class GraphqlProxyViewTest(TestCase):
         self.assertEqual(record.ds_results_count, 2)
         self.assertEqual(record.filtered_out_count, record.ds_results_count)
 
-    @patch("gsl_ds_proxy.views.requests.post")
+    @patch("gsl_ds_proxy.views.upstream.post")
     def test_request_log_on_introspection_omits_dossier_counts(self, mock_post):
         introspection_payload = {"data": {"__schema": {"types": [{"name": "Query"}]}}}
         mock_post.return_value.status_code = 200
@@ -1255,10 +1260,10 @@ class GraphqlProxyViewTest(TestCase):
 
 @override_settings(DS_API_TOKEN="test-ds-token", DS_API_URL="https://ds.test/graphql")
 class GraphqlProxyTokenLockTest(TestCase):
-    """One in-flight request per token, enforced by the Redis lock.
+    """Bounded in-flight requests per token, enforced by the Redis semaphore.
 
-    The lock layer (`acquire_token_lock` / `release_token_lock`) is mocked here
-    just like `requests.post` is, so the suite doesn't need a live Redis. The
+    The slot layer (`acquire_token_slot` / `release_token_slot`) is mocked here
+    just like the upstream DS call is, so the suite doesn't need a live Redis. The
     locks module itself is unit-tested in test_locks.py.
     """
 
@@ -1299,48 +1304,49 @@ class GraphqlProxyTokenLockTest(TestCase):
             }
         }
 
-    @patch("gsl_ds_proxy.views.release_token_lock")
-    @patch("gsl_ds_proxy.views.acquire_token_lock", return_value=None)
+    @patch("gsl_ds_proxy.views.release_token_slot")
+    @patch("gsl_ds_proxy.views.acquire_token_slot", return_value=None)
     def test_concurrent_request_rejected_with_429(self, mock_acquire, mock_release):
-        # acquire returns None => a request from this token is already in flight.
+        # acquire returns None => every slot of this token is taken and the
+        # wait queue is full or timed out.
         response = self._post(self._get_demarche_payload())
 
         self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "1")
         body = json.loads(response.content)
         self.assertEqual(
             body["errors"][0]["message"],
-            "Une seule requête à la fois est autorisée par token. "
-            "Une requête est déjà en cours pour ce token, attendez sa fin "
-            "avant d'en envoyer une autre.",
+            "Trop de requêtes simultanées pour ce token (1 au maximum). "
+            "Attendez la fin d'une requête en cours avant d'en envoyer une autre.",
         )
         self.assertTrue(body["errors"][0]["extensions"]["requestId"])
         # No worker work happened and there is nothing to release.
         mock_release.assert_not_called()
 
-    @patch("gsl_ds_proxy.views.requests.post")
-    @patch("gsl_ds_proxy.views.release_token_lock")
-    @patch("gsl_ds_proxy.views.acquire_token_lock")
-    def test_lock_released_after_successful_request(
+    @patch("gsl_ds_proxy.views.upstream.post")
+    @patch("gsl_ds_proxy.views.release_token_slot")
+    @patch("gsl_ds_proxy.views.acquire_token_slot")
+    def test_slot_released_after_successful_request(
         self, mock_acquire, mock_release, mock_post
     ):
-        fake_lock = MagicMock()
-        mock_acquire.return_value = fake_lock
+        fake_slot = _FAKE_SLOT
+        mock_acquire.return_value = fake_slot
         self._mock_ds_success(mock_post)
 
         response = self._post(self._get_demarche_payload())
         self.assertEqual(response.status_code, 200)
         _read_stream(response)
 
-        mock_release.assert_called_once_with(fake_lock, self.token.id)
+        mock_release.assert_called_once_with(fake_slot, self.token.id)
 
-    @patch("gsl_ds_proxy.views.requests.post")
-    @patch("gsl_ds_proxy.views.release_token_lock")
-    @patch("gsl_ds_proxy.views.acquire_token_lock")
-    def test_lock_released_after_ds_error(self, mock_acquire, mock_release, mock_post):
+    @patch("gsl_ds_proxy.views.upstream.post")
+    @patch("gsl_ds_proxy.views.release_token_slot")
+    @patch("gsl_ds_proxy.views.acquire_token_slot")
+    def test_slot_released_after_ds_error(self, mock_acquire, mock_release, mock_post):
         import requests as req
 
-        fake_lock = MagicMock()
-        mock_acquire.return_value = fake_lock
+        fake_slot = _FAKE_SLOT
+        mock_acquire.return_value = fake_slot
         mock_post.side_effect = req.exceptions.Timeout()
 
         response = self._post(self._get_demarche_payload())
@@ -1348,21 +1354,21 @@ class GraphqlProxyTokenLockTest(TestCase):
         # Drain the stream so the generator (and its finally) runs to the end.
         _read_stream(response)
 
-        mock_release.assert_called_once_with(fake_lock, self.token.id)
+        mock_release.assert_called_once_with(fake_slot, self.token.id)
 
-    @patch("gsl_ds_proxy.views.requests.post")
-    @patch("gsl_ds_proxy.views.release_token_lock")
-    @patch("gsl_ds_proxy.views.acquire_token_lock")
-    def test_distinct_tokens_acquire_independent_locks(
+    @patch("gsl_ds_proxy.views.upstream.post")
+    @patch("gsl_ds_proxy.views.release_token_slot")
+    @patch("gsl_ds_proxy.views.acquire_token_slot")
+    def test_distinct_tokens_acquire_independent_slots(
         self, mock_acquire, mock_release, mock_post
     ):
-        # Each token gets its own lock keyed on its id, so they never block
+        # Each token gets its own slots keyed on its id, so they never block
         # one another even on the same démarche.
         other_token = ProxyTokenFactory(
             demarche=self.demarche,
             groupe_instructeur_ds_id="GROUPE-2",
         )
-        mock_acquire.return_value = MagicMock()
+        mock_acquire.return_value = _FAKE_SLOT
         self._mock_ds_success(mock_post)
 
         self._read_ok(self._post(self._get_demarche_payload()))
@@ -1376,6 +1382,242 @@ class GraphqlProxyTokenLockTest(TestCase):
         acquired_token_ids = [call.args[0] for call in mock_acquire.call_args_list]
         self.assertEqual(acquired_token_ids, [self.token.id, other_token.id])
 
+    @patch("gsl_ds_proxy.views.upstream.post")
+    @patch("gsl_ds_proxy.views.release_token_slot")
+    @patch("gsl_ds_proxy.views.acquire_token_slot", return_value=_FAKE_SLOT)
+    def test_token_concurrency_limit_overrides_the_default(
+        self, mock_acquire, mock_release, mock_post
+    ):
+        self.token.max_concurrent_requests = 5
+        self.token.save()
+        self._mock_ds_success(mock_post)
+
+        self._read_ok(self._post(self._get_demarche_payload()))
+
+        mock_acquire.assert_called_once_with(self.token.id, 5)
+
     def _read_ok(self, response):
         self.assertEqual(response.status_code, 200)
         _read_stream(response)
+
+
+@override_settings(
+    DS_API_TOKEN="test-ds-token",
+    DS_API_URL="https://ds.test/graphql",
+    DS_PROXY_CACHE_ENABLED=True,
+)
+class GraphqlProxyResponseCacheTest(TestCase):
+    """Opt-in response cache. Redis is mocked (cache.get / cache.set); the
+    cache module itself is unit-tested in test_cache.py."""
+
+    def setUp(self):
+        self.demarche = DemarcheFactory(ds_number=123)
+        self.token = ProxyTokenFactory(
+            demarche=self.demarche,
+            groupe_instructeur_ds_id="GROUPE-1",
+        )
+        self.url = "/ds-proxy/graphql/"
+        self.headers = {"HTTP_AUTHORIZATION": f"Bearer {self.token.plaintext_key}"}
+        for target, kwargs in (
+            ("gsl_ds_proxy.views.acquire_token_slot", {"return_value": _FAKE_SLOT}),
+            ("gsl_ds_proxy.views.release_token_slot", {}),
+            ("gsl_ds_proxy.cache.ProxyResponseCache.get", {"return_value": None}),
+            ("gsl_ds_proxy.cache.ProxyResponseCache.set", {}),
+        ):
+            patcher = patch(target, **kwargs)
+            setattr(self, f"mock_{target.rsplit('.', 1)[-1]}", patcher.start())
+            self.addCleanup(patcher.stop)
+
+    def _post(self):
+        return self.client.post(
+            self.url,
+            data=json.dumps(
+                {
+                    "query": "query getDemarche { demarche { number } }",
+                    "operationName": "getDemarche",
+                    "variables": {"demarcheNumber": self.demarche.ds_number},
+                }
+            ),
+            content_type="application/json",
+            **self.headers,
+        )
+
+    def _mock_ds_response(self, mock_post, ds_response_data):
+        mock_post.return_value.status_code = 200
+        mock_post.return_value.raise_for_status.return_value = None
+        mock_post.return_value.json.return_value = ds_response_data
+
+    @patch("gsl_ds_proxy.views.upstream.post")
+    def test_cache_hit_served_without_slot_nor_ds_call(self, mock_post):
+        self.mock_get.return_value = b'{"data": {"demarche": {"number": 123}}}'
+
+        with self.assertLogs("gsl_ds_proxy.views", level="INFO") as cm:
+            response = self._post()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            json.loads(response.content), {"data": {"demarche": {"number": 123}}}
+        )
+        mock_post.assert_not_called()
+        self.mock_acquire_token_slot.assert_not_called()
+        self.assertEqual(cm.records[0].outcome, "cache_hit")
+        self.assertEqual(cm.records[0].cache, "hit")
+
+    @patch("gsl_ds_proxy.views.upstream.post")
+    def test_cache_miss_stores_the_filtered_response(self, mock_post):
+        self._mock_ds_response(
+            mock_post, {"data": {"demarche": {"number": 123, "dossiers": None}}}
+        )
+
+        with self.assertLogs("gsl_ds_proxy.views", level="INFO") as cm:
+            body = _read_stream(self._post())
+
+        self.mock_set.assert_called_once_with(body.lstrip())
+        self.assertEqual(cm.records[-1].cache, "miss")
+
+    @patch("gsl_ds_proxy.views.upstream.post")
+    def test_response_with_ds_errors_is_not_cached(self, mock_post):
+        self._mock_ds_response(
+            mock_post,
+            {
+                "data": {"demarche": {"number": 123}},
+                "errors": [{"message": "Timeout"}],
+            },
+        )
+
+        _read_stream(self._post())
+
+        self.mock_set.assert_not_called()
+
+    @override_settings(DS_PROXY_CACHE_ENABLED=False)
+    @patch("gsl_ds_proxy.views.upstream.post")
+    def test_cache_disabled(self, mock_post):
+        self._mock_ds_response(mock_post, {"data": {"demarche": {"number": 123}}})
+
+        _read_stream(self._post())
+
+        self.mock_get.assert_not_called()
+        self.mock_set.assert_not_called()
+
+
+@override_settings(DS_API_TOKEN="test-ds-token", DS_API_URL="https://ds.test/graphql")
+class GraphqlProxyPreparedOperationTest(TestCase):
+    """Prepared-operation cache and persisted queries. Redis is mocked
+    (load_persisted_query / store_persisted_query)."""
+
+    _QUERY = "query getDemarche { demarche { number } }"
+
+    def setUp(self):
+        self.demarche = DemarcheFactory(ds_number=123)
+        self.token = ProxyTokenFactory(
+            demarche=self.demarche,
+            groupe_instructeur_ds_id="GROUPE-1",
+        )
+        self.url = "/ds-proxy/graphql/"
+        self.headers = {"HTTP_AUTHORIZATION": f"Bearer {self.token.plaintext_key}"}
+        prepared_operations.clear()
+        self.addCleanup(prepared_operations.clear)
+        for target, kwargs in (
+            ("gsl_ds_proxy.views.acquire_token_slot", {"return_value": _FAKE_SLOT}),
+            ("gsl_ds_proxy.views.release_token_slot", {}),
+            ("gsl_ds_proxy.views.load_persisted_query", {"return_value": None}),
+            ("gsl_ds_proxy.views.store_persisted_query", {}),
+        ):
+            patcher = patch(target, **kwargs)
+            setattr(self, f"mock_{target.rsplit('.', 1)[-1]}", patcher.start())
+            self.addCleanup(patcher.stop)
+
+    def _post(self, query=None, sha256_hash=None):
+        data = {"variables": {"demarcheNumber": self.demarche.ds_number}}
+        if query is not None:
+            data["query"] = query
+        if sha256_hash is not None:
+            data["extensions"] = {
+                "persistedQuery": {"version": 1, "sha256Hash": sha256_hash}
+            }
+        return self.client.post(
+            self.url,
+            data=json.dumps(data),
+            content_type="application/json",
+            **self.headers,
+        )
+
+    def _mock_ds_success(self, mock_post):
+        mock_post.return_value.status_code = 200
+        mock_post.return_value.raise_for_status.return_value = None
+        mock_post.return_value.json.return_value = {
+            "data": {"demarche": {"number": self.demarche.ds_number}}
+        }
+
+    @patch("gsl_ds_proxy.views.upstream.post")
+    def test_document_parsed_and_validated_once(self, mock_post):
+        self._mock_ds_success(mock_post)
+
+        with patch("gsl_ds_proxy.views.parse", wraps=parse) as mock_parse:
+            _read_stream(self._post(self._QUERY))
+            _read_stream(self._post(self._QUERY))
+
+        mock_parse.assert_called_once()
+        self.assertEqual(mock_post.call_count, 2)
+
+    def test_rejected_document_is_not_cached(self):
+        query = "query { demarche { groupeInstructeurs { id } } }"
+
+        with patch("gsl_ds_proxy.views.parse", wraps=parse) as mock_parse:
+            self.assertEqual(self._post(query).status_code, 403)
+            self.assertEqual(self._post(query).status_code, 403)
+
+        self.assertEqual(mock_parse.call_count, 2)
+
+    def test_unknown_persisted_query(self):
+        response = self._post(sha256_hash=document_hash(self._QUERY))
+
+        self.assertEqual(response.status_code, 400)
+        error = json.loads(response.content)["errors"][0]
+        self.assertEqual(error["message"], "PersistedQueryNotFound")
+        self.assertEqual(error["extensions"]["code"], "PERSISTED_QUERY_NOT_FOUND")
+
+    @patch("gsl_ds_proxy.views.upstream.post")
+    def test_persisted_query_registered_with_full_query(self, mock_post):
+        self._mock_ds_success(mock_post)
+        sha256_hash = document_hash(self._QUERY)
+
+        _read_stream(self._post(self._QUERY, sha256_hash))
+
+        self.mock_store_persisted_query.assert_called_once_with(
+            sha256_hash, self._QUERY
+        )
+
+    @patch("gsl_ds_proxy.views.upstream.post")
+    def test_persisted_query_registered_for_an_already_prepared_document(
+        self, mock_post
+    ):
+        self._mock_ds_success(mock_post)
+        sha256_hash = document_hash(self._QUERY)
+
+        with patch("gsl_ds_proxy.views.parse", wraps=parse) as mock_parse:
+            _read_stream(self._post(self._QUERY))
+            _read_stream(self._post(self._QUERY, sha256_hash))
+
+        mock_parse.assert_called_once()
+        self.mock_store_persisted_query.assert_called_once_with(
+            sha256_hash, self._QUERY
+        )
+
+    @patch("gsl_ds_proxy.views.upstream.post")
+    def test_persisted_query_sent_by_hash_only(self, mock_post):
+        self._mock_ds_success(mock_post)
+        self.mock_load_persisted_query.return_value = self._QUERY
+
+        response = self._post(sha256_hash=document_hash(self._QUERY))
+
+        data = _parse_stream(response)
+        self.assertEqual(data["data"]["demarche"]["number"], 123)
+        self.assertEqual(mock_post.call_args.kwargs["json"]["query"], self._QUERY)
+        self.mock_store_persisted_query.assert_not_called()
+
+    def test_persisted_query_hash_mismatch_rejected(self):
+        response = self._post(self._QUERY, sha256_hash="0" * 64)
+
+        self.assertEqual(response.status_code, 400)
+        self.mock_store_persisted_query.assert_not_called()
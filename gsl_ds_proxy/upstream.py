@@ -0,0 +1,138 @@
+"""Connexions du proxy vers l'API DS.
+
+Une seule session HTTP par worker, partagée par ses threads : les connexions
+TCP/TLS vers DS sont gardées ouvertes (keep-alive) et réutilisées d'une
+requête proxy à l'autre, au lieu d'un handshake complet à chaque appel. Le
+pool urllib3 est thread-safe ; la session ne garde aucun cookie, pour que rien
+ne passe d'un partenaire à l'autre.
+
+Le pool garde au plus DS_PROXY_UPSTREAM_POOL_SIZE connexions. Au-delà, une
+requête n'attend pas : elle ouvre une connexion supplémentaire, fermée après
+usage, et le pool est signalé comme saturé dans les logs.
+
+Chaque appel logge sa latence découpée en trois phases : connexion (0 si une
+connexion du pool est réutilisée), attente du premier octet (envoi de la
+requête compris) et lecture du corps.
+"""
+
+import logging
+import threading
+import time
+from http.cookiejar import DefaultCookiePolicy
+
+import requests
+from django.conf import settings
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+logger = logging.getLogger(__name__)
+
+_session = None
+_session_lock = threading.Lock()
+_in_flight = 0
+_in_flight_lock = threading.Lock()
+# Durée de la dernière ouverture de connexion du thread courant
+_connect_timing = threading.local()
+
+
+def _elapsed_ms(started_at):
+    return int((time.monotonic() - started_at) * 1000)
+
+
+class _TimedHTTPConnection(HTTPConnection):
+    def connect(self):
+        started_at = time.monotonic()
+        super().connect()
+        _connect_timing.connect_ms = _elapsed_ms(started_at)
+
+
+class _TimedHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        started_at = time.monotonic()
+        super().connect()
+        _connect_timing.connect_ms = _elapsed_ms(started_at)
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class _UpstreamAdapter(requests.adapters.HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _TimedHTTPConnectionPool,
+            "https": _TimedHTTPSConnectionPool,
+        }
+
+
+def get_upstream_session() -> requests.Session:
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+            adapter = _UpstreamAdapter(
+                pool_connections=1,
+                pool_maxsize=settings.DS_PROXY_UPSTREAM_POOL_SIZE,
+                pool_block=False,
+            )
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+        return _session
+
+
+def post(url, *, json, headers, timeout, log_extra=None) -> requests.Response:
+    """POST vers DS via la session partagée ; le corps est lu avant le retour.
+
+    Lève les mêmes exceptions que ``requests.post``.
+    """
+    global _in_flight
+    pool_size = settings.DS_PROXY_UPSTREAM_POOL_SIZE
+    with _in_flight_lock:
+        _in_flight += 1
+        pool_in_use = _in_flight
+    if pool_in_use > pool_size:
+        logger.warning(
+            "DS proxy: upstream pool exhausted",
+            extra={
+                **(log_extra or {}),
+                "pool_in_use": pool_in_use,
+                "pool_size": pool_size,
+            },
+        )
+
+    _connect_timing.connect_ms = None
+    try:
+        started_at = time.monotonic()
+        response = get_upstream_session().post(
+            url, json=json, headers=headers, timeout=timeout, stream=True
+        )
+        ttfb_ms = _elapsed_ms(started_at)
+        body = response.content
+        body_ms = _elapsed_ms(started_at) - ttfb_ms
+    finally:
+        with _in_flight_lock:
+            _in_flight -= 1
+
+    connect_ms = _connect_timing.connect_ms
+    logger.info(
+        "DS proxy: upstream timings",
+        extra={
+            **(log_extra or {}),
+            "connection_reused": connect_ms is None,
+            "connect_ms": connect_ms or 0,
+            "ttfb_ms": ttfb_ms,
+            "body_ms": body_ms,
+            "response_size": len(body),
+            "pool_in_use": pool_in_use,
+            "pool_size": pool_size,
+            "pool_exhausted": pool_in_use > pool_size,
+        },
+    )
+    return response
@@ -5,14 +5,24 @@ import uuid
 
 import requests
 from django.conf import settings
-from django.http import JsonResponse, StreamingHttpResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 from graphql import GraphQLError, OperationType, parse
 from graphql.language.ast import FieldNode, OperationDefinitionNode
 
-from gsl_ds_proxy.filters import filter_response
-from gsl_ds_proxy.locks import acquire_token_lock, release_token_lock
+from gsl_ds_proxy import upstream
+from gsl_ds_proxy.cache import CACHE_HIT, CACHE_MISS, ProxyResponseCache
+from gsl_ds_proxy.documents import (
+    PreparedOperation,
+    document_hash,
+    load_persisted_query,
+    normalized_document_hash,
+    prepared_operations,
+    store_persisted_query,
+)
+from gsl_ds_proxy.filters import filter_response, iter_json_bytes
+from gsl_ds_proxy.locks import acquire_token_slot, release_token_slot
 from gsl_ds_proxy.models import ProxyToken
 from gsl_ds_proxy.query_guard import validate_demarche_selections
 
@@ -23,7 +33,7 @@ _BUSINESS_FIELDS = {"demarche", "dossier"}
 _ALLOWED_ROOT_FIELDS = _BUSINESS_FIELDS | _INTROSPECTION_FIELDS
 _INTROSPECTION_SENTINEL = "__introspection__"
 
-# Same three connections as filters._filter_dossier_nodes; kept in sync so the
+# Same three connections as filters._DOSSIER_CONNECTIONS; kept in sync so the
 # pre/post counts in the per-request log match what filter_response actually
 # touched.
 _DEMARCHE_DOSSIER_CONNECTIONS = (
@@ -179,6 +189,15 @@ def _check_root_field_allowed(proxy_token, root_field, variables, request_id):
     return None
 
 
+def _check_demarche_selections(doc, operation, request_id):
+    forbidden_field = validate_demarche_selections(doc, operation)
+    if forbidden_field is not None:
+        return _error_response(
+            f"Champ démarche non autorisé : `{forbidden_field}`.", 403, request_id
+        )
+    return None
+
+
 def _scoped_field_present(root_field, response_data):
     if root_field == _INTROSPECTION_SENTINEL:
         return True
@@ -254,11 +273,12 @@ def _forward_to_ds(
 
     started_at = time.monotonic()
     try:
-        ds_response = requests.post(
+        ds_response = upstream.post(
             settings.DS_API_URL,
             json=ds_payload,
             headers=headers,
             timeout=_DS_TIMEOUT,
+            log_extra=log_extra,
         )
     except requests.exceptions.ConnectionError:
         elapsed_ms = int((time.monotonic() - started_at) * 1000)
@@ -310,6 +330,124 @@ def _resolve_token(request, request_id):
     return proxy_token, None
 
 
+def _prepare_operation(query, operation_name, request_id):
+    """Return (PreparedOperation, None) or (None, error_response).
+
+    Runs every check that depends on the document alone, so that the result
+    can be cached in documents.prepared_operations.
+    """
+    try:
+        doc = parse(query)
+    except GraphQLError as exc:
+        return None, _error_response(
+            f"Requête GraphQL invalide : {exc.message}", 400, request_id
+        )
+
+    operation, error = _pick_operation(doc, operation_name, request_id)
+    if error is not None:
+        return None, error
+
+    if operation.operation is not OperationType.QUERY:
+        return None, _error_response(
+            "Les mutations ne sont pas autorisées.", 403, request_id
+        )
+
+    root_field, error = _root_field(operation, request_id)
+    if error is not None:
+        return None, error
+
+    error = _check_demarche_selections(doc, operation, request_id)
+    if error is not None:
+        return None, error
+
+    return PreparedOperation(
+        query=query,
+        doc=doc,
+        operation=operation,
+        operation_name=operation.name.value if operation.name else None,
+        root_field=root_field,
+        normalized_hash=normalized_document_hash(doc),
+    ), None
+
+
+def _persisted_query_hash(body):
+    extensions = body.get("extensions") or {}
+    persisted_query = extensions.get("persistedQuery") or {}
+    return persisted_query.get("sha256Hash")
+
+
+def _persisted_query_not_found(request_id):
+    # Apollo clients resend the full query when they see this message.
+    entry = _error_entry("PersistedQueryNotFound", request_id)
+    entry["extensions"]["code"] = "PERSISTED_QUERY_NOT_FOUND"
+    return JsonResponse({"errors": [entry]}, status=400)
+
+
+def _resolve_operation(body, request_id):
+    """Return (PreparedOperation, None) or (None, error_response).
+
+    The body carries the query text, a persisted-query hash
+    (``extensions.persistedQuery.sha256Hash``) or both. Documents already
+    validated by this worker are served from the prepared-operation cache.
+    """
+    query = body.get("query") or ""
+    operation_name = body.get("operationName")
+    persisted_hash = _persisted_query_hash(body)
+    if persisted_hash and query and document_hash(query) != persisted_hash:
+        return None, _error_response(
+            "sha256Hash ne correspond pas à la requête envoyée.", 400, request_id
+        )
+
+    cache_key = (persisted_hash or document_hash(query), operation_name)
+    prepared = prepared_operations.get(cache_key)
+    if prepared is not None:
+        # Registration (hash + query) of a document this worker already
+        # prepared: the other workers only know it once stored.
+        if persisted_hash and query:
+            store_persisted_query(persisted_hash, query)
+        return prepared, None
+
+    if persisted_hash and not query:
+        query = load_persisted_query(persisted_hash)
+        if query is None:
+            return None, _persisted_query_not_found(request_id)
+        persisted_hash = None  # already stored
+
+    prepared, error = _prepare_operation(query, operation_name, request_id)
+    if error is not None:
+        return None, error
+
+    prepared_operations.put(cache_key, prepared)
+    if persisted_hash:
+        store_persisted_query(persisted_hash, query)
+    return prepared, None
+
+
+def _lookup_cache(prepared, variables, proxy_token, request_id):
+    """Return (cache, None) or (cache, cached_response).
+
+    cache is None when the request is not cacheable (cache disabled, zero TTL
+    for the operation).
+    """
+    cache = ProxyResponseCache.for_request(prepared, variables, proxy_token)
+    cached = cache.get() if cache is not None else None
+    if cached is None:
+        return cache, None
+    logger.info(
+        "DS proxy: request",
+        extra={
+            "request_id": request_id,
+            "proxy_token_id": proxy_token.id,
+            "demarche_number": proxy_token.demarche.ds_number,
+            "operation_name": prepared.operation_name,
+            "root_field": prepared.root_field,
+            "outcome": "cache_hit",
+            "cache": CACHE_HIT,
+        },
+    )
+    return cache, HttpResponse(cached, content_type="application/json", status=200)
+
+
 @csrf_exempt
 @require_POST
 def graphql_proxy(request):
@@ -325,63 +463,52 @@ def graphql_proxy(request):
     except (json.JSONDecodeError, ValueError):
         return _error_response("Corps de requête JSON invalide.", 400, request_id)
 
-    query = body.get("query", "")
     variables = body.get("variables")
 
-    try:
-        doc = parse(query)
-    except GraphQLError as exc:
-        return _error_response(
-            f"Requête GraphQL invalide : {exc.message}", 400, request_id
-        )
-
-    operation, error = _pick_operation(doc, body.get("operationName"), request_id)
+    prepared, error = _resolve_operation(body, request_id)
     if error is not None:
         return error
 
-    if operation.operation is not OperationType.QUERY:
-        return _error_response("Les mutations ne sont pas autorisées.", 403, request_id)
-
-    root_field, error = _root_field(operation, request_id)
-    if error is not None:
-        return error
-
-    operation_name = operation.name.value if operation.name else None
-
     # Scope check: the token is tied to a single démarche
-    error = _check_root_field_allowed(proxy_token, root_field, variables, request_id)
+    error = _check_root_field_allowed(
+        proxy_token, prepared.root_field, variables, request_id
+    )
     if error is not None:
         return error
 
-    forbidden_field = validate_demarche_selections(doc, operation)
-    if forbidden_field is not None:
-        return _error_response(
-            f"Champ démarche non autorisé : `{forbidden_field}`.", 403, request_id
-        )
-
-    # One in-flight request per token: acquire the lock just before the
-    # expensive DS forward. A second concurrent request from the same token is
-    # rejected immediately (429) instead of holding a second worker hostage.
-    lock = acquire_token_lock(proxy_token.id)
-    if lock is None:
-        return _error_response(
-            "Une seule requête à la fois est autorisée par token. "
-            "Une requête est déjà en cours pour ce token, attendez sa fin "
-            "avant d'en envoyer une autre.",
+    # Opt-in short-TTL cache: a hit is served without taking a slot nor
+    # calling DS. Only complete "ok" responses are ever stored.
+    cache, cached_response = _lookup_cache(prepared, variables, proxy_token, request_id)
+    if cached_response is not None:
+        return cached_response
+
+    # Bounded in-flight requests per token: take a slot just before the
+    # expensive DS forward. When every slot is taken the request waits in a
+    # short bounded queue, then is rejected (429) instead of holding a worker
+    # hostage for long.
+    slot = acquire_token_slot(proxy_token.id, proxy_token.concurrency_limit)
+    if slot is None:
+        response = _error_response(
+            "Trop de requêtes simultanées pour ce token "
+            f"({proxy_token.concurrency_limit} au maximum). Attendez la fin "
+            "d'une requête en cours avant d'en envoyer une autre.",
             429,
             request_id,
         )
+        response["Retry-After"] = "1"
+        return response
 
     allowed_groupe_ds_id = proxy_token.groupe_instructeur_ds_id
     stream = _stream_ds_response(
         proxy_token,
-        root_field,
-        operation_name,
-        query,
+        prepared.root_field,
+        prepared.operation_name,
+        prepared.query,
         variables,
         allowed_groupe_ds_id,
         request_id,
-        lock,
+        slot,
+        cache,
     )
     return StreamingHttpResponse(stream, content_type="application/json", status=200)
 
@@ -394,9 +521,10 @@ def _stream_ds_response(
     variables,
     allowed_groupe_ds_id,
     request_id,
-    lock,
+    slot,
+    cache=None,
 ):
-    # The lock acquired in the view is released here in a finally so every exit
+    # The slot acquired in the view is released here in a finally so every exit
     # path frees it: DS error return, verbatim forward, scope error, ok — and
     # also if the client disconnects (Django closes the iterator, which raises
     # GeneratorExit and triggers the finally).
@@ -421,8 +549,10 @@ def _stream_ds_response(
                 "operation_name": operation_name,
                 "root_field": root_field,
                 "elapsed_ms": elapsed_ms,
+                "queue_wait_ms": slot.queue_wait_ms,
                 "ds_errors_count": len(response_data.get("errors") or []),
                 "outcome": outcome,
+                "cache": CACHE_MISS if cache is not None else None,
             }
             if original is not None:
                 post = (
@@ -446,7 +576,7 @@ def _stream_ds_response(
                 *response_data["errors"],
             ]
             _log_request(outcome="verbatim_forward", filtered=response_data)
-            yield json.dumps(forwarded).encode()
+            yield from iter_json_bytes(forwarded)
             return
 
         scope_error = _check_response_allowed(proxy_token, root_field, response_data)
@@ -465,9 +595,12 @@ def _stream_ds_response(
 
         filtered = filter_response(response_data, allowed_groupe_ds_id)
         _log_request(outcome="ok", filtered=filtered)
-        yield json.dumps(filtered).encode()
+        chunks = iter_json_bytes(filtered)
+        if cache is not None and not response_data.get("errors"):
+            chunks = cache.tee(chunks)
+        yield from chunks
     finally:
-        release_token_lock(lock, proxy_token.id)
+        release_token_slot(slot, proxy_token.id)
 
 
 graphql_proxy.login_required = False
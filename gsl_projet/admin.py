@@ -101,6 +101,7 @@ class ProjetAdmin(AllPermsForStaffUser, admin.ModelAdmin):
         )
         qs = qs.defer(
             "dossier_ds__ds_data__raw_data",
+            "dossier_ds__ds_data__raw_data_archive",
             "dossier_ds__ds_demarche__raw_ds_data",
         )
         qs = qs.prefetch_related("dotationprojet_set")
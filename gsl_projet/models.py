@@ -2,6 +2,7 @@ from datetime import UTC, date, datetime
 from datetime import timezone as tz
 from typing import TYPE_CHECKING, List, Optional, Tuple
 
+from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator
 from django.db import models, transaction
@@ -21,6 +22,10 @@ from django_fsm import FSMField, transition
 
 from gsl_core.models import Adresse, BaseModel, Collegue, Departement, Perimetre
 from gsl_demarches_simplifiees.models import Dossier
+from gsl_demarches_simplifiees.outbox import (
+    enqueue_annotations_update,
+    enqueue_repasser_en_instruction,
+)
 from gsl_demarches_simplifiees.services import DsService
 from gsl_notification.models import (
     GENERATED_DOCUMENTS,
@@ -855,15 +860,20 @@ class DotationProjet(BaseModel):
         self.accept_without_ds_update(montant, enveloppe, actor=user)
 
         projet_dotation_checked = self.other_accepted_dotations
+        annotations = {
+            "dotations_to_be_checked": [self.dotation] + projet_dotation_checked,
+            "annotations_dotation_to_update": self.dotation,
+            "assiette": floatize(self.assiette),
+            "montant": floatize(montant),
+            "taux": floatize(self.taux_retenu),
+        }
+        if settings.DS_MUTATIONS_OUTBOX_ENABLED:
+            enqueue_annotations_update(self.projet.dossier_ds, user, **annotations)
+            return
+
         ds_service = DsService()
         ds_service.update_ds_annotations_for_one_dotation(
-            dossier=self.projet.dossier_ds,
-            user=user,
-            dotations_to_be_checked=[self.dotation] + projet_dotation_checked,
-            annotations_dotation_to_update=self.dotation,
-            assiette=floatize(self.assiette),
-            montant=floatize(montant),
-            taux=floatize(self.taux_retenu),
+            dossier=self.projet.dossier_ds, user=user, **annotations
         )
 
     @transition(field=status, source="*", target=PROJET_STATUS_REFUSED)
@@ -980,6 +990,16 @@ class DotationProjet(BaseModel):
 
         self.set_back_status_to_processing_without_ds(actor=user)
 
+        if settings.DS_MUTATIONS_OUTBOX_ENABLED:
+            if is_notified:
+                enqueue_repasser_en_instruction(self.projet.dossier_ds, user)
+            enqueue_annotations_update(
+                self.projet.dossier_ds,
+                user,
+                dotations_to_be_checked=self.other_accepted_dotations,
+            )
+            return
+
         if is_notified:
             ds_service.repasser_en_instruction(self.projet.dossier_ds, user)
 
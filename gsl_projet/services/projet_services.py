@@ -8,10 +8,13 @@ logger = logging.getLogger(__name__)
 
 class ProjetService:
     @classmethod
-    def create_or_update_projet_and_co_from_dossier(cls, ds_dossier_number: str):
+    def create_or_update_projet_and_co_from_dossier(
+        cls, ds_dossier_number: str, ds_dossier: Dossier | None = None
+    ):
         from gsl_projet.services.dotation_projet_services import DotationProjetService
 
-        ds_dossier = Dossier.objects.get(ds_number=ds_dossier_number)
+        if ds_dossier is None:
+            ds_dossier = Dossier.objects.get(ds_number=ds_dossier_number)
         projet = cls.create_or_update_from_ds_dossier(ds_dossier)
         DotationProjetService.create_or_update_dotation_projet_from_projet(projet)
 
@@ -4,6 +4,7 @@ from unittest import mock
 import pytest
 from django.db import IntegrityError
 from django.forms import ValidationError
+from django.test import override_settings
 from django.utils import timezone
 from django_fsm import TransitionNotAllowed
 
@@ -12,7 +13,7 @@ from gsl_core.tests.factories import (
     DepartementFactory,
     PerimetreFactory,
 )
-from gsl_demarches_simplifiees.models import Dossier
+from gsl_demarches_simplifiees.models import Dossier, DsMutation
 from gsl_historique.models import ProjetAction
 from gsl_programmation.models import ProgrammationProjet
 from gsl_programmation.tests.factories import (
@@ -412,6 +413,54 @@ def test_accept_does_not_create_status_change_action_when_already_accepted_and_s
     )
 
 
+@override_settings(DS_MUTATIONS_OUTBOX_ENABLED=True)
+@mock.patch("gsl_projet.models.DsService")
+def test_accept_with_outbox_enqueues_the_annotations_mutation(mock_ds_service):
+    dotation_projet = DotationProjetFactory(assiette=10_000, dotation=DOTATION_DETR)
+    enveloppe = DetrEnveloppeFactory(annee=2025)
+    user = CollegueFactory()
+
+    dotation_projet.accept(montant=5_000, enveloppe=enveloppe, user=user)
+
+    mock_ds_service.assert_not_called()
+    mutation = DsMutation.objects.get()
+    assert mutation.dossier == dotation_projet.dossier_ds
+    assert mutation.instructeur == user
+    assert mutation.kind == DsMutation.KIND_ANNOTATIONS
+    assert mutation.status == DsMutation.STATUS_PENDING
+    assert mutation.payload == {
+        "dotations_to_be_checked": [DOTATION_DETR],
+        "annotations_dotation_to_update": DOTATION_DETR,
+        "assiette": 10_000.0,
+        "montant": 5_000.0,
+        "taux": 50.0,
+    }
+
+
+@override_settings(DS_MUTATIONS_OUTBOX_ENABLED=True)
+@mock.patch("gsl_projet.models.DsService")
+def test_set_back_status_to_processing_with_outbox_enqueues_state_then_annotations(
+    mock_ds_service,
+):
+    dotation_projet = DotationProjetFactory(
+        dotation=DOTATION_DETR,
+        status=PROJET_STATUS_ACCEPTED,
+        projet__notified_at=timezone.now(),
+    )
+    user = CollegueFactory()
+
+    dotation_projet.set_back_status_to_processing(user=user)
+
+    mock_ds_service.return_value.repasser_en_instruction.assert_not_called()
+    mock_ds_service.return_value.update_ds_annotations_for_one_dotation.assert_not_called()
+    assert list(
+        DsMutation.objects.order_by("created_at").values_list("kind", "payload")
+    ) == [
+        (DsMutation.KIND_REPASSER_EN_INSTRUCTION, {}),
+        (DsMutation.KIND_ANNOTATIONS, {"dotations_to_be_checked": []}),
+    ]
+
+
 def test_accept_creates_status_change_action_when_already_accepted_but_enveloppe_changed():
     old_enveloppe = DetrEnveloppeFactory(annee=2024)
     new_enveloppe = DetrEnveloppeFactory(annee=2025)